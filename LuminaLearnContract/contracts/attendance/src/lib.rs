@@ -1,12 +1,13 @@
 #![no_std]
 use soroban_sdk::{
     contract, contracterror, contractimpl, log, symbol_short, Address, Env, Map,
-    Symbol, BytesN, prng::Prng // Corrected Prng import, removed unused imports
+    Symbol, BytesN
 };
 
 // Define storage keys
 const TEACHER: Symbol = symbol_short!("TEACHER");
 const LECTURES: Symbol = symbol_short!("LECTURES"); // Map<u64, Address> lecture_id -> teacher_address
+const TEACHERS: Symbol = symbol_short!("TEACHERS"); // Map<Address, bool> teachers the admin allowed to create lectures
 const SESSIONS: Symbol = symbol_short!("SESSIONS"); // Map<u64, (BytesN<32>, u64)> lecture_id -> (nonce, expiry_timestamp)
 const RECORDS: Symbol = symbol_short!("RECORDS"); // Map<u64, Map<Address, bool>> lecture_id -> (student_address -> attended)
 
@@ -44,6 +45,16 @@ pub enum Error {
 #[contract]
 pub struct AttendanceContract;
 
+/// Fails unless `admin` is the admin set at initialization and authorized the call.
+fn require_admin(env: &Env, admin: &Address) -> Result<(), Error> {
+    let stored_admin: Address = env.storage().instance().get(&TEACHER).ok_or(Error::NotInitialized)?;
+    if *admin != stored_admin {
+        return Err(Error::Unauthorized);
+    }
+    admin.require_auth();
+    Ok(())
+}
+
 #[contractimpl]
 impl AttendanceContract {
     /// Initialize the contract, setting the teacher/admin.
@@ -55,21 +66,66 @@ impl AttendanceContract {
         env.storage().instance().set(&TEACHER, &teacher);
         // Initialize maps
         env.storage().persistent().set(&LECTURES, &Map::<u64, Address>::new(&env));
+        env.storage().persistent().set(&TEACHERS, &Map::<Address, bool>::new(&env));
         env.storage().persistent().set(&SESSIONS, &Map::<u64, (BytesN<32>, u64)>::new(&env));
         env.storage().persistent().set(&RECORDS, &Map::<u64, Map<Address, bool>>::new(&env));
         env.storage().persistent().set(&STUDENTS, &Map::<u64, Map<u64, StudentInfo>>::new(&env)); // Initialize STUDENTS map
         Ok(())
     }
 
-    /// Allows the teacher to create a new lecture entry.
+    /// Allows the admin to let a teacher create lectures.
+    pub fn add_teacher(env: Env, admin: Address, teacher: Address) -> Result<(), Error> {
+        require_admin(&env, &admin)?;
+
+        let mut teachers: Map<Address, bool> = env.storage().persistent().get(&TEACHERS).unwrap_or_else(|| Map::new(&env));
+        teachers.set(teacher.clone(), true);
+        env.storage().persistent().set(&TEACHERS, &teachers);
+        env.storage().persistent().extend_ttl(&TEACHERS, 100_000_u32, 500_000_u32);
+
+        log!(&env, "Teacher added: {}", teacher);
+        Ok(())
+    }
+
+    /// Allows the admin to stop a teacher from creating further lectures.
+    /// Lectures the teacher already owns keep their owner.
+    pub fn remove_teacher(env: Env, admin: Address, teacher: Address) -> Result<(), Error> {
+        require_admin(&env, &admin)?;
+
+        let mut teachers: Map<Address, bool> = env.storage().persistent().get(&TEACHERS).unwrap_or_else(|| Map::new(&env));
+        teachers.remove(teacher.clone());
+        env.storage().persistent().set(&TEACHERS, &teachers);
+
+        log!(&env, "Teacher removed: {}", teacher);
+        Ok(())
+    }
+
+    /// Check if the admin allowed a teacher to create lectures.
+    pub fn is_teacher(env: Env, teacher: Address) -> bool {
+        env.storage()
+            .persistent()
+            .get(&TEACHERS)
+            .and_then(|teachers: Map<Address, bool>| teachers.get(teacher))
+            .unwrap_or(false)
+    }
+
+    /// Creates a lecture owned by the calling teacher.
+    /// Only the admin set at initialization and teachers it added with
+    /// `add_teacher` may create lectures; an existing lecture can only be
+    /// re-created by its owner or the admin. Only the owner (or the admin)
+    /// may later start sessions for it.
     pub fn create_lecture(env: Env, teacher: Address, lecture_id: u64) -> Result<(), Error> {
-        let stored_teacher = env.storage().instance().get(&TEACHER).ok_or(Error::NotInitialized)?;
-        if teacher != stored_teacher {
+        let admin: Address = env.storage().instance().get(&TEACHER).ok_or(Error::NotInitialized)?;
+        if teacher != admin && !Self::is_teacher(env.clone(), teacher.clone()) {
             return Err(Error::Unauthorized);
         }
         teacher.require_auth(); // Ensure the caller is the teacher
 
         let mut lectures: Map<u64, Address> = env.storage().persistent().get(&LECTURES).unwrap(); // Should exist after init
+        if let Some(owner) = lectures.get(lecture_id) {
+            if owner != teacher && teacher != admin {
+                return Err(Error::Unauthorized);
+            }
+        }
         lectures.set(lecture_id, teacher.clone());
         env.storage().persistent().set(&LECTURES, &lectures);
         // Extend TTL for persistent storage
@@ -125,35 +181,30 @@ impl AttendanceContract {
     }
 
     /// Starts an attendance session for a given lecture.
-    /// Generates a random nonce and sets an expiry time (e.g., 5 minutes).
-    /// Returns the nonce to be used off-chain (e.g., in a QR code).
-    pub fn start_attendance(env: Env, teacher: Address, lecture_id: u64, duration_seconds: u64) -> Result<BytesN<32>, Error> {
-        let stored_teacher = env.storage().instance().get(&TEACHER).ok_or(Error::NotInitialized)?;
-         if teacher != stored_teacher {
-            return Err(Error::Unauthorized);
-        }
+    /// The nonce is generated off-chain by the application and shown in the
+    /// QR code; students must present the same nonce before the expiry time.
+    pub fn start_attendance(
+        env: Env,
+        teacher: Address,
+        lecture_id: u64,
+        nonce: BytesN<32>,
+        duration_seconds: u64,
+    ) -> Result<(), Error> {
+        let admin: Address = env.storage().instance().get(&TEACHER).ok_or(Error::NotInitialized)?;
         teacher.require_auth();
 
         let lectures: Map<u64, Address> = env.storage().persistent().get(&LECTURES).ok_or(Error::LectureNotFound)?;
-        if !lectures.contains_key(lecture_id) {
-             return Err(Error::LectureNotFound);
+        let owner = lectures.get(lecture_id).ok_or(Error::LectureNotFound)?;
+        // Only the teacher who created the lecture (or the admin) can start sessions
+        if owner != teacher && teacher != admin {
+            return Err(Error::Unauthorized);
         }
-        // Ensure the teacher calling is the one who created the lecture (or the main admin)
-        // For simplicity now, only the main admin can start sessions
-        // if lectures.get(lecture_id).unwrap() != teacher {
-        //     return Err(Error::Unauthorized);
-        // }
-
-
-        // Generate a random nonce
-        let mut prng = env.prng(); // Get Prng instance from Env
-        let nonce: BytesN<32> = prng.gen();
 
         let current_timestamp = env.ledger().timestamp();
         let expiry_timestamp = current_timestamp + duration_seconds;
 
         let mut sessions: Map<u64, (BytesN<32>, u64)> = env.storage().persistent().get(&SESSIONS).unwrap();
-        sessions.set(lecture_id, (nonce.clone(), expiry_timestamp));
+        sessions.set(lecture_id, (nonce, expiry_timestamp));
         env.storage().persistent().set(&SESSIONS, &sessions);
         // Extend TTL for the session entry - should last slightly longer than the session itself
         // Cast duration to u32. Add checks if duration could exceed u32::MAX
@@ -163,7 +214,7 @@ impl AttendanceContract {
 
 
         log!(&env, "Attendance started for lecture: {}, expires at: {}", lecture_id, expiry_timestamp);
-        Ok(nonce)
+        Ok(())
     }
 
     /// Allows a student to mark their attendance using the nonce provided off-chain.
@@ -210,6 +261,8 @@ impl AttendanceContract {
 
 
         log!(&env, "Student {} marked attendance for lecture {}", student, lecture_id);
+        // Indexed off-chain by the `index_blockchain` worker
+        env.events().publish((symbol_short!("attend"), lecture_id), student);
         Ok(())
     }
 
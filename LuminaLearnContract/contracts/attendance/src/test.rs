@@ -1,21 +1,72 @@
 #![cfg(test)]
 
 use super::*;
-use soroban_sdk::{vec, Env, String};
+use soroban_sdk::{testutils::Address as _, Address, BytesN, Env};
+
+fn setup(env: &Env) -> (AttendanceContractClient<'_>, Address) {
+    env.mock_all_auths();
+    let contract_id = env.register(AttendanceContract, ());
+    let client = AttendanceContractClient::new(env, &contract_id);
+    let admin = Address::generate(env);
+    client.initialize(&admin);
+    (client, admin)
+}
+
+#[test]
+fn test_only_added_teachers_create_lectures() {
+    let env = Env::default();
+    let (client, admin) = setup(&env);
+    let teacher = Address::generate(&env);
+
+    // An address the admin never added cannot claim a lecture id
+    assert_eq!(client.try_create_lecture(&teacher, &1), Err(Ok(Error::Unauthorized)));
+    assert_eq!(client.try_add_teacher(&teacher, &teacher), Err(Ok(Error::Unauthorized)));
+
+    client.add_teacher(&admin, &teacher);
+    assert!(client.is_teacher(&teacher));
+    client.create_lecture(&teacher, &1);
+
+    client.remove_teacher(&admin, &teacher);
+    assert!(!client.is_teacher(&teacher));
+    assert_eq!(client.try_create_lecture(&teacher, &2), Err(Ok(Error::Unauthorized)));
+}
 
 #[test]
-fn test() {
+fn test_lecture_belongs_to_its_creator() {
     let env = Env::default();
-    let contract_id = env.register(Contract, ());
-    let client = ContractClient::new(&env, &contract_id);
-
-    let words = client.hello(&String::from_str(&env, "Dev"));
-    assert_eq!(
-        words,
-        vec![
-            &env,
-            String::from_str(&env, "Hello"),
-            String::from_str(&env, "Dev"),
-        ]
-    );
+    let (client, admin) = setup(&env);
+    let owner = Address::generate(&env);
+    let other = Address::generate(&env);
+    client.add_teacher(&admin, &owner);
+    client.add_teacher(&admin, &other);
+    client.create_lecture(&owner, &1);
+    let nonce = BytesN::from_array(&env, &[7; 32]);
+
+    // Another teacher can neither take the lecture over nor start its sessions
+    assert_eq!(client.try_create_lecture(&other, &1), Err(Ok(Error::Unauthorized)));
+    assert_eq!(client.try_start_attendance(&other, &1, &nonce, &300), Err(Ok(Error::Unauthorized)));
+    assert_eq!(client.try_start_attendance(&owner, &2, &nonce, &300), Err(Ok(Error::LectureNotFound)));
+
+    client.start_attendance(&owner, &1, &nonce, &300);
+    client.start_attendance(&admin, &1, &nonce, &300);
+}
+
+#[test]
+fn test_check_in_needs_the_session_nonce() {
+    let env = Env::default();
+    let (client, admin) = setup(&env);
+    let teacher = Address::generate(&env);
+    let student = Address::generate(&env);
+    client.add_teacher(&admin, &teacher);
+    client.create_lecture(&teacher, &1);
+    client.start_attendance(&teacher, &1, &BytesN::from_array(&env, &[7; 32]), &300);
+
+    let wrong = BytesN::from_array(&env, &[8; 32]);
+    assert_eq!(client.try_mark_attendance(&student, &1, &wrong), Err(Ok(Error::InvalidNonce)));
+    assert!(!client.get_attendance(&1, &student));
+
+    let nonce = BytesN::from_array(&env, &[7; 32]);
+    client.mark_attendance(&student, &1, &nonce);
+    assert!(client.get_attendance(&1, &student));
+    assert_eq!(client.try_mark_attendance(&student, &1, &nonce), Err(Ok(Error::AlreadyMarked)));
 }
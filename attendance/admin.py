@@ -1,14 +1,15 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Course, Lecture, Enrollment, AttendanceSession, Attendance
+from .models import (User, Course, Lecture, Enrollment, AttendanceSession, Attendance, BlockchainOutbox, ChannelAccount,
+                     ProvisionedKeypair, ChainAttendanceRecord, IndexerCursor, AttendanceAnchor)
 
 class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'is_admin', 'is_teacher', 'is_student', 'stellar_public_key')
-    list_filter = ('is_admin', 'is_teacher', 'is_student')
+    list_display = ('username', 'email', 'is_admin', 'is_teacher', 'is_student', 'stellar_public_key', 'stellar_status')
+    list_filter = ('is_admin', 'is_teacher', 'is_student', 'stellar_status')
     fieldsets = (
         (None, {'fields': ('username', 'email', 'password')}),
         ('Roles', {'fields': ('is_admin', 'is_teacher', 'is_student')}),
-        ('Blockchain', {'fields': ('stellar_public_key', 'stellar_seed')}),
+        ('Blockchain', {'fields': ('stellar_public_key', 'stellar_seed', 'stellar_status')}),
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
@@ -46,9 +47,43 @@ class AttendanceAdmin(admin.ModelAdmin):
     list_filter = ('blockchain_verified', 'timestamp', 'lecture__course')
     search_fields = ('student__username', 'lecture__title', 'lecture__course__name')
 
+class BlockchainOutboxAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'signer', 'lecture', 'attempts', 'transaction_hash', 'available_at', 'processed_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('signer__username', 'lecture__title', 'transaction_hash', 'last_error')
+
+class ChannelAccountAdmin(admin.ModelAdmin):
+    list_display = ('public_key', 'is_active', 'consecutive_failures', 'disabled_until', 'last_used')
+    list_filter = ('is_active',)
+    search_fields = ('public_key',)
+    exclude = ('secret_seed',)
+
+class ProvisionedKeypairAdmin(admin.ModelAdmin):
+    list_display = ('public_key', 'claimed_by', 'claimed_at', 'created_at')
+    search_fields = ('public_key', 'claimed_by__username')
+    exclude = ('secret_seed',)
+
+class ChainAttendanceRecordAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'lecture_ref', 'student_public_key', 'signer_public_key', 'ledger', 'transaction_hash')
+    list_filter = ('kind',)
+    search_fields = ('lecture_ref', 'student_public_key', 'signer_public_key', 'transaction_hash')
+
+class IndexerCursorAdmin(admin.ModelAdmin):
+    list_display = ('name', 'cursor', 'updated_at')
+
+class AttendanceAnchorAdmin(admin.ModelAdmin):
+    list_display = ('session', 'merkle_root', 'leaf_count', 'transaction_hash', 'created_at', 'anchored_at')
+    search_fields = ('merkle_root', 'transaction_hash')
+
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Course, CourseAdmin)
 admin.site.register(Lecture, LectureAdmin)
 admin.site.register(Enrollment, EnrollmentAdmin)
 admin.site.register(AttendanceSession, AttendanceSessionAdmin)
 admin.site.register(Attendance, AttendanceAdmin)
+admin.site.register(BlockchainOutbox, BlockchainOutboxAdmin)
+admin.site.register(ChannelAccount, ChannelAccountAdmin)
+admin.site.register(ProvisionedKeypair, ProvisionedKeypairAdmin)
+admin.site.register(ChainAttendanceRecord, ChainAttendanceRecordAdmin)
+admin.site.register(IndexerCursor, IndexerCursorAdmin)
+admin.site.register(AttendanceAnchor, AttendanceAnchorAdmin)
@@ -0,0 +1,110 @@
+"""
+Merkle-batched anchoring of attendance records.
+
+With ``STELLAR_ATTENDANCE_ANCHORING = 'merkle'`` a QR check-in only saves the
+``Attendance`` row. When the session closes (and, with
+``python manage.py anchor_attendance``, every few seconds while it is open)
+the session's not yet anchored rows are hashed into a Merkle tree. An
+``AttendanceAnchor`` keeps the root, and each row gets its inclusion proof.
+A single ``ANCHOR_ATTENDANCE`` outbox entry then publishes the root as a
+transaction hash memo. A 300-student lecture therefore costs one transaction
+instead of 300, and each record can still be checked on its own with
+``verify_anchored``.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from . import merkle, outbox
+from .models import Attendance, AttendanceAnchor, AttendanceSession, BlockchainOutbox
+
+MERKLE = 'merkle'
+
+
+def anchoring_enabled():
+    return settings.STELLAR_ATTENDANCE_ANCHORING == MERKLE
+
+
+def _unanchored(queryset):
+    # Rows already queued on their own (manual attendance, or check-ins from
+    # before anchoring was enabled) are left to their outbox entries
+    return queryset.filter(
+        anchor__isnull=True,
+        blockchain_verified=False,
+        session__isnull=False,
+    ).exclude(Exists(BlockchainOutbox.objects.filter(attendance=OuterRef('pk'))))
+
+
+def anchor_session(session):
+    """
+    Anchor the session's attendance rows that are not anchored yet
+
+    Call inside the transaction that closes the session, or on its own.
+
+    Returns:
+        AttendanceAnchor or None: the new anchor, or None if there was nothing to anchor
+    """
+    with transaction.atomic():
+        rows = list(_unanchored(Attendance.objects.filter(session=session))
+                    .select_related('student', 'session')
+                    .select_for_update(of=('self',))
+                    .order_by('pk'))
+        if not rows:
+            return None
+
+        root, proofs = merkle.build_tree([merkle.leaf_hash(merkle.attendance_leaf(row)) for row in rows])
+        anchor = AttendanceAnchor.objects.create(session=session, merkle_root=root.hex(), leaf_count=len(rows))
+        for row, proof in zip(rows, proofs):
+            row.anchor = anchor
+            row.merkle_proof = proof
+        Attendance.objects.bulk_update(rows, ['anchor', 'merkle_proof'], batch_size=500)
+
+        lecture = session.lecture
+        outbox.enqueue(
+            BlockchainOutbox.ANCHOR_ATTENDANCE,
+            lecture.course.teacher,
+            lecture=lecture,
+            session=session,
+            anchor_id=anchor.pk,
+            merkle_root=anchor.merkle_root,
+        )
+    return anchor
+
+
+def anchor_pending_sessions(include_active=True):
+    """
+    Anchor every session that has unanchored rows
+
+    Args:
+        include_active: also anchor sessions that are still open (interval
+            anchoring); otherwise only closed sessions are caught up
+
+    Returns:
+        list: the new ``AttendanceAnchor`` rows
+    """
+    sessions = AttendanceSession.objects.filter(
+        Exists(_unanchored(Attendance.objects.filter(session=OuterRef('pk'))))
+    ).select_related('lecture__course__teacher')
+    if not include_active:
+        sessions = sessions.filter(is_active=False)
+    anchors = []
+    for session in sessions:
+        anchor = anchor_session(session)
+        if anchor is not None:
+            anchors.append(anchor)
+    return anchors
+
+
+def verify_anchored(attendance):
+    """
+    Check an anchored row against its published Merkle root
+
+    Returns:
+        bool: True if the row's leaf and proof lead to a root whose anchor
+        transaction has been confirmed
+    """
+    anchor = attendance.anchor
+    if anchor is None or not anchor.anchored_at or attendance.merkle_proof is None:
+        return False
+    leaf = merkle.leaf_hash(merkle.attendance_leaf(attendance))
+    return merkle.verify_proof(leaf, attendance.merkle_proof, anchor.merkle_root)
@@ -0,0 +1,98 @@
+"""
+QR check-in fast path.
+
+A check-in used to take a query each for the lecture, the session, the
+duplicate check and the enrollment check before inserting, and two
+students' bursts could race between the duplicate check and the insert.
+``check_in`` instead refuses scans against the session's cached roster
+(``attendance.roster``) without a query and relies on
+``unique_together('student', 'lecture')`` for the insert: an
+``IntegrityError`` from a duplicate, concurrent or not, is reported as
+"already marked" rather than a server error.
+
+The roster may be stale in this process: with a per-process cache, closing
+a session or unenrolling a student only drops the copy of the worker that
+handled it. So a scan the roster accepts is re-checked in the insert's
+transaction with one indexed query for the session still being active and
+the student still enrolled.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+
+from . import outbox
+from .anchoring import anchoring_enabled
+from .models import Attendance, AttendanceSession, BlockchainOutbox, Enrollment
+from .roster import drop_roster, get_roster
+
+NO_SESSION = 'No active attendance session for this lecture'
+ALREADY_MARKED = 'You have already marked attendance for this lecture'
+NOT_ENROLLED = 'You are not enrolled in this course'
+
+
+class CheckInError(Exception):
+    """
+    Raised when a scan cannot be recorded; the message is shown to the student
+    """
+
+
+def check_in(student, data):
+    """
+    Record ``student``'s attendance for a payload accepted by ``verify_qr_data``
+
+    Queues the blockchain write in the same transaction (unless Merkle
+    anchoring covers the row later).
+
+    Returns:
+        SessionRoster: the roster of the session the student checked in to
+
+    Raises:
+        CheckInError: no matching active session, not enrolled, or already marked
+    """
+    roster = get_roster(data['lecture_id'])
+    if roster is None or roster.is_expired() or not roster.matches(data):
+        raise CheckInError(NO_SESSION)
+    if not roster.is_enrolled(student.pk):
+        raise CheckInError(NOT_ENROLLED)
+
+    try:
+        with transaction.atomic():
+            _recheck(roster, student)
+            attendance = Attendance.objects.create(
+                student=student,
+                lecture_id=roster.lecture_id,
+                session_id=roster.session_id,
+                blockchain_verified=False
+            )
+            # Queue the blockchain record instead of waiting on the network;
+            # with Merkle anchoring the session's root covers this row later
+            if not anchoring_enabled():
+                outbox.enqueue(
+                    BlockchainOutbox.MARK_ATTENDANCE,
+                    student,
+                    lecture=roster.lecture_id,
+                    session=roster.session_id,
+                    attendance=attendance,
+                    nonce=roster.nonce
+                )
+    except IntegrityError:
+        # The student is already marked, possibly by a concurrent scan
+        raise CheckInError(ALREADY_MARKED) from None
+    return roster
+
+
+def _recheck(roster, student):
+    """
+    Confirm from the database what the possibly stale ``roster`` accepted
+    """
+    current = (AttendanceSession.objects
+               .filter(pk=roster.session_id)
+               .annotate(enrolled=Exists(Enrollment.objects.filter(course_id=OuterRef('lecture__course_id'),
+                                                                   student=student)))
+               .values_list('is_active', 'enrolled')
+               .first())
+    if current is None or not current[0]:
+        drop_roster(roster.lecture_id)
+        raise CheckInError(NO_SESSION)
+    if not current[1]:
+        drop_roster(roster.lecture_id)
+        raise CheckInError(NOT_ENROLLED)
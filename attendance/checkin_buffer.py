@@ -0,0 +1,292 @@
+"""
+Write-behind ingestion of QR check-ins.
+
+With ``CHECKIN_WRITE_BEHIND = True`` a scan is validated against the
+session's cached roster (``attendance.roster``) and a cached set of
+already-marked students, and appended to an on-disk journal; the student
+gets an answer without a database write. A burst of a
+few hundred scans therefore no longer queues a few hundred INSERTs on the
+database lock.
+
+``python manage.py flush_checkin_buffer`` (or ``flush``) moves the journal
+aside and persists it with ``bulk_create(ignore_conflicts=True)`` in
+batches of ``CHECKIN_FLUSH_BATCH_SIZE``, adding the outbox entries for the
+new rows in the same transaction.
+
+The journal is crash-safe:
+
+* each record is a single ``O_APPEND`` write under an exclusive ``flock``,
+  followed by ``fsync`` when ``CHECKIN_BUFFER_FSYNC`` is set, so an accepted
+  check-in survives a process or machine crash;
+* the flusher renames the journal before reading it, and writers that had
+  the old file open notice the rename and retry on the new one;
+* a renamed file is only deleted after its transaction commits. Flushing it
+  again after a crash is harmless: conflicting rows are ignored and outbox
+  entries are only added for rows that have none.
+
+``Attendance.timestamp`` is set when the record is flushed, so it trails
+the scan by up to the flush interval.
+
+Scans are checked against the cached roster, which another process may not
+have dropped yet after a close or an unenrollment. The flush therefore skips
+records scanned after their session ended or from students no longer
+enrolled in the course.
+"""
+import fcntl
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .anchoring import anchoring_enabled
+from .checkin import ALREADY_MARKED, NO_SESSION, NOT_ENROLLED, CheckInError
+from .models import Attendance, AttendanceSession, BlockchainOutbox, Enrollment
+from .roster import get_roster
+
+logger = logging.getLogger(__name__)
+
+JOURNAL = 'checkins.jsonl'
+FLUSHING_SUFFIX = '.flushing'
+
+
+def write_behind_enabled():
+    return settings.CHECKIN_WRITE_BEHIND
+
+
+def _buffer_dir():
+    return Path(settings.CHECKIN_BUFFER_DIR)
+
+
+def _marked_key(lecture_id):
+    return f"checkin_marked:{lecture_id}"
+
+
+def _marker_key(lecture_id, student_id):
+    return f"checkin_buffered:{lecture_id}:{student_id}"
+
+
+def _already_marked(lecture_id):
+    """
+    Students with an attendance row for the lecture, cached for ``CHECKIN_SESSION_CACHE_SECONDS``
+    """
+    key = _marked_key(lecture_id)
+    marked = cache.get(key)
+    if marked is None:
+        marked = set(Attendance.objects.filter(lecture_id=lecture_id).values_list('student_id', flat=True))
+        cache.set(key, marked, settings.CHECKIN_SESSION_CACHE_SECONDS)
+    return marked
+
+
+def buffer_check_in(student, data):
+    """
+    Validate a verified QR payload against the cached session roster and journal it
+
+    Returns:
+        SessionRoster: the roster of the session, for the response
+
+    Raises:
+        CheckInError: no matching active session, not enrolled, or already marked
+    """
+    lecture_id = data['lecture_id']
+    roster = get_roster(lecture_id)
+    if roster is None or roster.is_expired() or not roster.matches(data):
+        raise CheckInError(NO_SESSION)
+    if not roster.is_enrolled(student.pk):
+        raise CheckInError(NOT_ENROLLED)
+    if student.pk in _already_marked(lecture_id):
+        raise CheckInError(ALREADY_MARKED)
+
+    # Atomic across processes for shared cache backends; the unique
+    # constraint still drops any duplicate that gets past it
+    remaining = int(roster.end_time - time.time()) if roster.end_time else 0
+    if not cache.add(_marker_key(lecture_id, student.pk), True,
+                     remaining + settings.CHECKIN_SESSION_CACHE_SECONDS):
+        raise CheckInError(ALREADY_MARKED)
+
+    try:
+        append({
+            'student': student.pk,
+            'lecture': lecture_id,
+            'session': roster.session_id,
+            'nonce': roster.nonce,
+            'scanned_at': timezone.now().isoformat(),
+        })
+    except OSError:
+        cache.delete(_marker_key(lecture_id, student.pk))
+        raise
+    return roster
+
+
+def append(record):
+    """
+    Durably append one record to the journal
+    """
+    directory = _buffer_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / JOURNAL
+    line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                rotated = os.fstat(fd).st_ino != os.stat(path).st_ino
+            except FileNotFoundError:
+                rotated = True
+            if rotated:
+                # The flusher renamed the file after we opened it
+                continue
+            os.write(fd, line)
+            if settings.CHECKIN_BUFFER_FSYNC:
+                os.fsync(fd)
+            return
+        finally:
+            os.close(fd)
+
+
+def pending_count():
+    """
+    Number of journaled check-ins not flushed yet
+    """
+    directory = _buffer_dir()
+    if not directory.exists():
+        return 0
+    count = 0
+    for path in [directory / JOURNAL, *directory.glob(f'*{FLUSHING_SUFFIX}')]:
+        try:
+            with open(path, 'rb') as journal:
+                count += sum(1 for _ in journal)
+        except FileNotFoundError:
+            pass
+    return count
+
+
+def _rotate(directory):
+    path = directory / JOURNAL
+    try:
+        os.rename(path, directory / f"checkins.{time.time_ns()}.{os.getpid()}{FLUSHING_SUFFIX}")
+    except FileNotFoundError:
+        pass
+
+
+def _read(fd, path):
+    records = []
+    with os.fdopen(os.dup(fd), 'rb') as journal:
+        for number, line in enumerate(journal, 1):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn final line from a crash mid-write was never acknowledged
+                logger.warning("Skipping unreadable check-in record %s:%d", path.name, number)
+    return records
+
+
+def flush(batch_size=None):
+    """
+    Persist every journaled check-in
+
+    Returns:
+        int: journal records processed
+    """
+    batch_size = batch_size or settings.CHECKIN_FLUSH_BATCH_SIZE
+    directory = _buffer_dir()
+    if not directory.exists():
+        return 0
+    _rotate(directory)
+
+    processed = 0
+    for path in sorted(directory.glob(f'*{FLUSHING_SUFFIX}')):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue  # Another flusher finished it
+        try:
+            # Waits for writers still appending to it, and for other flushers
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if not path.exists():
+                continue
+            records = _read(fd, path)
+            for start in range(0, len(records), batch_size):
+                persist(records[start:start + batch_size])
+            os.remove(path)
+            processed += len(records)
+        finally:
+            os.close(fd)
+    return processed
+
+
+def _still_valid(records):
+    """
+    The records whose session had not ended when they were scanned and whose
+    student is still enrolled
+    """
+    if not records:
+        return records
+    sessions = {pk: (end_time, course_id) for pk, end_time, course_id in
+                AttendanceSession.objects.filter(pk__in={record['session'] for record in records})
+                .values_list('pk', 'end_time', 'lecture__course_id')}
+    enrolled = set(Enrollment.objects
+                   .filter(student_id__in={record['student'] for record in records},
+                           course_id__in={course_id for _, course_id in sessions.values()})
+                   .values_list('student_id', 'course_id'))
+    valid = []
+    for record in records:
+        end_time, course_id = sessions.get(record['session'], (None, None))
+        if course_id is None or (record['student'], course_id) not in enrolled:
+            logger.warning("Dropping check-in of student %s: not enrolled or session %s gone",
+                           record['student'], record['session'])
+        elif end_time is not None and datetime.fromisoformat(record['scanned_at']) > end_time:
+            logger.warning("Dropping check-in of student %s scanned after session %s ended",
+                           record['student'], record['session'])
+        else:
+            valid.append(record)
+    return valid
+
+
+def persist(records):
+    """
+    Insert a batch of journal records and queue their blockchain writes
+    """
+    records = _still_valid(records)
+    if not records:
+        return
+    with transaction.atomic():
+        Attendance.objects.bulk_create(
+            [Attendance(student_id=record['student'], lecture_id=record['lecture'],
+                        session_id=record['session'], blockchain_verified=False,
+                        timestamp=datetime.fromisoformat(record['scanned_at']))
+             for record in records],
+            ignore_conflicts=True,
+        )
+        # With Merkle anchoring the session's root covers these rows later
+        if anchoring_enabled():
+            return
+        by_pair = {(record['student'], record['lecture']): record for record in records}
+        new_rows = (Attendance.objects
+                    .filter(lecture_id__in={record['lecture'] for record in records},
+                            student_id__in={record['student'] for record in records},
+                            blockchain_verified=False,
+                            anchor__isnull=True)
+                    .exclude(Exists(BlockchainOutbox.objects.filter(attendance=OuterRef('pk'))))
+                    .only('pk', 'student_id', 'lecture_id', 'session_id'))
+        BlockchainOutbox.objects.bulk_create([
+            BlockchainOutbox(
+                kind=BlockchainOutbox.MARK_ATTENDANCE,
+                signer_id=row.student_id,
+                lecture_id=row.lecture_id,
+                session_id=row.session_id,
+                attendance=row,
+                payload={'nonce': by_pair[(row.student_id, row.lecture_id)]['nonce']},
+            )
+            for row in new_rows
+            # Rows recorded another way (manual attendance) are not ours to queue
+            if by_pair.get((row.student_id, row.lecture_id), {}).get('session') == row.session_id
+        ])
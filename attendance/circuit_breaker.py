@@ -0,0 +1,260 @@
+"""
+Per-endpoint circuit breakers for Horizon and Soroban RPC.
+
+When an endpoint is down or overloaded, every call would otherwise wait out
+a full HTTP timeout (times the client's retries), tying up outbox workers
+and anything else that talks to the chain. Each configured URL gets one
+``CircuitBreaker`` that every client of that URL (sync and async) shares:
+
+* **closed**: calls pass through. Outcomes are kept over a sliding window
+  of ``STELLAR_BREAKER_WINDOW`` calls. Once at least
+  ``STELLAR_BREAKER_MIN_CALLS`` are recorded, the breaker opens if either
+  rate crosses its threshold:
+
+  * the failure rate (exceptions and 5xx responses) reaches
+    ``STELLAR_BREAKER_FAILURE_RATE``;
+  * the slow-call rate (calls over ``STELLAR_BREAKER_SLOW_CALL_SECONDS``)
+    reaches ``STELLAR_BREAKER_SLOW_CALL_RATE``.
+
+* **open**: calls fail at once with ``CircuitOpenError`` for
+  ``STELLAR_BREAKER_OPEN_SECONDS``.
+* **half-open**: up to ``STELLAR_BREAKER_HALF_OPEN_CALLS`` trial calls are
+  let through. If they all succeed the breaker closes; any failure re-opens it.
+
+4xx responses (``tx_bad_seq``, missing accounts, ...) are answers from a
+healthy server and do not count as failures. State is per process and is
+exposed through ``breaker_states()`` on the blockchain status endpoint.
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from stellar_sdk.client.base_async_client import BaseAsyncClient
+from stellar_sdk.client.base_sync_client import BaseSyncClient
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an endpoint whose breaker is open
+    """
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit breaker for {name} is open; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def _is_failure_response(response):
+    return getattr(response, 'status_code', 200) >= 500
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker for one endpoint
+    """
+
+    def __init__(self, name, clock=time.monotonic):
+        self.name = name
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._outcomes = deque()  # (failed, slow) per call while closed
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+        self.counters = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= settings.STELLAR_BREAKER_OPEN_SECONDS:
+                return HALF_OPEN
+            return self._state
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self.counters['opened'] += 1
+
+    def before_call(self):
+        """
+        Admit a call or raise ``CircuitOpenError``
+        """
+        if not settings.STELLAR_BREAKER_ENABLED:
+            return
+        with self._lock:
+            if self._state == OPEN:
+                remaining = settings.STELLAR_BREAKER_OPEN_SECONDS - (self._clock() - self._opened_at)
+                if remaining > 0:
+                    self.counters['rejected'] += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._state = HALF_OPEN
+                self._trials = 0
+                self._trial_successes = 0
+            if self._state == HALF_OPEN:
+                if self._trials >= settings.STELLAR_BREAKER_HALF_OPEN_CALLS:
+                    self.counters['rejected'] += 1
+                    raise CircuitOpenError(self.name, 1)
+                self._trials += 1
+
+    def record(self, failed, duration):
+        """
+        Record the outcome of an admitted call
+        """
+        if not settings.STELLAR_BREAKER_ENABLED:
+            return
+        slow = duration >= settings.STELLAR_BREAKER_SLOW_CALL_SECONDS
+        with self._lock:
+            self.counters['calls'] += 1
+            self.counters['failures'] += failed
+            self.counters['slow_calls'] += slow
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= settings.STELLAR_BREAKER_HALF_OPEN_CALLS:
+                        self._state = CLOSED
+                return
+            if self._state == OPEN:
+                return  # A call admitted before the breaker opened
+
+            self._outcomes.append((failed, slow))
+            while len(self._outcomes) > settings.STELLAR_BREAKER_WINDOW:
+                self._outcomes.popleft()
+            calls = len(self._outcomes)
+            if calls < settings.STELLAR_BREAKER_MIN_CALLS:
+                return
+            failure_rate = sum(1 for f, _ in self._outcomes if f) / calls
+            slow_rate = sum(1 for _, s in self._outcomes if s) / calls
+            if (failure_rate >= settings.STELLAR_BREAKER_FAILURE_RATE
+                    or slow_rate >= settings.STELLAR_BREAKER_SLOW_CALL_RATE):
+                self._open()
+
+    def call(self, fn):
+        """
+        Run ``fn()`` through the breaker
+        """
+        self.before_call()
+        start = self._clock()
+        try:
+            result = fn()
+        except Exception:
+            self.record(True, self._clock() - start)
+            raise
+        self.record(_is_failure_response(result), self._clock() - start)
+        return result
+
+    async def call_async(self, fn):
+        """
+        Await ``fn()`` through the breaker
+        """
+        self.before_call()
+        start = self._clock()
+        try:
+            result = await fn()
+        except Exception:
+            self.record(True, self._clock() - start)
+            raise
+        self.record(_is_failure_response(result), self._clock() - start)
+        return result
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                'state': state,
+                'window_calls': calls,
+                'window_failure_rate': round(sum(1 for f, _ in self._outcomes if f) / calls, 3) if calls else 0.0,
+                'window_slow_rate': round(sum(1 for _, s in self._outcomes if s) / calls, 3) if calls else 0.0,
+                **self.counters,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._outcomes.clear()
+            self._trials = 0
+            self._trial_successes = 0
+
+
+class BreakerClient(BaseSyncClient):
+    """
+    Sync HTTP client that routes requests through an endpoint's breaker
+
+    Streams are long-lived and bypass the breaker.
+    """
+
+    def __init__(self, inner, breaker):
+        self.inner = inner
+        self.breaker = breaker
+
+    def get(self, url, params=None):
+        return self.breaker.call(lambda: self.inner.get(url, params))
+
+    def post(self, url, data=None, json_data=None):
+        return self.breaker.call(lambda: self.inner.post(url, data, json_data))
+
+    def stream(self, url, params=None):
+        return self.inner.stream(url, params)
+
+    def close(self):
+        self.inner.close()
+
+
+class AsyncBreakerClient(BaseAsyncClient):
+    """
+    Async HTTP client that routes requests through an endpoint's breaker
+    """
+
+    def __init__(self, inner, breaker):
+        self.inner = inner
+        self.breaker = breaker
+
+    async def get(self, url, params=None):
+        return await self.breaker.call_async(lambda: self.inner.get(url, params))
+
+    async def post(self, url, data=None, json_data=None):
+        return await self.breaker.call_async(lambda: self.inner.post(url, data, json_data))
+
+    def stream(self, url, params=None):
+        return self.inner.stream(url, params)
+
+    async def close(self):
+        await self.inner.close()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(url):
+    """
+    The process-wide breaker for ``url``
+    """
+    breaker = _breakers.get(url)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(url, CircuitBreaker(url))
+    return breaker
+
+
+def breaker_states():
+    """
+    ``{url: {"state", window rates, counters}}`` for every endpoint used so far
+    """
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {url: breaker.stats() for url, breaker in breakers.items()}
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
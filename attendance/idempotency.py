@@ -0,0 +1,111 @@
+"""
+Idempotent POST handling for check-ins.
+
+The scanner page posts every time the camera decodes the code, and flaky
+phones retry, so one student often sends the same check-in several times.
+``idempotent`` records the first final JSON answer in the shared cache for
+``CHECKIN_IDEMPOTENCY_TTL`` seconds and replays it for repeats, before the view
+verifies the QR code or touches the ORM or Stellar.
+
+A request is identified by the user, the ``Idempotency-Key`` header when the
+client sends one, and a digest of the posted ``qr_data`` (so a key reused
+for a different code is a different request). A repeat that arrives while
+the first request is still running gets a 409 instead of running twice.
+Replays are answered before the check-in rate limit, so a retrying phone
+does not use up the student's allowance.
+
+The monitoring counters live in the same cache, so with a shared
+``CACHE_URL`` they add up every worker's requests.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+IN_FLIGHT_SECONDS = 30  # Longest a first request is expected to run
+
+STATS_KEY = 'idempotency:stats:'
+STATS = ('requests', 'stored', 'replayed', 'in_flight')
+
+
+def _count(name):
+    key = STATS_KEY + name
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def idempotency_stats():
+    """
+    Counters for monitoring: requests seen, answers stored, repeats replayed or refused while in flight
+    """
+    counts = cache.get_many([STATS_KEY + name for name in STATS])
+    stats = {name: counts.get(STATS_KEY + name, 0) for name in STATS}
+    stats['suppressed'] = stats['replayed'] + stats['in_flight']
+    return stats
+
+
+def reset_idempotency_stats():
+    cache.delete_many([STATS_KEY + name for name in STATS])
+
+
+def request_key(request, scope, field):
+    client_key = request.headers.get(IDEMPOTENCY_HEADER, '')[:128]
+    digest = hashlib.sha256(
+        f"{request.user.pk}\0{client_key}\0{request.POST.get(field, '')}".encode()
+    ).hexdigest()[:40]
+    return f"idempotency:{scope}:{digest}"
+
+
+def idempotent(scope, field='qr_data', replayable=None):
+    """
+    Replay a POST view's first final JSON answer to repeats of the same request
+
+    Args:
+        scope: name separating this view's keys from others
+        field: POST field whose value identifies the request
+        replayable: callable taking the decoded JSON answer and returning
+            whether it is final; other answers (e.g. transient errors) are
+            not stored, so the client can retry. Defaults to every answer.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'POST' or not request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            _count('requests')
+            key = request_key(request, scope, field)
+            stored = cache.get(key)
+            if stored is not None:
+                _count('replayed')
+                response = JsonResponse(stored['data'], status=stored['status'])
+                response[REPLAYED_HEADER] = 'true'
+                return response
+
+            lock_key = f"{key}:lock"
+            if not cache.add(lock_key, True, IN_FLIGHT_SECONDS):
+                _count('in_flight')
+                return JsonResponse({'success': False, 'error': 'This check-in is already being processed'},
+                                    status=409)
+            try:
+                response = view(request, *args, **kwargs)
+                if isinstance(response, JsonResponse) and response.status_code < 500:
+                    data = json.loads(response.content)
+                    if replayable is None or replayable(data):
+                        cache.set(key, {'data': data, 'status': response.status_code},
+                                  settings.CHECKIN_IDEMPOTENCY_TTL)
+                        _count('stored')
+                return response
+            finally:
+                cache.delete(lock_key)
+        return wrapper
+    return decorator
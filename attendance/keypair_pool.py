@@ -0,0 +1,148 @@
+"""
+Pool of pre-funded Stellar keypairs for signups.
+
+Creating and funding an account (Friendbot or a ``create_account``
+transaction) takes seconds, and registering it on-chain takes a ledger
+close. Neither belongs in the signup request. The ``refill_keypair_pool``
+command keeps ``STELLAR_KEYPAIR_POOL_SIZE`` funded keypairs ready. Signup
+claims one with a single compare-and-set update, and the registration
+transaction goes through the blockchain outbox. ``User.stellar_status``
+shows ``pending`` until the outbox confirms it. If the pool runs dry,
+signup falls back to a fresh keypair that the outbox funds first.
+"""
+import logging
+import random
+
+from django.conf import settings
+from django.utils import timezone
+from stellar_sdk import CreateAccount, Keypair
+
+from . import outbox
+from .models import BlockchainOutbox, ProvisionedKeypair, User
+from .stellar_helper import MAX_OPERATIONS_PER_TRANSACTION, StellarHelper
+
+logger = logging.getLogger(__name__)
+
+# Unclaimed rows a claim picks from at random, so concurrent signups rarely collide
+_CLAIM_CANDIDATES = 8
+
+
+def fund_from_account(keypairs, funder_seed, starting_balance):
+    """
+    Create accounts for ``keypairs`` with create_account operations, 100 per transaction
+
+    The funder (usually ``STELLAR_ADMIN_SECRET``) also signs other writes, so
+    its sequence numbers come from the shared sequence manager, and each
+    transaction waits for ledger inclusion so the accounts exist once handed out.
+
+    Returns:
+        list: the keypairs whose transaction succeeded
+    """
+    funder = Keypair.from_secret(funder_seed)
+    funded = []
+    size = MAX_OPERATIONS_PER_TRANSACTION
+    for start in range(0, len(keypairs), size):
+        chunk = keypairs[start:start + size]
+        operations = [CreateAccount(destination=keypair.public_key, starting_balance=starting_balance)
+                      for keypair in chunk]
+        try:
+            StellarHelper._submit_transaction(funder, "Provision accounts", operations, wait=True)
+        except Exception as e:
+            logger.warning("Funding %s accounts failed: %s", len(chunk), e)
+            continue
+        funded.extend(chunk)
+    return funded
+
+
+def fund_keypairs(keypairs, funder_seed=None, starting_balance=None):
+    """
+    Fund ``keypairs`` from ``funder_seed`` (default ``STELLAR_ADMIN_SECRET``), or Friendbot on testnet
+
+    Returns:
+        list: the keypairs that were funded
+    """
+    funder_seed = funder_seed or settings.STELLAR_ADMIN_SECRET
+    if funder_seed:
+        return fund_from_account(keypairs, funder_seed, starting_balance or settings.STELLAR_KEYPAIR_POOL_BALANCE)
+    if not settings.STELLAR_TESTNET:
+        raise ValueError("A funding account is required outside testnet")
+    funded = []
+    for keypair in keypairs:
+        try:
+            if StellarHelper.fund_account(keypair.public_key):
+                funded.append(keypair)
+        except Exception as e:
+            logger.warning("Friendbot could not fund %s: %s", keypair.public_key, e)
+    return funded
+
+
+def available_count():
+    return ProvisionedKeypair.objects.filter(claimed_at__isnull=True).count()
+
+
+def refill(target=None, batch_size=MAX_OPERATIONS_PER_TRANSACTION, funder_seed=None, starting_balance=None):
+    """
+    Create and fund keypairs until ``target`` (default ``STELLAR_KEYPAIR_POOL_SIZE``) are unclaimed
+
+    At most ``batch_size`` keypairs are added per call.
+
+    Returns:
+        int: number of keypairs added
+    """
+    target = settings.STELLAR_KEYPAIR_POOL_SIZE if target is None else target
+    missing = min(target - available_count(), batch_size)
+    if missing <= 0:
+        return 0
+    funded = fund_keypairs([Keypair.random() for _ in range(missing)], funder_seed, starting_balance)
+    ProvisionedKeypair.objects.bulk_create([
+        ProvisionedKeypair(public_key=keypair.public_key, secret_seed=keypair.secret)
+        for keypair in funded
+    ])
+    return len(funded)
+
+
+def claim_keypair(user):
+    """
+    Hand an unclaimed pool keypair to ``user``
+
+    Returns:
+        ProvisionedKeypair or None: None when the pool is empty
+    """
+    candidates = list(ProvisionedKeypair.objects
+                      .filter(claimed_at__isnull=True)
+                      .order_by('id')
+                      .values_list('pk', flat=True)[:_CLAIM_CANDIDATES])
+    random.shuffle(candidates)
+    now = timezone.now()
+    for pk in candidates:
+        claimed = ProvisionedKeypair.objects.filter(pk=pk, claimed_at__isnull=True).update(
+            claimed_by=user, claimed_at=now
+        )
+        if claimed:
+            return ProvisionedKeypair.objects.get(pk=pk)
+    return None
+
+
+def provision_account(user, role):
+    """
+    Give a new user a Stellar account and queue its on-chain registration
+
+    Call inside the transaction that saves ``user``.
+
+    Args:
+        user: the saved user
+        role: ``admin``, ``teacher`` or ``student``
+    """
+    keypair = claim_keypair(user)
+    if keypair is not None:
+        public_key, secret_seed, fund = keypair.public_key, keypair.secret_seed, False
+    else:
+        logger.warning("Keypair pool is empty; %s will be funded by the outbox", user.username)
+        created = StellarHelper.create_keypair()
+        public_key, secret_seed, fund = created['public_key'], created['secret_seed'], True
+
+    user.stellar_public_key = public_key
+    user.stellar_seed = secret_seed
+    user.stellar_status = User.STELLAR_PENDING
+    user.save(update_fields=['stellar_public_key', 'stellar_seed', 'stellar_status'])
+    outbox.enqueue(BlockchainOutbox.REGISTER_ACCOUNT, user, role=role, fund=fund)
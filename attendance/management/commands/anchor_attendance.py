@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from attendance.anchoring import anchor_pending_sessions
+
+
+class Command(BaseCommand):
+    help = "Anchor unanchored attendance records as one Merkle root per session (STELLAR_ATTENDANCE_ANCHORING=merkle)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=60.0,
+                            help='Seconds between anchoring rounds')
+        parser.add_argument('--closed-only', action='store_true',
+                            help='Only catch up closed sessions instead of anchoring open ones at every interval')
+        parser.add_argument('--once', action='store_true',
+                            help='Run a single round and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            anchors = anchor_pending_sessions(include_active=not options['closed_only'])
+            for anchor in anchors:
+                self.stdout.write(f"Anchored {anchor.leaf_count} records of session {anchor.session_id}: {anchor.merkle_root}")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from attendance import qr_payload
+from attendance.qr_utils import _render_qr_code, build_qr, current_step, qr_token, rotating_payload, static_payload
+from attendance.stellar_helper import StellarHelper
+
+
+class Command(BaseCommand):
+    help = "Compare QR version, PNG size and encode time of the JSON and compact QR payload formats"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Renders per payload; the mean time is reported')
+        parser.add_argument('--lecture-id', type=int, default=1234)
+        parser.add_argument('--session-id', type=int, default=56789)
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+
+        lecture_id, session_id = options['lecture_id'], options['session_id']
+        nonce = StellarHelper.generate_nonce()
+        expiry = timezone.now() + timedelta(minutes=15)
+        step = current_step()
+        token = qr_token(lecture_id, session_id, step)
+        payloads = [
+            ('json static', static_payload(lecture_id, nonce, expiry)),
+            ('compact static', qr_payload.pack_static(lecture_id, session_id, nonce, expiry)),
+            ('json rotating', rotating_payload(lecture_id, session_id, step)),
+            ('compact rotating', qr_payload.pack_rotating(lecture_id, session_id, step, token)),
+        ]
+
+        self.stdout.write(f"{'format':<18}{'chars':>7}{'version':>9}{'modules':>9}{'png bytes':>11}{'encode ms':>11}")
+        for name, payload in payloads:
+            qr = build_qr(payload)
+            modules = qr.modules_count
+            # Render without the image cache, as on a cache miss
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                png = _render_qr_code(payload)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / options['iterations']
+            self.stdout.write(f"{name:<18}{len(payload):>7}{qr.version:>9}{modules:>9}{len(png):>11}{elapsed_ms:>11.2f}")
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from attendance.checkin_buffer import flush
+
+
+class Command(BaseCommand):
+    help = "Bulk-insert journaled write-behind check-ins (CHECKIN_WRITE_BEHIND=True)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.CHECKIN_FLUSH_BATCH_SIZE,
+                            help='Rows per bulk_create transaction')
+        parser.add_argument('--interval', type=float, default=settings.CHECKIN_FLUSH_INTERVAL,
+                            help='Seconds between flushes')
+        parser.add_argument('--once', action='store_true',
+                            help='Flush once and exit')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        while True:
+            close_old_connections()
+            processed = flush(options['batch_size'])
+            if processed:
+                self.stdout.write(f"Flushed {processed} check-ins")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from attendance.stellar_helper import get_contract_id, get_network_passphrase
+from attendance.stellar_indexer import AttendanceIndexer
+
+
+class Command(BaseCommand):
+    help = ("Follow the project's accounts and the attendance contract from the stored cursors and index "
+            "attendance memos and contract events")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between catch-up rounds (about one ledger close)')
+        parser.add_argument('--from-start', action='store_true',
+                            help="With no stored events cursor, index all contract events the RPC server keeps instead of "
+                                 "starting now (accounts are always indexed from their first transaction)")
+        parser.add_argument('--once', action='store_true',
+                            help='Run a single catch-up round and exit')
+
+    def handle(self, *args, **options):
+        indexer = AttendanceIndexer(
+            get_network_passphrase(),
+            contract_id=get_contract_id(),
+            from_start=options['from_start'],
+        )
+        while True:
+            close_old_connections()
+            counts = indexer.run_once()
+            if any(counts.values()):
+                self.stdout.write(f"Indexed {counts['transactions']} memo records, {counts['events']} contract events")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
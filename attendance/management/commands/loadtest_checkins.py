@@ -0,0 +1,258 @@
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from importlib import import_module
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from attendance.idempotency import REPLAYED_HEADER
+from attendance.middleware import CACHE_BACKEND_HEADER, QUERY_COUNT_HEADER, SIMULATOR_HEADER
+from attendance.models import Attendance, AttendanceSession, Course, Enrollment, Lecture, User
+from attendance.qr_utils import session_payload
+from attendance.roster import drop_roster, load_roster
+from attendance.stellar_helper import StellarHelper
+
+CURVES = ('burst', 'uniform', 'ramp', 'poisson')
+LOCAL_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def arrival_offsets(curve, count, duration, rng):
+    """
+    Seconds after the start at which each of ``count`` scans is sent
+
+    burst: all at once; uniform: evenly spaced over ``duration``; ramp: the
+    rate grows linearly, as when a class files in; poisson: random arrivals
+    at an average rate of ``count / duration``.
+    """
+    if curve == 'burst' or duration <= 0:
+        return [0.0] * count
+    if curve == 'uniform':
+        return [duration * i / count for i in range(count)]
+    if curve == 'ramp':
+        return [duration * math.sqrt(i / count) for i in range(count)]
+    offsets, t = [], 0.0
+    for _ in range(count):
+        offsets.append(t)
+        t += rng.expovariate(count / duration)
+    return offsets
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of sorted ``values``
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+
+
+class Command(BaseCommand):
+    help = ("Create a course with N enrolled students and an active session, fire concurrent check-ins "
+            "at a running server and report throughput, latency, errors and DB queries per request")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Base URL of the server under test; it must use this database')
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--scans-per-student', type=int, default=1,
+                            help='Repeated submissions of the same scan, as from re-decodes and retries')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Requests in flight at most')
+        parser.add_argument('--curve', choices=CURVES, default='poisson',
+                            help='Arrival curve of the scans')
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Seconds over which scans arrive (ignored for burst)')
+        parser.add_argument('--timeout', type=float, default=10.0,
+                            help='Seconds before a request counts as timed out')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the generated course, users and attendance')
+        parser.add_argument('--allow-local-cache', action='store_true',
+                            help='Run with a local-memory cache; only meaningful when the server runs in this process')
+
+    def handle(self, *args, **options):
+        if options['students'] < 1 or options['scans_per_student'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--students, --scans-per-student and --concurrency must be at least 1")
+        cache_backend = settings.CACHES['default']['BACKEND']
+        if cache_backend == LOCAL_CACHE_BACKEND and not options['allow_local_cache']:
+            raise CommandError("CACHE_URL is a local-memory cache, so the server cannot see the session roster "
+                               "this command loads. Point the command and the server at the same shared "
+                               "CACHE_URL (e.g. redis://localhost:6379/1), or pass --allow-local-cache when the "
+                               "server runs in this process")
+        self._check_server(options['url'], cache_backend, options['timeout'])
+
+        rng = random.Random(options['seed'])
+        session, students, stores = self._create_fixture(options)
+        try:
+            results, elapsed = self._run(session, stores, options, rng)
+            self._report(results, elapsed, session)
+        finally:
+            if not options['keep']:
+                self._remove_fixture(session, students, stores)
+
+    def _check_server(self, url, cache_backend, timeout):
+        """
+        Report the cache and ledger the server under test uses, from the
+        headers ``QueryCountMiddleware`` adds
+        """
+        try:
+            with urlopen(url.rstrip('/') + reverse('login'), timeout=timeout) as response:
+                headers = response.headers
+        except HTTPError as e:
+            headers = e.headers
+        except (URLError, OSError) as e:
+            raise CommandError(f"Cannot reach the server under test at {url}: {e}")
+        server_cache, simulator = headers.get(CACHE_BACKEND_HEADER), headers.get(SIMULATOR_HEADER)
+        if server_cache is None:
+            self.stderr.write("The server did not report its cache or ledger; start it with QUERY_COUNT_HEADER=True")
+            return
+        self.stdout.write(f"Server cache: {server_cache}; ledger simulator {'on' if simulator == 'true' else 'off'}")
+        if server_cache != cache_backend:
+            self.stderr.write(f"The server uses {server_cache} but this command uses {cache_backend}; "
+                              "the session roster is rebuilt by the server from the database")
+        elif server_cache == LOCAL_CACHE_BACKEND:
+            self.stderr.write("The server uses a local-memory cache: each of its workers keeps its own rosters, "
+                              "rate limits and idempotency answers")
+        if simulator != 'true':
+            self.stderr.write("STELLAR_SIMULATOR is off on the server; its check-ins reach the configured "
+                              "Stellar network")
+
+    def _create_fixture(self, options):
+        prefix = f"lt{get_random_string(6).lower()}"
+        password = make_password(None)  # Students are logged in by creating their sessions directly
+        now = timezone.now()
+        teacher = User.objects.create(username=f'{prefix}-teacher', password=password, is_teacher=True)
+        course = Course.objects.create(name='Load test', code=prefix, teacher=teacher)
+        lecture = Lecture.objects.create(course=course, title=f'Load test {prefix}', date=now.date(),
+                                         start_time=now.time(), end_time=now.time())
+        session = AttendanceSession.objects.create(
+            lecture=lecture,
+            nonce=StellarHelper.generate_nonce(),
+            end_time=now + timedelta(seconds=options['duration'] + 600)
+        )
+        students = User.objects.bulk_create([
+            User(username=f'{prefix}-s{i}', password=password, is_student=True)
+            for i in range(options['students'])
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, course=course, roll_number=str(i))
+            for i, student in enumerate(students)
+        ])
+        load_roster(session)  # bulk_create skips the signals that drop stale rosters
+
+        engine = import_module(settings.SESSION_ENGINE)
+        stores = []
+        for student in students:
+            store = engine.SessionStore()
+            store[SESSION_KEY] = str(student.pk)
+            store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+            store[HASH_SESSION_KEY] = student.get_session_auth_hash()
+            store.create()
+            stores.append(store)
+        self.stdout.write(f"Created {len(students)} students enrolled in {course.code}, session {session.pk}")
+        return session, students, stores
+
+    def _remove_fixture(self, session, students, stores):
+        for store in stores:
+            store.delete()
+        drop_roster(session.lecture_id)
+        teacher = session.lecture.course.teacher
+        User.objects.filter(pk__in=[student.pk for student in students]).delete()
+        teacher.delete()  # Cascades to the course, lecture, session and attendance
+
+    def _run(self, session, stores, options, rng):
+        url = options['url'].rstrip('/') + reverse('process_attendance')
+        # Repeats of a student's scan reuse its idempotency key, like the scanner page
+        requests = [(store, str(uuid.uuid4())) for store in stores] * options['scans_per_student']
+        offsets = arrival_offsets(options['curve'], len(requests), options['duration'], rng)
+        lock = threading.Lock()
+        results = []
+
+        def scan(store, key, offset, started):
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            result = self._post(url, store, key, session_payload(session), options['timeout'])
+            result['latency'] = time.perf_counter() - sent
+            result['lag'] = sent - (started + offset)
+            with lock:
+                results.append(result)
+
+        self.stdout.write(f"Sending {len(requests)} check-ins to {url} ({options['curve']}, "
+                          f"{options['duration']:g}s, concurrency {options['concurrency']})")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for (store, key), offset in zip(requests, offsets):
+                pool.submit(scan, store, key, offset, started)
+        return results, time.perf_counter() - started
+
+    def _post(self, url, store, key, qr_data, timeout):
+        csrf_token = get_random_string(32)
+        request = Request(url, data=urlencode({'qr_data': qr_data}).encode(), headers={
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Cookie': f"{settings.SESSION_COOKIE_NAME}={store.session_key}; "
+                      f"{settings.CSRF_COOKIE_NAME}={csrf_token}",
+            'X-CSRFToken': csrf_token,
+            'Referer': url,
+            'Idempotency-Key': key,
+        })
+        result = {'queries': None}
+        try:
+            with urlopen(request, timeout=timeout) as response:
+                result['queries'] = response.headers.get(QUERY_COUNT_HEADER)
+                replayed = response.headers.get(REPLAYED_HEADER) == 'true'
+                body = json.loads(response.read())
+            outcome = 'success' if body.get('success') else body.get('error', 'unknown error')
+            result['outcome'] = f'{outcome} (replayed)' if replayed else outcome
+        except HTTPError as e:
+            result['queries'] = e.headers.get(QUERY_COUNT_HEADER)
+            result['outcome'] = f'HTTP {e.code}'
+        except TimeoutError:
+            result['outcome'] = 'timeout'
+        except URLError as e:
+            result['outcome'] = 'timeout' if isinstance(e.reason, TimeoutError) else f'connection error: {e.reason}'
+        except OSError as e:
+            result['outcome'] = f'connection error: {e}'
+        except ValueError:
+            result['outcome'] = 'non-JSON response'
+        return result
+
+    def _report(self, results, elapsed, session):
+        latencies = sorted(result['latency'] * 1000 for result in results)
+        lags = sorted(max(result['lag'], 0) * 1000 for result in results)
+        outcomes = Counter(result['outcome'] for result in results)
+        succeeded = outcomes.get('success', 0)
+        replayed = sum(count for outcome, count in outcomes.items() if outcome.endswith('(replayed)'))
+
+        self.stdout.write(f"Requests: {len(results)} in {elapsed:.2f}s, {len(results) / elapsed:.1f}/s; "
+                          f"{succeeded} checked in, {succeeded / elapsed:.1f}/s; {replayed} replayed")
+        self.stdout.write(f"Latency ms: p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+                          f"p99 {percentile(latencies, 99):.1f}  max {latencies[-1]:.1f}")
+        self.stdout.write(f"Start lag ms (client queueing): p95 {percentile(lags, 95):.1f}  max {lags[-1]:.1f}")
+        self.stdout.write("Outcomes:")
+        for outcome, count in outcomes.most_common():
+            self.stdout.write(f"  {count:>7}  {outcome}")
+
+        queries = sorted(int(result['queries']) for result in results if result['queries'] is not None)
+        if queries:
+            self.stdout.write(f"DB queries per request: mean {sum(queries) / len(queries):.2f}  "
+                              f"p95 {percentile(queries, 95)}  max {queries[-1]}")
+        else:
+            self.stdout.write("DB queries per request: unknown; start the server with QUERY_COUNT_HEADER=True")
+        self.stdout.write(f"Attendance rows recorded: {Attendance.objects.filter(session=session).count()}")
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from attendance import outbox
+from attendance.models import BlockchainOutbox, Lecture, User
+from attendance.stellar_contract import contract_invocation_enabled
+from attendance.stellar_helper import StellarHelper
+
+
+class Command(BaseCommand):
+    help = ("Prepare a newly deployed attendance contract (STELLAR_CONTRACT_ID): add the existing teachers "
+            "to its allow-list and queue today's and upcoming lectures for creation on it")
+
+    def handle(self, *args, **options):
+        if not contract_invocation_enabled():
+            raise CommandError("Set STELLAR_CONTRACT_INVOCATION=True and STELLAR_CONTRACT_ID to the new contract")
+
+        added = 0
+        teachers = User.objects.filter(is_teacher=True).exclude(stellar_seed__isnull=True).exclude(stellar_seed='')
+        for teacher in teachers:
+            response = StellarHelper.register_teacher(teacher.stellar_seed)
+            if 'error' in response:
+                self.stderr.write(f"Could not add teacher {teacher.username}: {response['error']}")
+            else:
+                added += 1
+
+        lectures = Lecture.objects.filter(date__gte=timezone.localdate()).select_related('course__teacher')
+        queued = 0
+        with transaction.atomic():
+            for lecture in lectures:
+                start_dt = datetime.combine(lecture.date, lecture.start_time)
+                end_dt = datetime.combine(lecture.date, lecture.end_time)
+                outbox.enqueue(
+                    BlockchainOutbox.CREATE_LECTURE,
+                    lecture.course.teacher,
+                    lecture=lecture,
+                    course_id=lecture.course_id,
+                    title=lecture.title,
+                    date_timestamp=int(start_dt.timestamp()),
+                    duration_minutes=int((end_dt - start_dt).total_seconds() / 60)
+                )
+                queued += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {added} of {teachers.count()} teachers to the contract; queued {queued} lectures"
+        ))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from attendance.outbox import confirm_submitted
+
+
+class Command(BaseCommand):
+    help = "Confirm submitted blockchain transactions in batches and mark the recorded rows verified"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Overdue hashes looked up individually per polling round')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between polling rounds (about one ledger close)')
+        parser.add_argument('--once', action='store_true',
+                            help='Run a single polling round and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            counts = confirm_submitted(options['batch_size'])
+            if any(counts.values()):
+                self.stdout.write(
+                    f"Confirmed {counts['confirmed']}, failed {counts['failed']}, waiting {counts['waiting']}, "
+                    f"fee-bumped {counts['bumped']}"
+                )
+            if options['once']:
+                break
+            time.sleep(options['interval'])
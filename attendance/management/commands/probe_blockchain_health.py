@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from attendance.stellar_health import health_prober
+
+
+class Command(BaseCommand):
+    help = "Probe Horizon and Soroban RPC periodically and cache the health snapshot for the status page"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds between probes (defaults to half of STELLAR_HEALTH_TTL, so the snapshot never goes stale)')
+        parser.add_argument('--once', action='store_true',
+                            help='Probe once and exit')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.STELLAR_HEALTH_TTL / 2
+        while True:
+            snapshot = health_prober.refresh(force=True)
+            self.stdout.write(f"{snapshot['status']}: {snapshot['message']}")
+            if options['once']:
+                break
+            time.sleep(interval)
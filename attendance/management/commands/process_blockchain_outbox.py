@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from attendance.outbox import claim_batch, process_entry
+
+
+def _process_in_thread(entry):
+    try:
+        return process_entry(entry)
+    finally:
+        # Worker threads get their own DB connection; don't leak it
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Submit queued blockchain writes from the outbox and mark the recorded rows verified"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.STELLAR_OUTBOX_CONCURRENCY,
+                            help='Number of entries submitted in parallel')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Entries claimed per polling round')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the currently due entries and exit')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        processed = failed = 0
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                close_old_connections()
+                entries = claim_batch(options['batch_size'])
+                if not entries:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                if concurrency == 1:
+                    results = [process_entry(entry) for entry in entries]
+                else:
+                    results = list(executor.map(_process_in_thread, entries))
+                processed += results.count(True)
+                failed += results.count(False)
+                self.stdout.write(f"Submitted {results.count(True)}/{len(results)} outbox entries")
+
+        self.stdout.write(self.style.SUCCESS(f"Outbox drained: {processed} submitted, {failed} failed or retrying"))
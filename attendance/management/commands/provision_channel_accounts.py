@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from stellar_sdk import Keypair
+
+from attendance.keypair_pool import fund_keypairs
+from attendance.models import ChannelAccount
+from attendance.stellar_channels import channel_pool
+
+
+class Command(BaseCommand):
+    help = "Create and fund channel accounts used as transaction sources for teacher/admin writes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10,
+                            help='Number of new channel accounts to create')
+        parser.add_argument('--starting-balance', default='5',
+                            help='XLM sent to each channel when funding from --funder-seed')
+        parser.add_argument('--funder-seed', default=settings.STELLAR_ADMIN_SECRET,
+                            help='Seed of the account that funds the channels '
+                                 '(defaults to STELLAR_ADMIN_SECRET; Friendbot is used on testnet without one)')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if count < 1:
+            raise CommandError("--count must be at least 1")
+
+        keypairs = [Keypair.random() for _ in range(count)]
+        try:
+            funded = fund_keypairs(keypairs, options['funder_seed'], options['starting_balance'])
+        except ValueError:
+            raise CommandError("A --funder-seed is required outside testnet")
+
+        ChannelAccount.objects.bulk_create([
+            ChannelAccount(public_key=keypair.public_key, secret_seed=keypair.secret)
+            for keypair in funded
+        ])
+        channel_pool.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f"Provisioned {len(funded)} of {count} channel accounts "
+            f"({ChannelAccount.objects.filter(is_active=True).count()} active in total)"
+        ))
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from attendance.keypair_pool import available_count, refill
+
+
+class Command(BaseCommand):
+    help = "Keep a pool of created and funded Stellar keypairs ready for signups"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', type=int, default=settings.STELLAR_KEYPAIR_POOL_SIZE,
+                            help='Unclaimed keypairs to keep in the pool')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Most keypairs funded per round')
+        parser.add_argument('--starting-balance', default=settings.STELLAR_KEYPAIR_POOL_BALANCE,
+                            help='XLM sent to each account when funding from --funder-seed')
+        parser.add_argument('--funder-seed', default=settings.STELLAR_ADMIN_SECRET,
+                            help='Seed of the account that funds the keypairs '
+                                 '(defaults to STELLAR_ADMIN_SECRET; Friendbot is used on testnet without one)')
+        parser.add_argument('--interval', type=float, default=10.0,
+                            help='Seconds between checks of the pool level')
+        parser.add_argument('--once', action='store_true',
+                            help='Top the pool up once and exit')
+
+    def handle(self, *args, **options):
+        if options['target'] < 0:
+            raise CommandError("--target cannot be negative")
+        while True:
+            close_old_connections()
+            try:
+                added = refill(options['target'], options['batch_size'], options['funder_seed'],
+                               options['starting_balance'])
+            except ValueError:
+                raise CommandError("A --funder-seed is required outside testnet")
+            if added:
+                self.stdout.write(f"Added {added} keypairs ({available_count()} available)")
+            if options['once'] and (not added or available_count() >= options['target']):
+                break
+            if not added:
+                time.sleep(options['interval'])
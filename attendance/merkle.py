@@ -0,0 +1,105 @@
+"""
+Merkle trees over attendance records.
+
+With ``STELLAR_ATTENDANCE_ANCHORING = 'merkle'`` check-ins are not written to
+the chain one by one. Instead the rows of a session are hashed into a tree
+and only the 32-byte root is published (see ``attendance.anchoring``). Each
+row keeps its inclusion proof, so anyone holding the row can recompute its
+leaf, walk the proof up to the root and compare it with the root on-chain.
+
+Hashing follows RFC 6962: leaves are ``sha256(0x00 || data)`` and interior
+nodes ``sha256(0x01 || left || right)``, so a leaf can never be passed off
+as an interior node. A node without a sibling is promoted to the next level
+unchanged.
+"""
+import hashlib
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def leaf_hash(data):
+    """
+    Hash of one leaf; ``data`` is bytes or str
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(LEAF_PREFIX + data).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def attendance_leaf(attendance):
+    """
+    Leaf data for an ``Attendance`` row: ``lecture_id|student_public_key|session_nonce``
+
+    Only values a student can show independently are used, so the proof can
+    be checked without access to the database. The check-in time is left
+    out: the row's timestamp is not what the student's scan proved, and
+    leaves must stay stable however it is stored.
+    """
+    return '|'.join([
+        str(attendance.lecture_id),
+        attendance.student.stellar_public_key or '',
+        attendance.session.nonce if attendance.session_id else '',
+    ])
+
+
+def build_tree(leaves):
+    """
+    Build a tree over already hashed leaves
+
+    Args:
+        leaves: list of 32-byte leaf hashes, in order
+
+    Returns:
+        tuple: ``(root, proofs)``; ``proofs[i]`` is the list of
+        ``[side, sibling_hex]`` steps from leaf ``i`` to the root, where
+        ``side`` is ``"L"`` when the sibling is on the left
+    """
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+
+    proofs = [[] for _ in leaves]
+    positions = list(range(len(leaves)))  # Index of each leaf's ancestor on the current level
+    level = list(leaves)
+    while len(level) > 1:
+        parents = []
+        for i in range(0, len(level) - 1, 2):
+            parents.append(node_hash(level[i], level[i + 1]))
+        if len(level) % 2:
+            parents.append(level[-1])
+
+        for leaf, position in enumerate(positions):
+            sibling = position ^ 1
+            if sibling < len(level):
+                side = 'L' if sibling < position else 'R'
+                proofs[leaf].append([side, level[sibling].hex()])
+            positions[leaf] = position // 2
+        level = parents
+    return level[0], proofs
+
+
+def root_from_proof(leaf, proof):
+    """
+    Walk ``proof`` up from the 32-byte ``leaf`` hash and return the root
+    """
+    node = leaf
+    for side, sibling_hex in proof:
+        sibling = bytes.fromhex(sibling_hex)
+        node = node_hash(sibling, node) if side == 'L' else node_hash(node, sibling)
+    return node
+
+
+def verify_proof(leaf, proof, root):
+    """
+    Whether ``proof`` links the ``leaf`` hash to ``root`` (bytes or hex)
+    """
+    if isinstance(root, str):
+        root = bytes.fromhex(root)
+    try:
+        return root_from_proof(leaf, proof) == root
+    except (TypeError, ValueError):
+        return False
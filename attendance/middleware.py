@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+QUERY_COUNT_HEADER = 'X-DB-Query-Count'
+QUERY_TIME_HEADER = 'X-DB-Query-Time-Ms'
+CACHE_BACKEND_HEADER = 'X-Cache-Backend'
+SIMULATOR_HEADER = 'X-Stellar-Simulator'
+
+
+class QueryCountMiddleware:
+    """
+    Report the number of database queries a request ran, and their total time,
+    in response headers, along with the cache backend and whether the ledger
+    simulator is on
+
+    Only loaded with ``QUERY_COUNT_HEADER=True``; ``loadtest_checkins`` reads
+    the headers to report queries per check-in and the server's configuration.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_COUNT_HEADER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        response[QUERY_COUNT_HEADER] = str(counter.count)
+        response[QUERY_TIME_HEADER] = f"{counter.seconds * 1000:.2f}"
+        response[CACHE_BACKEND_HEADER] = settings.CACHES['default']['BACKEND']
+        response[SIMULATOR_HEADER] = 'true' if settings.STELLAR_SIMULATOR else 'false'
+        return response
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 08:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_attendancesession_blockchain_verified_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockchainOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('create_lecture', 'Create lecture'), ('start_attendance', 'Start attendance session'), ('mark_attendance', 'Mark attendance'), ('close_attendance', 'Close attendance session'), ('manual_attendance', 'Manual attendance')], max_length=32)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attendance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='blockchain_outbox', to='attendance.attendance')),
+                ('lecture', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='blockchain_outbox', to='attendance.lecture')),
+                ('session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='blockchain_outbox', to='attendance.attendancesession')),
+                ('signer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blockchain_outbox', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('available_at', 'id'),
+                'indexes': [models.Index(fields=['status', 'available_at'], name='attendance__status_fc1b76_idx')],
+            },
+        ),
+    ]
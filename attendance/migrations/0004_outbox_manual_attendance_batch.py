@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_blockchainoutbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blockchainoutbox',
+            name='kind',
+            field=models.CharField(choices=[('create_lecture', 'Create lecture'), ('start_attendance', 'Start attendance session'), ('mark_attendance', 'Mark attendance'), ('close_attendance', 'Close attendance session'), ('manual_attendance', 'Manual attendance'), ('manual_attendance_batch', 'Manual attendance (batch)')], max_length=32),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_outbox_manual_attendance_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_key', models.CharField(max_length=56, unique=True)),
+                ('secret_seed', models.CharField(max_length=56)),
+                ('is_active', models.BooleanField(default=True)),
+                ('consecutive_failures', models.PositiveIntegerField(default=0)),
+                ('disabled_until', models.DateTimeField(blank=True, null=True)),
+                ('last_used', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0005_channelaccount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockchainoutbox',
+            name='transaction_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='blockchainoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('submitted', 'Awaiting confirmation'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_outbox_transaction_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexerCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('cursor', models.CharField(blank=True, max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChainAttendanceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('check_in', 'Student check-in'), ('manual', 'Manual attendance'), ('session_start', 'Session started'), ('session_end', 'Session closed'), ('lecture', 'Lecture created')], max_length=16)),
+                ('lecture_ref', models.CharField(max_length=28)),
+                ('student_public_key', models.CharField(blank=True, max_length=56)),
+                ('student_key_prefix', models.CharField(blank=True, max_length=8)),
+                ('signer_public_key', models.CharField(max_length=56)),
+                ('transaction_hash', models.CharField(max_length=64)),
+                ('operation_index', models.PositiveIntegerField(default=0)),
+                ('ledger', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('indexed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('-ledger', 'id'),
+                'indexes': [models.Index(fields=['lecture_ref', 'student_key_prefix'], name='attendance__lecture_53e286_idx'), models.Index(fields=['kind', 'lecture_ref'], name='attendance__kind_823ac2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('transaction_hash', 'operation_index'), name='unique_chain_record_operation')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 09:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_chain_attendance_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='stellar_status',
+            field=models.CharField(choices=[('pending', 'Registering on blockchain'), ('active', 'Registered'), ('failed', 'Registration failed')], default='active', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='blockchainoutbox',
+            name='kind',
+            field=models.CharField(choices=[('create_lecture', 'Create lecture'), ('start_attendance', 'Start attendance session'), ('mark_attendance', 'Mark attendance'), ('close_attendance', 'Close attendance session'), ('manual_attendance', 'Manual attendance'), ('manual_attendance_batch', 'Manual attendance (batch)'), ('register_account', 'Register account')], max_length=32),
+        ),
+        migrations.CreateModel(
+            name='ProvisionedKeypair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_key', models.CharField(max_length=56, unique=True)),
+                ('secret_seed', models.CharField(max_length=56)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_by', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='provisioned_keypair', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['claimed_at', 'id'], name='attendance__claimed_9d8b89_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 09:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_keypair_pool'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='merkle_proof',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='blockchainoutbox',
+            name='kind',
+            field=models.CharField(choices=[('create_lecture', 'Create lecture'), ('start_attendance', 'Start attendance session'), ('mark_attendance', 'Mark attendance'), ('close_attendance', 'Close attendance session'), ('manual_attendance', 'Manual attendance'), ('manual_attendance_batch', 'Manual attendance (batch)'), ('register_account', 'Register account'), ('anchor_attendance', 'Anchor attendance Merkle root')], max_length=32),
+        ),
+        migrations.CreateModel(
+            name='AttendanceAnchor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merkle_root', models.CharField(max_length=64)),
+                ('leaf_count', models.PositiveIntegerField()),
+                ('transaction_hash', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('anchored_at', models.DateTimeField(blank=True, null=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anchors', to='attendance.attendancesession')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='anchor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendances', to='attendance.attendanceanchor'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 09:57
+
+from django.db import migrations, models
+
+
+def reset_index(apps, schema_editor):
+    # Rows from the network-wide feed were never checked against their
+    # signer; the per-account cursors re-index the project's history
+    apps.get_model('attendance', 'ChainAttendanceRecord').objects.all().delete()
+    apps.get_model('attendance', 'IndexerCursor').objects.filter(name='horizon_transactions').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0009_attendance_anchor'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_index, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='chainattendancerecord',
+            name='attendance__lecture_53e286_idx',
+        ),
+        migrations.RemoveField(
+            model_name='chainattendancerecord',
+            name='student_key_prefix',
+        ),
+        migrations.AlterField(
+            model_name='indexercursor',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='chainattendancerecord',
+            index=models.Index(fields=['lecture_ref', 'student_public_key'], name='attendance__lecture_ef9520_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0010_indexer_project_accounts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockchainoutbox',
+            name='channel_lease',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 10:33
+
+from django.db import migrations, models
+
+
+def drop_confirmation_cursor(apps, schema_editor):
+    # The poller reads each source account's history instead of a global cursor
+    apps.get_model('attendance', 'IndexerCursor').objects.filter(name='outbox_confirmations').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0011_outbox_channel_lease'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_confirmation_cursor, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='blockchainoutbox',
+            name='source_account',
+            field=models.CharField(blank=True, max_length=56),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0012_outbox_source_account'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockchainoutbox',
+            name='envelope_xdr',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='blockchainoutbox',
+            name='fee_bumps',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
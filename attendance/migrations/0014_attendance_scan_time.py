@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 10:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0013_outbox_fee_bumps'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendance',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
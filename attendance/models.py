@@ -3,11 +3,21 @@ from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
 class User(AbstractUser):
+    STELLAR_PENDING = 'pending'
+    STELLAR_ACTIVE = 'active'
+    STELLAR_FAILED = 'failed'
+    STELLAR_STATUS_CHOICES = [
+        (STELLAR_PENDING, 'Registering on blockchain'),
+        (STELLAR_ACTIVE, 'Registered'),
+        (STELLAR_FAILED, 'Registration failed'),
+    ]
+
     is_admin = models.BooleanField(default=False)
     is_teacher = models.BooleanField(default=False)
     is_student = models.BooleanField(default=False)
     stellar_public_key = models.CharField(max_length=56, blank=True, null=True)
     stellar_seed = models.CharField(max_length=56, blank=True, null=True)  # This should be encrypted in production
+    stellar_status = models.CharField(max_length=16, choices=STELLAR_STATUS_CHOICES, default=STELLAR_ACTIVE)  # Set to pending at signup until the outbox registers the account
 
 class Course(models.Model):
     name = models.CharField(max_length=200)
@@ -60,12 +70,191 @@ class Attendance(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendances')
     lecture = models.ForeignKey(Lecture, on_delete=models.CASCADE, related_name='attendances')
     session = models.ForeignKey(AttendanceSession, on_delete=models.CASCADE, related_name='attendances', null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)  # When the student checked in; buffered scans keep their scan time
     blockchain_verified = models.BooleanField(default=False)
     transaction_hash = models.CharField(max_length=100, blank=True, null=True)
+    anchor = models.ForeignKey('AttendanceAnchor', on_delete=models.SET_NULL, related_name='attendances', null=True, blank=True)  # Set when recorded through a Merkle root
+    merkle_proof = models.JSONField(null=True, blank=True)  # [[side, sibling_hex], ...] from this row's leaf to the anchor root
     
     class Meta:
         unique_together = ('student', 'lecture')
     
     def __str__(self):
         return f"{self.student.username} - {self.lecture} - {self.timestamp}"
+
+class AttendanceAnchor(models.Model):
+    """
+    A Merkle root over a batch of a session's attendance rows, published on-chain
+    in a single transaction (see ``attendance.anchoring``).
+    """
+    session = models.ForeignKey(AttendanceSession, on_delete=models.CASCADE, related_name='anchors')
+    merkle_root = models.CharField(max_length=64)  # Hex; published as the transaction's hash memo
+    leaf_count = models.PositiveIntegerField()
+    transaction_hash = models.CharField(max_length=64, blank=True)  # Set once the anchor transaction is confirmed
+    created_at = models.DateTimeField(auto_now_add=True)
+    anchored_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.session} - {self.merkle_root[:12]} ({self.leaf_count} records)"
+
+class BlockchainOutbox(models.Model):
+    """
+    A pending blockchain write, stored in the same DB transaction as the row it
+    records and submitted later by the ``process_blockchain_outbox`` worker.
+    """
+    CREATE_LECTURE = 'create_lecture'
+    START_ATTENDANCE = 'start_attendance'
+    MARK_ATTENDANCE = 'mark_attendance'
+    CLOSE_ATTENDANCE = 'close_attendance'
+    MANUAL_ATTENDANCE = 'manual_attendance'
+    MANUAL_ATTENDANCE_BATCH = 'manual_attendance_batch'
+    REGISTER_ACCOUNT = 'register_account'
+    ANCHOR_ATTENDANCE = 'anchor_attendance'
+    KIND_CHOICES = [
+        (CREATE_LECTURE, 'Create lecture'),
+        (START_ATTENDANCE, 'Start attendance session'),
+        (MARK_ATTENDANCE, 'Mark attendance'),
+        (CLOSE_ATTENDANCE, 'Close attendance session'),
+        (MANUAL_ATTENDANCE, 'Manual attendance'),
+        (MANUAL_ATTENDANCE_BATCH, 'Manual attendance (batch)'),
+        (REGISTER_ACCOUNT, 'Register account'),
+        (ANCHOR_ATTENDANCE, 'Anchor attendance Merkle root'),
+    ]
+
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    SUBMITTED = 'submitted'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (SUBMITTED, 'Awaiting confirmation'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    signer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blockchain_outbox')  # Whose seed signs the transaction
+    lecture = models.ForeignKey(Lecture, on_delete=models.CASCADE, related_name='blockchain_outbox', null=True, blank=True)
+    session = models.ForeignKey(AttendanceSession, on_delete=models.CASCADE, related_name='blockchain_outbox', null=True, blank=True)
+    attendance = models.ForeignKey(Attendance, on_delete=models.CASCADE, related_name='blockchain_outbox', null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    transaction_hash = models.CharField(max_length=64, blank=True)  # Set once submitted
+    source_account = models.CharField(max_length=56, blank=True)  # Account the submitted transaction was sent from
+    channel_lease = models.CharField(max_length=100, blank=True)  # Channel held by the submitted transaction until it is confirmed
+    envelope_xdr = models.TextField(blank=True)  # Signed envelope of the submitted transaction, fee-bumped while it waits
+    fee_bumps = models.PositiveIntegerField(default=0)  # Fee bumps the confirmation poller has sent for it
+    available_at = models.DateTimeField(default=timezone.now)  # Next retry, lease expiry while processing, or confirmation deadline once submitted
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('available_at', 'id')
+        indexes = [
+            models.Index(fields=('status', 'available_at')),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+class ChannelAccount(models.Model):
+    """
+    Funded Stellar account used only as a transaction source (and fee payer),
+    so one teacher/admin signer can have several transactions in flight.
+    Provisioned with ``python manage.py provision_channel_accounts``.
+    """
+    public_key = models.CharField(max_length=56, unique=True)
+    secret_seed = models.CharField(max_length=56)  # This should be encrypted in production
+    is_active = models.BooleanField(default=True)
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    disabled_until = models.DateTimeField(null=True, blank=True)  # Cool-down after repeated failures
+    last_used = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.public_key
+
+    @property
+    def is_healthy(self):
+        return self.is_active and (self.disabled_until is None or self.disabled_until <= timezone.now())
+
+class ProvisionedKeypair(models.Model):
+    """
+    A created and funded Stellar account waiting to be handed to a new user.
+    Kept topped up by ``python manage.py refill_keypair_pool`` so signup
+    only has to claim a row.
+    """
+    public_key = models.CharField(max_length=56, unique=True)
+    secret_seed = models.CharField(max_length=56)  # This should be encrypted in production
+    claimed_by = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='provisioned_keypair')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('claimed_at', 'id')),
+        ]
+
+    def __str__(self):
+        return self.public_key
+
+class ChainAttendanceRecord(models.Model):
+    """
+    An attendance write found on the ledger by the ``index_blockchain`` worker.
+
+    One row per recording operation, parsed from the memos ``StellarHelper``
+    writes (``Att:``, ``MAtt:``, ``Att start:``, ...) or from the attendance
+    contract's events. Only writes signed by the account entitled to make
+    them are kept: the course teacher (or an admin) for lectures, sessions
+    and manual marks, an enrolled student for check-ins.
+    """
+    CHECK_IN = 'check_in'
+    MANUAL = 'manual'
+    SESSION_START = 'session_start'
+    SESSION_END = 'session_end'
+    LECTURE = 'lecture'
+    KIND_CHOICES = [
+        (CHECK_IN, 'Student check-in'),
+        (MANUAL, 'Manual attendance'),
+        (SESSION_START, 'Session started'),
+        (SESSION_END, 'Session closed'),
+        (LECTURE, 'Lecture created'),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    lecture_ref = models.CharField(max_length=28)  # Lecture id as written on-chain
+    student_public_key = models.CharField(max_length=56, blank=True)  # Blank for lecture and session rows
+    signer_public_key = models.CharField(max_length=56)
+    transaction_hash = models.CharField(max_length=64)
+    operation_index = models.PositiveIntegerField(default=0)
+    ledger = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(null=True, blank=True)  # Ledger close time
+    indexed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-ledger', 'id')
+        constraints = [
+            models.UniqueConstraint(fields=('transaction_hash', 'operation_index'), name='unique_chain_record_operation'),
+        ]
+        indexes = [
+            models.Index(fields=('lecture_ref', 'student_public_key')),
+            models.Index(fields=('kind', 'lecture_ref')),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.lecture_ref} ({self.transaction_hash[:10]})"
+
+class IndexerCursor(models.Model):
+    """
+    Last paging token an ``index_blockchain`` stream has processed
+    """
+    name = models.CharField(max_length=100, unique=True)  # e.g. ``account:<public key>``
+    cursor = models.CharField(max_length=100, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.cursor}"
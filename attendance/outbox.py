@@ -0,0 +1,555 @@
+"""
+Transactional outbox for blockchain writes.
+
+Views call :func:`enqueue` inside the same ``transaction.atomic()`` block that
+saves the ``Lecture``/``AttendanceSession``/``Attendance`` row, so the HTTP
+request only pays for database work. The ``process_blockchain_outbox``
+management command drains the table and submits through ``StellarHelper``.
+Transactions are submitted without waiting for ledger close; the
+``poll_blockchain_transactions`` command confirms their hashes in batches
+and only then flips ``blockchain_verified``.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import CharField, Exists, F, OuterRef, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+from stellar_sdk import Keypair
+from stellar_sdk.exceptions import NotFoundError
+
+from .circuit_breaker import CircuitOpenError
+from .models import (Attendance, AttendanceAnchor, AttendanceSession, BlockchainOutbox, ChannelAccount, Lecture,
+                     User)
+from .stellar_channels import channel_pool
+from .stellar_clients import get_horizon_server
+from .stellar_contract import contract_invoker
+from .stellar_fees import LEDGER_SECONDS, fee_bump_queued, submit_envelope
+from .stellar_helper import INVALID_KEY_ERROR, StellarHelper, get_network_passphrase, is_valid_public_key
+
+logger = logging.getLogger(__name__)
+
+def enqueue(kind, signer, lecture=None, session=None, attendance=None, **payload):
+    """
+    Queue a blockchain write; call inside the transaction that saves the record
+
+    Args:
+        kind: one of the ``BlockchainOutbox`` kind constants
+        signer: the user whose Stellar seed signs the transaction
+        lecture, session, attendance: the rows the write records, as
+            instances or primary keys
+        **payload: extra JSON-serialisable arguments for the handler
+
+    Returns:
+        BlockchainOutbox: the queued entry
+    """
+    return BlockchainOutbox.objects.create(
+        kind=kind,
+        signer=signer,
+        lecture_id=getattr(lecture, 'pk', lecture),
+        session_id=getattr(session, 'pk', session),
+        attendance_id=getattr(attendance, 'pk', attendance),
+        payload=payload,
+    )
+
+
+def claim_batch(limit):
+    """
+    Claim up to ``limit`` due entries for this worker
+
+    Entries stuck in ``processing`` past their lease (e.g. the worker crashed)
+    are claimed again. Each claim is a compare-and-set update, so several
+    workers can poll the same table without double-submitting.
+
+    Entries recording a session's activity (check-ins, close, anchor) wait
+    until the session's start entry is confirmed in a ledger, so the chain
+    sees them after it; if the start fails for good, they fail with it.
+
+    Returns:
+        list: the claimed ``BlockchainOutbox`` entries
+    """
+    now = timezone.now()
+    _fail_after_failed_start(now)
+    start_unconfirmed = (BlockchainOutbox.objects
+                         .filter(kind=BlockchainOutbox.START_ATTENDANCE, session_id=OuterRef('session_id'))
+                         .exclude(status=BlockchainOutbox.DONE))
+    due = Q(status=BlockchainOutbox.PENDING) | Q(status=BlockchainOutbox.PROCESSING)
+    candidates = (BlockchainOutbox.objects
+                  .filter(due, available_at__lte=now)
+                  .filter(Q(kind=BlockchainOutbox.START_ATTENDANCE) | ~Exists(start_unconfirmed))
+                  .values_list('pk', 'status')[:limit])
+
+    lease_until = now + timedelta(seconds=settings.STELLAR_OUTBOX_LEASE_SECONDS)
+    claimed = []
+    for pk, status in candidates:
+        updated = BlockchainOutbox.objects.filter(
+            pk=pk, status=status, available_at__lte=now
+        ).update(
+            status=BlockchainOutbox.PROCESSING,
+            attempts=F('attempts') + 1,
+            available_at=lease_until,
+        )
+        if updated:
+            claimed.append(pk)
+
+    return list(BlockchainOutbox.objects
+                .filter(pk__in=claimed)
+                .select_related('signer', 'lecture', 'session', 'attendance'))
+
+
+def _fail_after_failed_start(now):
+    """
+    Fail the pending entries of sessions whose start will never reach the chain
+    """
+    start_failed = BlockchainOutbox.objects.filter(
+        kind=BlockchainOutbox.START_ATTENDANCE, status=BlockchainOutbox.FAILED, session_id=OuterRef('session_id')
+    )
+    (BlockchainOutbox.objects
+     .filter(status=BlockchainOutbox.PENDING, session__isnull=False)
+     .exclude(kind=BlockchainOutbox.START_ATTENDANCE)
+     .filter(Exists(start_failed))
+     .update(status=BlockchainOutbox.FAILED, processed_at=now,
+             last_error='The session start was never recorded on-chain'))
+
+
+def start_recorded(session):
+    """
+    Whether ``session``'s start is on-chain or still on its way there
+    """
+    status = (BlockchainOutbox.objects
+              .filter(kind=BlockchainOutbox.START_ATTENDANCE, session=session)
+              .values_list('status', flat=True).first())
+    if status is None:
+        return session.blockchain_verified
+    return status != BlockchainOutbox.FAILED
+
+
+# Handlers submit the write and return the StellarHelper response dict. The
+# effect on the recorded row is applied by apply_confirmed once the
+# transaction is known to be in a ledger.
+
+def _create_lecture(entry):
+    payload = entry.payload
+    return StellarHelper.create_lecture(
+        entry.signer.stellar_seed,
+        entry.lecture_id,
+        payload['course_id'],
+        payload['title'],
+        payload['date_timestamp'],
+        payload['duration_minutes']
+    )
+
+
+def _start_attendance(entry):
+    return StellarHelper.start_attendance(
+        entry.signer.stellar_seed,
+        entry.lecture_id,
+        entry.payload.get('duration_seconds', 300),
+        nonce=entry.session.nonce if entry.session_id else None
+    )
+
+
+def _mark_attendance(entry):
+    return StellarHelper.mark_attendance(
+        entry.signer.stellar_seed,
+        entry.lecture_id,
+        entry.payload['nonce']
+    )
+
+
+def _close_attendance(entry):
+    return StellarHelper.close_attendance_session(
+        entry.signer.stellar_seed,
+        entry.lecture_id
+    )
+
+
+def _manual_attendance(entry):
+    return StellarHelper.manual_attendance(
+        entry.signer.stellar_seed,
+        entry.lecture_id,
+        entry.payload['student_public_key']
+    )
+
+
+def _manual_attendance_batch(entry):
+    """
+    Submit a whole manual-attendance selection as batched transactions
+
+    Payload: ``{"students": [{"attendance_id": ..., "public_key": ...}, ...]}``.
+    Batches wait for ledger inclusion, so rows are updated right here.
+    Students that failed stay in the payload so a retry only resubmits them;
+    students without a valid key are dropped, as no retry can record them.
+    """
+    students = entry.payload['students']
+    unrecordable = [student for student in students if not is_valid_public_key(student['public_key'])]
+    if unrecordable:
+        logger.warning("Outbox entry %s: attendance %s not recorded on-chain: %s", entry.pk,
+                       ', '.join(str(student['attendance_id']) for student in unrecordable), INVALID_KEY_ERROR)
+        students = [student for student in students if student not in unrecordable]
+        if not students:
+            return {'error': "No student has a valid Stellar public key"}
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(payload={'students': students})
+    response = StellarHelper.batch_manual_attendance(
+        entry.signer.stellar_seed,
+        entry.lecture_id,
+        [student['public_key'] for student in students]
+    )
+    results = response.get('results', {})
+
+    attendance_ids = {}
+    for student in students:
+        attendance_ids.setdefault(student['public_key'], []).append(student['attendance_id'])
+    for tx in response.get('transactions', []):
+        ids = [pk for key in tx['students'] for pk in attendance_ids.get(key, [])]
+        Attendance.objects.filter(pk__in=ids).update(blockchain_verified=True, transaction_hash=tx['hash'])
+    # Simulated submissions succeed without a transaction hash
+    simulated = [pk for key, result in results.items() if 'error' not in result and not result.get('hash')
+                 for pk in attendance_ids.get(key, [])]
+    if simulated:
+        Attendance.objects.filter(pk__in=simulated).update(blockchain_verified=True)
+
+    remaining = [student for student in students if 'error' in results.get(student['public_key'], {'error': True})]
+    if remaining and len(remaining) < len(students):
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(payload={'students': remaining})
+    if response.get('chain_pending'):
+        return {'chain_pending': True, 'retry_after': response['retry_after'],
+                'message': f"{len(remaining)} of {len(students)} students waiting for the blockchain"}
+    if remaining and len(remaining) < len(students):
+        return {'error': f"{len(remaining)} of {len(students)} students not recorded"}
+    return response
+
+
+def _register_account(entry):
+    """
+    Fund (if the signup did not get a pool keypair) and register a new user's account
+
+    Payload: ``{"role": "admin" | "teacher" | "student", "fund": bool}``.
+    Funding is recorded in the payload so a retry only re-registers.
+    """
+    payload = entry.payload
+    public_key = entry.signer.stellar_public_key
+    if payload.get('fund'):
+        if not StellarHelper.fund_account(public_key):
+            return {'error': f"Could not fund account {public_key}"}
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(payload={**payload, 'fund': False})
+    if payload['role'] == 'student':
+        return StellarHelper.register_student(entry.signer.stellar_seed)
+    return StellarHelper.register_teacher(entry.signer.stellar_seed)
+
+
+def _anchor_attendance(entry):
+    """
+    Publish a session's attendance Merkle root
+
+    Payload: ``{"anchor_id": ..., "merkle_root": hex}``.
+    """
+    return StellarHelper.anchor_attendance(
+        entry.signer.stellar_seed,
+        entry.lecture_id,
+        entry.payload['merkle_root']
+    )
+
+
+HANDLERS = {
+    BlockchainOutbox.CREATE_LECTURE: _create_lecture,
+    BlockchainOutbox.START_ATTENDANCE: _start_attendance,
+    BlockchainOutbox.MARK_ATTENDANCE: _mark_attendance,
+    BlockchainOutbox.CLOSE_ATTENDANCE: _close_attendance,
+    BlockchainOutbox.MANUAL_ATTENDANCE: _manual_attendance,
+    BlockchainOutbox.MANUAL_ATTENDANCE_BATCH: _manual_attendance_batch,
+    BlockchainOutbox.REGISTER_ACCOUNT: _register_account,
+    BlockchainOutbox.ANCHOR_ATTENDANCE: _anchor_attendance,
+}
+
+
+def apply_confirmed(entries):
+    """
+    Apply confirmed writes to the rows they record, one query per kind
+
+    Batch entries are skipped; their handler updates rows itself.
+    """
+    by_kind = defaultdict(list)
+    for entry in entries:
+        by_kind[entry.kind].append(entry)
+
+    if by_kind[BlockchainOutbox.CREATE_LECTURE]:
+        Lecture.objects.filter(
+            pk__in=[entry.lecture_id for entry in by_kind[BlockchainOutbox.CREATE_LECTURE]]
+        ).update(blockchain_lecture_id=Cast('pk', CharField()))
+    if by_kind[BlockchainOutbox.START_ATTENDANCE]:
+        AttendanceSession.objects.filter(
+            pk__in=[entry.session_id for entry in by_kind[BlockchainOutbox.START_ATTENDANCE]]
+        ).update(blockchain_verified=True)
+    if by_kind[BlockchainOutbox.REGISTER_ACCOUNT]:
+        User.objects.filter(
+            pk__in=[entry.signer_id for entry in by_kind[BlockchainOutbox.REGISTER_ACCOUNT]]
+        ).update(stellar_status=User.STELLAR_ACTIVE)
+    for entry in by_kind[BlockchainOutbox.ANCHOR_ATTENDANCE]:
+        anchor_id = entry.payload['anchor_id']
+        AttendanceAnchor.objects.filter(pk=anchor_id).update(
+            transaction_hash=entry.transaction_hash, anchored_at=timezone.now()
+        )
+        Attendance.objects.filter(anchor_id=anchor_id).update(
+            blockchain_verified=True, transaction_hash=entry.transaction_hash or None
+        )
+    rows = [
+        Attendance(pk=entry.attendance_id, blockchain_verified=True, transaction_hash=entry.transaction_hash or None)
+        for kind in (BlockchainOutbox.MARK_ATTENDANCE, BlockchainOutbox.MANUAL_ATTENDANCE)
+        for entry in by_kind[kind]
+        if entry.attendance_id
+    ]
+    if rows:
+        Attendance.objects.bulk_update(rows, ['blockchain_verified', 'transaction_hash'])
+
+
+def _schedule_retry(entry, error, now):
+    """
+    Put ``entry`` back in the queue with exponential backoff, or fail it for good
+    """
+    if entry.channel_lease:
+        # The submitted transaction failed or expired: its channel is free again
+        channel_pool.release_lease(entry.channel_lease)
+    if entry.attempts >= settings.STELLAR_OUTBOX_MAX_ATTEMPTS:
+        logger.warning("Outbox entry %s failed permanently: %s", entry.pk, error)
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(
+            status=BlockchainOutbox.FAILED, processed_at=now, last_error=error, channel_lease=''
+        )
+        if entry.kind == BlockchainOutbox.REGISTER_ACCOUNT:
+            User.objects.filter(pk=entry.signer_id).update(stellar_status=User.STELLAR_FAILED)
+    else:
+        delay = settings.STELLAR_OUTBOX_RETRY_DELAY * 2 ** (entry.attempts - 1)
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(
+            status=BlockchainOutbox.PENDING,
+            available_at=now + timedelta(seconds=delay),
+            last_error=error,
+            channel_lease='',
+        )
+
+
+def process_entry(entry):
+    """
+    Submit one claimed entry and record the outcome
+
+    A transaction that was only queued by Horizon leaves the entry
+    ``submitted`` with its hash; ``confirm_submitted`` finishes it. Failures
+    are retried with exponential backoff until ``STELLAR_OUTBOX_MAX_ATTEMPTS``
+    is reached, then marked failed. While a circuit breaker is open the entry
+    is put back untouched until the breaker allows trial calls again.
+
+    Returns:
+        bool: True if the write was accepted by the network
+    """
+    try:
+        response = HANDLERS[entry.kind](entry)
+        error = response.get('error')
+    except CircuitOpenError as e:
+        response = {'chain_pending': True, 'retry_after': e.retry_after, 'message': str(e)}
+    except Exception as e:
+        logger.exception("Outbox entry %s raised", entry.pk)
+        response, error = {}, str(e)
+
+    now = timezone.now()
+    if response.get('chain_pending'):
+        # Nothing reached the network: wait out the open circuit breaker
+        # without using up one of the entry's attempts
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(
+            status=BlockchainOutbox.PENDING,
+            attempts=F('attempts') - 1,
+            available_at=now + timedelta(seconds=response['retry_after']),
+            last_error=response.get('message', ''),
+        )
+        return False
+    if error is not None:
+        _schedule_retry(entry, error, now)
+        return False
+
+    entry.transaction_hash = response.get('hash') or ''
+    if response.get('pending') and entry.transaction_hash:
+        deadline = now + timedelta(seconds=settings.STELLAR_TX_TIMEOUT + settings.STELLAR_CONFIRMATION_GRACE)
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(
+            status=BlockchainOutbox.SUBMITTED, transaction_hash=entry.transaction_hash,
+            source_account=response.get('source_account', ''), channel_lease=response.get('channel_lease', ''),
+            envelope_xdr=response.get('envelope_xdr', ''), fee_bumps=0,
+            available_at=deadline, processed_at=now, last_error=''
+        )
+        return True
+    if response.get('channel_lease'):
+        channel_pool.release_lease(response['channel_lease'])
+
+    apply_confirmed([entry])
+    BlockchainOutbox.objects.filter(pk=entry.pk).update(
+        status=BlockchainOutbox.DONE, transaction_hash=entry.transaction_hash, processed_at=now, last_error=''
+    )
+    return True
+
+
+def _scan_account(server, public_key, hashes, since, page_size, max_pages):
+    """
+    Read ``public_key``'s transactions from the newest back to ``since``, picking out ``hashes``
+
+    Failed transactions are included; a fee bump is found by its inner hash
+    too. Stops once a page reaches a ledger closed before ``since``, at the
+    account's first transaction, or after ``max_pages`` pages.
+
+    Returns:
+        dict: {hash: record} for the hashes seen
+    """
+    found = {}
+    builder = server.transactions().for_account(public_key).include_failed(True).order(desc=True).limit(page_size)
+    for _ in range(max_pages):
+        page = builder.call()['_embedded']['records']
+        for record in page:
+            for transaction_hash in (record['hash'], (record.get('inner_transaction') or {}).get('hash')):
+                if transaction_hash in hashes:
+                    found[transaction_hash] = record
+        if len(page) < page_size or len(found) == len(hashes):
+            break
+        if datetime.fromisoformat(page[-1]['created_at']) < since:
+            break
+        builder.cursor(page[-1]['paging_token'])
+    return found
+
+
+def _lookup_transaction(server, transaction_hash):
+    try:
+        return server.transactions().transaction(transaction_hash).call()
+    except NotFoundError:
+        return None
+
+
+def _fee_source(entry):
+    """
+    Keypair of the account ``entry``'s transaction was sent from, which pays its fee bumps
+
+    Returns:
+        Keypair or None: None if the seed is not known here
+    """
+    seed = (ChannelAccount.objects.filter(public_key=entry.source_account).values_list('secret_seed', flat=True).first()
+            or entry.signer.stellar_seed)
+    try:
+        keypair = Keypair.from_secret(seed)
+    except Exception:
+        return None
+    return keypair if keypair.public_key == entry.source_account else None
+
+
+def _bump_due(entry, now):
+    """
+    Whether ``entry``'s queued transaction has waited long enough for its next fee bump
+    """
+    if not entry.envelope_xdr or entry.fee_bumps >= settings.STELLAR_FEE_BUMP_ATTEMPTS:
+        return False
+    wait = LEDGER_SECONDS * settings.STELLAR_FEE_BUMP_AFTER_LEDGERS * (entry.fee_bumps + 1)
+    return now - (entry.processed_at or entry.created_at) >= timedelta(seconds=wait)
+
+
+def _fee_bump(server, entry):
+    """
+    Replace ``entry``'s queued transaction with a fee bump bidding higher
+
+    The entry keeps tracking the inner transaction's hash, which the scan
+    matches whichever envelope makes it into a ledger.
+
+    Returns:
+        bool: True if Horizon queued the fee bump
+    """
+    keypair = _fee_source(entry)
+    if keypair is None:
+        logger.warning("Outbox entry %s: no seed for %s to fee-bump with", entry.pk, entry.source_account)
+        return False
+    fee_bump = fee_bump_queued(entry.envelope_xdr, keypair, get_network_passphrase())
+    if fee_bump is None:
+        return False  # Already bidding the maximum
+    try:
+        submit_envelope(server, fee_bump, wait=False)
+    except Exception as e:
+        logger.warning("Outbox entry %s: fee bump rejected: %s", entry.pk, e)
+        return False
+    BlockchainOutbox.objects.filter(pk=entry.pk).update(
+        transaction_hash=fee_bump.transaction.inner_transaction_envelope.hash_hex(),
+        envelope_xdr=fee_bump.to_xdr(), fee_bumps=F('fee_bumps') + 1
+    )
+    return True
+
+
+def confirm_submitted(limit=500, server=None, page_size=200, max_pages=10):
+    """
+    Confirm submitted transactions and apply them to their rows in bulk
+
+    Pending hashes are looked for in the history of the accounts they were
+    submitted from (a channel account or the signer), newest first and back
+    to the oldest pending submission from that account; a transaction
+    cannot be in a ledger that closed before it was sent. One request
+    usually covers every pending hash of an account, so a round costs about
+    one request per account with transactions in flight, whatever the
+    traffic on the rest of the network, and nothing is skipped between
+    rounds since no cursor is kept. Hashes still missing after their
+    confirmation deadline are looked up individually, at most ``limit`` per
+    round; if Horizon has never seen them the transaction expired (its time
+    bounds ran out) and the entry is queued for resubmission. A transaction
+    still missing after ``STELLAR_FEE_BUMP_AFTER_LEDGERS`` ledgers is
+    outbid by a fee bump, then again after as many ledgers more, up to
+    ``STELLAR_FEE_BUMP_ATTEMPTS`` times.
+
+    Returns:
+        dict: counts of ``confirmed``, ``failed``, ``waiting`` and ``bumped`` entries
+    """
+    server = server or get_horizon_server()
+    now = timezone.now()
+    entries = list(BlockchainOutbox.objects.filter(status=BlockchainOutbox.SUBMITTED).select_related('signer'))
+    by_account = defaultdict(list)
+    for entry in entries:
+        if entry.source_account:
+            by_account[entry.source_account].append(entry)
+    records = {}
+    for public_key, account_entries in by_account.items():
+        # Allow for clock skew between this host and the network
+        since = (min(entry.processed_at or entry.created_at for entry in account_entries)
+                 - timedelta(seconds=settings.STELLAR_CONFIRMATION_GRACE))
+        try:
+            records.update(_scan_account(server, public_key, {entry.transaction_hash for entry in account_entries},
+                                         since, page_size, max_pages))
+        except Exception as e:
+            logger.warning("Could not read the transactions of %s: %s", public_key, e)
+
+    confirmed, failed, waiting, bumped, lookups = [], 0, 0, 0, 0
+    for entry in entries:
+        record = records.get(entry.transaction_hash)
+        if record is None and entry.available_at <= now and lookups < limit:
+            lookups += 1
+            try:
+                record = _lookup_transaction(server, entry.transaction_hash)
+            except Exception as e:
+                logger.warning("Could not look up transaction %s: %s", entry.transaction_hash, e)
+                waiting += 1
+                continue
+            if record is None:
+                _schedule_retry(entry, f"Transaction {entry.transaction_hash} expired before inclusion", now)
+                failed += 1
+                continue
+        if record is None:
+            waiting += 1
+            if entry.available_at > now and _bump_due(entry, now) and _fee_bump(server, entry):
+                bumped += 1
+        elif record.get('successful'):
+            confirmed.append(entry)
+        else:
+            if record.get('envelope_xdr'):
+                # A failed contract call may have used a stale cached footprint
+                contract_invoker.invalidate_envelope(record['envelope_xdr'], get_network_passphrase())
+            _schedule_retry(entry, f"Transaction {entry.transaction_hash} failed in ledger {record.get('ledger')}",
+                            now)
+            failed += 1
+
+    if confirmed:
+        for entry in confirmed:
+            if entry.channel_lease:
+                channel_pool.release_lease(entry.channel_lease)
+        apply_confirmed(confirmed)
+        BlockchainOutbox.objects.filter(pk__in=[entry.pk for entry in confirmed]).update(
+            status=BlockchainOutbox.DONE, processed_at=now, last_error='', channel_lease=''
+        )
+    return {'confirmed': len(confirmed), 'failed': failed, 'waiting': waiting, 'bumped': bumped}
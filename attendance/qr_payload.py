@@ -0,0 +1,128 @@
+"""
+Compact binary QR payloads.
+
+The JSON payload ``{"l":..,"n":..,"e":..}`` with a 44-character base64 nonce
+and an ISO-8601 expiry is around 90 bytes in QR byte mode. The compact
+format packs the same information into a few fixed-width fields and
+encodes them with base45 (RFC 9285), whose alphabet is exactly the QR
+alphanumeric character set. Alphanumeric mode stores 5.5 bits per
+character instead of 8, so the code needs a lower QR version.
+
+A compact payload is ``PREFIX`` followed by base45 text. The first packed
+byte is the format:
+
+* ``STATIC`` (1): lecture id, session id, expiry as epoch seconds and the
+  first 8 bytes of ``sha256(nonce)``. The session is indexed by id, so only
+  a digest of the nonce has to travel;
+* ``ROTATING`` (2): lecture id, session id, time step and the 12-byte
+  truncated HMAC of ``attendance.qr_utils.qr_token``.
+"""
+import base64
+import hashlib
+import struct
+
+BASE45_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+_BASE45_VALUES = {char: value for value, char in enumerate(BASE45_ALPHABET)}
+
+PREFIX = 'LA:'
+
+STATIC = 1
+ROTATING = 2
+
+_STATIC = struct.Struct('>BIII8s')
+_ROTATING = struct.Struct('>BIII12s')
+
+NONCE_DIGEST_BYTES = 8
+
+
+def b45encode(data):
+    """
+    Encode bytes as base45 text (RFC 9285)
+    """
+    chars = []
+    for i in range(0, len(data) - 1, 2):
+        n = data[i] * 256 + data[i + 1]
+        n, c = divmod(n, 45)
+        e, d = divmod(n, 45)
+        chars += [BASE45_ALPHABET[c], BASE45_ALPHABET[d], BASE45_ALPHABET[e]]
+    if len(data) % 2:
+        d, c = divmod(data[-1], 45)
+        chars += [BASE45_ALPHABET[c], BASE45_ALPHABET[d]]
+    return ''.join(chars)
+
+
+def b45decode(text):
+    """
+    Decode base45 text; raises ValueError on characters or groups outside the encoding
+    """
+    try:
+        values = [_BASE45_VALUES[char] for char in text]
+    except KeyError:
+        raise ValueError("Invalid base45 character") from None
+    if len(values) % 3 == 1:
+        raise ValueError("Invalid base45 length")
+
+    data = bytearray()
+    for i in range(0, len(values), 3):
+        group = values[i:i + 3]
+        n = sum(value * 45 ** power for power, value in enumerate(group))
+        if len(group) == 3:
+            if n > 0xFFFF:
+                raise ValueError("Invalid base45 group")
+            data += bytes(divmod(n, 256))
+        else:
+            if n > 0xFF:
+                raise ValueError("Invalid base45 group")
+            data.append(n)
+    return bytes(data)
+
+
+def is_compact(text):
+    return isinstance(text, str) and text.startswith(PREFIX)
+
+
+def nonce_digest(nonce):
+    return hashlib.sha256(nonce.encode()).digest()[:NONCE_DIGEST_BYTES]
+
+
+def pack_static(lecture_id, session_id, nonce, expiry_timestamp):
+    expiry = int(expiry_timestamp.timestamp()) if expiry_timestamp else 0
+    return PREFIX + b45encode(_STATIC.pack(STATIC, lecture_id, session_id, expiry, nonce_digest(nonce)))
+
+
+def pack_rotating(lecture_id, session_id, step, token):
+    """
+    ``token`` is the URL-safe base64 text from ``qr_utils.qr_token``
+    """
+    mac = base64.urlsafe_b64decode(token)
+    return PREFIX + b45encode(_ROTATING.pack(ROTATING, lecture_id, session_id, step, mac))
+
+
+def unpack(text):
+    """
+    Decode a compact payload
+
+    Returns:
+        dict: for ``STATIC`` the keys ``format``, ``l``, ``s``, ``e`` (epoch
+        seconds, 0 for none) and ``nonce_digest``; for ``ROTATING`` the keys
+        ``format``, ``l``, ``s``, ``t`` and ``h`` as in the JSON token payload
+
+    Raises:
+        ValueError: if the text is not a well-formed compact payload
+    """
+    if not is_compact(text):
+        raise ValueError("Not a compact QR payload")
+    data = b45decode(text[len(PREFIX):])
+    if not data:
+        raise ValueError("Empty compact QR payload")
+    try:
+        if data[0] == STATIC:
+            _, lecture_id, session_id, expiry, digest = _STATIC.unpack(data)
+            return {'format': STATIC, 'l': lecture_id, 's': session_id, 'e': expiry, 'nonce_digest': digest}
+        if data[0] == ROTATING:
+            _, lecture_id, session_id, step, mac = _ROTATING.unpack(data)
+            return {'format': ROTATING, 'l': lecture_id, 's': session_id, 't': step,
+                    'h': base64.urlsafe_b64encode(mac).decode()}
+    except struct.error:
+        raise ValueError("Truncated compact QR payload") from None
+    raise ValueError(f"Unknown compact QR payload format {data[0]}")
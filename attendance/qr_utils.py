@@ -1,11 +1,219 @@
 import qrcode
 import base64
+import hmac
 import io
 import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
 from django.conf import settings
 from django.utils import timezone
 import hashlib
 
+from . import qr_payload
+
+logger = logging.getLogger(__name__)
+
+STATIC = 'static'
+ROTATING = 'rotating'
+
+JSON = 'json'
+COMPACT = 'compact'
+
+
+class QRImageCache:
+    """
+    Bounded LRU cache of rendered QR PNGs, keyed by ``(lecture_id, payload)``
+    
+    The image for a session only changes when its payload does (new nonce,
+    expiry or token step), so teacher and projector pages that reload while
+    a session is open reuse the rendered PNG instead of encoding it again.
+    Entries are per process.
+    """
+    
+    def __init__(self, max_entries=None):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+    
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return settings.QR_CACHE_SIZE
+    
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return image
+    
+    def set(self, key, image):
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(self.max_entries, 0):
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def invalidate(self, lecture_id):
+        """
+        Drop every image rendered for ``lecture_id`` (session closed or extended)
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == lecture_id]:
+                del self._entries[key]
+                self._stats['invalidations'] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+    
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_rate': round(self._stats['hits'] / lookups, 3) if lookups else None,
+            }
+
+
+qr_image_cache = QRImageCache()
+
+
+def rotating_tokens_enabled():
+    return settings.QR_TOKEN_MODE == ROTATING
+
+
+def current_step(now=None):
+    """
+    Index of the ``QR_TOKEN_STEP``-second window containing ``now`` (a Unix time)
+    """
+    return int((time.time() if now is None else now) // settings.QR_TOKEN_STEP)
+
+
+def seconds_until_rotation(now=None):
+    now = time.time() if now is None else now
+    return settings.QR_TOKEN_STEP - int(now % settings.QR_TOKEN_STEP)
+
+
+def _token_key():
+    secret = settings.QR_TOKEN_SECRET or settings.SECRET_KEY
+    return hmac.new(secret.encode(), b'attendance-qr-token', hashlib.sha256).digest()
+
+
+def qr_token(lecture_id, session_id, step):
+    """
+    Truncated HMAC-SHA256 over ``lecture|session|step``, URL-safe base64 (96 bits)
+    """
+    message = f"{int(lecture_id)}|{int(session_id)}|{int(step)}".encode()
+    digest = hmac.new(_token_key(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:12]).decode()
+
+
+def verify_rotating_token(data, now=None):
+    """
+    Check a rotating QR payload without touching the database
+    
+    The step must be within ``QR_TOKEN_SKEW_STEPS`` of the current one and
+    the MAC is compared in constant time.
+    
+    Returns:
+        dict: ``lecture_id``, ``session_id`` and ``step`` if valid, None otherwise
+    """
+    try:
+        lecture_id, session_id, step = int(data['l']), int(data['s']), int(data['t'])
+        token = str(data['h'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if abs(current_step(now) - step) > settings.QR_TOKEN_SKEW_STEPS:
+        return None
+    if not hmac.compare_digest(token.encode(), qr_token(lecture_id, session_id, step).encode()):
+        return None
+    return {'lecture_id': lecture_id, 'session_id': session_id, 'step': step, 'nonce': None}
+
+
+def _payload(data):
+    # Compact JSON scans more reliably
+    return json.dumps(data, separators=(',', ':'))
+
+
+def static_payload(lecture_id, nonce, expiry_timestamp=None):
+    return _payload({
+        'l': lecture_id,
+        'n': nonce,
+        'e': expiry_timestamp.isoformat() if expiry_timestamp else None
+    })
+
+
+def rotating_payload(lecture_id, session_id, step=None):
+    step = current_step() if step is None else step
+    return _payload({'l': lecture_id, 's': session_id, 't': step, 'h': qr_token(lecture_id, session_id, step)})
+
+
+def compact_payloads_enabled():
+    return settings.QR_PAYLOAD_FORMAT == COMPACT
+
+
+def session_payload(session):
+    """
+    What the QR code of ``session`` encodes right now, for the configured
+    ``QR_TOKEN_MODE`` and ``QR_PAYLOAD_FORMAT``
+    """
+    if rotating_tokens_enabled():
+        if compact_payloads_enabled():
+            step = current_step()
+            return qr_payload.pack_rotating(session.lecture_id, session.pk, step,
+                                            qr_token(session.lecture_id, session.pk, step))
+        return rotating_payload(session.lecture_id, session.pk)
+    if compact_payloads_enabled():
+        return qr_payload.pack_static(session.lecture_id, session.pk, session.nonce, session.end_time)
+    return static_payload(session.lecture_id, session.nonce, session.end_time)
+
+
+def render_payload_png(lecture_id, payload):
+    """
+    Raw PNG bytes of a QR code encoding ``payload``
+    
+    Images are served from ``qr_image_cache`` while the payload stays the same.
+    """
+    key = (lecture_id, payload)
+    image = qr_image_cache.get(key)
+    if image is None:
+        image = _render_qr_code(payload)
+        qr_image_cache.set(key, image)
+    return image
+
+
+def render_qr_png(lecture_id, nonce, expiry_timestamp=None):
+    """
+    Raw PNG bytes of the static attendance QR code
+    """
+    return render_payload_png(lecture_id, static_payload(lecture_id, nonce, expiry_timestamp))
+
+
+def payload_etag(payload):
+    """
+    Strong ETag for a QR code: it changes exactly when the encoded payload does
+    """
+    return '"%s"' % hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def qr_etag(lecture_id, nonce, expiry_timestamp=None):
+    return payload_etag(static_payload(lecture_id, nonce, expiry_timestamp))
+
+
 def generate_qr_code(lecture_id, nonce, expiry_timestamp=None):
     """
     Generate a QR code image for attendance
@@ -18,16 +226,21 @@ def generate_qr_code(lecture_id, nonce, expiry_timestamp=None):
     Returns:
         Base64 encoded PNG image of the QR code
     """
-    # Create data payload - simplify the data structure for better scanning
-    data = {
-        'l': lecture_id,
-        'n': nonce,
-        'e': expiry_timestamp.isoformat() if expiry_timestamp else None
-    }
-    
-    # Convert to JSON - use a compact format
-    json_data = json.dumps(data, separators=(',', ':'))
-    
+    img_str = base64.b64encode(render_qr_png(lecture_id, nonce, expiry_timestamp)).decode()
+    return f"data:image/png;base64,{img_str}"
+
+
+def invalidate_qr_code(lecture_id):
+    """
+    Forget the cached QR images of a lecture whose session was closed or extended
+    """
+    qr_image_cache.invalidate(lecture_id)
+
+
+def build_qr(payload):
+    """
+    Fitted ``qrcode.QRCode`` for ``payload`` (its ``version`` is the symbol size)
+    """
     # Create QR code with highest error correction and bigger size
     qr = qrcode.QRCode(
         version=2,  # Use version 2 for compact data
@@ -35,23 +248,48 @@ def generate_qr_code(lecture_id, nonce, expiry_timestamp=None):
         box_size=15,  # Larger boxes for better scanning
         border=4,
     )
-    qr.add_data(json_data)
+    qr.add_data(payload)
     qr.make(fit=True)
-    
+    return qr
+
+
+def _render_qr_code(payload):
     # Create image with better contrast
-    img = qr.make_image(fill_color="black", back_color="white")
+    img = build_qr(payload).make_image(fill_color="black", back_color="white")
     
-    # Convert to base64
     buffer = io.BytesIO()
     img.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    
-    return f"data:image/png;base64,{img_str}"
+    return buffer.getvalue()
+
+
+def _verify_compact(data):
+    if data['format'] == qr_payload.ROTATING:
+        result = verify_rotating_token(data)
+        if result is None:
+            logger.info("Invalid or stale QR token")
+        return result
+    if rotating_tokens_enabled():
+        logger.info("Static QR codes are not accepted while rotating tokens are enabled")
+        return None
+    if data['e'] and time.time() > data['e']:
+        logger.info("QR code has expired")
+        return None
+    # The session is indexed by id; the view checks the nonce digest against it
+    return {
+        'lecture_id': data['l'],
+        'session_id': data['s'],
+        'nonce': None,
+        'nonce_digest': data['nonce_digest'],
+        'expiry': datetime.fromtimestamp(data['e'], tz=dt_timezone.utc).isoformat() if data['e'] else None,
+    }
+
 
 def verify_qr_data(json_data, max_age_seconds=300):
     """
     Verify QR code data is valid
     
+    Both the JSON payloads and the compact ``qr_payload`` format are accepted.
+    
     Args:
         json_data: JSON data from QR code
         max_age_seconds: Maximum age of QR code in seconds
@@ -60,9 +298,22 @@ def verify_qr_data(json_data, max_age_seconds=300):
         dict: Parsed data if valid, None otherwise
     """
     try:
-        print(f"Received QR data: {json_data}")
+        logger.debug("Received QR data: %s", json_data)
+        if qr_payload.is_compact(json_data):
+            return _verify_compact(qr_payload.unpack(json_data))
         data = json.loads(json_data)
         
+        # Rotating tokens carry their own validity; no expiry or DB lookup needed
+        if 'h' in data:
+            result = verify_rotating_token(data)
+            if result is None:
+                logger.info("Invalid or stale QR token")
+            return result
+        if rotating_tokens_enabled():
+            # A static code would stay valid as a screenshot for the whole session
+            logger.info("Static QR codes are not accepted while rotating tokens are enabled")
+            return None
+        
         # Check if new compact format or old format
         if 'l' in data and 'n' in data:
             # Using new compact format
@@ -80,7 +331,7 @@ def verify_qr_data(json_data, max_age_seconds=300):
             # Using original format
             result = data
         else:
-            print("Missing required fields in QR data")
+            logger.info("Missing required fields in QR data")
             return None
         
         # Check expiry if provided
@@ -88,13 +339,13 @@ def verify_qr_data(json_data, max_age_seconds=300):
             try:
                 expiry = timezone.datetime.fromisoformat(result['expiry'])
                 if timezone.now() > expiry:
-                    print("QR code has expired")
+                    logger.info("QR code has expired")
                     return None
             except ValueError as e:
-                print(f"Invalid expiry format: {e}")
+                logger.info("Invalid expiry format: %s", e)
                 return None
         
         return result
     except Exception as e:
-        print(f"Error parsing QR data: {e}")
+        logger.info("Error parsing QR data: %s", e)
         return None 
\ No newline at end of file
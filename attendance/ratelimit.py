@@ -0,0 +1,159 @@
+"""
+Shared sliding-window rate limiting.
+
+Counts live in the Django cache, so every worker sees the same numbers when
+``CACHE_URL`` points at Redis or Memcached. Each client gets one counter per
+fixed window of ``period`` seconds, incremented with the cache's atomic
+``incr``. The count over the last ``period`` seconds is estimated as the
+current window's count plus the previous window's count weighted by how much
+of it still overlaps (the sliding-window counter approximation), so a client
+cannot double its limit by straddling a window boundary.
+
+``ratelimit`` applies a limit from ``RATE_LIMITS`` to a view before it runs,
+keyed by client IP, user or session, and answers 429 with ``Retry-After``
+when it is exceeded. Views that need finer control (e.g. counting only
+successful submissions) use ``RateLimit`` directly.
+"""
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    ``'20/m'`` -> ``(20, 60)``; also accepts ``'100/10s'``
+
+    Raises:
+        ValueError: for anything else
+    """
+    count, _, period = rate.partition('/')
+    multiplier = period[:-1] or '1'
+    if period[-1:] not in PERIODS or not count.isdigit() or not multiplier.isdigit():
+        raise ValueError(f"Invalid rate {rate!r}; expected e.g. '20/m' or '100/10s'")
+    return int(count), int(multiplier) * PERIODS[period[-1]]
+
+
+def client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def request_identity(request, key):
+    """
+    What a request is counted against: ``'ip'``, ``'user'`` or ``'session'``
+
+    Anonymous requests fall back to the client IP for ``'user'`` and
+    ``'session'``.
+    """
+    if key == 'user' and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if key == 'session' and request.session.session_key:
+        return f"session:{request.session.session_key}"
+    return f"ip:{client_ip(request)}"
+
+
+class RateLimit:
+    """
+    At most ``limit`` hits per ``period`` seconds for each identity in ``scope``
+    """
+
+    def __init__(self, scope, limit, period):
+        self.scope = scope
+        self.limit = limit
+        self.period = period
+
+    def _key(self, identity, window):
+        return f"ratelimit:{self.scope}:{identity}:{window}"
+
+    def _windows(self, identity, now, current=None):
+        """
+        (previous window's count, current window's count, seconds into the current window)
+        """
+        window, elapsed = divmod(now, self.period)
+        window = int(window)
+        if current is None:
+            current = cache.get(self._key(identity, window), 0)
+        return cache.get(self._key(identity, window - 1), 0), current, elapsed
+
+    def _estimate(self, previous, current, elapsed):
+        return previous * (1 - elapsed / self.period) + current
+
+    def _retry_after(self, previous, current, elapsed):
+        # Until one more hit fits: within this window as the previous one's
+        # weight decays, or else part-way into the next one
+        if current < self.limit and previous:
+            wait = self.period * (1 - (self.limit - current - 1) / previous) - elapsed
+        else:
+            wait = self.period - elapsed + self.period * (1 - (self.limit - 1) / current)
+        return max(1, math.ceil(wait))
+
+    def count(self, identity, now=None):
+        """
+        Estimated hits of ``identity`` over the last ``period`` seconds, without adding one
+        """
+        return self._estimate(*self._windows(identity, time.time() if now is None else now))
+
+    def is_limited(self, identity, now=None):
+        return self.count(identity, now) >= self.limit
+
+    def hit(self, identity, now=None):
+        """
+        Count a hit and report whether it is within the limit
+
+        Returns:
+            tuple: (allowed, seconds to wait before retrying when not allowed)
+        """
+        now = time.time() if now is None else now
+        key = self._key(identity, int(now // self.period))
+        # The previous window is still read a period later
+        cache.add(key, 0, self.period * 2)
+        try:
+            current = cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(key, 1, self.period * 2)
+            current = 1
+        windows = self._windows(identity, now, current)
+        if self._estimate(*windows) <= self.limit:
+            return True, 0
+        return False, self._retry_after(*windows)
+
+
+def too_many_requests(request, retry_after):
+    return HttpResponse('Too many requests. Please try again later.', status=429,
+                        content_type='text/plain')
+
+
+def ratelimit(scope, key='ip', methods=('POST',), limited_response=too_many_requests):
+    """
+    Shed requests over the ``RATE_LIMITS[scope]`` rate before the view runs
+
+    Args:
+        scope: entry of ``RATE_LIMITS`` (e.g. ``'20/m'``); an empty rate
+            disables the limit
+        key: ``'ip'``, ``'user'`` or ``'session'`` (see ``request_identity``)
+        methods: request methods that are counted
+        limited_response: callable ``(request, retry_after)`` building the
+            response for a refused request
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = settings.RATE_LIMITS.get(scope)
+            if rate and request.method in methods:
+                allowed, retry_after = RateLimit(scope, *parse_rate(rate)).hit(request_identity(request, key))
+                if not allowed:
+                    response = limited_response(request, retry_after)
+                    response['Retry-After'] = str(retry_after)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
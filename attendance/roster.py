@@ -0,0 +1,141 @@
+"""
+Precomputed session rosters for query-free check-in authorization.
+
+When a teacher starts (or extends) a session, ``load_roster`` stores the
+session's identity, nonce and expiry together with the ids of the students
+enrolled in the course in the shared Django cache, under the lecture's key.
+The ids are kept as a sorted ``array('Q')`` serialised to bytes, 8 bytes per
+student, and membership is a binary search. Checking a scan (right
+session, not expired, enrolled) then reads one cache entry and runs no query.
+The roster can outlive a close or an enrollment change in other processes
+when the cache is not shared, so the writes re-check what it accepted
+(``attendance.checkin`` at insert time, ``attendance.checkin_buffer`` at
+flush time).
+
+The roster is dropped when the session closes and whenever an enrollment of
+the course is saved or deleted (see ``attendance.signals``); the next scan
+rebuilds it from the database. Bulk enrollment changes that bypass model
+signals must call ``drop_course_rosters`` themselves.
+"""
+import hmac
+import time
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from .models import AttendanceSession, Enrollment
+from .qr_payload import nonce_digest
+
+EXPIRED_GRACE_SECONDS = 60  # Keep a roster this long past the session end
+NO_END_TIMEOUT = 3600  # Cache timeout for a session without an end time
+
+
+def _roster_key(lecture_id):
+    return f"session_roster:{lecture_id}"
+
+
+class SessionRoster:
+    """
+    Identity, expiry and enrolled students of a lecture's active session
+    """
+
+    __slots__ = ('session_id', 'lecture_id', 'nonce', 'end_time', 'lecture_title', 'course_name', 'students')
+
+    def __init__(self, session_id, lecture_id, nonce, end_time, lecture_title, course_name, students):
+        self.session_id = session_id
+        self.lecture_id = lecture_id
+        self.nonce = nonce
+        self.end_time = end_time  # Epoch seconds, or None
+        self.lecture_title = lecture_title
+        self.course_name = course_name
+        self.students = students  # Sorted array('Q') of student ids
+
+    @classmethod
+    def from_cache(cls, data):
+        students = array('Q')
+        students.frombytes(data['students'])
+        return cls(data['session_id'], data['lecture_id'], data['nonce'], data['end_time'],
+                   data['lecture_title'], data['course_name'], students)
+
+    def to_cache(self):
+        return {
+            'session_id': self.session_id,
+            'lecture_id': self.lecture_id,
+            'nonce': self.nonce,
+            'end_time': self.end_time,
+            'lecture_title': self.lecture_title,
+            'course_name': self.course_name,
+            'students': self.students.tobytes(),
+        }
+
+    def is_enrolled(self, student_id):
+        i = bisect_left(self.students, student_id)
+        return i < len(self.students) and self.students[i] == student_id
+
+    def is_expired(self, now=None):
+        return self.end_time is not None and self.end_time <= (time.time() if now is None else now)
+
+    def matches(self, data):
+        """
+        Whether a payload accepted by ``verify_qr_data`` is for this session
+        """
+        if data.get('session_id') is not None:
+            if data['session_id'] != self.session_id:
+                return False
+            # Rotating tokens already proved the session id; compact static
+            # codes carry a digest of its nonce
+            return data.get('nonce_digest') is None or hmac.compare_digest(data['nonce_digest'],
+                                                                           nonce_digest(self.nonce))
+        return hmac.compare_digest(str(data.get('nonce')).encode(), self.nonce.encode())
+
+
+def load_roster(session):
+    """
+    Build and cache the roster of an active ``session``
+
+    Returns:
+        SessionRoster
+    """
+    lecture = session.lecture
+    students = array('Q', sorted(Enrollment.objects.filter(course_id=lecture.course_id)
+                                 .values_list('student_id', flat=True)))
+    end_time = session.end_time.timestamp() if session.end_time else None
+    roster = SessionRoster(session.pk, lecture.pk, session.nonce, end_time,
+                           lecture.title, lecture.course.name, students)
+    timeout = (max(int(end_time - time.time()), 0) + EXPIRED_GRACE_SECONDS) if end_time else NO_END_TIMEOUT
+    cache.set(_roster_key(lecture.pk), roster.to_cache(), timeout)
+    return roster
+
+
+def get_roster(lecture_id):
+    """
+    Roster of the lecture's active session, or None if it has none
+
+    Served from the cache; rebuilt from the database after an invalidation.
+    """
+    data = cache.get(_roster_key(lecture_id))
+    if data is not None:
+        return SessionRoster.from_cache(data)
+    session = (AttendanceSession.objects
+               .filter(lecture_id=lecture_id, is_active=True)
+               .select_related('lecture__course')
+               .order_by('-start_time')
+               .first())
+    if session is None:
+        return None
+    return load_roster(session)
+
+
+def drop_roster(lecture_id):
+    cache.delete(_roster_key(lecture_id))
+
+
+def drop_course_rosters(course_id):
+    """
+    Drop the rosters of every active session of a course (its enrollments changed)
+    """
+    lecture_ids = (AttendanceSession.objects
+                   .filter(lecture__course_id=course_id, is_active=True)
+                   .values_list('lecture_id', flat=True))
+    cache.delete_many([_roster_key(lecture_id) for lecture_id in set(lecture_ids)])
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Enrollment
+from .roster import drop_course_rosters
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    # Active sessions authorize scans from a cached roster of the course
+    drop_course_rosters(instance.course_id)
@@ -0,0 +1,564 @@
+"""
+Async counterpart of ``StellarHelper`` for ASGI deployments.
+
+``AsyncStellarHelper`` exposes the same methods as ``StellarHelper`` as
+coroutines, built on the SDK's ``ServerAsync``/``SorobanServerAsync`` with an
+aiohttp client, so an async view can keep many chain calls in flight on one
+event loop instead of holding a worker thread per call.
+
+aiohttp sessions belong to the event loop that created them, so clients are
+pooled per running loop rather than per process. Sequence numbers, channel
+leases, fee selection and the batch and fee-bump decisions are shared with
+the synchronous helper; the steps that touch the database or the shared cache
+run through ``sync_to_async``.
+"""
+import asyncio
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from stellar_sdk import Keypair, MuxedAccount, ServerAsync, SorobanServerAsync, TransactionBuilder
+from stellar_sdk.client.aiohttp_client import AiohttpClient
+from stellar_sdk.exceptions import BaseHorizonError
+
+from . import stellar_fees
+from .circuit_breaker import AsyncBreakerClient, CircuitOpenError, get_breaker
+from .stellar_channels import channel_pool
+from .stellar_fees import (attach_async_result_codes, fee_bumps, fee_policy, is_stuck_transaction_error,
+                           queued_with_envelope)
+from .stellar_helper import (INVALID_KEY_ERROR, StellarHelper, _add_memo, _batch_summary, _chunks,
+                             _circuit_open_summary, _failed_chunk, _failure, _lecture_memo, _split_valid_keys,
+                             blockchain_enabled, get_contract_id, get_network_passphrase, is_valid_public_key)
+from .stellar_contract import contract_invocation_enabled
+from .stellar_sequence import is_bad_sequence_error, sequence_manager
+from .stellar_simulator import AsyncSimulatorClient, simulator_enabled
+
+
+def _build_async_client(url):
+    """
+    Create a pooled aiohttp client using the configured pool size and timeouts,
+    behind the same circuit breaker as the sync clients for ``url``
+    """
+    if simulator_enabled():
+        client = AsyncSimulatorClient()
+    else:
+        client = AiohttpClient(
+            pool_size=settings.STELLAR_HTTP_POOL_SIZE,
+            request_timeout=settings.STELLAR_HTTP_TIMEOUT,
+            post_timeout=settings.STELLAR_HTTP_TIMEOUT,
+        )
+    return AsyncBreakerClient(client, get_breaker(url))
+
+
+class AsyncClientRegistry:
+    """
+    One ``ServerAsync``/``SorobanServerAsync`` per URL and running event loop
+    """
+
+    def __init__(self):
+        self._servers = weakref.WeakKeyDictionary()
+
+    def _loop_servers(self):
+        return self._servers.setdefault(asyncio.get_running_loop(), {})
+
+    def horizon(self, url=None):
+        """
+        Return the Horizon ``ServerAsync`` for ``url`` on the running loop
+        """
+        url = url or settings.STELLAR_HORIZON_URL
+        servers = self._loop_servers()
+        key = ('horizon', url)
+        if key not in servers:
+            servers[key] = ServerAsync(horizon_url=url, client=_build_async_client(url))
+        return servers[key]
+
+    def soroban(self, url=None):
+        """
+        Return the ``SorobanServerAsync`` for ``url`` on the running loop
+        """
+        url = url or settings.STELLAR_RPC_URL
+        servers = self._loop_servers()
+        key = ('soroban', url)
+        if key not in servers:
+            servers[key] = SorobanServerAsync(url, client=_build_async_client(url))
+        return servers[key]
+
+    async def close(self):
+        """
+        Close the clients opened on the running loop
+        """
+        servers = self._servers.pop(asyncio.get_running_loop(), {})
+        for server in servers.values():
+            try:
+                await server.close()
+            except Exception:
+                pass
+
+
+async_registry = AsyncClientRegistry()
+
+
+def get_async_horizon_server(url=None):
+    return async_registry.horizon(url)
+
+
+def get_async_soroban_server(url=None):
+    return async_registry.soroban(url)
+
+
+async def close_async_clients():
+    await async_registry.close()
+
+
+async def submit_envelope_async(server, envelope, wait=True):
+    """
+    Async version of ``stellar_fees.submit_envelope``
+    """
+    if wait:
+        return await server.submit_transaction(envelope)
+    try:
+        return await server.submit_transaction_async(envelope)
+    except BaseHorizonError as e:
+        attach_async_result_codes(e)
+        raise
+
+
+async def submit_with_fee_bumps_async(server, envelope, fee_source_keypair, base_fee, network_passphrase,
+                                      policy=None, wait=True):
+    """
+    Async version of ``stellar_fees.submit_with_fee_bumps``
+    """
+    try:
+        return queued_with_envelope(await submit_envelope_async(server, envelope, wait), envelope)
+    except Exception as e:
+        if not is_stuck_transaction_error(e):
+            raise
+        last_error = e
+
+    for fee_bump in fee_bumps(envelope, fee_source_keypair, base_fee, network_passphrase, policy):
+        try:
+            return queued_with_envelope(await submit_envelope_async(server, fee_bump, wait), fee_bump)
+        except Exception as e:
+            if not is_stuck_transaction_error(e):
+                raise
+            last_error = e
+    raise last_error
+
+
+class AsyncStellarHelper:
+    """
+    Coroutine versions of the ``StellarHelper`` methods
+    """
+    create_keypair = staticmethod(StellarHelper.create_keypair)
+    generate_nonce = staticmethod(StellarHelper.generate_nonce)
+    _self_payment = staticmethod(StellarHelper._self_payment)
+    _attendance_payment = staticmethod(StellarHelper._attendance_payment)
+    _transaction_fields = staticmethod(StellarHelper._transaction_fields)
+
+    @staticmethod
+    async def fund_account(public_key):
+        """
+        Fund an account on testnet using Friendbot
+        """
+        client = _build_async_client()
+        try:
+            response = await client.get('https://friendbot.stellar.org', {'addr': public_key})
+        finally:
+            await client.close()
+        return response.status_code == 200
+
+    @staticmethod
+    async def _reserve_account(server, public_key):
+        # Prime the shared counter without a blocking load_account call
+        if not await sync_to_async(sequence_manager.is_primed, thread_sensitive=False)(public_key):
+            account = await server.load_account(public_key)
+            await sync_to_async(sequence_manager.prime, thread_sensitive=False)(public_key, account.sequence)
+        return await sync_to_async(sequence_manager.next_account, thread_sensitive=False)(public_key)
+
+    @classmethod
+    async def _submit_transaction(cls, source_keypair, memo, operations=(), use_channel=False,
+                                  fee_class=stellar_fees.ADMIN, wait=None):
+        """
+        Build, sign and submit a transaction signed by ``source_keypair``
+
+        Behaves like ``StellarHelper._submit_transaction``: local sequence
+        numbers with a resync on ``tx_bad_seq``, an optional channel account as
+        transaction source, adaptive fees, fee bumps and ``wait``.
+
+        Returns:
+            dict: the Horizon submission response
+        """
+        if wait is None:
+            wait = not settings.STELLAR_ASYNC_SUBMISSION
+        server = get_async_horizon_server()
+        channel = await sync_to_async(channel_pool.lease)() if use_channel and operations else None
+        signers = [source_keypair]
+        if channel:
+            signers.insert(0, channel.keypair)
+            for operation in operations:
+                if operation.source is None:
+                    operation.source = MuxedAccount.from_account(source_keypair.public_key)
+        transaction_source = channel.public_key if channel else source_keypair.public_key
+        base_fee = await sync_to_async(fee_policy.base_fee, thread_sensitive=False)(fee_class)
+        attempts = max(1, settings.STELLAR_SEQUENCE_RETRIES + 1)
+
+        queued = False
+        try:
+            for attempt in range(attempts):
+                source_account = await cls._reserve_account(server, transaction_source)
+                builder = TransactionBuilder(
+                    source_account=source_account,
+                    network_passphrase=get_network_passphrase(),
+                    base_fee=base_fee
+                )
+                for operation in operations:
+                    builder.append_operation(operation)
+                transaction = _add_memo(builder, memo).set_timeout(settings.STELLAR_TX_TIMEOUT).build()
+                for signer in signers:
+                    transaction.sign(signer)
+                try:
+                    response = await submit_with_fee_bumps_async(
+                        server, transaction, signers[0], base_fee, get_network_passphrase(), policy=fee_policy,
+                        wait=wait
+                    )
+                except Exception as e:
+                    if is_bad_sequence_error(e) and attempt + 1 < attempts:
+                        account = await server.load_account(transaction_source)
+                        await sync_to_async(sequence_manager.resync, thread_sensitive=False)(
+                            transaction_source, account.sequence
+                        )
+                        continue
+                    await sync_to_async(sequence_manager.invalidate, thread_sensitive=False)(transaction_source)
+                    raise
+                break
+        except Exception as e:
+            if channel:
+                await sync_to_async(channel_pool.record_failure)(channel, e)
+            raise
+        else:
+            queued = "tx_status" in response
+            if queued:
+                response["source_account"] = transaction_source
+            if channel:
+                await sync_to_async(channel_pool.record_success)(channel)
+                if queued:
+                    response["channel_lease"] = channel.lease
+            return response
+        finally:
+            # A queued transaction keeps its channel until it is confirmed
+            if channel and not queued:
+                await sync_to_async(channel_pool.release)(channel)
+
+    @classmethod
+    async def initialize_contract(cls, admin_seed):
+        """
+        Initialize the attendance contract with an admin
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": "Contract initialized (simulated)"}
+
+        try:
+            admin_keypair = Keypair.from_secret(admin_seed)
+            response = await cls._submit_transaction(admin_keypair, "Initialize contract")
+            return {
+                "status": "success",
+                "message": "Contract initialized (simulated - SDK compatibility mode)",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+
+    @classmethod
+    async def register_teacher(cls, teacher_seed):
+        """
+        Register a teacher in the smart contract
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": "Teacher registered (simulated)"}
+        if contract_invocation_enabled():
+            # The admin adds the teacher to the contract's allow-list
+            return await sync_to_async(StellarHelper.register_teacher, thread_sensitive=False)(teacher_seed)
+
+        try:
+            teacher_keypair = Keypair.from_secret(teacher_seed)
+            response = await cls._submit_transaction(teacher_keypair, "Register teacher")
+            return {
+                "status": "success",
+                "message": "Teacher registered successfully",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+
+    @classmethod
+    async def register_student(cls, student_seed):
+        """
+        Register a student in the smart contract
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": "Student registered (simulated)"}
+
+        try:
+            student_keypair = Keypair.from_secret(student_seed)
+            response = await cls._submit_transaction(student_keypair, "Register student",
+                                                     fee_class=stellar_fees.CHECKIN)
+            return {
+                "status": "success",
+                "message": "Student registered successfully",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+
+    @classmethod
+    async def create_lecture(cls, teacher_seed, lecture_id, course_id, title, date_timestamp, duration_minutes):
+        """
+        Create a lecture entry in the smart contract
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": f"Lecture {lecture_id} created (simulated)"}
+        if contract_invocation_enabled():
+            return await sync_to_async(StellarHelper.create_lecture, thread_sensitive=False)(
+                teacher_seed, lecture_id, course_id, title, date_timestamp, duration_minutes
+            )
+
+        try:
+            teacher_keypair = Keypair.from_secret(teacher_seed)
+            response = await cls._submit_transaction(
+                teacher_keypair,
+                _lecture_memo("Create lecture: ", lecture_id),
+                [cls._self_payment(teacher_keypair.public_key)],
+                use_channel=True
+            )
+            return {
+                "status": "success",
+                "message": f"Lecture {lecture_id} created successfully",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+
+    @classmethod
+    async def start_attendance(cls, teacher_seed, lecture_id, duration_seconds=300, nonce=None):
+        """
+        Start an attendance session for a lecture
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": f"Attendance started for {lecture_id} (simulated)"}
+        if contract_invocation_enabled():
+            return await sync_to_async(StellarHelper.start_attendance, thread_sensitive=False)(
+                teacher_seed, lecture_id, duration_seconds, nonce
+            )
+
+        try:
+            teacher_keypair = Keypair.from_secret(teacher_seed)
+            response = await cls._submit_transaction(
+                teacher_keypair,
+                _lecture_memo("Att start:", lecture_id),
+                [cls._self_payment(teacher_keypair.public_key)],
+                use_channel=True
+            )
+            return {
+                "status": "success",
+                "message": f"Attendance session started for {lecture_id}",
+                "nonce": nonce or f"nonce_{int(time.time())}",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+
+    @classmethod
+    async def mark_attendance(cls, student_seed, lecture_id, nonce):
+        """
+        Mark attendance for a student in a lecture
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": f"Attendance marked for {lecture_id} (simulated)"}
+        if contract_invocation_enabled():
+            # Contract calls are prepared through the shared sync invoker and its cache
+            return await sync_to_async(StellarHelper.mark_attendance, thread_sensitive=False)(
+                student_seed, lecture_id, nonce
+            )
+
+        try:
+            student_keypair = Keypair.from_secret(student_seed)
+            response = await cls._submit_transaction(
+                student_keypair,
+                _lecture_memo("Att:", lecture_id, f":{nonce[:10]}"),
+                [cls._self_payment(student_keypair.public_key)],
+                fee_class=stellar_fees.CHECKIN
+            )
+            return {
+                "status": "success",
+                "message": f"Attendance marked successfully for {lecture_id}",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+
+    @classmethod
+    async def close_attendance_session(cls, teacher_seed, lecture_id):
+        """
+        Close an active attendance session
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": f"Attendance session closed for {lecture_id} (simulated)"}
+
+        try:
+            teacher_keypair = Keypair.from_secret(teacher_seed)
+            response = await cls._submit_transaction(
+                teacher_keypair,
+                _lecture_memo("Att end:", lecture_id),
+                [cls._self_payment(teacher_keypair.public_key)],
+                use_channel=True
+            )
+            return {
+                "status": "success",
+                "message": f"Attendance session closed successfully for {lecture_id}",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+
+    @classmethod
+    async def anchor_attendance(cls, teacher_seed, lecture_id, merkle_root):
+        """
+        Publish the Merkle root over a batch of a lecture's attendance records
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": f"Attendance anchored for {lecture_id} (simulated)"}
+
+        try:
+            teacher_keypair = Keypair.from_secret(teacher_seed)
+            response = await cls._submit_transaction(
+                teacher_keypair,
+                bytes.fromhex(merkle_root),
+                [cls._self_payment(teacher_keypair.public_key)],
+                use_channel=True
+            )
+            return {
+                "status": "success",
+                "message": f"Attendance Merkle root anchored for {lecture_id}",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+
+    @classmethod
+    async def manual_attendance(cls, teacher_seed, lecture_id, student_public_key):
+        """
+        Manually mark attendance for a student
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": f"Manual attendance marked for {lecture_id} (simulated)"}
+
+        try:
+            teacher_keypair = Keypair.from_secret(teacher_seed)
+            if not is_valid_public_key(student_public_key):
+                raise ValueError(INVALID_KEY_ERROR)
+            response = await cls._submit_transaction(
+                teacher_keypair,
+                _lecture_memo("MAtt:", lecture_id),
+                [cls._attendance_payment(teacher_keypair.public_key, student_public_key)],
+                use_channel=True
+            )
+            return {
+                "status": "success",
+                "message": f"Manual attendance marked successfully for {lecture_id}",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+
+    @classmethod
+    async def batch_manual_attendance(cls, teacher_seed, lecture_id, student_public_keys):
+        """
+        Manually mark attendance for many students with as few transactions as possible
+
+        See ``StellarHelper.batch_manual_attendance`` for the response format.
+        """
+        student_public_keys, results = _split_valid_keys(student_public_keys)
+        if not blockchain_enabled():
+            return {
+                "status": "success",
+                "message": f"Manual attendance marked for {len(student_public_keys)} students in {lecture_id} (simulated)",
+                "results": {**results, **{key: {"status": "success"} for key in student_public_keys}},
+                "transactions": []
+            }
+
+        try:
+            teacher_keypair = Keypair.from_secret(teacher_seed)
+            memo = _lecture_memo("MAtt:", lecture_id)
+        except Exception as e:
+            return _failure(e)
+
+        transactions = []
+        for chunk in _chunks(student_public_keys):
+            # One retry without the students whose operations were rejected
+            for retried in (False, True):
+                try:
+                    response = await cls._submit_transaction(
+                        teacher_keypair,
+                        memo,
+                        [cls._attendance_payment(teacher_keypair.public_key, key) for key in chunk],
+                        use_channel=True,
+                        wait=True
+                    )
+                except CircuitOpenError as e:
+                    return _circuit_open_summary(lecture_id, student_public_keys, results, transactions, e)
+                except Exception as e:
+                    failed, chunk = _failed_chunk(chunk, e, retried)
+                    results.update(failed)
+                    if not chunk:
+                        break
+                    continue
+
+                transactions.append({"hash": response.get("hash"), "students": chunk})
+                for key in chunk:
+                    results[key] = {"status": "success", "hash": response.get("hash")}
+                break
+
+        return _batch_summary(lecture_id, results, transactions)
+
+    @classmethod
+    async def verify_attendance(cls, lecture_id, student_public_key):
+        """
+        Verify if a student has attended a lecture
+        """
+        return await sync_to_async(StellarHelper.verify_attendance)(lecture_id, student_public_key)
+
+    @classmethod
+    async def verify_contract_connection(cls):
+        """
+        Verify that the contract connection is working properly
+
+        Horizon and Soroban RPC are probed concurrently.
+        """
+        if not blockchain_enabled():
+            return {"status": "error", "message": "No contract ID provided"}
+
+        horizon, soroban = await asyncio.gather(
+            get_async_horizon_server().root().call(),
+            get_async_soroban_server().get_health(),
+            return_exceptions=True
+        )
+        if isinstance(horizon, Exception):
+            return {
+                "status": "error",
+                "message": f"Could not connect to Stellar network: {horizon}",
+                "contract_id": get_contract_id()
+            }
+        if isinstance(soroban, Exception):
+            return {
+                "status": "partial",
+                "message": "Connected to Stellar network, but Soroban RPC connection failed.",
+                "contract_id": get_contract_id(),
+                "network_info": "Connected to Horizon API only"
+            }
+        return {
+            "status": "success",
+            "message": "Successfully connected to Stellar network and Soroban RPC.",
+            "contract_id": get_contract_id(),
+            "network_info": "Connected to Horizon and Soroban APIs"
+        }
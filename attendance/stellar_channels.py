@@ -0,0 +1,166 @@
+"""
+Channel-account pool for parallel submissions from one signer.
+
+Stellar accepts one transaction per source-account sequence number, so every
+write signed by the same teacher/admin seed queues behind the previous one.
+Channel accounts lift that limit: a leased channel is the transaction source
+(and pays the fee) while the teacher/admin stays the source of every
+operation and co-signs. Leases are taken round-robin with an atomic
+``cache.add``, so with a shared cache backend two workers never submit from
+the same channel at once. Channels that keep failing are cooled down.
+
+stellar-core keeps at most one queued transaction per source account, so a
+channel whose transaction Horizon only queued stays leased until the outbox
+confirms it (``release_lease``) or the lease runs out. Leases last at least
+``STELLAR_TX_TIMEOUT`` plus the confirmation grace, by when the transaction
+is either in a ledger or can no longer be.
+"""
+import itertools
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from stellar_sdk import Keypair
+
+from .models import ChannelAccount
+
+# Transaction results that point at the channel itself rather than the operation
+CHANNEL_FAILURE_CODES = {'tx_insufficient_balance', 'tx_no_source_account', 'tx_bad_seq'}
+
+
+class LeasedChannel:
+    def __init__(self, pk, public_key, secret_seed, token):
+        self.pk = pk
+        self.public_key = public_key
+        self.keypair = Keypair.from_secret(secret_seed)
+        self.token = token
+
+    @property
+    def lease(self):
+        """
+        Identifies this lease, for ``ChannelPool.release_lease`` from another process
+        """
+        return f"{self.public_key}:{self.token}"
+
+    def __repr__(self):
+        return f"<LeasedChannel {self.public_key}>"
+
+
+def _is_channel_failure(error):
+    result_codes = (getattr(error, 'extras', None) or {}).get('result_codes') or {}
+    return result_codes.get('transaction') in CHANNEL_FAILURE_CODES
+
+
+class ChannelPool:
+    """
+    Round-robin leasing of healthy channel accounts
+    """
+
+    def __init__(self, refresh_seconds=30):
+        self._refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._channels = []
+        self._loaded_at = 0.0
+        self._counter = itertools.count()
+
+    def _lease_key(self, public_key):
+        return f"stellar_channel_lease:{public_key}"
+
+    def _lease_seconds(self):
+        return max(settings.STELLAR_CHANNEL_LEASE_SECONDS,
+                   settings.STELLAR_TX_TIMEOUT + settings.STELLAR_CONFIRMATION_GRACE)
+
+    def _healthy_channels(self):
+        now = time.monotonic()
+        if now - self._loaded_at > self._refresh_seconds:
+            with self._lock:
+                if now - self._loaded_at > self._refresh_seconds:
+                    self._channels = [
+                        channel for channel in ChannelAccount.objects.filter(is_active=True).order_by('pk')
+                        if channel.is_healthy
+                    ]
+                    self._loaded_at = now
+        return self._channels
+
+    def refresh(self):
+        """
+        Reload the channel list on next lease (e.g. after provisioning)
+        """
+        self._loaded_at = 0.0
+
+    def lease(self):
+        """
+        Lease the next free healthy channel
+
+        Returns:
+            LeasedChannel or None: None if channels are disabled, none are
+            provisioned or all are busy; callers then use the signer as source
+        """
+        if not settings.STELLAR_CHANNELS_ENABLED:
+            return None
+        channels = self._healthy_channels()
+        if not channels:
+            return None
+        start = next(self._counter)
+        for offset in range(len(channels)):
+            channel = channels[(start + offset) % len(channels)]
+            token = uuid.uuid4().hex
+            if cache.add(self._lease_key(channel.public_key), token, self._lease_seconds()):
+                return LeasedChannel(channel.pk, channel.public_key, channel.secret_seed, token)
+        return None
+
+    def release(self, channel):
+        self.release_lease(channel.lease)
+
+    def release_lease(self, lease):
+        """
+        Free the channel of a ``LeasedChannel.lease``, unless it expired and was leased again
+        """
+        public_key, _, token = lease.partition(':')
+        key = self._lease_key(public_key)
+        if cache.get(key) == token:
+            cache.delete(key)
+
+    def record_success(self, channel):
+        ChannelAccount.objects.filter(pk=channel.pk).update(
+            consecutive_failures=0, last_used=timezone.now()
+        )
+
+    def record_failure(self, channel, error):
+        """
+        Count a failure against the channel; cool it down after too many in a row
+        """
+        if not _is_channel_failure(error):
+            return
+        ChannelAccount.objects.filter(pk=channel.pk).update(
+            consecutive_failures=F('consecutive_failures') + 1, last_used=timezone.now()
+        )
+        cooldown_until = timezone.now() + timedelta(seconds=settings.STELLAR_CHANNEL_COOLDOWN)
+        disabled = ChannelAccount.objects.filter(
+            pk=channel.pk, consecutive_failures__gte=settings.STELLAR_CHANNEL_MAX_FAILURES
+        ).update(disabled_until=cooldown_until, consecutive_failures=0)
+        if disabled:
+            self.refresh()
+
+    def stats(self):
+        """
+        Return the health of every provisioned channel for monitoring
+        """
+        return [
+            {
+                'public_key': channel.public_key,
+                'healthy': channel.is_healthy,
+                'leased': cache.get(self._lease_key(channel.public_key)) is not None,
+                'consecutive_failures': channel.consecutive_failures,
+                'last_used': channel.last_used,
+            }
+            for channel in ChannelAccount.objects.order_by('pk')
+        ]
+
+
+channel_pool = ChannelPool()
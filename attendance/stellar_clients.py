@@ -0,0 +1,182 @@
+"""
+Process-wide registry of long-lived Horizon and Soroban RPC clients.
+
+Every ``Server``/``SorobanServer`` built by the SDK owns its own
+``requests`` session, so constructing one per call throws away the
+keep-alive connection and pays a fresh TCP+TLS handshake each time.
+The registry keeps exactly one pooled client per configured URL and
+hands the same server objects to every caller in the process.
+"""
+import atexit
+import os
+import threading
+
+from django.conf import settings
+from stellar_sdk import Server, SorobanServer
+from stellar_sdk.client.requests_client import RequestsClient
+
+from .circuit_breaker import BreakerClient, get_breaker
+from .stellar_simulator import SimulatorClient, simulator_enabled
+
+
+def _build_client(url):
+    """
+    Create a pooled HTTP client using the configured pool size and timeouts,
+    behind the circuit breaker for ``url``
+    """
+    if simulator_enabled():
+        client = SimulatorClient()
+    else:
+        client = RequestsClient(
+            pool_size=settings.STELLAR_HTTP_POOL_SIZE,
+            num_retries=settings.STELLAR_HTTP_RETRIES,
+            request_timeout=settings.STELLAR_HTTP_TIMEOUT,
+            post_timeout=settings.STELLAR_HTTP_TIMEOUT,
+        )
+    return BreakerClient(client, get_breaker(url))
+
+
+class ClientRegistry:
+    """
+    Thread-safe cache of Horizon and Soroban servers keyed by URL.
+
+    Connections are never shared across a fork: the child process drops the
+    clients it inherited (without closing sockets that still belong to the
+    parent) and lazily builds its own on first use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._horizon = {}
+        self._soroban = {}
+
+    def _check_pid(self):
+        # Covers forks that happen outside os.register_at_fork (e.g. some
+        # multiprocessing start methods) as a second line of defence.
+        if self._pid != os.getpid():
+            self.reset_after_fork()
+
+    def reset_after_fork(self):
+        """
+        Forget inherited clients in a freshly forked child process
+        """
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._horizon = {}
+        self._soroban = {}
+
+    def horizon(self, url=None):
+        """
+        Return the shared Horizon ``Server`` for ``url`` (defaults to settings)
+        """
+        url = url or settings.STELLAR_HORIZON_URL
+        self._check_pid()
+        server = self._horizon.get(url)
+        if server is None:
+            with self._lock:
+                server = self._horizon.get(url)
+                if server is None:
+                    server = Server(horizon_url=url, client=_build_client(url))
+                    self._horizon[url] = server
+        return server
+
+    def soroban(self, url=None):
+        """
+        Return the shared ``SorobanServer`` for ``url`` (defaults to settings)
+        """
+        url = url or settings.STELLAR_RPC_URL
+        self._check_pid()
+        server = self._soroban.get(url)
+        if server is None:
+            with self._lock:
+                server = self._soroban.get(url)
+                if server is None:
+                    server = SorobanServer(url, client=_build_client(url))
+                    self._soroban[url] = server
+        return server
+
+    def close(self):
+        """
+        Close every pooled connection; clients are rebuilt on next use
+        """
+        with self._lock:
+            servers = list(self._horizon.values()) + list(self._soroban.values())
+            self._horizon = {}
+            self._soroban = {}
+        for server in servers:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """
+        Return connection pool statistics for every registered client
+
+        Returns:
+            dict: ``{"pid": ..., "horizon": {url: {...}}, "soroban": {url: {...}}}``
+        """
+        self._check_pid()
+        with self._lock:
+            horizon = dict(self._horizon)
+            soroban = dict(self._soroban)
+        return {
+            'pid': self._pid,
+            'horizon': {url: _pool_stats(server._client.inner) for url, server in horizon.items()},
+            'soroban': {url: _pool_stats(server._client.inner) for url, server in soroban.items()},
+        }
+
+
+def _pool_stats(client):
+    """
+    Summarise the urllib3 pools behind a ``RequestsClient``
+    """
+    stats = {
+        'pool_size': getattr(client, 'pool_size', None),
+        'hosts': 0,
+        'connections_opened': 0,
+        'requests_sent': 0,
+        'idle_connections': 0,
+    }
+    session = getattr(client, '_session', None)
+    if session is None:
+        return stats
+    for adapter in set(session.adapters.values()):
+        pools = getattr(adapter.poolmanager, 'pools', None)
+        if pools is None:
+            continue
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['hosts'] += 1
+            stats['connections_opened'] += pool.num_connections
+            stats['requests_sent'] += pool.num_requests
+            if pool.pool is not None:
+                stats['idle_connections'] += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+    return stats
+
+
+registry = ClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset_after_fork)
+
+atexit.register(registry.close)
+
+
+def get_horizon_server(url=None):
+    return registry.horizon(url)
+
+
+def get_soroban_server(url=None):
+    return registry.soroban(url)
+
+
+def close_clients():
+    registry.close()
+
+
+def client_stats():
+    return registry.stats()
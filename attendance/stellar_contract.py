@@ -0,0 +1,278 @@
+"""
+Invocation of the deployed ``AttendanceContract`` through Soroban RPC.
+
+A contract call is simulated, prepared (footprint, resources and resource
+fee taken from the simulation), signed and then submitted through the usual
+Horizon path in ``StellarHelper._submit_transaction``.
+
+Simulating every call costs an RPC round-trip that rarely changes anything:
+the contract keeps its state under fixed keys, so the footprint of a
+function depends only on the shape of its arguments, not their values.
+``ContractInvoker`` therefore caches the prepared ``SorobanTransactionData``
+per ``(contract, function, argument shape)`` in the Django cache:
+
+* resources and the resource fee are padded by
+  ``STELLAR_SOROBAN_RESOURCE_MARGIN`` before caching, since storage maps
+  grow between calls;
+* the source-account authorization entry is rebuilt from the actual
+  arguments, so only calls authorized by the transaction source are cached;
+* entries expire after ``STELLAR_SOROBAN_PREPARE_TTL`` seconds and are
+  dropped as soon as the ledger rejects a transaction built from them. A
+  rejected submission is re-simulated and sent once more, and a failure
+  found later by the confirmation poller drops the entry for the next call.
+"""
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from stellar_sdk import Account, Address, TransactionBuilder, scval, xdr
+from stellar_sdk.exceptions import BaseHorizonError
+from stellar_sdk.helpers import parse_transaction_envelope_from_xdr
+from stellar_sdk.operation import InvokeHostFunction
+
+from .stellar_clients import get_soroban_server
+
+logger = logging.getLogger(__name__)
+
+_UINT32_MAX = 2 ** 32 - 1
+
+# Ledger rejections that mean the cached footprint or resources are stale
+_STALE_TRANSACTION_CODES = {'tx_soroban_invalid', 'tx_insufficient_fee'}
+_STALE_OPERATION_CODES = {'op_resource_limit_exceeded', 'op_entry_archived', 'op_insufficient_refundable_fee'}
+
+
+class ContractSimulationError(Exception):
+    """
+    Raised when Soroban RPC cannot simulate a contract call (e.g. the contract returned an error)
+    """
+
+
+def contract_invocation_enabled():
+    return bool(settings.STELLAR_CONTRACT_INVOCATION and settings.STELLAR_CONTRACT_ID)
+
+
+def invoke_operation(contract_id, function, args):
+    """
+    ``InvokeHostFunction`` operation calling ``function(*args)`` on ``contract_id``
+    """
+    host_function = xdr.HostFunction(
+        type=xdr.HostFunctionType.HOST_FUNCTION_TYPE_INVOKE_CONTRACT,
+        invoke_contract=xdr.InvokeContractArgs(
+            contract_address=Address(contract_id).to_xdr_sc_address(),
+            function_name=xdr.SCSymbol(function.encode()),
+            args=list(args),
+        ),
+    )
+    return InvokeHostFunction(host_function=host_function, auth=[])
+
+
+def argument_shape(args):
+    """
+    Value-independent description of ``args``: type, plus length for sized values
+    """
+    shape = []
+    for arg in args:
+        kind = arg.type.name
+        if arg.type == xdr.SCValType.SCV_ADDRESS:
+            kind += ':' + arg.address.type.name
+        elif arg.type == xdr.SCValType.SCV_BYTES:
+            kind += f':{len(arg.bytes.sc_bytes)}'
+        elif arg.type == xdr.SCValType.SCV_VEC and arg.vec is not None:
+            kind += f':{len(arg.vec.sc_vec)}'
+        shape.append(kind)
+    return tuple(shape)
+
+
+def _source_auth_entry(invoke_args):
+    """
+    Authorization of the whole invocation by the transaction source account
+    """
+    return xdr.SorobanAuthorizationEntry(
+        credentials=xdr.SorobanCredentials(type=xdr.SorobanCredentialsType.SOROBAN_CREDENTIALS_SOURCE_ACCOUNT),
+        root_invocation=xdr.SorobanAuthorizedInvocation(
+            function=xdr.SorobanAuthorizedFunction(
+                type=xdr.SorobanAuthorizedFunctionType.SOROBAN_AUTHORIZED_FUNCTION_TYPE_CONTRACT_FN,
+                contract_fn=invoke_args,
+            ),
+            sub_invocations=[],
+        ),
+    )
+
+
+def _is_source_authorized(auth_entries):
+    # Address credentials carry per-call nonces and signatures, which cannot be reused
+    return all(
+        entry.credentials.type == xdr.SorobanCredentialsType.SOROBAN_CREDENTIALS_SOURCE_ACCOUNT
+        and not entry.root_invocation.sub_invocations
+        for entry in auth_entries
+    )
+
+
+def _pad(value, margin, limit=None):
+    padded = int(value * margin) + 1
+    return min(padded, limit) if limit is not None else padded
+
+
+def is_stale_preparation_error(error):
+    """
+    Return True if a submission was rejected because of its footprint, resources or resource fee
+    """
+    if not isinstance(error, BaseHorizonError):
+        return False
+    result_codes = (error.extras or {}).get('result_codes') or {}
+    for codes in (result_codes, result_codes.get('inner_transaction') or {}):
+        if codes.get('transaction') in _STALE_TRANSACTION_CODES:
+            return True
+        if _STALE_OPERATION_CODES.intersection(codes.get('operations') or ()):
+            return True
+    return False
+
+
+class ContractInvoker:
+    """
+    Simulates and prepares contract calls, caching the preparation per argument shape
+
+    Args:
+        soroban_server: callable returning the ``SorobanServer`` to simulate on
+        key_prefix: cache key prefix for prepared entries
+    """
+
+    def __init__(self, soroban_server=get_soroban_server, key_prefix='stellar_contract_prep'):
+        self._soroban_server = soroban_server
+        self._key_prefix = key_prefix
+        self._stats_lock = threading.Lock()
+        self.stats = {'simulations': 0, 'cache_hits': 0, 'invalidations': 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _cache_key(self, contract_id, function, args):
+        shape = '|'.join(argument_shape(args))
+        digest = hashlib.sha256(f"{contract_id}:{function}:{shape}".encode()).hexdigest()[:32]
+        return f"{self._key_prefix}:{digest}"
+
+    def simulate(self, envelope):
+        """
+        Simulate ``envelope`` and raise ``ContractSimulationError`` if the call fails
+        """
+        self._count('simulations')
+        simulation = self._soroban_server().simulate_transaction(envelope)
+        if simulation.error:
+            raise ContractSimulationError(simulation.error)
+        if simulation.restore_preamble is not None:
+            raise ContractSimulationError("Contract state is archived and must be restored first")
+        return simulation
+
+    def prepare(self, envelope, contract_id, function, args, fresh=False):
+        """
+        Return ``envelope`` with footprint, resources, fee and authorization filled in
+
+        Uses the cached preparation for the argument shape unless ``fresh``;
+        otherwise simulates and caches the result when it can be reused.
+        """
+        key = self._cache_key(contract_id, function, args)
+        cached = None if fresh else cache.get(key)
+        if cached is not None:
+            self._count('cache_hits')
+            return self._apply_cached(envelope, cached)
+
+        simulation = self.simulate(envelope)
+        prepared = self._soroban_server().prepare_transaction(envelope, simulation)
+        auth = [xdr.SorobanAuthorizationEntry.from_xdr(entry) for entry in simulation.results[0].auth or ()]
+        if _is_source_authorized(auth):
+            cache.set(key, {
+                'soroban_data': self._padded(prepared.transaction.soroban_data).to_xdr(),
+                'authorize': bool(auth),
+            }, settings.STELLAR_SOROBAN_PREPARE_TTL)
+        return prepared
+
+    @staticmethod
+    def _padded(soroban_data):
+        margin = settings.STELLAR_SOROBAN_RESOURCE_MARGIN
+        padded = xdr.SorobanTransactionData.from_xdr(soroban_data.to_xdr())
+        resources = padded.resources
+        resources.instructions = xdr.Uint32(_pad(resources.instructions.uint32, margin, _UINT32_MAX))
+        resources.disk_read_bytes = xdr.Uint32(_pad(resources.disk_read_bytes.uint32, margin, _UINT32_MAX))
+        resources.write_bytes = xdr.Uint32(_pad(resources.write_bytes.uint32, margin, _UINT32_MAX))
+        padded.resource_fee = xdr.Int64(_pad(padded.resource_fee.int64, margin))
+        return padded
+
+    @staticmethod
+    def _apply_cached(envelope, cached):
+        soroban_data = xdr.SorobanTransactionData.from_xdr(cached['soroban_data'])
+        transaction = envelope.transaction
+        if transaction.soroban_data:
+            transaction.fee -= transaction.soroban_data.resource_fee.int64
+        transaction.fee += soroban_data.resource_fee.int64
+        transaction.soroban_data = soroban_data
+        operation = transaction.operations[0]
+        if cached['authorize'] and not operation.auth:
+            operation.auth = [_source_auth_entry(operation.host_function.invoke_contract)]
+        return envelope
+
+    def invalidate(self, contract_id, function, args):
+        """
+        Drop the cached preparation for this call's argument shape
+        """
+        self._count('invalidations')
+        cache.delete(self._cache_key(contract_id, function, args))
+
+    def invalidate_envelope(self, envelope_xdr, network_passphrase):
+        """
+        Drop the preparation used by a contract call that failed on the ledger
+
+        Non-contract transactions are ignored.
+        """
+        try:
+            envelope = parse_transaction_envelope_from_xdr(envelope_xdr, network_passphrase)
+        except Exception:
+            return
+        transaction = envelope.transaction
+        if hasattr(transaction, 'inner_transaction_envelope'):
+            transaction = transaction.inner_transaction_envelope.transaction
+        if len(transaction.operations) != 1 or not isinstance(transaction.operations[0], InvokeHostFunction):
+            return
+        invoke_args = transaction.operations[0].host_function.invoke_contract
+        if invoke_args is None:
+            return
+        contract_id = Address.from_xdr_sc_address(invoke_args.contract_address).address
+        self.invalidate(contract_id, invoke_args.function_name.sc_symbol.decode(), invoke_args.args)
+
+    def invoke(self, contract_id, function, args, submit):
+        """
+        Submit a call, re-simulating once if the ledger rejects a cached preparation
+
+        Args:
+            submit: ``StellarHelper._submit_transaction``-style callable taking
+                the operations and a ``prepare(envelope)`` hook
+
+        Returns:
+            dict: the Horizon submission response
+        """
+        try:
+            return submit([invoke_operation(contract_id, function, args)],
+                          lambda envelope: self.prepare(envelope, contract_id, function, args))
+        except Exception as e:
+            if not is_stale_preparation_error(e):
+                raise
+            logger.info("Contract call %s rejected with a stale preparation; re-simulating", function)
+            self.invalidate(contract_id, function, args)
+        return submit([invoke_operation(contract_id, function, args)],
+                      lambda envelope: self.prepare(envelope, contract_id, function, args, fresh=True))
+
+    def read(self, contract_id, function, args, source_public_key, network_passphrase):
+        """
+        Simulate a read-only call and return its result as a Python value
+        """
+        envelope = (TransactionBuilder(Account(source_public_key, 0), network_passphrase, base_fee=100)
+                    .append_operation(invoke_operation(contract_id, function, args))
+                    .set_timeout(settings.STELLAR_TX_TIMEOUT)
+                    .build())
+        simulation = self.simulate(envelope)
+        return scval.to_native(xdr.SCVal.from_xdr(simulation.results[0].xdr))
+
+
+contract_invoker = ContractInvoker()
@@ -0,0 +1,276 @@
+"""
+Adaptive fee policy for Stellar transactions.
+
+Horizon's ``fee_stats`` are refreshed by a background thread and cached for
+``STELLAR_FEE_STATS_TTL`` seconds, so choosing a fee never costs a request.
+Each operation class bids a configured percentile of recently charged fees:
+student check-ins can wait a ledger or two, teacher/admin writes bid higher.
+A transaction rejected for a low fee, or whose blocking submission times out
+in the queue, is wrapped in a fee-bump transaction with a higher bid instead
+of being rebuilt. A transaction Horizon only queued is bumped by the
+confirmation poller once it has waited ``STELLAR_FEE_BUMP_AFTER_LEDGERS``
+ledgers (see ``fee_bump_queued``).
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from stellar_sdk import FeeBumpTransactionEnvelope, TransactionBuilder
+from stellar_sdk.exceptions import BadRequestError, BadResponseError, BaseHorizonError
+from stellar_sdk.helpers import parse_transaction_envelope_from_xdr
+
+from .stellar_clients import get_horizon_server
+from .stellar_results import result_codes_from_xdr
+
+logger = logging.getLogger(__name__)
+
+MIN_BASE_FEE = 100  # stroops, network minimum per operation
+LEDGER_SECONDS = 5  # typical ledger close time
+
+# stellar-core only lets a fee bump replace a queued transaction when it
+# bids at least this many times the queued fee per operation
+REPLACE_BY_FEE_MULTIPLIER = 10
+
+# Operation classes
+CHECKIN = 'checkin'
+ADMIN = 'admin'
+
+# Percentiles Horizon reports under fee_stats["fee_charged"]
+_REPORTED_PERCENTILES = (10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99)
+
+
+def is_stuck_transaction_error(error):
+    """
+    Return True if a submission timed out in the queue or was priced out
+
+    Both cases leave the signed transaction valid, so it can be fee-bumped.
+    A 503 (``TRY_AGAIN_LATER``) is not one of them: the source account
+    already has a transaction queued, which a higher fee does not change.
+    """
+    if isinstance(error, BadResponseError) and error.status == 504:
+        return True
+    if isinstance(error, BadRequestError):
+        result_codes = (error.extras or {}).get('result_codes') or {}
+        return result_codes.get('transaction') == 'tx_insufficient_fee'
+    return False
+
+
+class FeePolicy:
+    """
+    Picks per-operation base fees from cached Horizon fee statistics
+    """
+
+    def __init__(self, fetch_stats=None):
+        self._fetch_stats = fetch_stats or (lambda: get_horizon_server().fee_stats().call())
+        self._lock = threading.Lock()
+        self._stats = None
+        self._fetched_at = 0.0
+        self._refresher = None
+        self._refresher_pid = None
+
+    def _percentiles(self):
+        return {
+            CHECKIN: settings.STELLAR_FEE_CHECKIN_PERCENTILE,
+            ADMIN: settings.STELLAR_FEE_ADMIN_PERCENTILE,
+        }
+
+    def refresh(self):
+        """
+        Fetch fee_stats from Horizon now; failures keep the previous snapshot
+        """
+        try:
+            stats = self._fetch_stats()
+        except Exception as e:
+            logger.warning("Could not refresh Stellar fee stats: %s", e)
+            return self._stats
+        with self._lock:
+            self._stats = stats
+            self._fetched_at = time.monotonic()
+        return stats
+
+    def _ensure_refresher(self):
+        # One daemon thread per process; a forked child starts its own
+        if self._refresher is not None and self._refresher_pid == os.getpid() and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher_pid == os.getpid() and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name='stellar-fee-stats', daemon=True)
+            self._refresher_pid = os.getpid()
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            self.refresh()
+            time.sleep(max(1, settings.STELLAR_FEE_STATS_TTL))
+
+    def stats(self):
+        """
+        Return the cached fee_stats snapshot, or None if it is missing or stale
+        """
+        if settings.STELLAR_FEE_STATS_BACKGROUND:
+            self._ensure_refresher()
+        elif time.monotonic() - self._fetched_at > settings.STELLAR_FEE_STATS_TTL:
+            self.refresh()
+        if self._stats is None or time.monotonic() - self._fetched_at > settings.STELLAR_FEE_STATS_TTL * 3:
+            return None
+        return self._stats
+
+    def base_fee(self, operation_class=ADMIN, percentile=None):
+        """
+        Per-operation fee (in stroops) to bid for ``operation_class``
+
+        Falls back to ``STELLAR_FEE_DEFAULT`` until fee stats are available
+        and never exceeds ``STELLAR_MAX_BASE_FEE``.
+        """
+        stats = self.stats()
+        if stats is None:
+            fee = settings.STELLAR_FEE_DEFAULT
+        else:
+            if percentile is None:
+                percentile = self._percentiles().get(operation_class, settings.STELLAR_FEE_ADMIN_PERCENTILE)
+            reported = min((p for p in _REPORTED_PERCENTILES if p >= percentile), default=99)
+            fee_charged = stats.get('fee_charged') or {}
+            fee = max(
+                int(fee_charged.get(f"p{reported}", MIN_BASE_FEE)),
+                int(stats.get('last_ledger_base_fee', MIN_BASE_FEE)),
+            )
+        return max(MIN_BASE_FEE, min(int(fee), settings.STELLAR_MAX_BASE_FEE))
+
+    def bump_fee(self, previous_base_fee):
+        """
+        Per-operation fee for the next fee bump of a stuck transaction
+
+        At least ``REPLACE_BY_FEE_MULTIPLIER`` times ``previous_base_fee``,
+        since a smaller bump of a queued transaction is rejected, and at
+        most ``STELLAR_MAX_BASE_FEE``.
+        """
+        multiplier = max(settings.STELLAR_FEE_BUMP_MULTIPLIER, REPLACE_BY_FEE_MULTIPLIER)
+        fee = max(
+            previous_base_fee * multiplier,
+            self.base_fee(percentile=99),
+        )
+        return max(MIN_BASE_FEE, min(int(fee), settings.STELLAR_MAX_BASE_FEE))
+
+
+def attach_async_result_codes(error):
+    """
+    Give a ``/transactions_async`` rejection the ``extras.result_codes`` of a synchronous one
+    """
+    try:
+        body = json.loads(error.message)
+    except (TypeError, ValueError):
+        return
+    if isinstance(body, dict) and body.get('error_result_xdr') and not error.extras:
+        try:
+            result_codes = result_codes_from_xdr(body['error_result_xdr'])
+        except Exception:
+            return
+        error.extras = {'hash': body.get('hash'), 'result_codes': result_codes}
+
+
+def submit_envelope(server, envelope, wait=True):
+    """
+    Submit ``envelope`` through Horizon
+
+    Args:
+        wait: use ``/transactions`` and wait for ledger inclusion; otherwise
+            use ``/transactions_async``, which returns ``{"hash", "tx_status"}``
+            as soon as stellar-core has queued the transaction
+
+    Returns:
+        dict: the Horizon response
+    """
+    if wait:
+        return server.submit_transaction(envelope)
+    try:
+        return server.submit_transaction_async(envelope)
+    except BaseHorizonError as e:
+        attach_async_result_codes(e)
+        raise
+
+
+def submit_with_fee_bumps(server, envelope, fee_source_keypair, base_fee, network_passphrase, policy=None,
+                          wait=True):
+    """
+    Submit ``envelope``; wrap it in fee-bump transactions while it is stuck
+
+    Returns:
+        dict: the Horizon response for whichever envelope was accepted
+    """
+    try:
+        return queued_with_envelope(submit_envelope(server, envelope, wait), envelope)
+    except Exception as e:
+        if not is_stuck_transaction_error(e):
+            raise
+        last_error = e
+
+    for fee_bump in fee_bumps(envelope, fee_source_keypair, base_fee, network_passphrase, policy):
+        try:
+            return queued_with_envelope(submit_envelope(server, fee_bump, wait), fee_bump)
+        except Exception as e:
+            if not is_stuck_transaction_error(e):
+                raise
+            last_error = e
+    raise last_error
+
+
+def fee_bumps(envelope, fee_source_keypair, base_fee, network_passphrase, policy=None):
+    """
+    Signed fee-bump envelopes for a stuck ``envelope``, each outbidding the last
+
+    Yields at most ``STELLAR_FEE_BUMP_ATTEMPTS`` envelopes and stops early once
+    the fee reaches ``STELLAR_MAX_BASE_FEE``. Shared by the sync and async
+    submission loops, which stop asking for the next bump once one is accepted.
+    """
+    policy = policy or fee_policy
+    for _ in range(settings.STELLAR_FEE_BUMP_ATTEMPTS):
+        bumped_fee = policy.bump_fee(base_fee)
+        if bumped_fee <= base_fee:
+            return  # Already bidding the maximum
+        fee_bump = TransactionBuilder.build_fee_bump_transaction(
+            fee_source=fee_source_keypair.public_key,
+            base_fee=bumped_fee,
+            inner_transaction_envelope=envelope,
+            network_passphrase=network_passphrase
+        )
+        fee_bump.sign(fee_source_keypair)
+        logger.info("Fee-bumping stuck transaction to %s stroops/op", bumped_fee)
+        yield fee_bump
+        base_fee = bumped_fee
+
+
+def queued_with_envelope(response, envelope):
+    """
+    Add the submitted ``envelope_xdr`` to a response Horizon only queued
+
+    The confirmation poller needs it to fee-bump the transaction later.
+    """
+    if "tx_status" in response:
+        response["envelope_xdr"] = envelope.to_xdr()
+    return response
+
+
+def fee_bump_queued(envelope_xdr, fee_source_keypair, network_passphrase, policy=None):
+    """
+    Fee bump replacing a queued transaction, or the fee bump already queued for it
+
+    Returns:
+        FeeBumpTransactionEnvelope or None: signed by ``fee_source_keypair``;
+        None once the bid is at ``STELLAR_MAX_BASE_FEE``
+    """
+    envelope = parse_transaction_envelope_from_xdr(envelope_xdr, network_passphrase)
+    if isinstance(envelope, FeeBumpTransactionEnvelope):
+        inner = envelope.transaction.inner_transaction_envelope
+        # A fee bump's fee covers the inner operations plus itself
+        base_fee = envelope.transaction.fee // (len(inner.transaction.operations) + 1)
+    else:
+        inner = envelope
+        base_fee = envelope.transaction.fee // max(len(envelope.transaction.operations), 1)
+    return next(fee_bumps(inner, fee_source_keypair, base_fee, network_passphrase, policy), None)
+
+
+fee_policy = FeePolicy()
@@ -0,0 +1,191 @@
+"""
+Cached health of the Horizon and Soroban RPC endpoints.
+
+Probing both endpoints on every status page view or AJAX poll multiplies
+network traffic by the number of open dashboards. ``HealthProber`` keeps
+one snapshot of status, per-endpoint latency and the latest ledger in the
+cache, plus a bounded history for trend display:
+
+* a fresh snapshot (younger than ``STELLAR_HEALTH_TTL``) is served as is;
+* a stale one is served immediately while one background thread re-probes;
+* with no snapshot at all the caller probes, and concurrent callers wait
+  for that single probe instead of starting their own.
+
+Probes are coalesced in-process with a lock and across processes with a
+``cache.add`` flag, so with a shared cache (``CACHE_URL``) one probe serves
+every web worker. ``python manage.py probe_blockchain_health`` keeps the
+snapshot warm so requests never probe at all.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .stellar_clients import get_horizon_server, get_soroban_server
+from .stellar_helper import blockchain_enabled, get_contract_id
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'stellar_health:snapshot'
+HISTORY_KEY = 'stellar_health:history'
+PROBE_FLAG_KEY = 'stellar_health:probing'
+
+
+def _timed(call):
+    """
+    Run ``call`` and return ``(result, error, latency_ms)``
+    """
+    start = time.perf_counter()
+    try:
+        result, error = call(), None
+    except Exception as e:
+        result, error = None, str(e)
+    return result, error, round((time.perf_counter() - start) * 1000, 1)
+
+
+def probe():
+    """
+    Probe Horizon and Soroban RPC once
+
+    Returns:
+        dict: the ``verify_contract_connection`` fields (``status``,
+        ``message``, ``contract_id``, ``network_info``) plus ``horizon`` and
+        ``soroban`` entries with ``ok``, ``latency_ms``, ``latest_ledger``
+        and ``error``
+    """
+    if not blockchain_enabled():
+        return {"status": "error", "message": "No contract ID provided"}
+
+    root, horizon_error, horizon_ms = _timed(lambda: get_horizon_server().root().call())
+    health, soroban_error, soroban_ms = _timed(lambda: get_soroban_server().get_health())
+    snapshot = {
+        "contract_id": get_contract_id(),
+        "horizon": {
+            "ok": horizon_error is None,
+            "latency_ms": horizon_ms,
+            "latest_ledger": root.get("history_latest_ledger") if root else None,
+            "error": horizon_error,
+        },
+        "soroban": {
+            "ok": soroban_error is None,
+            "latency_ms": soroban_ms,
+            "latest_ledger": health.latest_ledger if health else None,
+            "error": soroban_error,
+        },
+    }
+    if horizon_error is None and soroban_error is None:
+        snapshot.update(status="success",
+                        message="Successfully connected to Stellar network and Soroban RPC.",
+                        network_info="Connected to Horizon and Soroban APIs")
+    elif horizon_error is None:
+        snapshot.update(status="partial",
+                        message="Connected to Stellar network, but Soroban RPC connection failed.",
+                        network_info="Connected to Horizon API only")
+    else:
+        snapshot.update(status="error", message=f"Could not connect to Stellar network: {horizon_error}")
+    return snapshot
+
+
+def _history_point(snapshot):
+    return {
+        "checked_at": snapshot["checked_at"],
+        "status": snapshot["status"],
+        "horizon_latency_ms": (snapshot.get("horizon") or {}).get("latency_ms"),
+        "soroban_latency_ms": (snapshot.get("soroban") or {}).get("latency_ms"),
+        "latest_ledger": (snapshot.get("horizon") or {}).get("latest_ledger"),
+    }
+
+
+class HealthProber:
+    """
+    Serves the cached health snapshot and coalesces probes
+    """
+
+    def __init__(self, probe_fn=probe, sleep=time.sleep):
+        self._probe = probe_fn
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, snapshot):
+        return snapshot is not None and time.time() - snapshot["checked_at"] < settings.STELLAR_HEALTH_TTL
+
+    def _probe_timeout(self):
+        # Each endpoint gets one HTTP timeout
+        return 2 * settings.STELLAR_HTTP_TIMEOUT + 5
+
+    def refresh(self, force=False):
+        """
+        Probe now, unless another caller is already probing
+
+        Args:
+            force: probe even if the cached snapshot is still fresh
+
+        Returns:
+            dict: the newest snapshot
+        """
+        with self._lock:
+            snapshot = cache.get(SNAPSHOT_KEY)
+            if not force and self._is_fresh(snapshot):
+                return snapshot  # Refreshed while this caller waited for the lock
+            if not cache.add(PROBE_FLAG_KEY, True, timeout=self._probe_timeout()):
+                return snapshot or self._wait_for_probe()
+            try:
+                snapshot = self._probe()
+                snapshot["checked_at"] = time.time()
+                self._store(snapshot)
+            finally:
+                cache.delete(PROBE_FLAG_KEY)
+        return snapshot
+
+    def _store(self, snapshot):
+        # Only the holder of PROBE_FLAG_KEY writes, so the history update does not race
+        keep = max(settings.STELLAR_HEALTH_HISTORY, 1)
+        timeout = max(settings.STELLAR_HEALTH_TTL * keep, 3600)
+        history = cache.get(HISTORY_KEY) or []
+        history = (history + [_history_point(snapshot)])[-keep:]
+        cache.set_many({SNAPSHOT_KEY: snapshot, HISTORY_KEY: history}, timeout=timeout)
+
+    def _wait_for_probe(self):
+        """
+        Wait for another process's probe to publish a snapshot
+        """
+        deadline = time.monotonic() + self._probe_timeout()
+        while time.monotonic() < deadline:
+            self._sleep(0.1)
+            snapshot = cache.get(SNAPSHOT_KEY)
+            if snapshot is not None:
+                return snapshot
+            if cache.get(PROBE_FLAG_KEY) is None:
+                break  # That probe gave up without a result
+        return {"status": "error", "message": "Blockchain health check in progress", "checked_at": time.time()}
+
+    def _refresh_in_background(self):
+        if self._lock.locked():
+            return
+        threading.Thread(target=self.refresh, name='stellar-health-probe', daemon=True).start()
+
+    def snapshot(self):
+        """
+        The cached snapshot; a stale one is returned at once and refreshed in the background
+
+        Returns:
+            dict: the snapshot, with ``stale`` set when it is past its TTL
+        """
+        snapshot = cache.get(SNAPSHOT_KEY)
+        if snapshot is None:
+            return self.refresh()
+        if self._is_fresh(snapshot):
+            return snapshot
+        self._refresh_in_background()
+        return {**snapshot, "stale": True}
+
+    def history(self):
+        """
+        Recent ``{checked_at, status, *_latency_ms, latest_ledger}`` points, oldest first
+        """
+        return cache.get(HISTORY_KEY) or []
+
+
+health_prober = HealthProber()
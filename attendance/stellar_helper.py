@@ -1,14 +1,30 @@
 from stellar_sdk import Server, Keypair, Network, TransactionBuilder, Asset, scval, xdr
 from stellar_sdk.exceptions import NotFoundError, BadRequestError
-from stellar_sdk import SorobanServer, StrKey
+from stellar_sdk import SorobanServer, StrKey, MuxedAccount
 from stellar_sdk.operation import InvokeHostFunction, Payment
 from stellar_sdk.xdr import HostFunction
 from django.conf import settings
 import base64
 import hashlib
+import logging
 import secrets
 import time
 
+from .circuit_breaker import CircuitOpenError
+from .stellar_clients import get_horizon_server, get_soroban_server
+from .stellar_sequence import sequence_manager
+from .stellar_channels import channel_pool
+from . import stellar_fees
+from .stellar_fees import fee_policy, submit_with_fee_bumps
+from .stellar_simulator import SimulatorClient, simulator_enabled
+from .stellar_indexer import has_attended
+from .stellar_contract import contract_invocation_enabled, contract_invoker
+
+logger = logging.getLogger(__name__)
+
+# Stellar protocol limit on operations in a single transaction
+MAX_OPERATIONS_PER_TRANSACTION = 100
+
 # Configuration from Django settings
 def get_horizon_url():
     return settings.STELLAR_HORIZON_URL
@@ -22,6 +38,158 @@ def get_network_passphrase():
 def get_contract_id():
     return settings.STELLAR_CONTRACT_ID
 
+def blockchain_enabled():
+    """
+    True if calls go to a real network (a contract is configured) or to the local simulator
+    """
+    return bool(get_contract_id()) or simulator_enabled()
+
+def _operation_result_codes(error):
+    """
+    Per-operation result codes from a failed Horizon submission, if any
+    """
+    extras = getattr(error, 'extras', None) or {}
+    return (extras.get('result_codes') or {}).get('operations') or []
+
+def _operation_result_code(error, index):
+    codes = _operation_result_codes(error)
+    return codes[index] if index < len(codes) else 'unknown'
+
+def _rejected_operation_indexes(error):
+    """
+    Indexes of the operations that caused a ``tx_failed`` rejection
+    """
+    return {index for index, code in enumerate(_operation_result_codes(error)) if code != 'op_success'}
+
+# Text memos hold at most this many bytes
+MAX_MEMO_TEXT_BYTES = 28
+
+INVALID_KEY_ERROR = "Missing or invalid Stellar public key"
+
+def is_valid_public_key(public_key):
+    """
+    Whether ``public_key`` is a well-formed Stellar account id (``G...``)
+    """
+    return bool(public_key) and StrKey.is_valid_ed25519_public_key(public_key)
+
+def _lecture_memo(prefix, lecture_id, suffix=''):
+    """
+    Text memo carrying the full ``lecture_id``
+    
+    Truncating the id would let two lectures share a memo, so an id that
+    does not fit raises ValueError instead.
+    """
+    memo = f"{prefix}{lecture_id}{suffix}"
+    if len(memo.encode('utf-8')) > MAX_MEMO_TEXT_BYTES:
+        raise ValueError(f"Lecture id {lecture_id} is too long for a {prefix.strip()!r} memo")
+    return memo
+
+def _add_memo(builder, memo):
+    """
+    Attach ``memo`` to ``builder``: 32 bytes become a hash memo, text a text memo
+    """
+    if isinstance(memo, bytes):
+        return builder.add_hash_memo(memo)
+    return builder.add_text_memo(memo)
+
+def _nonce_bytes(nonce):
+    """
+    The 32-byte form of a session nonce, as the contract stores it
+    
+    Nonces from ``generate_nonce`` are 32 random bytes in base64; anything
+    else is hashed.
+    """
+    try:
+        raw = base64.b64decode(nonce, validate=True)
+    except (ValueError, TypeError):
+        raw = b''
+    return raw if len(raw) == 32 else hashlib.sha256(nonce.encode('utf-8')).digest()
+
+def _failure(error):
+    """
+    Result dict for a chain call that raised ``error``
+    
+    An open circuit breaker means nothing reached the network, so instead of
+    an ``error`` the result says the write is still pending: the caller keeps
+    its local record and retries after ``retry_after`` seconds.
+    """
+    if isinstance(error, CircuitOpenError):
+        return {
+            "status": "pending",
+            "message": str(error),
+            "chain_pending": True,
+            "retry_after": error.retry_after
+        }
+    return {"error": str(error)}
+
+def _split_valid_keys(public_keys):
+    """
+    Deduplicated well-formed keys, and an error result for every other entry
+    
+    Returns:
+        tuple: (valid keys in order, ``{key: {"error": ...}}`` for the rest)
+    """
+    public_keys = list(dict.fromkeys(public_keys))
+    invalid = {key: {"error": INVALID_KEY_ERROR} for key in public_keys if not is_valid_public_key(key)}
+    return [key for key in public_keys if key not in invalid], invalid
+
+def _batch_summary(lecture_id, results, transactions, circuit_error=None):
+    """
+    Build the batch_manual_attendance response from per-student results
+    
+    With ``circuit_error`` the batch stopped at an open circuit breaker and the
+    response is marked ``chain_pending``.
+    """
+    pending = {"chain_pending": True, "retry_after": circuit_error.retry_after} if circuit_error else {}
+    failed = sum(1 for result in results.values() if "error" in result)
+    if failed == len(results) and results:
+        return {
+            "error": f"Manual attendance failed for all {failed} students",
+            "results": results,
+            "transactions": transactions,
+            **pending
+        }
+    return {
+        "status": "success" if not failed else "partial",
+        "message": f"Manual attendance marked for {len(results) - failed} of {len(results)} students in {lecture_id}",
+        "results": results,
+        "transactions": transactions,
+        **pending
+    }
+
+def _chunks(public_keys):
+    """
+    Split ``public_keys`` into groups that fit in one transaction each
+    """
+    size = MAX_OPERATIONS_PER_TRANSACTION
+    return [public_keys[start:start + size] for start in range(0, len(public_keys), size)]
+
+def _failed_chunk(chunk, error, retried):
+    """
+    Results for the students of a chunk whose submission raised ``error``,
+    and the students to resubmit
+
+    Students whose operations were rejected fail on their own and the rest
+    of the chunk is resubmitted once; any other error, or a failed retry,
+    fails the whole chunk.
+    """
+    rejected = set() if retried else _rejected_operation_indexes(error)
+    if not rejected:
+        return {key: {"error": str(error)} for key in chunk}, []
+    failed = {chunk[index]: {"error": f"Operation rejected: {_operation_result_code(error, index)}"}
+              for index in rejected}
+    return failed, [key for index, key in enumerate(chunk) if index not in rejected]
+
+def _circuit_open_summary(lecture_id, student_public_keys, results, transactions, error):
+    """
+    Summary of a batch stopped by an open circuit breaker
+
+    Nothing was sent, so the students not yet recorded stay pending.
+    """
+    for key in student_public_keys:
+        results.setdefault(key, {"error": str(error), "chain_pending": True})
+    return _batch_summary(lecture_id, results, transactions, circuit_error=error)
+
 class StellarHelper:
     @staticmethod
     def create_keypair():
@@ -39,8 +207,12 @@ class StellarHelper:
         """
         Fund an account on testnet using Friendbot
         """
+        if simulator_enabled():
+            response = SimulatorClient().get('https://friendbot.stellar.org', {'addr': public_key})
+            return response.status_code == 200
         import requests
-        response = requests.get(f'https://friendbot.stellar.org?addr={public_key}')
+        response = requests.get('https://friendbot.stellar.org', params={'addr': public_key},
+                                timeout=settings.STELLAR_FRIENDBOT_TIMEOUT)
         return response.status_code == 200
     
     @staticmethod
@@ -52,361 +224,528 @@ class StellarHelper:
         nonce = base64.b64encode(random_bytes).decode('utf-8')
         return nonce
     
+    @staticmethod
+    def _self_payment(public_key):
+        """
+        Minimal payment to self, used as the carrier operation for memo-only records
+        """
+        return Payment(
+            destination=public_key,
+            asset=Asset.native(),
+            amount="0.0000001"  # Minimum amount to avoid dust limit
+        )
+    
+    @staticmethod
+    def _transaction_fields(response):
+        """
+        Hash of a submitted transaction and whether its ledger inclusion is still unconfirmed
+        
+        A pending transaction also carries its ``source_account``, where the
+        confirmation poller looks for it, its signed ``envelope_xdr``, which
+        the poller fee-bumps if it waits too long, and from a channel account
+        the channel's ``channel_lease``, to release once it is confirmed.
+        """
+        fields = {"hash": response.get("hash"), "pending": "tx_status" in response}
+        for key in ("source_account", "channel_lease", "envelope_xdr"):
+            if key in response:
+                fields[key] = response[key]
+        return fields
+    
+    @classmethod
+    def _submit_transaction(cls, source_keypair, memo, operations=(), use_channel=False,
+                            fee_class=stellar_fees.ADMIN, wait=None, prepare=None):
+        """
+        Build, sign and submit a transaction signed by ``source_keypair``
+        
+        ``memo`` is memo text, or 32 bytes for a hash memo. ``prepare`` is
+        applied to every built envelope before signing; contract calls use it
+        to add their footprint and resource fee.
+        
+        The source sequence comes from the local sequence manager instead of a
+        ``load_account`` round-trip; a ``tx_bad_seq`` rejection resyncs it and
+        rebuilds the transaction.
+        
+        With ``use_channel`` a leased channel account becomes the transaction
+        source and fee payer, ``source_keypair`` stays the source of every
+        operation, and both sign. Without a free channel the signer's own
+        account is used as before. If the transaction is only queued the
+        channel stays leased; the response's ``channel_lease`` releases it,
+        and ``source_account`` names the account it was submitted from.
+        
+        The fee is picked from cached fee stats for ``fee_class``, the
+        transaction expires after ``STELLAR_TX_TIMEOUT`` seconds, and a stuck
+        submission is fee-bumped by the transaction source.
+        
+        Unless ``wait`` is given, ``STELLAR_ASYNC_SUBMISSION`` decides whether
+        to return as soon as the transaction is queued (``{"hash", "tx_status"}``)
+        or to wait for ledger inclusion.
+        
+        Returns:
+            dict: the Horizon submission response
+        """
+        if wait is None:
+            wait = not settings.STELLAR_ASYNC_SUBMISSION
+        server = get_horizon_server()
+        channel = channel_pool.lease() if use_channel and operations else None
+        signers = [source_keypair]
+        if channel:
+            signers.insert(0, channel.keypair)
+            for operation in operations:
+                if operation.source is None:
+                    operation.source = MuxedAccount.from_account(source_keypair.public_key)
+        transaction_source = channel.public_key if channel else source_keypair.public_key
+        
+        base_fee = fee_policy.base_fee(fee_class)
+        
+        def build_and_submit(source_account):
+            builder = TransactionBuilder(
+                source_account=source_account,
+                network_passphrase=get_network_passphrase(),
+                base_fee=base_fee
+            )
+            for operation in operations:
+                builder.append_operation(operation)
+            transaction = _add_memo(builder, memo).set_timeout(settings.STELLAR_TX_TIMEOUT).build()
+            if prepare is not None:
+                transaction = prepare(transaction)
+            for signer in signers:
+                transaction.sign(signer)
+            # The transaction source (channel or signer) pays for any fee bump
+            return submit_with_fee_bumps(server, transaction, signers[0], base_fee, get_network_passphrase(),
+                                         policy=fee_policy, wait=wait)
+        
+        queued = False
+        try:
+            response = sequence_manager.submit(transaction_source, build_and_submit)
+        except Exception as e:
+            if channel:
+                channel_pool.record_failure(channel, e)
+            raise
+        else:
+            queued = "tx_status" in response
+            if queued:
+                response["source_account"] = transaction_source
+            if channel:
+                channel_pool.record_success(channel)
+                if queued:
+                    response["channel_lease"] = channel.lease
+            return response
+        finally:
+            # A queued transaction keeps its channel until it is confirmed
+            if channel and not queued:
+                channel_pool.release(channel)
+    
+    @classmethod
+    def _invoke_contract(cls, source_keypair, memo, function, args, use_channel=False,
+                         fee_class=stellar_fees.ADMIN):
+        """
+        Call ``function(*args)`` on the attendance contract, authorized by ``source_keypair``
+        
+        The memo is kept so the indexer records contract calls like memo-only
+        writes. Preparation is cached by ``contract_invoker``.
+        """
+        def submit(operations, prepare):
+            return cls._submit_transaction(source_keypair, memo, operations, use_channel=use_channel,
+                                           fee_class=fee_class, prepare=prepare)
+        return contract_invoker.invoke(get_contract_id(), function, args, submit)
+    
     @classmethod
     def initialize_contract(cls, admin_seed):
         """
         Initialize the attendance contract with an admin
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return {"status": "success", "message": "Contract initialized (simulated)"}
         
         try:
             # Create keypair from secret
             admin_keypair = Keypair.from_secret(admin_seed)
             
-            # Connect to the Stellar network
-            server = Server(horizon_url=get_horizon_url())
-            soroban_server = SorobanServer(get_soroban_rpc_url())
-            
-            # Get the current account details
-            admin_account = server.load_account(admin_keypair.public_key)
-            
-            # Create a transaction
-            transaction = (
-                TransactionBuilder(
-                    source_account=admin_account,
-                    network_passphrase=get_network_passphrase(),
-                    base_fee=100000  # Adjust as needed
-                )
-                .add_text_memo("Initialize contract")
-                .build()
-            )
-            
-            # Sign the transaction
-            transaction.sign(admin_keypair)
+            # Reuse the pooled connection to the Stellar network
+            server = get_horizon_server()
+            soroban_server = get_soroban_server()
             
-            # Submit the transaction
-            response = server.submit_transaction(transaction)
-            return {"status": "success", "message": "Contract initialized (simulated - SDK compatibility mode)"}
+            # Build, sign and submit the transaction
+            response = cls._submit_transaction(admin_keypair, "Initialize contract")
+            return {
+                "status": "success",
+                "message": "Contract initialized (simulated - SDK compatibility mode)",
+                **cls._transaction_fields(response)
+            }
         except Exception as e:
-            return {"error": str(e)}
+            return _failure(e)
     
     @classmethod
     def register_teacher(cls, teacher_seed):
         """
         Register a teacher in the smart contract
+        
+        With contract invocation, the admin (``STELLAR_ADMIN_SECRET``) adds the
+        teacher to the contract's allow-list; only listed teachers may create
+        lectures.
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return {"status": "success", "message": "Teacher registered (simulated)"}
         
         try:
             # Create keypair from secret
             teacher_keypair = Keypair.from_secret(teacher_seed)
             
-            # Connect to the Stellar network
-            server = Server(horizon_url=get_horizon_url())
-            
-            # Get the current account details
-            teacher_account = server.load_account(teacher_keypair.public_key)
-            
-            # Create a transaction
-            transaction = (
-                TransactionBuilder(
-                    source_account=teacher_account,
-                    network_passphrase=get_network_passphrase(),
-                    base_fee=100000  # Adjust as needed
+            # Build, sign and submit the transaction
+            if contract_invocation_enabled():
+                if not settings.STELLAR_ADMIN_SECRET:
+                    return {"error": "STELLAR_ADMIN_SECRET is required to add teachers to the contract"}
+                admin_keypair = Keypair.from_secret(settings.STELLAR_ADMIN_SECRET)
+                response = cls._invoke_contract(
+                    admin_keypair,
+                    "Register teacher",
+                    'add_teacher',
+                    [scval.to_address(admin_keypair.public_key), scval.to_address(teacher_keypair.public_key)]
                 )
-                .add_text_memo("Register teacher")
-                .build()
-            )
-            
-            # Sign the transaction
-            transaction.sign(teacher_keypair)
-            
-            # Submit the transaction
-            response = server.submit_transaction(transaction)
-            return {"status": "success", "message": "Teacher registered successfully"}
+            else:
+                response = cls._submit_transaction(teacher_keypair, "Register teacher")
+            return {
+                "status": "success",
+                "message": "Teacher registered successfully",
+                **cls._transaction_fields(response)
+            }
         except Exception as e:
-            return {"error": str(e)}
+            return _failure(e)
     
     @classmethod
     def register_student(cls, student_seed):
         """
         Register a student in the smart contract
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return {"status": "success", "message": "Student registered (simulated)"}
         
         try:
             # Create keypair from secret
             student_keypair = Keypair.from_secret(student_seed)
             
-            # Connect to the Stellar network
-            server = Server(horizon_url=get_horizon_url())
-            
-            # Get the current account details
-            student_account = server.load_account(student_keypair.public_key)
-            
-            # Create a transaction
-            transaction = (
-                TransactionBuilder(
-                    source_account=student_account,
-                    network_passphrase=get_network_passphrase(),
-                    base_fee=100000  # Adjust as needed
-                )
-                .add_text_memo("Register student")
-                .build()
-            )
-            
-            # Sign the transaction
-            transaction.sign(student_keypair)
-            
-            # Submit the transaction
-            response = server.submit_transaction(transaction)
-            return {"status": "success", "message": "Student registered successfully"}
+            # Build, sign and submit the transaction
+            response = cls._submit_transaction(student_keypair, "Register student",
+                                               fee_class=stellar_fees.CHECKIN)
+            return {
+                "status": "success",
+                "message": "Student registered successfully",
+                **cls._transaction_fields(response)
+            }
         except Exception as e:
-            return {"error": str(e)}
+            return _failure(e)
     
     @classmethod
     def create_lecture(cls, teacher_seed, lecture_id, course_id, title, date_timestamp, duration_minutes):
         """
         Create a lecture entry in the smart contract
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return {"status": "success", "message": f"Lecture {lecture_id} created (simulated)"}
         
         try:
             # Create keypair from secret
             teacher_keypair = Keypair.from_secret(teacher_seed)
             
-            # Connect to the Stellar network
-            server = Server(horizon_url=get_horizon_url())
-            
-            # Get the current account details
-            teacher_account = server.load_account(teacher_keypair.public_key)
-            
-            # Create a transaction with a dummy payment operation to self
+            # Build, sign and submit a transaction with a dummy payment operation to self
             # This is needed because a transaction must have at least one operation
-            transaction = (
-                TransactionBuilder(
-                    source_account=teacher_account,
-                    network_passphrase=get_network_passphrase(),
-                    base_fee=100000  # Adjust as needed
+            if contract_invocation_enabled():
+                response = cls._invoke_contract(
+                    teacher_keypair,
+                    _lecture_memo("Create lecture: ", lecture_id),
+                    'create_lecture',
+                    [scval.to_address(teacher_keypair.public_key), scval.to_uint64(int(lecture_id))],
+                    use_channel=True
                 )
-                .append_payment_op(
-                    destination=teacher_keypair.public_key,
-                    amount="0.0000001",  # Minimum amount to avoid dust limit
-                    asset=Asset.native()
+            else:
+                response = cls._submit_transaction(
+                    teacher_keypair,
+                    _lecture_memo("Create lecture: ", lecture_id),
+                    [cls._self_payment(teacher_keypair.public_key)],
+                    use_channel=True
                 )
-                .add_text_memo(f"Create lecture: {lecture_id}")
-                .build()
-            )
-            
-            # Sign the transaction
-            transaction.sign(teacher_keypair)
+            logger.debug("Create lecture %s response: %s", lecture_id, response)
             
-            # Submit the transaction
-            response = server.submit_transaction(transaction)
-            print("Transaction response:")
-            print(response)
-            
-            return {"status": "success", "message": f"Lecture {lecture_id} created successfully"}
+            return {
+                "status": "success",
+                "message": f"Lecture {lecture_id} created successfully",
+                **cls._transaction_fields(response)
+            }
         except Exception as e:
-            return {"error": str(e)}
+            return _failure(e)
     
     @classmethod
-    def start_attendance(cls, teacher_seed, lecture_id, duration_seconds=300):
+    def start_attendance(cls, teacher_seed, lecture_id, duration_seconds=300, nonce=None):
         """
         Start an attendance session for a lecture
+        
+        With contract invocation, ``nonce`` (the session's QR nonce) is
+        registered on-chain so the contract accepts the students' check-ins.
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return {"status": "success", "message": f"Attendance started for {lecture_id} (simulated)"}
         
         try:
             # Create keypair from secret
             teacher_keypair = Keypair.from_secret(teacher_seed)
             
-            # Connect to the Stellar network
-            server = Server(horizon_url=get_horizon_url())
-            
-            # Get the current account details
-            teacher_account = server.load_account(teacher_keypair.public_key)
-            
-            # Create a transaction
-            transaction = (
-                TransactionBuilder(
-                    source_account=teacher_account,
-                    network_passphrase=get_network_passphrase(),
-                    base_fee=100000  # Adjust as needed
+            # Build, sign and submit a transaction with a dummy payment operation to self
+            # This is needed because a transaction must have at least one operation
+            if contract_invocation_enabled():
+                nonce = nonce or cls.generate_nonce()
+                response = cls._invoke_contract(
+                    teacher_keypair,
+                    _lecture_memo("Att start:", lecture_id),
+                    'start_attendance',
+                    [scval.to_address(teacher_keypair.public_key), scval.to_uint64(int(lecture_id)),
+                     scval.to_bytes(_nonce_bytes(nonce)), scval.to_uint64(int(duration_seconds))],
+                    use_channel=True
                 )
-                .append_payment_op(
-                    destination=teacher_keypair.public_key,
-                    amount="0.0000001",  # Minimum amount to avoid dust limit
-                    asset=Asset.native()
+            else:
+                response = cls._submit_transaction(
+                    teacher_keypair,
+                    _lecture_memo("Att start:", lecture_id),
+                    [cls._self_payment(teacher_keypair.public_key)],
+                    use_channel=True
                 )
-                .add_text_memo(f"Att start:{str(lecture_id)[:10]}")
-                .build()
-            )
-            
-            # Sign the transaction
-            transaction.sign(teacher_keypair)
-            
-            # Submit the transaction
-            response = server.submit_transaction(transaction)
-            
-            # Generate a nonce for attendance QR code
-            nonce = f"nonce_{int(time.time())}"
+                
+                # Generate a nonce for attendance QR code
+                nonce = nonce or f"nonce_{int(time.time())}"
             
             return {
                 "status": "success",
                 "message": f"Attendance session started for {lecture_id}",
-                "nonce": nonce
+                "nonce": nonce,
+                **cls._transaction_fields(response)
             }
         except Exception as e:
-            return {"error": str(e)}
+            return _failure(e)
     
     @classmethod
     def mark_attendance(cls, student_seed, lecture_id, nonce):
         """
         Mark attendance for a student in a lecture
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return {"status": "success", "message": f"Attendance marked for {lecture_id} (simulated)"}
         
         try:
             # Create keypair from secret
             student_keypair = Keypair.from_secret(student_seed)
             
-            # Connect to the Stellar network
-            server = Server(horizon_url=get_horizon_url())
-            
-            # Get the current account details
-            student_account = server.load_account(student_keypair.public_key)
-            
-            # Create a transaction
-            transaction = (
-                TransactionBuilder(
-                    source_account=student_account,
-                    network_passphrase=get_network_passphrase(),
-                    base_fee=100000  # Adjust as needed
+            # Build, sign and submit a transaction with a dummy payment operation to self
+            # This is needed because a transaction must have at least one operation
+            if contract_invocation_enabled():
+                response = cls._invoke_contract(
+                    student_keypair,
+                    _lecture_memo("Att:", lecture_id, f":{nonce[:10]}"),
+                    'mark_attendance',
+                    [scval.to_address(student_keypair.public_key), scval.to_uint64(int(lecture_id)),
+                     scval.to_bytes(_nonce_bytes(nonce))],
+                    fee_class=stellar_fees.CHECKIN
                 )
-                .append_payment_op(
-                    destination=student_keypair.public_key,
-                    amount="0.0000001",  # Minimum amount to avoid dust limit
-                    asset=Asset.native()
+            else:
+                response = cls._submit_transaction(
+                    student_keypair,
+                    _lecture_memo("Att:", lecture_id, f":{nonce[:10]}"),
+                    [cls._self_payment(student_keypair.public_key)],
+                    fee_class=stellar_fees.CHECKIN
                 )
-                .add_text_memo(f"Att:{str(lecture_id)[:10]}:{nonce[:10]}")
-                .build()
-            )
-            
-            # Sign the transaction
-            transaction.sign(student_keypair)
-            
-            # Submit the transaction
-            response = server.submit_transaction(transaction)
-            return {"status": "success", "message": f"Attendance marked successfully for {lecture_id}"}
+            return {
+                "status": "success",
+                "message": f"Attendance marked successfully for {lecture_id}",
+                **cls._transaction_fields(response)
+            }
         except Exception as e:
-            return {"error": str(e)}
+            return _failure(e)
     
     @classmethod
     def close_attendance_session(cls, teacher_seed, lecture_id):
         """
         Close an active attendance session
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return {"status": "success", "message": f"Attendance session closed for {lecture_id} (simulated)"}
         
         try:
             # Create keypair from secret
             teacher_keypair = Keypair.from_secret(teacher_seed)
             
-            # Connect to the Stellar network
-            server = Server(horizon_url=get_horizon_url())
-            
-            # Get the current account details
-            teacher_account = server.load_account(teacher_keypair.public_key)
-            
-            # Create a transaction
-            transaction = (
-                TransactionBuilder(
-                    source_account=teacher_account,
-                    network_passphrase=get_network_passphrase(),
-                    base_fee=100000  # Adjust as needed
-                )
-                .append_payment_op(
-                    destination=teacher_keypair.public_key,
-                    amount="0.0000001",  # Minimum amount to avoid dust limit
-                    asset=Asset.native()
-                )
-                .add_text_memo(f"Att end:{str(lecture_id)[:10]}")
-                .build()
+            # Build, sign and submit a transaction with a dummy payment operation to self
+            # This is needed because a transaction must have at least one operation
+            response = cls._submit_transaction(
+                teacher_keypair,
+                _lecture_memo("Att end:", lecture_id),
+                [cls._self_payment(teacher_keypair.public_key)],
+                use_channel=True
             )
-            
-            # Sign the transaction
-            transaction.sign(teacher_keypair)
-            
-            # Submit the transaction
-            response = server.submit_transaction(transaction)
-            return {"status": "success", "message": f"Attendance session closed successfully for {lecture_id}"}
+            return {
+                "status": "success",
+                "message": f"Attendance session closed successfully for {lecture_id}",
+                **cls._transaction_fields(response)
+            }
         except Exception as e:
-            return {"error": str(e)}
+            return _failure(e)
+    
+    @classmethod
+    def anchor_attendance(cls, teacher_seed, lecture_id, merkle_root):
+        """
+        Publish the Merkle root over a batch of a lecture's attendance records
+        
+        The root is the transaction's hash memo, so one transaction records
+        the whole batch; each row's stored proof links it to this root.
+        """
+        if not blockchain_enabled():
+            return {"status": "success", "message": f"Attendance anchored for {lecture_id} (simulated)"}
+        
+        try:
+            teacher_keypair = Keypair.from_secret(teacher_seed)
+            response = cls._submit_transaction(
+                teacher_keypair,
+                bytes.fromhex(merkle_root),
+                [cls._self_payment(teacher_keypair.public_key)],
+                use_channel=True
+            )
+            return {
+                "status": "success",
+                "message": f"Attendance Merkle root anchored for {lecture_id}",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
     
     @classmethod
     def manual_attendance(cls, teacher_seed, lecture_id, student_public_key):
         """
         Manually mark attendance for a student
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return {"status": "success", "message": f"Manual attendance marked for {lecture_id} (simulated)"}
         
         try:
             # Create keypair from secret
             teacher_keypair = Keypair.from_secret(teacher_seed)
             
-            # Connect to the Stellar network
-            server = Server(horizon_url=get_horizon_url())
-            
-            # Get the current account details
-            teacher_account = server.load_account(teacher_keypair.public_key)
-            
-            # Create a transaction
-            transaction = (
-                TransactionBuilder(
-                    source_account=teacher_account,
-                    network_passphrase=get_network_passphrase(),
-                    base_fee=100000  # Adjust as needed
-                )
-                .append_payment_op(
-                    destination=teacher_keypair.public_key,
-                    amount="0.0000001",  # Minimum amount to avoid dust limit
-                    asset=Asset.native()
-                )
-                .add_text_memo(f"MAtt:{str(lecture_id)[:7]}:{student_public_key[:8]}")
-                .build()
+            if not is_valid_public_key(student_public_key):
+                raise ValueError(INVALID_KEY_ERROR)
+            # The payment to the student puts the full key on-chain for the indexer
+            response = cls._submit_transaction(
+                teacher_keypair,
+                _lecture_memo("MAtt:", lecture_id),
+                [cls._attendance_payment(teacher_keypair.public_key, student_public_key)],
+                use_channel=True
             )
-            
-            # Sign the transaction
-            transaction.sign(teacher_keypair)
-            
-            # Submit the transaction
-            response = server.submit_transaction(transaction)
-            return {"status": "success", "message": f"Manual attendance marked successfully for {lecture_id}"}
+            return {
+                "status": "success",
+                "message": f"Manual attendance marked successfully for {lecture_id}",
+                **cls._transaction_fields(response)
+            }
+        except Exception as e:
+            return _failure(e)
+    
+    @classmethod
+    def batch_manual_attendance(cls, teacher_seed, lecture_id, student_public_keys):
+        """
+        Manually mark attendance for many students with as few transactions as possible
+        
+        Each student becomes one payment operation from the teacher to the
+        student's account, packed up to MAX_OPERATIONS_PER_TRANSACTION per
+        transaction. Missing or malformed keys are reported as failed before
+        any transaction is built. If the network rejects individual
+        operations (e.g. an unfunded student account) those students are
+        reported as failed and the rest of the chunk is resubmitted once
+        without them.
+        
+        Args:
+            teacher_seed: Secret seed of the teacher signing the transactions
+            lecture_id: ID of the lecture
+            student_public_keys: Stellar public keys of the students to mark
+            
+        Returns:
+            dict: ``results`` maps each public key to ``{"status": "success", "hash": ...}``
+            or ``{"error": ...}``; ``transactions`` lists ``{"hash", "students"}`` per
+            submitted transaction
+        """
+        student_public_keys, results = _split_valid_keys(student_public_keys)
+        if not blockchain_enabled():
+            return {
+                "status": "success",
+                "message": f"Manual attendance marked for {len(student_public_keys)} students in {lecture_id} (simulated)",
+                "results": {**results, **{key: {"status": "success"} for key in student_public_keys}},
+                "transactions": []
+            }
+        
+        try:
+            teacher_keypair = Keypair.from_secret(teacher_seed)
+            memo = _lecture_memo("MAtt:", lecture_id)
         except Exception as e:
-            return {"error": str(e)}
+            return _failure(e)
+        
+        transactions = []
+        for chunk in _chunks(student_public_keys):
+            # One retry without the students whose operations were rejected
+            for retried in (False, True):
+                try:
+                    response = cls._submit_transaction(
+                        teacher_keypair,
+                        memo,
+                        [cls._attendance_payment(teacher_keypair.public_key, key) for key in chunk],
+                        use_channel=True,
+                        wait=True  # Rejected operations are only known once the ledger applied them
+                    )
+                except CircuitOpenError as e:
+                    return _circuit_open_summary(lecture_id, student_public_keys, results, transactions, e)
+                except Exception as e:
+                    failed, chunk = _failed_chunk(chunk, e, retried)
+                    results.update(failed)
+                    if not chunk:
+                        break
+                    continue
+                
+                transactions.append({"hash": response.get("hash"), "students": chunk})
+                for key in chunk:
+                    results[key] = {"status": "success", "hash": response.get("hash")}
+                break
+        
+        return _batch_summary(lecture_id, results, transactions)
+    
+    @staticmethod
+    def _attendance_payment(teacher_public_key, student_public_key):
+        """
+        Minimal payment from the teacher to a student, identifying the student on-chain
+        """
+        return Payment(
+            destination=student_public_key,
+            asset=Asset.native(),
+            amount="0.0000001",  # Minimum amount to avoid dust limit
+            source=teacher_public_key
+        )
     
     @classmethod
     def verify_attendance(cls, lecture_id, student_public_key):
         """
         Verify if a student has attended a lecture
+        
+        Answered from the on-chain index kept by ``index_blockchain``, so
+        writes newer than the indexer's cursor are not visible yet. With
+        contract invocation, records the index does not have yet are read
+        from the contract's ``get_attendance``.
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return True
         
         try:
-            # For now, we'll return a simulated success
-            return True
+            if has_attended(lecture_id, student_public_key, get_network_passphrase()):
+                return True
+            if contract_invocation_enabled():
+                return bool(contract_invoker.read(
+                    get_contract_id(), 'get_attendance',
+                    [scval.to_uint64(int(lecture_id)), scval.to_address(student_public_key)],
+                    student_public_key, get_network_passphrase()
+                ))
+            return False
         except Exception as e:
-            print(f"Error verifying attendance: {e}")
+            logger.warning("Error verifying attendance of %s for lecture %s: %s", student_public_key, lecture_id, e)
             return False
     
     @classmethod
@@ -414,18 +753,18 @@ class StellarHelper:
         """
         Verify that the contract connection is working properly
         """
-        if not get_contract_id():
+        if not blockchain_enabled():
             return {"status": "error", "message": "No contract ID provided"}
         
         try:
             # First try connecting to Horizon
             try:
-                server = Server(horizon_url=get_horizon_url())
+                server = get_horizon_server()
                 network_response = server.root().call()
                 horizon_connected = True
                 
                 # Now try connecting to Soroban RPC
-                soroban_server = SorobanServer(get_soroban_rpc_url())
+                soroban_server = get_soroban_server()
                 soroban_info = soroban_server.get_health()
                 soroban_connected = True
             except Exception as e:
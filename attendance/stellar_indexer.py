@@ -0,0 +1,445 @@
+"""
+Local index of attendance writes found on the ledger.
+
+Checking a record on Horizon per call means scanning an account's history,
+far too slow for reports. The ``index_blockchain`` worker instead follows
+the transaction history of the project's own accounts (teachers and admins
+every round, students while they have recent or unconfirmed check-ins),
+each from its own persisted cursor, and stores every transaction carrying
+one of the memos ``StellarHelper`` writes (``Att:``, ``MAtt:``,
+``Att start:``, ``Att end:``, ``Create lecture:``) as
+``ChainAttendanceRecord`` rows. When a contract is configured, its
+``attend`` events are followed the same way through Soroban RPC.
+
+Anyone can write these memos, so a row is only kept when its signer is
+entitled to it: the course teacher (or an admin) for lecture, session and
+manual rows, an enrolled student quoting one of the lecture's session
+nonces for check-ins. ``StellarHelper.verify_attendance`` and the
+statistics page then answer from indexed queries.
+"""
+import base64
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from stellar_sdk import FeeBumpTransactionEnvelope, scval, xdr
+from stellar_sdk.exceptions import NotFoundError
+from stellar_sdk.helpers import parse_transaction_envelope_from_xdr
+from stellar_sdk.operation import Payment
+from stellar_sdk.soroban_rpc import EventFilter, EventFilterType
+
+from . import merkle
+from .models import (Attendance, AttendanceSession, ChainAttendanceRecord, Enrollment, IndexerCursor, Lecture,
+                     User)
+from .stellar_clients import get_horizon_server, get_soroban_server
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_CURSOR = 'account:{}'
+SOROBAN_CURSOR = 'soroban_events'
+
+# Students are followed while they have a check-in this recent or one not yet confirmed
+STUDENT_LOOKBACK = timedelta(days=1)
+
+# Topic the attendance contract publishes from mark_attendance
+ATTEND_EVENT = 'attend'
+
+# Confirmed anchor transactions never change, so their roots are cached
+ANCHOR_ROOT_KEY = 'anchor_root:{}'
+ANCHOR_ROOT_TTL = 24 * 3600
+
+_MEMO_PREFIXES = (
+    ('Att start:', ChainAttendanceRecord.SESSION_START),
+    ('Att end:', ChainAttendanceRecord.SESSION_END),
+    ('Create lecture: ', ChainAttendanceRecord.LECTURE),
+    ('MAtt:', ChainAttendanceRecord.MANUAL),
+    ('Att:', ChainAttendanceRecord.CHECK_IN),
+)
+
+
+def parse_memo(memo):
+    """
+    Split an attendance memo into ``(kind, lecture_ref, rest)``
+
+    ``rest`` is what follows the lecture id, e.g. the session nonce prefix
+    of a check-in.
+
+    Returns:
+        tuple or None: None for memos this project does not write
+    """
+    if not memo:
+        return None
+    for prefix, kind in _MEMO_PREFIXES:
+        if not memo.startswith(prefix):
+            continue
+        lecture_ref, _, rest = memo[len(prefix):].partition(':')
+        if not lecture_ref:
+            return None
+        return kind, lecture_ref, rest
+    return None
+
+
+def _operation_source(operation, transaction_source):
+    return operation.source.account_id if operation.source is not None else transaction_source
+
+
+def records_from_transaction(record, network_passphrase):
+    """
+    Build the (unsaved) index rows for one Horizon transaction record
+
+    A ``MAtt:`` memo yields one row per payment to a student, keyed by its
+    destination; a check-in is keyed by the student account that signed it
+    and carries the memo's nonce prefix as ``nonce_prefix`` for
+    ``trusted_records``.
+    """
+    parsed = parse_memo(record.get('memo') if record.get('memo_type') == 'text' else None)
+    if parsed is None:
+        return []
+    kind, lecture_ref, rest = parsed
+
+    envelope = parse_transaction_envelope_from_xdr(record['envelope_xdr'], network_passphrase)
+    if isinstance(envelope, FeeBumpTransactionEnvelope):
+        envelope = envelope.transaction.inner_transaction_envelope
+    tx = envelope.transaction
+    source = tx.source.account_id
+    operations = list(tx.operations)
+    if not operations:
+        return []
+
+    common = {
+        'kind': kind,
+        'lecture_ref': lecture_ref,
+        'transaction_hash': record['hash'],
+        'ledger': int(record.get('ledger') or 0),
+        'created_at': parse_datetime(record['created_at']) if record.get('created_at') else None,
+    }
+    if kind == ChainAttendanceRecord.MANUAL:
+        records = []
+        for index, operation in enumerate(operations):
+            signer = _operation_source(operation, source)
+            if isinstance(operation, Payment) and operation.destination.account_id != signer:
+                records.append(ChainAttendanceRecord(
+                    student_public_key=operation.destination.account_id,
+                    signer_public_key=signer,
+                    operation_index=index,
+                    **common
+                ))
+        return records
+
+    signer = _operation_source(operations[0], source)
+    row = ChainAttendanceRecord(
+        student_public_key=signer if kind == ChainAttendanceRecord.CHECK_IN else '',
+        signer_public_key=signer,
+        **common
+    )
+    row.nonce_prefix = rest
+    return [row]
+
+
+def records_from_event(event):
+    """
+    Build the index row for an ``attend`` contract event, or None for other events
+
+    Topics are ``("attend", lecture_id)``; the value is the student address.
+    The contract itself checked the session nonce, so the row has no
+    ``nonce_prefix`` to check.
+    """
+    try:
+        topics = [scval.to_native(xdr.SCVal.from_xdr(topic)) for topic in event.topic]
+        if len(topics) < 2 or topics[0] != ATTEND_EVENT:
+            return None
+        student = scval.to_native(xdr.SCVal.from_xdr(event.value)).address
+    except Exception as e:
+        logger.warning("Skipping undecodable contract event %s: %s", event.id, e)
+        return None
+    return ChainAttendanceRecord(
+        kind=ChainAttendanceRecord.CHECK_IN,
+        lecture_ref=str(topics[1]),
+        student_public_key=student,
+        signer_public_key=student,
+        transaction_hash=event.transaction_hash,
+        # Keep clear of the memo rows of the same transaction
+        operation_index=1000 + event.operation_index,
+        ledger=event.ledger,
+        created_at=event.ledger_close_at,
+    )
+
+
+def trusted_records(records):
+    """
+    Drop the rows whose signer is not entitled to the write
+
+    Lecture, session and manual rows must be signed by the course teacher
+    or an admin (who may also mark attendance from the manual form). A
+    check-in must be signed by a student enrolled in the course and, when
+    it comes from a memo, quote the prefix of one of the lecture's session
+    nonces. Rows for lectures this database does not have are dropped too.
+    """
+    lecture_ids = {int(record.lecture_ref) for record in records if record.lecture_ref.isdigit()}
+    if not lecture_ids:
+        return []
+    lectures = Lecture.objects.select_related('course__teacher').in_bulk(lecture_ids)
+    admins = set(User.objects.filter(is_admin=True).exclude(stellar_public_key__isnull=True)
+                 .values_list('stellar_public_key', flat=True))
+    enrolled = defaultdict(set)
+    for course_id, public_key in (Enrollment.objects
+                                  .filter(course__lectures__in=lecture_ids, student__stellar_public_key__isnull=False)
+                                  .values_list('course_id', 'student__stellar_public_key')):
+        enrolled[course_id].add(public_key)
+    nonces = defaultdict(set)
+    for lecture_id, nonce in AttendanceSession.objects.filter(lecture_id__in=lecture_ids).values_list('lecture_id', 'nonce'):
+        nonces[lecture_id].add(nonce[:10])
+
+    trusted = []
+    for record in records:
+        lecture = lectures.get(int(record.lecture_ref)) if record.lecture_ref.isdigit() else None
+        if lecture is None:
+            continue
+        signer = record.signer_public_key
+        if record.kind == ChainAttendanceRecord.CHECK_IN:
+            nonce_prefix = getattr(record, 'nonce_prefix', None)
+            allowed = (signer in enrolled[lecture.course_id]
+                       and (nonce_prefix is None or nonce_prefix in nonces[lecture.pk]))
+        else:
+            allowed = signer == lecture.course.teacher.stellar_public_key or signer in admins
+        if allowed:
+            trusted.append(record)
+        else:
+            logger.info("Ignoring %s for lecture %s signed by %s", record.get_kind_display(), record.lecture_ref,
+                        signer)
+    return trusted
+
+
+def _save(name, records, cursor):
+    """
+    Store a page of rows and advance the cursor in one transaction
+    """
+    with transaction.atomic():
+        ChainAttendanceRecord.objects.bulk_create(records, ignore_conflicts=True)
+        IndexerCursor.objects.update_or_create(name=name, defaults={'cursor': cursor})
+
+
+def get_cursor(name):
+    return IndexerCursor.objects.filter(name=name).values_list('cursor', flat=True).first()
+
+
+def watched_accounts(now=None):
+    """
+    Public keys whose transactions are indexed this round, staff first
+
+    Teachers and admins sign lectures, sessions and manual marks, so they are
+    always followed. Students are only followed while they have a check-in
+    from the last ``STUDENT_LOOKBACK`` or one the chain has not confirmed,
+    which keeps a round's requests proportional to current activity.
+    """
+    now = now or timezone.now()
+    keyed = User.objects.exclude(stellar_public_key__isnull=True).exclude(stellar_public_key='')
+    staff = keyed.filter(Q(is_teacher=True) | Q(is_admin=True)).order_by('pk')
+    recent = Attendance.objects.filter(student=OuterRef('pk')).filter(
+        Q(blockchain_verified=False) | Q(timestamp__gte=now - STUDENT_LOOKBACK)
+    )
+    students = keyed.filter(is_student=True).filter(Exists(recent)).order_by('pk')
+    return list(dict.fromkeys([
+        *staff.values_list('stellar_public_key', flat=True),
+        *students.values_list('stellar_public_key', flat=True),
+    ]))
+
+
+class AttendanceIndexer:
+    """
+    Follows the project's accounts on Horizon (and the contract on Soroban
+    RPC) from the persisted cursors into the index
+
+    Args:
+        network_passphrase: used to decode transaction envelopes
+        contract_id: follow this contract's events as well, if set
+        from_start: with no stored events cursor, start from the oldest
+            ledger the RPC server keeps instead of from now. Accounts are
+            always followed from their first transaction.
+    """
+
+    def __init__(self, network_passphrase, contract_id=None, horizon=None, soroban=None, from_start=False,
+                 page_size=200):
+        self.network_passphrase = network_passphrase
+        self.contract_id = contract_id
+        self.horizon = horizon
+        self.soroban = soroban
+        self.from_start = from_start
+        self.page_size = page_size
+
+    def index_account(self, public_key, max_pages=10):
+        """
+        Index up to ``max_pages`` pages of an account's new transactions
+
+        Returns:
+            int: number of index rows written
+        """
+        server = self.horizon or get_horizon_server()
+        name = ACCOUNT_CURSOR.format(public_key)
+        cursor = get_cursor(name)
+        indexed = 0
+        for _ in range(max_pages):
+            builder = server.transactions().for_account(public_key).order(desc=False).limit(self.page_size)
+            if cursor:
+                builder = builder.cursor(cursor)
+            try:
+                page = builder.call()['_embedded']['records']
+            except NotFoundError:
+                return indexed  # Not created on the network yet
+            if not page:
+                break
+            records = []
+            for record in page:
+                try:
+                    records.extend(records_from_transaction(record, self.network_passphrase))
+                except Exception as e:
+                    logger.warning("Skipping undecodable transaction %s: %s", record.get('hash'), e)
+            records = trusted_records(records)
+            cursor = page[-1]['paging_token']
+            _save(name, records, cursor)
+            indexed += len(records)
+            if len(page) < self.page_size:
+                break
+        return indexed
+
+    def index_transactions(self, max_pages=10):
+        """
+        Index new transactions of every account in ``watched_accounts``
+
+        Returns:
+            int: number of index rows written
+        """
+        indexed = 0
+        for public_key in watched_accounts():
+            try:
+                indexed += self.index_account(public_key, max_pages)
+            except Exception as e:
+                # One unreachable account must not hold back the others
+                logger.warning("Could not index transactions of %s: %s", public_key, e)
+        return indexed
+
+    def index_events(self, max_pages=50):
+        """
+        Index up to ``max_pages`` pages of the contract's events
+
+        Returns:
+            int: number of index rows written
+        """
+        if not self.contract_id:
+            return 0
+        server = self.soroban or get_soroban_server()
+        filters = [EventFilter(event_type=EventFilterType.CONTRACT, contract_ids=[self.contract_id])]
+        cursor = get_cursor(SOROBAN_CURSOR)
+        indexed = 0
+        for _ in range(max_pages):
+            if cursor:
+                response = server.get_events(filters=filters, cursor=cursor, limit=self.page_size)
+            else:
+                health = server.get_health()
+                start = health.oldest_ledger if self.from_start else health.latest_ledger
+                response = server.get_events(start_ledger=start, filters=filters, limit=self.page_size)
+            records = trusted_records([record for record in map(records_from_event, response.events)
+                                       if record is not None])
+            cursor = response.cursor
+            _save(SOROBAN_CURSOR, records, cursor)
+            indexed += len(records)
+            if len(response.events) < self.page_size:
+                break
+        return indexed
+
+    def run_once(self):
+        """
+        Catch up both streams once
+
+        Returns:
+            dict: ``{"transactions": n, "events": n}`` rows written
+        """
+        counts = {'transactions': self.index_transactions(), 'events': 0}
+        try:
+            counts['events'] = self.index_events()
+        except Exception as e:
+            # Horizon memos already cover every write; events are a second source
+            logger.warning("Could not index contract events: %s", e)
+        return counts
+
+
+def anchored_root(transaction_hash, lecture, network_passphrase, server=None):
+    """
+    Merkle root published by the anchor transaction ``transaction_hash``
+
+    The root is the transaction's hash memo. It only counts if the
+    transaction succeeded and was signed by the lecture's teacher or an
+    admin, like the index's other lecture rows.
+
+    Returns:
+        str or None: the hex root, or None if the transaction does not publish one
+    """
+    if not transaction_hash:
+        return None
+    key = ANCHOR_ROOT_KEY.format(transaction_hash)
+    root = cache.get(key)
+    if root is not None:
+        return root
+    server = server or get_horizon_server()
+    try:
+        record = server.transactions().transaction(transaction_hash).call()
+    except NotFoundError:
+        return None
+    if not record.get('successful') or record.get('memo_type') != 'hash':
+        return None
+
+    envelope = parse_transaction_envelope_from_xdr(record['envelope_xdr'], network_passphrase)
+    if isinstance(envelope, FeeBumpTransactionEnvelope):
+        envelope = envelope.transaction.inner_transaction_envelope
+    tx = envelope.transaction
+    if not tx.operations:
+        return None
+    signer = _operation_source(tx.operations[0], tx.source.account_id)
+    entitled = (signer == lecture.course.teacher.stellar_public_key
+                or User.objects.filter(is_admin=True, stellar_public_key=signer).exists())
+    if not entitled:
+        logger.info("Ignoring anchor %s for lecture %s signed by %s", transaction_hash, lecture.pk, signer)
+        return None
+    root = base64.b64decode(record['memo']).hex()
+    cache.set(key, root, ANCHOR_ROOT_TTL)
+    return root
+
+
+def has_attended(lecture_id, student_public_key, network_passphrase):
+    """
+    True if the index holds a check-in or manual mark for the student in the lecture
+
+    A check-in only counts once the index also holds a session start for
+    the lecture in the same or an earlier ledger. Check-ins recorded through
+    a Merkle root (``STELLAR_ATTENDANCE_ANCHORING = 'merkle'``) count when
+    their proof leads to the root their anchor transaction published on-chain.
+    """
+    records = ChainAttendanceRecord.objects.filter(lecture_ref=str(lecture_id), student_public_key=student_public_key)
+    if records.filter(kind=ChainAttendanceRecord.MANUAL).exists():
+        return True
+    session_started = ChainAttendanceRecord.objects.filter(
+        kind=ChainAttendanceRecord.SESSION_START,
+        lecture_ref=str(lecture_id),
+        ledger__lte=OuterRef('ledger'),
+    )
+    if records.filter(kind=ChainAttendanceRecord.CHECK_IN).filter(Exists(session_started)).exists():
+        return True
+
+    attendance = (Attendance.objects
+                  .filter(lecture_id=lecture_id, student__stellar_public_key=student_public_key,
+                          anchor__isnull=False)
+                  .exclude(anchor__transaction_hash='')
+                  .select_related('student', 'session', 'anchor', 'lecture__course__teacher')
+                  .first())
+    if attendance is None:
+        return False
+    root = anchored_root(attendance.anchor.transaction_hash, attendance.lecture, network_passphrase)
+    if root is None:
+        return False
+    leaf = merkle.leaf_hash(merkle.attendance_leaf(attendance))
+    return merkle.verify_proof(leaf, attendance.merkle_proof or [], root)
@@ -0,0 +1,116 @@
+"""
+Conversion between Stellar transaction result XDR and Horizon result codes.
+
+Horizon's synchronous ``/transactions`` endpoint reports failures as
+``extras.result_codes`` (``tx_bad_seq``, ``op_no_destination``, ...). The
+asynchronous ``/transactions_async`` endpoint only returns the raw
+``error_result_xdr``. ``result_codes_from_xdr`` turns that XDR into the same
+shape, so retry and channel-health logic works with either endpoint.
+"""
+from stellar_sdk import xdr
+from stellar_sdk.operation import CreateAccount, InvokeHostFunction, Payment
+
+# Horizon names that do not follow the mechanical XDR -> snake_case mapping
+_TRANSACTION_CODE_ALIASES = {
+    'txNO_ACCOUNT': 'tx_no_source_account',
+}
+_OPERATION_CODE_ALIASES = {
+    'opNO_ACCOUNT': 'op_no_source_account',
+    'CREATE_ACCOUNT_ALREADY_EXIST': 'op_already_exists',
+}
+
+
+def _transaction_code(code):
+    name = code.name
+    if name in _TRANSACTION_CODE_ALIASES:
+        return _TRANSACTION_CODE_ALIASES[name]
+    return 'tx_' + name[len('tx'):].lower()
+
+
+def _operation_code(result):
+    if result.code != xdr.OperationResultCode.opINNER:
+        name = result.code.name
+        return _OPERATION_CODE_ALIASES.get(name, 'op_' + name[len('op'):].lower())
+    tr = result.tr
+    # Exactly one *_result attribute is set, matching the operation type
+    inner = next((value for key, value in vars(tr).items() if key.endswith('_result') and value is not None), None)
+    if inner is None:
+        return 'op_unknown'
+    name = inner.code.name
+    if name in _OPERATION_CODE_ALIASES:
+        return _OPERATION_CODE_ALIASES[name]
+    prefix = tr.type.name + '_'
+    return 'op_' + (name[len(prefix):] if name.startswith(prefix) else name).lower()
+
+
+def result_codes_from_xdr(result_xdr):
+    """
+    Decode a base64 ``TransactionResult`` into Horizon's ``result_codes`` dict
+
+    Returns:
+        dict: ``{"transaction": ..., "operations": [...]}`` (operations only
+        when the transaction failed on them), plus ``inner_transaction`` for
+        a failed fee bump
+    """
+    result = xdr.TransactionResult.from_xdr(result_xdr).result
+    codes = {'transaction': _transaction_code(result.code)}
+    if result.results is not None:
+        codes['operations'] = [_operation_code(operation) for operation in result.results]
+    if result.inner_result_pair is not None:
+        inner = result.inner_result_pair.result.result
+        inner_codes = {'transaction': _transaction_code(inner.code)}
+        if inner.results is not None:
+            inner_codes['operations'] = [_operation_code(operation) for operation in inner.results]
+        codes['inner_transaction'] = inner_codes
+    return codes
+
+
+def result_xdr_from_codes(transaction_code, operations=(), fee_charged=0):
+    """
+    Encode Horizon-style result codes as a base64 ``TransactionResult``
+
+    Args:
+        transaction_code: e.g. ``tx_bad_seq`` or ``tx_failed``
+        operations: ``(operation, code)`` pairs for a ``tx_failed`` result;
+            only payment, create-account and contract-call codes are encoded precisely
+        fee_charged: fee in stroops
+    """
+    names = {alias: name for name, alias in _TRANSACTION_CODE_ALIASES.items()}
+    name = names.get(transaction_code, 'tx' + transaction_code[len('tx_'):].upper())
+    code = xdr.TransactionResultCode[name]
+    results = None
+    if code == xdr.TransactionResultCode.txFAILED:
+        results = [_operation_result(operation, operation_code) for operation, operation_code in operations]
+    return xdr.TransactionResult(
+        fee_charged=xdr.Int64(fee_charged),
+        result=xdr.TransactionResultResult(code=code, results=results),
+        ext=xdr.TransactionResultExt(0),
+    ).to_xdr()
+
+
+def _operation_result(operation, operation_code):
+    if isinstance(operation, Payment):
+        suffix = 'SUCCESS' if operation_code == 'op_success' else operation_code[len('op_'):].upper()
+        tr = xdr.OperationResultTr(
+            type=xdr.OperationType.PAYMENT,
+            payment_result=xdr.PaymentResult(code=xdr.PaymentResultCode['PAYMENT_' + suffix]),
+        )
+    elif isinstance(operation, CreateAccount):
+        names = {'op_success': 'CREATE_ACCOUNT_SUCCESS', 'op_already_exists': 'CREATE_ACCOUNT_ALREADY_EXIST',
+                 'op_underfunded': 'CREATE_ACCOUNT_UNDERFUNDED'}
+        tr = xdr.OperationResultTr(
+            type=xdr.OperationType.CREATE_ACCOUNT,
+            create_account_result=xdr.CreateAccountResult(code=xdr.CreateAccountResultCode[names[operation_code]]),
+        )
+    elif isinstance(operation, InvokeHostFunction):
+        suffix = 'SUCCESS' if operation_code == 'op_success' else operation_code[len('op_'):].upper()
+        tr = xdr.OperationResultTr(
+            type=xdr.OperationType.INVOKE_HOST_FUNCTION,
+            invoke_host_function_result=xdr.InvokeHostFunctionResult(
+                code=xdr.InvokeHostFunctionResultCode['INVOKE_HOST_FUNCTION_' + suffix],
+                success=xdr.Hash(bytes(32)) if operation_code == 'op_success' else None,
+            ),
+        )
+    else:
+        return xdr.OperationResult(code=xdr.OperationResultCode.opNOT_SUPPORTED)
+    return xdr.OperationResult(code=xdr.OperationResultCode.opINNER, tr=tr)
@@ -0,0 +1,156 @@
+"""
+Local sequence-number management for Stellar source accounts.
+
+Instead of calling ``load_account`` before every transaction, the current
+sequence of each source account is loaded once and then handed out with an
+atomic increment in the Django cache. With a shared cache backend (Redis,
+Memcached) several workers draw from the same counter, so concurrent
+submissions from one teacher account no longer race on the same number.
+When Horizon answers ``tx_bad_seq`` the counter is resynced from the
+ledger and the transaction is rebuilt with a fresh number.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from stellar_sdk import Account
+from stellar_sdk.exceptions import BadRequestError
+
+from .stellar_clients import get_horizon_server
+
+
+def _load_sequence_from_horizon(public_key):
+    return get_horizon_server().load_account(public_key).sequence
+
+
+def is_bad_sequence_error(error):
+    """
+    Return True if ``error`` is Horizon rejecting a transaction for ``tx_bad_seq``
+    """
+    if not isinstance(error, BadRequestError):
+        return False
+    result_codes = (error.extras or {}).get('result_codes') or {}
+    if result_codes.get('transaction') == 'tx_bad_seq':
+        return True
+    # Fee-bump wrappers report the inner transaction's result separately
+    inner = result_codes.get('inner_transaction') or {}
+    return isinstance(inner, dict) and inner.get('transaction') == 'tx_bad_seq'
+
+
+class SequenceManager:
+    """
+    Hands out sequence numbers for source accounts without a Horizon round-trip.
+
+    Args:
+        loader: callable returning the ledger sequence for a public key
+        key_prefix: cache key prefix for the per-account counters
+    """
+
+    def __init__(self, loader=_load_sequence_from_horizon, key_prefix='stellar_seq'):
+        self._loader = loader
+        self._key_prefix = key_prefix
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _cache_key(self, public_key):
+        return f"{self._key_prefix}:{public_key}"
+
+    def _account_lock(self, public_key):
+        with self._locks_guard:
+            lock = self._locks.get(public_key)
+            if lock is None:
+                lock = self._locks[public_key] = threading.Lock()
+            return lock
+
+    def _prime(self, public_key):
+        """
+        Load the ledger sequence into the cache unless another caller already did
+        """
+        key = self._cache_key(public_key)
+        with self._account_lock(public_key):
+            if cache.get(key) is None:
+                cache.add(key, int(self._loader(public_key)), settings.STELLAR_SEQUENCE_TTL)
+
+    def is_primed(self, public_key):
+        """
+        Return True if a sequence for ``public_key`` is already cached
+        """
+        return cache.get(self._cache_key(public_key)) is not None
+
+    def prime(self, public_key, sequence):
+        """
+        Seed the counter with a sequence loaded elsewhere (e.g. by an async client)
+        """
+        cache.add(self._cache_key(public_key), int(sequence), settings.STELLAR_SEQUENCE_TTL)
+
+    def next_sequence(self, public_key):
+        """
+        Reserve the next sequence number for ``public_key``
+
+        Returns:
+            int: the sequence number the next transaction must carry
+        """
+        key = self._cache_key(public_key)
+        for _ in range(2):
+            if cache.get(key) is None:
+                self._prime(public_key)
+            try:
+                return cache.incr(key)
+            except ValueError:
+                # The counter expired between the check and the increment
+                continue
+        raise RuntimeError(f"Could not reserve a sequence number for {public_key}")
+
+    def next_account(self, public_key):
+        """
+        Return an ``Account`` whose next built transaction uses a reserved sequence
+        """
+        # TransactionBuilder.build() increments the account before using it
+        return Account(public_key, self.next_sequence(public_key) - 1)
+
+    def resync(self, public_key, sequence=None):
+        """
+        Reload the sequence from the ledger after a ``tx_bad_seq`` rejection
+
+        Args:
+            sequence: the ledger sequence if the caller already loaded it
+        """
+        with self._account_lock(public_key):
+            if sequence is None:
+                sequence = self._loader(public_key)
+            cache.set(self._cache_key(public_key), int(sequence), settings.STELLAR_SEQUENCE_TTL)
+
+    def invalidate(self, public_key):
+        """
+        Forget the cached sequence, e.g. after a reserved number went unused
+        """
+        cache.delete(self._cache_key(public_key))
+
+    def submit(self, public_key, build_and_submit):
+        """
+        Run ``build_and_submit(account)`` with a reserved sequence, retrying on ``tx_bad_seq``
+
+        Args:
+            public_key: the transaction source account
+            build_and_submit: callable receiving an ``Account`` and returning the
+                Horizon response for the transaction built from it
+
+        Returns:
+            The value returned by ``build_and_submit``
+        """
+        attempts = max(1, settings.STELLAR_SEQUENCE_RETRIES + 1)
+        for attempt in range(attempts):
+            account = self.next_account(public_key)
+            try:
+                return build_and_submit(account)
+            except Exception as e:
+                if is_bad_sequence_error(e) and attempt + 1 < attempts:
+                    self.resync(public_key)
+                    continue
+                # The reserved number may not have been consumed on the ledger,
+                # which would leave a gap for every later transaction.
+                self.invalidate(public_key)
+                raise
+
+
+sequence_manager = SequenceManager()
@@ -0,0 +1,661 @@
+"""
+Offline stand-in for Horizon and Soroban RPC.
+
+``LedgerSimulator`` keeps accounts, sequence numbers and applied
+transactions in memory and answers the subset of the Horizon/Soroban API
+this project uses. It accepts real signed envelopes: signatures, sequence
+numbers, fees and time bounds are checked as the network would, and results
+and errors come back in Horizon's response format. So ``StellarHelper`` runs
+its whole code path (building, signing, sequencing, fee bumps, channel
+accounts) without testnet.
+
+Latency, the rate of injected errors and the ledger close time are
+configurable. A seeded RNG makes runs reproducible. Set ``STELLAR_SIMULATOR``
+to route the pooled clients in ``stellar_clients`` (and the async ones) to the
+simulator. State lives in the process that created it: the web server, the
+outbox worker and the indexer each see their own ledger, so the simulator
+only gives a consistent picture when everything runs in one process (tests,
+``loadtest_checkins`` against a single runserver).
+
+Streams are finite: they replay the records after the cursor and stop once
+caught up, instead of waiting for new ledgers like Horizon's SSE endpoints.
+"""
+import asyncio
+import base64
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from stellar_sdk import FeeBumpTransactionEnvelope, Keypair, scval, xdr
+from stellar_sdk.client.base_async_client import BaseAsyncClient
+from stellar_sdk.client.base_sync_client import BaseSyncClient
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import BadSignatureError, StreamClientError
+from stellar_sdk.helpers import parse_transaction_envelope_from_xdr
+from stellar_sdk.operation import CreateAccount, InvokeHostFunction, Payment
+
+from .stellar_results import result_xdr_from_codes
+
+BASE_FEE = 100  # stroops per operation
+SOROBAN_RESOURCE_FEE = 50000  # stroops quoted for every contract call
+FRIENDBOT_BALANCE = Decimal('10000')
+
+
+def _json_response(status_code, body, url=''):
+    return Response(status_code=status_code, text=json.dumps(body), headers={'Content-Type': 'application/json'},
+                    url=url)
+
+
+def _problem(status_code, title, extras=None):
+    body = {'type': 'about:blank', 'title': title, 'status': status_code}
+    if extras is not None:
+        body['extras'] = extras
+    return _json_response(status_code, body)
+
+
+class _SubmissionError(Exception):
+    def __init__(self, transaction_code, operation_codes=None, operations=(), fee_charged=0):
+        super().__init__(transaction_code)
+        self.transaction_code = transaction_code
+        self.operation_codes = operation_codes
+        self.operations = operations
+        self.fee_charged = fee_charged
+
+    def result_xdr(self):
+        return result_xdr_from_codes(self.transaction_code, zip(self.operations, self.operation_codes or ()),
+                                     self.fee_charged)
+
+
+class LedgerSimulator:
+    """
+    In-memory ledger answering Horizon and Soroban RPC requests
+
+    Args:
+        network_passphrase: passphrase transactions must be signed for
+        latency: mean seconds added to every request (jittered ±50%)
+        error_rate: probability that a request fails with a 5xx response
+        ledger_close_seconds: ledger close interval; synchronous submissions
+            wait for the next close (0 closes a ledger per transaction)
+        seed: RNG seed for latency jitter and error injection
+        auto_fund: create unknown accounts with the Friendbot balance on first use
+    """
+
+    def __init__(self, network_passphrase, latency=0.0, error_rate=0.0, ledger_close_seconds=0.0, seed=0,
+                 auto_fund=True, clock=time.monotonic):
+        self.network_passphrase = network_passphrase
+        self.latency = latency
+        self.error_rate = error_rate
+        self.ledger_close_seconds = ledger_close_seconds
+        self.auto_fund = auto_fund
+        self._clock = clock
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self._genesis = clock()
+        self._ledger_counter = 1
+        self.accounts = {}
+        self.transactions = {}
+        self._participants = {}  # transaction hash -> accounts it touches
+        self._paging_counter = 0  # Transactions are paged in the order they were applied
+        self.stats = {'requests': 0, 'submitted': 0, 'applied': 0, 'rejected': 0, 'injected_errors': 0,
+                      'simulations': 0}
+        # Contract calls are not executed; simulation quotes this resource fee
+        # and submissions declaring less fail like an under-funded invocation
+        self.soroban_resource_fee = SOROBAN_RESOURCE_FEE
+        self.contract_attendance = set()  # (lecture_id, student) pairs from applied mark_attendance calls
+
+    # Ledger state
+
+    def latest_ledger(self):
+        if self.ledger_close_seconds > 0:
+            return 1 + int((self._clock() - self._genesis) / self.ledger_close_seconds)
+        return self._ledger_counter
+
+    def _seconds_until_close(self):
+        if self.ledger_close_seconds <= 0:
+            return 0.0
+        elapsed = self._clock() - self._genesis
+        return self.ledger_close_seconds - (elapsed % self.ledger_close_seconds)
+
+    def fund(self, public_key, balance=FRIENDBOT_BALANCE):
+        """
+        Create ``public_key`` like Friendbot would; returns False if it exists
+        """
+        with self._lock:
+            if public_key in self.accounts:
+                return False
+            # New accounts start at <ledger> << 32, as on the real network
+            self.accounts[public_key] = {
+                'sequence': self.latest_ledger() << 32,
+                'balance': Decimal(balance),
+            }
+            return True
+
+    def _account(self, public_key):
+        if public_key not in self.accounts and self.auto_fund:
+            self.fund(public_key)
+        return self.accounts.get(public_key)
+
+    def _account_json(self, public_key, account):
+        return {
+            'id': public_key,
+            'account_id': public_key,
+            'sequence': str(account['sequence']),
+            'subentry_count': 0,
+            'last_modified_ledger': self.latest_ledger(),
+            'thresholds': {'low_threshold': 0, 'med_threshold': 0, 'high_threshold': 0},
+            'flags': {'auth_required': False, 'auth_revocable': False, 'auth_immutable': False},
+            'balances': [{'asset_type': 'native', 'balance': f"{account['balance']:.7f}"}],
+            'signers': [{'key': public_key, 'weight': 1, 'type': 'ed25519_public_key'}],
+            'data': {},
+        }
+
+    # Request handling
+
+    def handle(self, method, url, params=None, data=None, json_data=None):
+        """
+        Answer one HTTP request
+
+        Returns:
+            tuple: ``(Response, delay)`` where ``delay`` is how long the
+            client should wait before returning it
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency * self._rng.uniform(0.5, 1.5) if self.latency else 0.0
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.stats['injected_errors'] += 1
+                if method == 'POST' and urlsplit(url).path.rstrip('/').endswith('/transactions'):
+                    return _problem(504, 'Timeout'), delay
+                return _problem(503, 'Service Unavailable'), delay
+            response, wait_for_close = self._route(method, url, params or {}, data or {}, json_data)
+            if wait_for_close:
+                delay += self._seconds_until_close()
+            response.url = url
+            return response, delay
+
+    def _route(self, method, url, params, data, json_data):
+        parts = urlsplit(url)
+        params = {**{key: values[0] for key, values in parse_qs(parts.query).items()}, **params}
+        path = [segment for segment in parts.path.split('/') if segment]
+
+        if json_data is not None:
+            return self._soroban_rpc(json_data), False
+        if method == 'POST' and path == ['transactions']:
+            return self._submit(data.get('tx', '')), True
+        if method == 'POST' and path == ['transactions_async']:
+            return self._submit_async(data.get('tx', '')), False
+        if method == 'GET':
+            if not path and 'addr' in params:
+                return self._friendbot(params['addr']), False
+            if not path:
+                return self._root(), False
+            if path == ['fee_stats']:
+                return self._fee_stats(), False
+            if len(path) == 2 and path[0] == 'accounts':
+                account = self._account(path[1])
+                if account is None:
+                    return _problem(404, 'Resource Missing'), False
+                return _json_response(200, self._account_json(path[1], account)), False
+            if len(path) == 3 and path[0] == 'accounts' and path[2] == 'transactions':
+                return self._transactions(params, path[1]), False
+            if path == ['transactions']:
+                return self._transactions(params), False
+            if len(path) == 2 and path[0] == 'transactions':
+                record = self.transactions.get(path[1])
+                if record is None or record['ledger'] > self.latest_ledger():
+                    return _problem(404, 'Resource Missing'), False
+                return _json_response(200, record), False
+        return _problem(404, 'Resource Missing'), False
+
+    def _transactions(self, params, public_key=None):
+        include_failed = str(params.get('include_failed', 'false')).lower() == 'true'
+        latest = self.latest_ledger()
+        records = [
+            record for transaction_hash, record in self.transactions.items()
+            if (public_key is None or public_key in self._participants[transaction_hash])
+            and record['ledger'] <= latest and (include_failed or record['successful'])
+        ]
+        descending = params.get('order', 'asc') == 'desc'
+        cursor = params.get('cursor')
+        if cursor == 'now':
+            records = []
+        elif cursor:
+            position = int(cursor)
+            records = [record for record in records
+                       if (int(record['paging_token']) < position if descending
+                           else int(record['paging_token']) > position)]
+        if descending:
+            records.reverse()
+        records = records[:int(params.get('limit', 10))]
+        return _json_response(200, {'_links': {}, '_embedded': {'records': records}})
+
+    def _root(self):
+        ledger = self.latest_ledger()
+        return _json_response(200, {
+            'horizon_version': 'simulator',
+            'core_version': 'simulator',
+            'history_latest_ledger': ledger,
+            'core_latest_ledger': ledger,
+            'network_passphrase': self.network_passphrase,
+            'current_protocol_version': 22,
+        })
+
+    def _fee_stats(self):
+        percentiles = ('p10', 'p20', 'p30', 'p40', 'p50', 'p60', 'p70', 'p80', 'p90', 'p95', 'p99')
+        flat = {name: str(BASE_FEE) for name in percentiles}
+        return _json_response(200, {
+            'last_ledger': str(self.latest_ledger()),
+            'last_ledger_base_fee': str(BASE_FEE),
+            'ledger_capacity_usage': '0.1',
+            'fee_charged': {'max': str(BASE_FEE), 'min': str(BASE_FEE), 'mode': str(BASE_FEE), **flat},
+            'max_fee': {'max': str(BASE_FEE), 'min': str(BASE_FEE), 'mode': str(BASE_FEE), **flat},
+        })
+
+    def _friendbot(self, public_key):
+        if not self.fund(public_key):
+            return _problem(400, 'Bad Request', {'reason': 'account already funded'})
+        return _json_response(200, {'successful': True, 'source_account': public_key})
+
+    def _soroban_rpc(self, request):
+        ledger = self.latest_ledger()
+        results = {
+            'getHealth': {'status': 'healthy', 'latestLedger': ledger, 'oldestLedger': 1,
+                          'ledgerRetentionWindow': 17280},
+            'getLatestLedger': {'id': f"{ledger:064x}", 'protocolVersion': 22, 'sequence': ledger},
+            'getNetwork': {'passphrase': self.network_passphrase, 'protocolVersion': 22},
+            # Contracts are not executed here, so there are never events
+            'getEvents': {'events': [], 'latestLedger': ledger, 'oldestLedger': 1, 'latestLedgerCloseTime': '0',
+                          'oldestLedgerCloseTime': '0', 'cursor': f"{ledger:019d}-0000000000"},
+        }
+        if request.get('method') == 'simulateTransaction':
+            results['simulateTransaction'] = self._simulate((request.get('params') or {}).get('transaction', ''))
+        if request.get('method') not in results:
+            body = {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'error': {'code': -32601, 'message': 'method not found'}}
+        else:
+            body = {'jsonrpc': '2.0', 'id': request.get('id'), 'result': results[request['method']]}
+        return _json_response(200, body)
+
+    def _simulate(self, envelope_xdr):
+        """
+        Quote a contract call: a footprint over the contract instance, fixed
+        resources, source-account authorization and the call's return value
+        """
+        self.stats['simulations'] += 1
+        ledger = self.latest_ledger()
+        try:
+            envelope = parse_transaction_envelope_from_xdr(envelope_xdr, self.network_passphrase)
+            operation, = envelope.transaction.operations
+            invoke_args = operation.host_function.invoke_contract
+        except Exception:
+            return {'error': 'transaction is not a single contract invocation', 'latestLedger': ledger}
+
+        instance_key = xdr.LedgerKey(
+            type=xdr.LedgerEntryType.CONTRACT_DATA,
+            contract_data=xdr.LedgerKeyContractData(
+                contract=invoke_args.contract_address,
+                key=xdr.SCVal(xdr.SCValType.SCV_LEDGER_KEY_CONTRACT_INSTANCE),
+                durability=xdr.ContractDataDurability.PERSISTENT,
+            ),
+        )
+        transaction_data = xdr.SorobanTransactionData(
+            ext=xdr.SorobanTransactionDataExt(0),
+            resources=xdr.SorobanResources(
+                footprint=xdr.LedgerFootprint(read_only=[instance_key], read_write=[]),
+                instructions=xdr.Uint32(1_000_000),
+                disk_read_bytes=xdr.Uint32(2_000),
+                write_bytes=xdr.Uint32(500),
+            ),
+            resource_fee=xdr.Int64(self.soroban_resource_fee),
+        )
+        auth = xdr.SorobanAuthorizationEntry(
+            credentials=xdr.SorobanCredentials(type=xdr.SorobanCredentialsType.SOROBAN_CREDENTIALS_SOURCE_ACCOUNT),
+            root_invocation=xdr.SorobanAuthorizedInvocation(
+                function=xdr.SorobanAuthorizedFunction(
+                    type=xdr.SorobanAuthorizedFunctionType.SOROBAN_AUTHORIZED_FUNCTION_TYPE_CONTRACT_FN,
+                    contract_fn=invoke_args,
+                ),
+                sub_invocations=[],
+            ),
+        )
+        function = invoke_args.function_name.sc_symbol.decode()
+        if function == 'get_attendance':
+            lecture_id, student = (scval.to_native(arg) for arg in invoke_args.args)
+            result, auth_entries = scval.to_bool((lecture_id, student.address) in self.contract_attendance), []
+        else:
+            result, auth_entries = scval.to_void(), [auth.to_xdr()]
+        return {
+            'transactionData': transaction_data.to_xdr(),
+            'minResourceFee': str(self.soroban_resource_fee),
+            'results': [{'auth': auth_entries, 'xdr': result.to_xdr()}],
+            'latestLedger': ledger,
+        }
+
+    # Transactions
+
+    def _submit_async(self, envelope_xdr):
+        # Queue admission only: a transaction whose operations fail is still
+        # included (as failed) and only shows up as such once it is looked up.
+        self.stats['submitted'] += 1
+        try:
+            envelope = parse_transaction_envelope_from_xdr(envelope_xdr, self.network_passphrase)
+        except Exception:
+            return _json_response(400, {'hash': '', 'tx_status': 'ERROR', 'error_result_xdr': ''})
+        transaction_hash = envelope.hash_hex()
+        try:
+            self._apply(envelope, transaction_hash)
+        except _SubmissionError as e:
+            if e.transaction_code != 'tx_failed':
+                self.stats['rejected'] += 1
+                return _json_response(400, {'hash': transaction_hash, 'tx_status': 'ERROR',
+                                            'error_result_xdr': e.result_xdr()})
+        self.stats['applied'] += 1
+        return _json_response(201, {'hash': transaction_hash, 'tx_status': 'PENDING'})
+
+    def _submit(self, envelope_xdr):
+        self.stats['submitted'] += 1
+        try:
+            envelope = parse_transaction_envelope_from_xdr(envelope_xdr, self.network_passphrase)
+        except Exception:
+            return _problem(400, 'Transaction Malformed', {'envelope_xdr': envelope_xdr})
+
+        transaction_hash = envelope.hash_hex()
+        try:
+            self._apply(envelope, transaction_hash)
+        except _SubmissionError as e:
+            self.stats['rejected'] += 1
+            result_codes = {'transaction': e.transaction_code}
+            if e.operation_codes is not None:
+                result_codes['operations'] = e.operation_codes
+            return _problem(400, 'Transaction Failed', {
+                'hash': transaction_hash,
+                'envelope_xdr': envelope_xdr,
+                'result_xdr': e.result_xdr(),
+                'result_codes': result_codes,
+            })
+        self.stats['applied'] += 1
+        return _json_response(200, self.transactions[transaction_hash])
+
+    def _verify_signed(self, envelope, signers):
+        transaction_hash = envelope.hash()
+        for public_key in signers:
+            keypair = Keypair.from_public_key(public_key)
+            if not any(self._signature_matches(keypair, transaction_hash, signature)
+                       for signature in envelope.signatures):
+                return False
+        return True
+
+    @staticmethod
+    def _signature_matches(keypair, transaction_hash, signature):
+        try:
+            keypair.verify(transaction_hash, signature.signature)
+        except BadSignatureError:
+            return False
+        return True
+
+    def _apply(self, envelope, transaction_hash):
+        """
+        Validate ``envelope`` and apply it, recording it under ``transaction_hash``
+        """
+        fee_source = None
+        max_fee = None
+        if isinstance(envelope, FeeBumpTransactionEnvelope):
+            fee_bump = envelope.transaction
+            fee_source = fee_bump.fee_source.account_id
+            inner_envelope = fee_bump.inner_transaction_envelope
+            max_fee = fee_bump.base_fee * (len(inner_envelope.transaction.operations) + 1)
+            if self._account(fee_source) is None:
+                raise _SubmissionError('tx_fee_bump_inner_failed')
+            if not self._verify_signed(envelope, [fee_source]):
+                raise _SubmissionError('tx_bad_auth')
+            envelope = inner_envelope
+
+        transaction = envelope.transaction
+        source = transaction.source.account_id
+        account = self._account(source)
+        if account is None:
+            raise _SubmissionError('tx_no_source_account')
+
+        time_bounds = transaction.preconditions.time_bounds if transaction.preconditions else None
+        now = int(time.time())
+        if time_bounds and time_bounds.max_time and now > time_bounds.max_time:
+            raise _SubmissionError('tx_too_late')
+        if time_bounds and time_bounds.min_time and now < time_bounds.min_time:
+            raise _SubmissionError('tx_too_early')
+
+        if transaction.sequence != account['sequence'] + 1:
+            raise _SubmissionError('tx_bad_seq')
+        operations = transaction.operations
+        if max_fee is None:
+            max_fee = transaction.fee
+        if max_fee < BASE_FEE * (len(operations) + (1 if fee_source else 0)):
+            raise _SubmissionError('tx_insufficient_fee')
+
+        signers = {source} | {op.source.account_id for op in operations if op.source is not None}
+        if fee_source is None and not self._verify_signed(envelope, signers):
+            raise _SubmissionError('tx_bad_auth')
+        if fee_source is not None and not self._verify_signed(envelope, signers):
+            raise _SubmissionError('tx_fee_bump_inner_failed')
+
+        # Like the network, a failed transaction still consumes its sequence and fee
+        fee_charged = BASE_FEE * len(operations) + (BASE_FEE if fee_source else 0)
+        fee_payer = self.accounts[fee_source or source]
+        account['sequence'] = transaction.sequence
+        fee_payer['balance'] -= Decimal(fee_charged) / Decimal(10 ** 7)
+
+        operation_codes = [self._check_operation(op, source, transaction) for op in operations]
+        successful = all(code == 'op_success' for code in operation_codes)
+        if successful:
+            for operation in operations:
+                self._apply_operation(operation, source)
+
+        if self.ledger_close_seconds <= 0:
+            self._ledger_counter += 1
+            ledger = self._ledger_counter
+        else:
+            ledger = self.latest_ledger() + 1
+        memo_type, memo = 'none', None
+        if getattr(transaction.memo, 'memo_text', None) is not None:
+            memo_type, memo = 'text', transaction.memo.memo_text.decode()
+        elif getattr(transaction.memo, 'memo_hash', None) is not None:
+            # Horizon returns hash memos base64-encoded
+            memo_type, memo = 'hash', base64.b64encode(transaction.memo.memo_hash).decode()
+        self._paging_counter += 1
+        record = self.transactions[transaction_hash] = {
+            'id': transaction_hash,
+            'paging_token': str(self._paging_counter),
+            'hash': transaction_hash,
+            'successful': successful,
+            'ledger': ledger,
+            'created_at': datetime.now(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'source_account': source,
+            'source_account_sequence': str(transaction.sequence),
+            'fee_account': fee_source or source,
+            'fee_charged': str(fee_charged),
+            'max_fee': str(max_fee),
+            'operation_count': len(operations),
+            'envelope_xdr': envelope.to_xdr(),
+            'memo_type': memo_type,
+            'memo': memo,
+        }
+        participants = {source, fee_source or source}
+        for operation in operations:
+            if operation.source is not None:
+                participants.add(operation.source.account_id)
+            if isinstance(operation, Payment):
+                participants.add(operation.destination.account_id)
+            elif isinstance(operation, CreateAccount):
+                participants.add(operation.destination)
+        self._participants[transaction_hash] = participants
+        if fee_source:
+            record['inner_transaction'] = {'hash': envelope.hash_hex(), 'max_fee': str(transaction.fee)}
+        if not successful:
+            raise _SubmissionError('tx_failed', operation_codes, operations, fee_charged)
+
+    def _check_operation(self, operation, transaction_source, transaction):
+        source = self.accounts.get(operation.source.account_id if operation.source else transaction_source)
+        if isinstance(operation, InvokeHostFunction):
+            if transaction.soroban_data is None:
+                return 'op_malformed'
+            if transaction.soroban_data.resource_fee.int64 < self.soroban_resource_fee:
+                return 'op_insufficient_refundable_fee'
+        if isinstance(operation, Payment):
+            if operation.destination.account_id not in self.accounts:
+                return 'op_no_destination'
+            if source['balance'] < Decimal(operation.amount):
+                return 'op_underfunded'
+        if isinstance(operation, CreateAccount):
+            if operation.destination in self.accounts:
+                return 'op_already_exists'
+            if source['balance'] < Decimal(operation.starting_balance):
+                return 'op_underfunded'
+        return 'op_success'
+
+    def _apply_operation(self, operation, transaction_source):
+        source = self.accounts[operation.source.account_id if operation.source else transaction_source]
+        if isinstance(operation, Payment):
+            source['balance'] -= Decimal(operation.amount)
+            self.accounts[operation.destination.account_id]['balance'] += Decimal(operation.amount)
+        elif isinstance(operation, InvokeHostFunction):
+            invoke_args = operation.host_function.invoke_contract
+            if invoke_args is not None and invoke_args.function_name.sc_symbol == b'mark_attendance':
+                student, lecture_id = (scval.to_native(arg) for arg in invoke_args.args[:2])
+                self.contract_attendance.add((lecture_id, student.address))
+        elif isinstance(operation, CreateAccount):
+            source['balance'] -= Decimal(operation.starting_balance)
+            self.accounts[operation.destination] = {
+                'sequence': self.latest_ledger() << 32,
+                'balance': Decimal(operation.starting_balance),
+            }
+
+
+def _stream_page(response, params):
+    """
+    Split one streamed response into its records and the params for the next page
+
+    Returns ``None`` as the params once the stream has caught up.
+    """
+    if response.status_code >= 400:
+        raise StreamClientError(params.get('cursor'), "Failed to get stream message.")
+    body = response.json()
+    if '_embedded' not in body:
+        return [body], None  # A single resource streams its current state once
+    records = body['_embedded']['records']
+    if not records:
+        return [], None
+    return records, {**params, 'cursor': records[-1]['paging_token']}
+
+
+class SimulatorClient(BaseSyncClient):
+    """
+    Synchronous SDK HTTP client backed by a ``LedgerSimulator``
+
+    Without an explicit simulator the process-wide one is used, so
+    ``reset_simulator`` also resets clients that are already pooled.
+    """
+
+    def __init__(self, simulator=None, sleep=time.sleep):
+        self._simulator = simulator
+        self._sleep = sleep
+
+    @property
+    def simulator(self):
+        return self._simulator or get_simulator()
+
+    def _call(self, method, url, params=None, data=None, json_data=None):
+        response, delay = self.simulator.handle(method, url, params=params, data=data, json_data=json_data)
+        if delay:
+            self._sleep(delay)
+        return response
+
+    def get(self, url, params=None):
+        return self._call('GET', url, params=params)
+
+    def post(self, url, data=None, json_data=None):
+        return self._call('POST', url, data=data, json_data=json_data)
+
+    def stream(self, url, params=None):
+        params = dict(params or {})
+        while params is not None:
+            records, params = _stream_page(self._call('GET', url, params=params), params)
+            yield from records
+
+    def close(self):
+        pass
+
+
+class AsyncSimulatorClient(BaseAsyncClient):
+    """
+    Asynchronous SDK HTTP client backed by a ``LedgerSimulator``
+    """
+
+    def __init__(self, simulator=None):
+        self._simulator = simulator
+
+    @property
+    def simulator(self):
+        return self._simulator or get_simulator()
+
+    async def _call(self, method, url, params=None, data=None, json_data=None):
+        response, delay = self.simulator.handle(method, url, params=params, data=data, json_data=json_data)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
+
+    async def get(self, url, params=None):
+        return await self._call('GET', url, params=params)
+
+    async def post(self, url, data=None, json_data=None):
+        return await self._call('POST', url, data=data, json_data=json_data)
+
+    async def stream(self, url, params=None):
+        params = dict(params or {})
+        while params is not None:
+            records, params = _stream_page(await self._call('GET', url, params=params), params)
+            for record in records:
+                yield record
+
+    async def close(self):
+        pass
+
+
+_simulator = None
+_simulator_lock = threading.Lock()
+
+
+def simulator_enabled():
+    return settings.STELLAR_SIMULATOR
+
+
+def get_simulator():
+    """
+    Return the process-wide simulator, created from settings on first use
+    """
+    global _simulator
+    if _simulator is None:
+        with _simulator_lock:
+            if _simulator is None:
+                from .stellar_helper import get_network_passphrase
+                _simulator = LedgerSimulator(
+                    network_passphrase=get_network_passphrase(),
+                    latency=settings.STELLAR_SIMULATOR_LATENCY,
+                    error_rate=settings.STELLAR_SIMULATOR_ERROR_RATE,
+                    ledger_close_seconds=settings.STELLAR_SIMULATOR_LEDGER_CLOSE,
+                    seed=settings.STELLAR_SIMULATOR_SEED,
+                    auto_fund=settings.STELLAR_SIMULATOR_AUTO_FUND,
+                )
+    return _simulator
+
+
+def reset_simulator():
+    """
+    Drop the simulated ledger; the next request starts a fresh one from settings
+    """
+    global _simulator
+    with _simulator_lock:
+        _simulator = None
@@ -0,0 +1,151 @@
+import base64
+import json
+from datetime import date, time, timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from stellar_sdk import Keypair
+
+from attendance import merkle
+from attendance.anchoring import anchor_pending_sessions, anchor_session, verify_anchored
+from attendance.models import (Attendance, AttendanceAnchor, AttendanceSession, BlockchainOutbox,
+                               Course, Enrollment, Lecture, User)
+from attendance.stellar_clients import close_clients
+from attendance.stellar_helper import StellarHelper
+from attendance.stellar_simulator import get_simulator, reset_simulator
+
+
+class MerkleTreeTests(TestCase):
+    """Test cases for Merkle roots and inclusion proofs"""
+
+    def test_every_proof_verifies(self):
+        """Test that each leaf's proof leads to the root for balanced and unbalanced trees"""
+        for size in range(1, 10):
+            leaves = [merkle.leaf_hash(f'record-{i}') for i in range(size)]
+            root, proofs = merkle.build_tree(leaves)
+            for leaf, proof in zip(leaves, proofs):
+                self.assertTrue(merkle.verify_proof(leaf, proof, root.hex()))
+
+    def test_tampered_leaf_or_proof_fails(self):
+        """Test that a changed record or proof step does not verify"""
+        leaves = [merkle.leaf_hash(f'record-{i}') for i in range(5)]
+        root, proofs = merkle.build_tree(leaves)
+        self.assertFalse(merkle.verify_proof(merkle.leaf_hash('record-9'), proofs[0], root))
+        bad_proof = [['R' if side == 'L' else 'L', sibling] for side, sibling in proofs[0]]
+        self.assertFalse(merkle.verify_proof(leaves[0], bad_proof, root))
+
+    def test_single_leaf_is_its_own_root(self):
+        """Test that a one-record tree has the leaf as root and an empty proof"""
+        leaf = merkle.leaf_hash('only')
+        self.assertEqual(merkle.build_tree([leaf]), (leaf, [[]]))
+
+
+@override_settings(STELLAR_SIMULATOR=True, STELLAR_CONTRACT_ID='', STELLAR_SIMULATOR_LATENCY=0.0,
+                   STELLAR_SIMULATOR_ERROR_RATE=0.0, STELLAR_SIMULATOR_LEDGER_CLOSE=0.0,
+                   STELLAR_FEE_STATS_BACKGROUND=False, STELLAR_CHANNELS_ENABLED=False,
+                   STELLAR_ASYNC_SUBMISSION=False, STELLAR_ATTENDANCE_ANCHORING='merkle')
+class MerkleAnchoringTests(TestCase):
+    """Test cases for anchoring a session's check-ins as one Merkle root"""
+
+    def setUp(self):
+        cache.clear()
+        close_clients()
+        reset_simulator()
+        teacher_keys = Keypair.random()
+        self.teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True,
+                                                stellar_seed=teacher_keys.secret,
+                                                stellar_public_key=teacher_keys.public_key)
+        course = Course.objects.create(name='Physics', code='PHY101', teacher=self.teacher)
+        self.lecture = Lecture.objects.create(course=course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        self.session = AttendanceSession.objects.create(lecture=self.lecture, nonce='abc123',
+                                                        end_time=timezone.now() + timedelta(minutes=15),
+                                                        blockchain_verified=True)
+        self.students = []
+        for i in range(5):
+            keys = Keypair.random()
+            student = User.objects.create_user(username=f'student{i}', password='pass12345', is_student=True,
+                                               stellar_seed=keys.secret, stellar_public_key=keys.public_key)
+            Enrollment.objects.create(student=student, course=course, roll_number=str(i))
+            self.students.append(student)
+
+    def tearDown(self):
+        close_clients()
+        reset_simulator()
+        cache.clear()
+
+    def scan(self, student):
+        self.client.force_login(student)
+        qr_data = json.dumps({'l': self.lecture.id, 'n': 'abc123',
+                              'e': (timezone.now() + timedelta(minutes=5)).isoformat()})
+        return self.client.post(reverse('process_attendance'), {'qr_data': qr_data}).json()
+
+    def test_session_is_anchored_in_one_transaction(self):
+        """Test that check-ins queue nothing and closing the session publishes a single root"""
+        for student in self.students:
+            self.assertTrue(self.scan(student)['success'])
+        self.assertFalse(BlockchainOutbox.objects.filter(kind=BlockchainOutbox.MARK_ATTENDANCE).exists())
+
+        self.client.force_login(self.teacher)
+        self.client.get(reverse('close_attendance_session', args=[self.session.pk]))
+        anchor = AttendanceAnchor.objects.get()
+        self.assertEqual(anchor.leaf_count, 5)
+
+        transactions_before = len(get_simulator().transactions)
+        call_command('process_blockchain_outbox', '--once', '--concurrency', '1', stdout=StringIO())
+        # The session close and the anchor, for all five check-ins
+        self.assertEqual(len(get_simulator().transactions) - transactions_before, 2)
+
+        anchor.refresh_from_db()
+        published = get_simulator().transactions[anchor.transaction_hash]
+        self.assertEqual(published['memo_type'], 'hash')
+        self.assertEqual(base64.b64decode(published['memo']).hex(), anchor.merkle_root)
+        for attendance in Attendance.objects.select_related('student', 'anchor'):
+            self.assertTrue(attendance.blockchain_verified)
+            self.assertEqual(attendance.transaction_hash, anchor.transaction_hash)
+            self.assertTrue(verify_anchored(attendance))
+            self.assertTrue(StellarHelper.verify_attendance(self.lecture.id, attendance.student.stellar_public_key))
+
+    def test_interval_anchoring_only_covers_new_rows(self):
+        """Test that each round anchors the rows added since the previous one"""
+        for student in self.students[:3]:
+            Attendance.objects.create(student=student, lecture=self.lecture, session=self.session)
+        call_command('anchor_attendance', '--once', stdout=StringIO())
+        Attendance.objects.create(student=self.students[3], lecture=self.lecture, session=self.session)
+
+        self.assertEqual([anchor.leaf_count for anchor in anchor_pending_sessions()], [1])
+        self.assertEqual(sorted(AttendanceAnchor.objects.values_list('leaf_count', flat=True)), [1, 3])
+        self.assertIsNone(anchor_session(self.session))
+
+    def test_tampered_record_does_not_verify(self):
+        """Test that a row changed after anchoring no longer matches the root"""
+        attendance = Attendance.objects.create(student=self.students[0], lecture=self.lecture, session=self.session)
+        Attendance.objects.create(student=self.students[1], lecture=self.lecture, session=self.session)
+        anchor = anchor_session(self.session)
+        AttendanceAnchor.objects.filter(pk=anchor.pk).update(anchored_at=timezone.now())
+
+        attendance = Attendance.objects.select_related('student', 'session', 'anchor').get(pk=attendance.pk)
+        self.assertTrue(verify_anchored(attendance))
+        attendance.student = self.students[2]
+        self.assertFalse(verify_anchored(attendance))
+
+    def test_verification_reads_the_published_root(self):
+        """Test that an anchored row only verifies against the root its transaction carries on-chain"""
+        Attendance.objects.create(student=self.students[0], lecture=self.lecture, session=self.session)
+        anchor = anchor_session(self.session)
+        call_command('process_blockchain_outbox', '--once', '--concurrency', '1', stdout=StringIO())
+        anchor.refresh_from_db()
+        public_key = self.students[0].stellar_public_key
+        self.assertTrue(StellarHelper.verify_attendance(self.lecture.id, public_key))
+
+        # A local record pointing at a transaction that published something else does not count
+        cache.clear()
+        other = StellarHelper.mark_attendance(self.teacher.stellar_seed, self.lecture.id, 'abc123')
+        AttendanceAnchor.objects.filter(pk=anchor.pk).update(transaction_hash=other['hash'])
+        self.assertFalse(StellarHelper.verify_attendance(self.lecture.id, public_key))
+        AttendanceAnchor.objects.filter(pk=anchor.pk).update(transaction_hash='f' * 64, anchored_at=timezone.now())
+        self.assertFalse(StellarHelper.verify_attendance(self.lecture.id, public_key))
@@ -0,0 +1,97 @@
+from datetime import date, time, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from attendance.checkin import ALREADY_MARKED, NO_SESSION, NOT_ENROLLED, CheckInError, check_in
+from attendance.models import Attendance, AttendanceSession, BlockchainOutbox, Course, Enrollment, Lecture, User
+from attendance.roster import get_roster, load_roster
+
+
+class CheckInTests(TestCase):
+    """Test cases for the roster-authorized check-in path"""
+
+    def setUp(self):
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        course = Course.objects.create(name='Physics', code='PHY101', teacher=teacher)
+        self.lecture = Lecture.objects.create(course=course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        self.session = AttendanceSession.objects.create(lecture=self.lecture, nonce='abc123',
+                                                        end_time=timezone.now() + timedelta(minutes=10))
+        self.student = User.objects.create_user(username='student', password='pass12345', is_student=True)
+        Enrollment.objects.create(student=self.student, course=course, roll_number='1')
+        self.data = {'lecture_id': self.lecture.id, 'nonce': 'abc123'}
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_check_in_runs_one_check_and_the_inserts(self):
+        """Test that with the roster cached a check-in runs one re-check and the attendance and outbox inserts"""
+        load_roster(self.session)
+        with CaptureQueriesContext(connection) as queries:
+            roster = check_in(self.student, self.data)
+        statements = [query['sql'].split()[0].upper() for query in queries.captured_queries
+                      if 'SAVEPOINT' not in query['sql'].upper()]
+        self.assertEqual(statements, ['SELECT', 'INSERT', 'INSERT'])
+        self.assertEqual(roster.lecture_title, 'Optics')
+        attendance = Attendance.objects.get()
+        self.assertEqual(attendance.session, self.session)
+        self.assertTrue(BlockchainOutbox.objects.filter(attendance=attendance, lecture=self.lecture).exists())
+
+    def test_duplicate_is_rejected_by_the_constraint(self):
+        """Test that a second scan fails its insert and is reported as already marked"""
+        check_in(self.student, self.data)
+        with self.assertRaisesMessage(CheckInError, ALREADY_MARKED):
+            check_in(self.student, self.data)
+        self.assertEqual(BlockchainOutbox.objects.count(), 1)
+
+    def test_authorization_needs_no_queries(self):
+        """Test that wrong sessions and unenrolled students are refused from the cached roster"""
+        load_roster(self.session)
+        outsider = User.objects.create_user(username='outsider', password='pass12345', is_student=True)
+        with self.assertNumQueries(0):
+            with self.assertRaisesMessage(CheckInError, NOT_ENROLLED):
+                check_in(outsider, self.data)
+            with self.assertRaisesMessage(CheckInError, NO_SESSION):
+                check_in(self.student, {'lecture_id': self.lecture.id, 'nonce': 'wrong'})
+
+    def test_unknown_session_and_unenrolled_student(self):
+        """Test that a wrong nonce or a student outside the course is refused"""
+        with self.assertRaisesMessage(CheckInError, NO_SESSION):
+            check_in(self.student, {'lecture_id': self.lecture.id, 'nonce': 'wrong'})
+        outsider = User.objects.create_user(username='outsider', password='pass12345', is_student=True)
+        with self.assertRaisesMessage(CheckInError, NOT_ENROLLED):
+            check_in(outsider, self.data)
+
+    def test_enrollment_changes_and_close_drop_the_roster(self):
+        """Test that enrolling a student or closing the session rebuilds or removes the roster"""
+        load_roster(self.session)
+        newcomer = User.objects.create_user(username='newcomer', password='pass12345', is_student=True)
+        Enrollment.objects.create(student=newcomer, course=self.lecture.course, roll_number='2')
+        self.assertTrue(get_roster(self.lecture.id).is_enrolled(newcomer.pk))
+
+        self.client.force_login(self.lecture.course.teacher)
+        self.client.get(reverse('close_attendance_session', args=[self.session.pk]))
+        self.assertIsNone(get_roster(self.lecture.id))
+
+    def test_stale_roster_is_rechecked_at_insert(self):
+        """Test that a roster another worker did not drop cannot record a closed session or an unenrolled student"""
+        load_roster(self.session)
+        # Done by another worker with its own cache: the roster here is not dropped
+        with mock.patch('attendance.signals.drop_course_rosters'):
+            Enrollment.objects.filter(student=self.student).delete()
+        with self.assertRaisesMessage(CheckInError, NOT_ENROLLED):
+            check_in(self.student, self.data)
+
+        Enrollment.objects.create(student=self.student, course=self.lecture.course, roll_number='1')
+        load_roster(self.session)
+        AttendanceSession.objects.filter(pk=self.session.pk).update(is_active=False)
+        with self.assertRaisesMessage(CheckInError, NO_SESSION):
+            check_in(self.student, self.data)
+        self.assertFalse(Attendance.objects.exists())
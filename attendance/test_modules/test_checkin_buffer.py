@@ -0,0 +1,124 @@
+import json
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from attendance import checkin_buffer
+from attendance.checkin import ALREADY_MARKED, NO_SESSION, CheckInError
+from attendance.models import Attendance, AttendanceSession, BlockchainOutbox, Course, Enrollment, Lecture, User
+
+
+class CheckInBufferTests(TestCase):
+    """Test cases for write-behind check-ins"""
+
+    def setUp(self):
+        cache.clear()
+        self.buffer_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(CHECKIN_WRITE_BEHIND=True, CHECKIN_BUFFER_DIR=self.buffer_dir,
+                                                   CHECKIN_BUFFER_FSYNC=False, CHECKIN_FLUSH_BATCH_SIZE=2,
+                                                   QR_TOKEN_MODE='static')
+        self.settings_override.enable()
+
+        teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        self.course = Course.objects.create(name='Physics', code='PHY101', teacher=teacher)
+        self.lecture = Lecture.objects.create(course=self.course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        self.session = AttendanceSession.objects.create(lecture=self.lecture, nonce='abc123',
+                                                        end_time=timezone.now() + timedelta(minutes=10))
+        self.students = []
+        for i in range(5):
+            student = User.objects.create_user(username=f'student{i}', password='pass12345', is_student=True)
+            Enrollment.objects.create(student=student, course=self.course, roll_number=str(i))
+            self.students.append(student)
+        self.data = {'lecture_id': self.lecture.id, 'nonce': 'abc123'}
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.buffer_dir, ignore_errors=True)
+        cache.clear()
+
+    def test_scan_is_journaled_then_flushed_in_batches(self):
+        """Test that scans answer without inserting and the flusher persists them with outbox entries"""
+        self.client.force_login(self.students[0])
+        qr_data = json.dumps({'l': self.lecture.id, 'n': 'abc123',
+                              'e': (timezone.now() + timedelta(minutes=5)).isoformat()})
+        response = self.client.post(reverse('process_attendance'), {'qr_data': qr_data}).json()
+        self.assertTrue(response['success'])
+        self.assertEqual(response['lecture'], 'Optics')
+        for student in self.students[1:]:
+            checkin_buffer.buffer_check_in(student, self.data)
+        self.assertFalse(Attendance.objects.exists())
+        self.assertEqual(checkin_buffer.pending_count(), 5)
+
+        call_command('flush_checkin_buffer', '--once', stdout=StringIO())
+        self.assertEqual(Attendance.objects.filter(session=self.session).count(), 5)
+        self.assertEqual(BlockchainOutbox.objects.filter(kind=BlockchainOutbox.MARK_ATTENDANCE).count(), 5)
+        self.assertEqual(BlockchainOutbox.objects.first().payload, {'nonce': 'abc123'})
+        self.assertEqual(checkin_buffer.pending_count(), 0)
+
+    def test_cached_validation_needs_no_queries(self):
+        """Test that once the session is cached a scan is journaled without touching the database"""
+        checkin_buffer.buffer_check_in(self.students[0], self.data)
+        with self.assertNumQueries(0):
+            checkin_buffer.buffer_check_in(self.students[1], self.data)
+            with self.assertRaisesMessage(CheckInError, ALREADY_MARKED):
+                checkin_buffer.buffer_check_in(self.students[1], self.data)
+            with self.assertRaisesMessage(CheckInError, NO_SESSION):
+                checkin_buffer.buffer_check_in(self.students[2], {'lecture_id': self.lecture.id, 'nonce': 'x'})
+
+    def test_reflushing_after_a_crash_is_harmless(self):
+        """Test that a journal flushed twice and a torn last line do not duplicate rows or outbox entries"""
+        for student in self.students[:3]:
+            checkin_buffer.buffer_check_in(student, self.data)
+        journal = Path(self.buffer_dir) / checkin_buffer.JOURNAL
+        contents = journal.read_bytes()
+        checkin_buffer.flush()
+
+        # As if the process died after committing but before deleting the file
+        leftover = Path(self.buffer_dir) / f'checkins.1.1{checkin_buffer.FLUSHING_SUFFIX}'
+        leftover.write_bytes(contents + b'{"student": 9')
+        self.assertEqual(checkin_buffer.flush(), 3)
+        self.assertEqual(Attendance.objects.count(), 3)
+        self.assertEqual(BlockchainOutbox.objects.count(), 3)
+        self.assertFalse(leftover.exists())
+
+    def test_closing_the_session_stops_buffered_scans(self):
+        """Test that closing a session drops the cached state so later scans are refused"""
+        checkin_buffer.buffer_check_in(self.students[0], self.data)
+        self.client.force_login(self.course.teacher)
+        self.client.get(reverse('close_attendance_session', args=[self.session.pk]))
+        with self.assertRaisesMessage(CheckInError, NO_SESSION):
+            checkin_buffer.buffer_check_in(self.students[1], self.data)
+
+    def test_flush_drops_scans_a_stale_roster_accepted(self):
+        """Test that scans after the session ended or from unenrolled students are not persisted"""
+        on_time, unenrolled, late = self.students[:3]
+        checkin_buffer.buffer_check_in(on_time, self.data)
+        # Another worker closed the session and unenrolled a student; this cache never heard
+        with mock.patch('attendance.signals.drop_course_rosters'):
+            Enrollment.objects.filter(student=unenrolled).delete()
+        checkin_buffer.buffer_check_in(unenrolled, self.data)
+        AttendanceSession.objects.filter(pk=self.session.pk).update(is_active=False, end_time=timezone.now())
+        checkin_buffer.buffer_check_in(late, self.data)
+
+        with self.assertLogs('attendance.checkin_buffer', 'WARNING'):
+            checkin_buffer.flush()
+        self.assertEqual(list(Attendance.objects.values_list('student', flat=True)), [on_time.pk])
+        self.assertEqual(BlockchainOutbox.objects.count(), 1)
+
+    def test_flushed_rows_keep_the_scan_time(self):
+        """Test that a buffered check-in is stored with the time of the scan, not of the flush"""
+        scanned_at = timezone.now() - timedelta(minutes=2)
+        with mock.patch('attendance.checkin_buffer.timezone.now', return_value=scanned_at):
+            checkin_buffer.buffer_check_in(self.students[0], self.data)
+        checkin_buffer.flush()
+        self.assertEqual(Attendance.objects.get().timestamp, scanned_at)
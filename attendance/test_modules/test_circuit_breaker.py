@@ -0,0 +1,158 @@
+import json
+from datetime import date, time, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from attendance import outbox
+from attendance.circuit_breaker import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError,
+                                        get_breaker, reset_breakers)
+from attendance.models import AttendanceSession, BlockchainOutbox, Course, Enrollment, Lecture, User
+from attendance.stellar_helper import _failure
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fail():
+    raise ConnectionError("connection refused")
+
+
+@override_settings(STELLAR_BREAKER_ENABLED=True, STELLAR_BREAKER_WINDOW=10, STELLAR_BREAKER_MIN_CALLS=4,
+                   STELLAR_BREAKER_FAILURE_RATE=0.5, STELLAR_BREAKER_SLOW_CALL_SECONDS=2.0,
+                   STELLAR_BREAKER_SLOW_CALL_RATE=0.75, STELLAR_BREAKER_OPEN_SECONDS=30,
+                   STELLAR_BREAKER_HALF_OPEN_CALLS=2)
+class CircuitBreakerTests(TestCase):
+    """Test cases for the per-endpoint circuit breaker"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker('horizon', clock=self.clock)
+
+    def trip(self):
+        for _ in range(4):
+            with self.assertRaises(ConnectionError):
+                self.breaker.call(fail)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_opens_on_failure_rate(self):
+        """Test that the breaker opens once enough calls in the window fail"""
+        self.breaker.call(lambda: 'ok')
+        self.breaker.call(lambda: 'ok')
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(fail)
+        self.assertEqual(self.breaker.state, CLOSED)
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(fail)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_opens_on_slow_calls(self):
+        """Test that successful but slow calls open the breaker too"""
+        def slow():
+            self.clock.now += 3
+            return 'ok'
+
+        for _ in range(3):
+            self.breaker.call(slow)
+        self.breaker.call(lambda: 'ok')
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_client_errors_do_not_count(self):
+        """Test that 4xx answers count as successes and 5xx as failures"""
+        for _ in range(4):
+            self.breaker.call(lambda: SimpleNamespace(status_code=400))
+        self.assertEqual(self.breaker.state, CLOSED)
+        for _ in range(4):
+            self.breaker.call(lambda: SimpleNamespace(status_code=503))
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_open_breaker_fails_fast(self):
+        """Test that calls are rejected without running while the breaker is open"""
+        self.trip()
+        called = mock.Mock()
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.call(called)
+        called.assert_not_called()
+        self.assertEqual(raised.exception.retry_after, 30)
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+
+    def test_half_open_trials_close_the_breaker(self):
+        """Test that successful trial calls after the open period close the breaker"""
+        self.trip()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.breaker.call(lambda: 'ok')
+        self.breaker.call(lambda: 'ok')
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_failure_reopens(self):
+        """Test that a failed trial call opens the breaker for another period"""
+        self.trip()
+        self.clock.now += 30
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(fail)
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(lambda: 'ok')
+
+    def test_failure_result_marks_chain_pending(self):
+        """Test that helpers report an open breaker as pending rather than as an error"""
+        self.assertEqual(_failure(CircuitOpenError('horizon', 12))['retry_after'], 12)
+        self.assertTrue(_failure(CircuitOpenError('horizon', 12))['chain_pending'])
+        self.assertEqual(_failure(ValueError('bad seed')), {'error': 'bad seed'})
+
+
+@override_settings(STELLAR_CONTRACT_ID='', STELLAR_BREAKER_ENABLED=True, STELLAR_BREAKER_OPEN_SECONDS=30)
+class CircuitBreakerOutboxTests(TestCase):
+    """Test cases for queued writes while the chain is unavailable"""
+
+    def setUp(self):
+        reset_breakers()
+        self.teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        self.student = User.objects.create_user(username='student', password='pass12345', is_student=True,
+                                                stellar_seed='S' * 56, stellar_public_key='G' * 56)
+        self.course = Course.objects.create(name='Physics', code='PHY101', teacher=self.teacher)
+        Enrollment.objects.create(student=self.student, course=self.course, roll_number='1')
+        self.lecture = Lecture.objects.create(course=self.course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        AttendanceSession.objects.create(lecture=self.lecture, nonce='abc123',
+                                         end_time=timezone.now() + timedelta(minutes=15))
+
+    def tearDown(self):
+        reset_breakers()
+
+    def test_open_breaker_does_not_use_an_attempt(self):
+        """Test that an entry rejected by the breaker is put back without counting the attempt"""
+        outbox.enqueue(BlockchainOutbox.MARK_ATTENDANCE, self.student, lecture=self.lecture,
+                       nonce='abc123')
+        with mock.patch('attendance.outbox.StellarHelper.mark_attendance',
+                        side_effect=CircuitOpenError('horizon', 20)):
+            outbox.process_entry(outbox.claim_batch(10)[0])
+
+        entry = BlockchainOutbox.objects.get()
+        self.assertEqual(entry.status, BlockchainOutbox.PENDING)
+        self.assertEqual(entry.attempts, 0)
+        self.assertGreater(entry.available_at, timezone.now() + timedelta(seconds=15))
+        self.assertIn('Circuit breaker', entry.last_error)
+
+    def test_check_in_reports_chain_pending(self):
+        """Test that check-in still succeeds locally and says the chain is unavailable"""
+        breaker = get_breaker('https://horizon-testnet.stellar.org')
+        with override_settings(STELLAR_BREAKER_MIN_CALLS=1, STELLAR_HORIZON_URL=breaker.name):
+            breaker.record(True, 0.0)
+            self.client.force_login(self.student)
+            qr_data = json.dumps({'l': self.lecture.id, 'n': 'abc123',
+                                  'e': (timezone.now() + timedelta(minutes=5)).isoformat()})
+            data = self.client.post(reverse('process_attendance'), {'qr_data': qr_data}).json()
+
+        self.assertTrue(data['success'])
+        self.assertTrue(data['chain_pending'])
+        self.assertTrue(BlockchainOutbox.objects.filter(kind=BlockchainOutbox.MARK_ATTENDANCE).exists())
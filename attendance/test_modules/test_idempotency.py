@@ -0,0 +1,93 @@
+import json
+from datetime import date, time, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from attendance.idempotency import REPLAYED_HEADER, idempotency_stats, request_key, reset_idempotency_stats
+from attendance.models import Attendance, AttendanceSession, BlockchainOutbox, Course, Enrollment, Lecture, User
+
+
+@override_settings(QR_TOKEN_MODE='static', CHECKIN_WRITE_BEHIND=False)
+class IdempotentCheckInTests(TestCase):
+    """Test cases for replaying repeated check-in submissions"""
+
+    def setUp(self):
+        cache.clear()
+        reset_idempotency_stats()
+        teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        course = Course.objects.create(name='Physics', code='PHY101', teacher=teacher)
+        self.lecture = Lecture.objects.create(course=course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        AttendanceSession.objects.create(lecture=self.lecture, nonce='abc123',
+                                         end_time=timezone.now() + timedelta(minutes=10))
+        self.student = User.objects.create_user(username='student', password='pass12345', is_student=True)
+        Enrollment.objects.create(student=self.student, course=course, roll_number='1')
+        self.client.force_login(self.student)
+        self.qr_data = json.dumps({'l': self.lecture.id, 'n': 'abc123',
+                                   'e': (timezone.now() + timedelta(minutes=5)).isoformat()})
+
+    def tearDown(self):
+        cache.clear()
+
+    def post(self, qr_data, key='scan-1'):
+        return self.client.post(reverse('process_attendance'), {'qr_data': qr_data},
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_repeat_replays_the_first_answer(self):
+        """Test that a repeated scan gets the original success without another check-in"""
+        first = self.post(self.qr_data)
+        self.assertTrue(first.json()['success'])
+
+        # Only the session and user lookups of the login remain
+        with self.assertNumQueries(2):
+            repeat = self.post(self.qr_data)
+        self.assertEqual(repeat.json(), first.json())
+        self.assertEqual(repeat[REPLAYED_HEADER], 'true')
+        self.assertEqual(Attendance.objects.count(), 1)
+        self.assertEqual(BlockchainOutbox.objects.count(), 1)
+
+        stats = idempotency_stats()
+        self.assertEqual((stats['requests'], stats['stored'], stats['replayed'], stats['suppressed']), (2, 1, 1, 1))
+
+    def test_new_key_or_other_code_runs_the_view(self):
+        """Test that a fresh key or a different code is not answered from the cache"""
+        self.post(self.qr_data)
+        retry = self.post(self.qr_data, key='scan-2')
+        self.assertNotIn(REPLAYED_HEADER, retry)
+        self.assertFalse(retry.json()['success'])
+
+        other = self.post('not a code')
+        self.assertNotIn(REPLAYED_HEADER, other)
+        self.assertEqual(other.json()['error'], 'Invalid QR code or expired')
+
+    def test_retriable_errors_are_not_replayed(self):
+        """Test that an error a later retry could clear is answered afresh"""
+        AttendanceSession.objects.update(is_active=False)
+        self.assertFalse(self.post(self.qr_data).json()['success'])
+        AttendanceSession.objects.update(is_active=True)
+
+        response = self.post(self.qr_data)
+        self.assertNotIn(REPLAYED_HEADER, response)
+        self.assertTrue(response.json()['success'])
+
+    def test_repeat_during_the_first_request_is_refused(self):
+        """Test that a repeat arriving while the first request runs gets a 409"""
+        first = self.post(self.qr_data)
+        cache.clear()
+        cache.add(f"{request_key(first.wsgi_request, 'check_in', 'qr_data')}:lock", True)
+
+        response = self.post(self.qr_data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(idempotency_stats()['in_flight'], 1)
+
+    @override_settings(RATE_LIMITS={'check_in': '1/m'})
+    def test_replays_do_not_use_up_the_rate_limit(self):
+        """Test that repeats of an answered scan are replayed without counting against the check-in limit"""
+        self.assertTrue(self.post(self.qr_data).json()['success'])
+        for _ in range(3):
+            self.assertEqual(self.post(self.qr_data)[REPLAYED_HEADER], 'true')
+
+        self.assertEqual(self.post('not a code').status_code, 429)
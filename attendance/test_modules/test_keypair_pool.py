@@ -0,0 +1,109 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from stellar_sdk import Keypair
+
+from attendance import keypair_pool, outbox
+from attendance.models import BlockchainOutbox, ProvisionedKeypair, User
+from attendance.stellar_clients import close_clients
+from attendance.stellar_helper import StellarHelper
+from attendance.stellar_sequence import sequence_manager
+from attendance.stellar_simulator import get_simulator, reset_simulator
+
+
+@override_settings(STELLAR_CONTRACT_ID='', STELLAR_SIMULATOR=False)
+class KeypairPoolTests(TestCase):
+    """Test cases for handing pre-funded keypairs to new users"""
+
+    def setUp(self):
+        self.keypairs = [Keypair.random() for _ in range(2)]
+        for keypair in self.keypairs:
+            ProvisionedKeypair.objects.create(public_key=keypair.public_key, secret_seed=keypair.secret)
+
+    def signup(self, username):
+        return self.client.post(reverse('student_signup'), {
+            'username': username, 'email': f'{username}@example.com',
+            'password1': 'Str0ng-pass-123', 'password2': 'Str0ng-pass-123',
+        })
+
+    def test_claims_are_exclusive(self):
+        """Test that every keypair is handed out once and an empty pool returns None"""
+        users = [User.objects.create_user(username=f'user{i}', password='pass12345') for i in range(3)]
+        claimed = [keypair_pool.claim_keypair(user) for user in users]
+
+        self.assertIsNone(claimed[2])
+        self.assertEqual({keypair.public_key for keypair in claimed[:2]},
+                         {keypair.public_key for keypair in self.keypairs})
+        self.assertEqual(keypair_pool.available_count(), 0)
+
+    def test_signup_claims_keypair_and_registers_in_background(self):
+        """Test that signup makes no chain calls and the outbox finishes registration"""
+        with mock.patch('attendance.stellar_helper.StellarHelper.fund_account') as fund_account:
+            response = self.signup('alice')
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        fund_account.assert_not_called()
+
+        user = User.objects.get(username='alice')
+        self.assertIn(user.stellar_public_key, {keypair.public_key for keypair in self.keypairs})
+        self.assertEqual(user.stellar_status, User.STELLAR_PENDING)
+        entry = BlockchainOutbox.objects.get(kind=BlockchainOutbox.REGISTER_ACCOUNT)
+        self.assertEqual(entry.payload, {'role': 'student', 'fund': False})
+
+        outbox.process_entry(outbox.claim_batch(10)[0])
+        user.refresh_from_db()
+        self.assertEqual(user.stellar_status, User.STELLAR_ACTIVE)
+
+    def test_empty_pool_funds_in_the_outbox(self):
+        """Test that without a pool keypair the worker funds the account before registering"""
+        ProvisionedKeypair.objects.all().delete()
+        self.signup('bob')
+        user = User.objects.get(username='bob')
+        self.assertTrue(user.stellar_public_key.startswith('G'))
+
+        with mock.patch('attendance.stellar_helper.StellarHelper.fund_account', return_value=True) as fund_account, \
+                mock.patch('attendance.stellar_helper.StellarHelper.register_student',
+                           return_value={'error': 'tx_bad_seq'}):
+            outbox.process_entry(outbox.claim_batch(10)[0])
+        fund_account.assert_called_once_with(user.stellar_public_key)
+        entry = BlockchainOutbox.objects.get(kind=BlockchainOutbox.REGISTER_ACCOUNT)
+        self.assertFalse(entry.payload['fund'])  # A retry does not fund again
+        self.assertEqual(entry.status, BlockchainOutbox.PENDING)
+
+
+@override_settings(STELLAR_SIMULATOR=True, STELLAR_SIMULATOR_LATENCY=0.0, STELLAR_SIMULATOR_LEDGER_CLOSE=0.0,
+                   STELLAR_SIMULATOR_ERROR_RATE=0.0, STELLAR_SIMULATOR_AUTO_FUND=False,
+                   STELLAR_FEE_STATS_BACKGROUND=False)
+class KeypairPoolRefillTests(TestCase):
+    """Test cases for topping up the keypair pool"""
+
+    def setUp(self):
+        cache.clear()
+        close_clients()
+        reset_simulator()
+        self.funder = Keypair.random()
+        get_simulator().fund(self.funder.public_key)
+
+    def tearDown(self):
+        close_clients()
+        reset_simulator()
+        cache.clear()
+
+    def test_refill_funds_up_to_target(self):
+        """Test that the refiller creates the missing accounts on the ledger"""
+        added = keypair_pool.refill(target=5, funder_seed=self.funder.secret, starting_balance='2')
+        self.assertEqual(added, 5)
+        self.assertEqual(keypair_pool.refill(target=5, funder_seed=self.funder.secret), 0)
+
+        accounts = get_simulator().accounts
+        for public_key in ProvisionedKeypair.objects.values_list('public_key', flat=True):
+            self.assertEqual(accounts[public_key]['balance'], 2)
+
+    def test_refill_shares_the_funders_sequence(self):
+        """Test that funding between the funder's other writes never leaves their sequence stale"""
+        StellarHelper._submit_transaction(self.funder, "Before", wait=True)
+        with mock.patch.object(sequence_manager, 'resync', wraps=sequence_manager.resync) as resync:
+            keypair_pool.refill(target=2, funder_seed=self.funder.secret, starting_balance='2')
+            StellarHelper._submit_transaction(self.funder, "After", wait=True)
+        resync.assert_not_called()
@@ -0,0 +1,69 @@
+import random
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from attendance.management.commands.loadtest_checkins import arrival_offsets
+from attendance.middleware import CACHE_BACKEND_HEADER, QUERY_COUNT_HEADER, SIMULATOR_HEADER
+from attendance.models import Course, User
+
+
+@override_settings(QUERY_COUNT_HEADER=True)
+class QueryCountMiddlewareTests(TestCase):
+    """Test cases for the query count response header"""
+
+    def test_header_counts_the_request_queries(self):
+        """Test that a response reports the queries its request ran"""
+        response = self.client.get(reverse('login'))
+        self.assertEqual(response[QUERY_COUNT_HEADER], '0')
+        self.assertEqual(response[CACHE_BACKEND_HEADER], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertIn(response[SIMULATOR_HEADER], ('true', 'false'))
+
+        user = User.objects.create_user(username='student', password='pass12345', is_student=True)
+        self.client.force_login(user)
+        response = self.client.post(reverse('process_attendance'), {'qr_data': 'not a code'})
+        self.assertEqual(response[QUERY_COUNT_HEADER], '2')
+
+    @override_settings(QUERY_COUNT_HEADER=False)
+    def test_header_is_off_by_default(self):
+        """Test that without the setting no header is added"""
+        self.assertNotIn(QUERY_COUNT_HEADER, self.client.get(reverse('login')))
+
+
+@override_settings(QUERY_COUNT_HEADER=True, QR_TOKEN_MODE='static', CHECKIN_WRITE_BEHIND=False)
+class LoadTestCommandTests(LiveServerTestCase):
+    """Test cases for the check-in load test against a live server"""
+
+    def test_arrival_curves(self):
+        """Test that every curve schedules each scan within the duration, in order"""
+        for curve in ('burst', 'uniform', 'ramp', 'poisson'):
+            offsets = arrival_offsets(curve, 50, 5.0, random.Random(0))
+            self.assertEqual(len(offsets), 50)
+            self.assertEqual(offsets, sorted(offsets))
+            self.assertEqual(offsets[0], 0.0)
+        self.assertTrue(all(offset < 5.0 for offset in arrival_offsets('ramp', 50, 5.0, random.Random(0))))
+
+    def test_run_reports_and_cleans_up(self):
+        """Test that a run checks every student in once, reports the results and removes its data"""
+        out = StringIO()
+        call_command('loadtest_checkins', '--url', self.live_server_url, '--students', '4',
+                     '--scans-per-student', '2', '--concurrency', '1', '--curve', 'burst', '--allow-local-cache',
+                     stdout=out, stderr=StringIO())
+        report = out.getvalue()
+        self.assertIn('Server cache: django.core.cache.backends.locmem.LocMemCache', report)
+        self.assertIn('Requests: 8', report)
+        self.assertIn('4 checked in', report)
+        self.assertIn('4 replayed', report)
+        self.assertIn('DB queries per request: mean', report)
+        self.assertIn('Attendance rows recorded: 4', report)
+        self.assertFalse(Course.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_local_memory_cache_is_refused(self):
+        """Test that a local-memory cache stops the run unless it is explicitly allowed"""
+        with self.assertRaisesMessage(CommandError, 'local-memory cache'):
+            call_command('loadtest_checkins', '--url', self.live_server_url, '--students', '1',
+                         stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Course.objects.exists())
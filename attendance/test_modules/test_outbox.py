@@ -0,0 +1,313 @@
+import json
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from stellar_sdk import Keypair
+
+from attendance import outbox
+from attendance.models import (Attendance, AttendanceSession, BlockchainOutbox, ChannelAccount,
+                               Course, Enrollment, Lecture, User)
+from attendance.stellar_channels import channel_pool
+from attendance.stellar_clients import close_clients
+from attendance.stellar_helper import StellarHelper
+from attendance.stellar_simulator import get_simulator, reset_simulator
+
+
+@override_settings(STELLAR_CONTRACT_ID='')
+class BlockchainOutboxTests(TestCase):
+    """Test cases for the transactional blockchain outbox"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        self.student = User.objects.create_user(username='student', password='pass12345', is_student=True,
+                                                stellar_seed='S' * 56, stellar_public_key='G' * 56)
+        self.course = Course.objects.create(name='Physics', code='PHY101', teacher=self.teacher)
+        Enrollment.objects.create(student=self.student, course=self.course, roll_number='1')
+        self.lecture = Lecture.objects.create(course=self.course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        self.session = AttendanceSession.objects.create(lecture=self.lecture, nonce='abc123',
+                                                        end_time=timezone.now() + timedelta(minutes=15))
+
+    def scan(self):
+        self.client.force_login(self.student)
+        qr_data = json.dumps({'l': self.lecture.id, 'n': 'abc123',
+                              'e': (timezone.now() + timedelta(minutes=5)).isoformat()})
+        return self.client.post(reverse('process_attendance'), {'qr_data': qr_data})
+
+    def test_check_in_queues_blockchain_write(self):
+        """Test that check-in records attendance and queues the chain write without calling Stellar"""
+        with mock.patch('attendance.outbox.StellarHelper.mark_attendance') as mark_attendance:
+            response = self.scan()
+        mark_attendance.assert_not_called()
+
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertTrue(data['blockchain_pending'])
+        attendance = Attendance.objects.get(student=self.student, lecture=self.lecture)
+        self.assertFalse(attendance.blockchain_verified)
+        entry = BlockchainOutbox.objects.get()
+        self.assertEqual(entry.kind, BlockchainOutbox.MARK_ATTENDANCE)
+        self.assertEqual(entry.attendance, attendance)
+        self.assertEqual(entry.payload, {'nonce': 'abc123'})
+
+    def test_worker_submits_and_marks_verified(self):
+        """Test that draining the outbox flips blockchain_verified"""
+        self.scan()
+        call_command('process_blockchain_outbox', '--once', '--concurrency', '1', stdout=StringIO())
+
+        self.assertTrue(Attendance.objects.get(student=self.student).blockchain_verified)
+        entry = BlockchainOutbox.objects.get()
+        self.assertEqual(entry.status, BlockchainOutbox.DONE)
+        self.assertEqual(entry.attempts, 1)
+
+    def test_failed_submission_is_retried_later(self):
+        """Test that a chain error reschedules the entry with backoff"""
+        outbox.enqueue(BlockchainOutbox.START_ATTENDANCE, self.teacher,
+                       lecture=self.lecture, session=self.session, duration_seconds=900)
+        entries = outbox.claim_batch(10)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(outbox.claim_batch(10), [])  # already leased
+
+        with mock.patch('attendance.outbox.StellarHelper.start_attendance', return_value={'error': 'timeout'}):
+            self.assertFalse(outbox.process_entry(entries[0]))
+
+        entry = BlockchainOutbox.objects.get()
+        self.assertEqual(entry.status, BlockchainOutbox.PENDING)
+        self.assertEqual(entry.last_error, 'timeout')
+        self.assertGreater(entry.available_at, timezone.now())
+        self.assertFalse(AttendanceSession.objects.get().blockchain_verified)
+
+    def test_entry_fails_after_max_attempts(self):
+        """Test that entries stop retrying after the configured attempts"""
+        entry = outbox.enqueue(BlockchainOutbox.CLOSE_ATTENDANCE, self.teacher, lecture=self.lecture)
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(attempts=4)
+        entry = outbox.claim_batch(1)[0]
+
+        with override_settings(STELLAR_OUTBOX_MAX_ATTEMPTS=5), \
+                mock.patch('attendance.outbox.StellarHelper.close_attendance_session',
+                           side_effect=RuntimeError('down')):
+            outbox.process_entry(entry)
+
+        self.assertEqual(BlockchainOutbox.objects.get().status, BlockchainOutbox.FAILED)
+
+    def test_session_entries_wait_for_the_start(self):
+        """Test that a session's close is only claimed once its start is confirmed"""
+        outbox.enqueue(BlockchainOutbox.START_ATTENDANCE, self.teacher, lecture=self.lecture, session=self.session)
+        outbox.enqueue(BlockchainOutbox.CLOSE_ATTENDANCE, self.teacher, lecture=self.lecture, session=self.session)
+
+        entries = outbox.claim_batch(10)
+        self.assertEqual([entry.kind for entry in entries], [BlockchainOutbox.START_ATTENDANCE])
+        with mock.patch('attendance.outbox.StellarHelper.start_attendance',
+                        return_value={'status': 'success', 'hash': 'ab' * 32, 'pending': True}):
+            outbox.process_entry(entries[0])
+        self.assertEqual(outbox.claim_batch(10), [])  # Submitted, not yet in a ledger
+
+        BlockchainOutbox.objects.filter(kind=BlockchainOutbox.START_ATTENDANCE).update(status=BlockchainOutbox.DONE)
+        self.assertEqual([entry.kind for entry in outbox.claim_batch(10)], [BlockchainOutbox.CLOSE_ATTENDANCE])
+
+    def test_failed_start_fails_the_close(self):
+        """Test that a close queued behind a start that failed for good is failed, not submitted"""
+        start = outbox.enqueue(BlockchainOutbox.START_ATTENDANCE, self.teacher,
+                               lecture=self.lecture, session=self.session)
+        outbox.enqueue(BlockchainOutbox.CLOSE_ATTENDANCE, self.teacher, lecture=self.lecture, session=self.session)
+        BlockchainOutbox.objects.filter(pk=start.pk).update(status=BlockchainOutbox.FAILED)
+
+        self.assertEqual(outbox.claim_batch(10), [])
+        close = BlockchainOutbox.objects.get(kind=BlockchainOutbox.CLOSE_ATTENDANCE)
+        self.assertEqual(close.status, BlockchainOutbox.FAILED)
+        self.assertIn('never recorded', close.last_error)
+
+    def test_close_is_not_queued_without_a_start(self):
+        """Test that closing a session whose start failed or was never queued only closes it locally"""
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('close_attendance_session', args=[self.session.id]))
+        self.assertFalse(AttendanceSession.objects.get().is_active)
+        self.assertFalse(BlockchainOutbox.objects.exists())
+
+        session = AttendanceSession.objects.create(lecture=self.lecture, nonce='def456')
+        start = outbox.enqueue(BlockchainOutbox.START_ATTENDANCE, self.teacher, lecture=self.lecture, session=session)
+        BlockchainOutbox.objects.filter(pk=start.pk).update(status=BlockchainOutbox.FAILED)
+        self.client.post(reverse('close_attendance_session', args=[session.id]))
+        self.assertFalse(BlockchainOutbox.objects.filter(kind=BlockchainOutbox.CLOSE_ATTENDANCE).exists())
+
+        session = AttendanceSession.objects.create(lecture=self.lecture, nonce='ghi789')
+        outbox.enqueue(BlockchainOutbox.START_ATTENDANCE, self.teacher, lecture=self.lecture, session=session)
+        self.client.post(reverse('close_attendance_session', args=[session.id]))
+        self.assertTrue(BlockchainOutbox.objects.filter(kind=BlockchainOutbox.CLOSE_ATTENDANCE).exists())
+
+    def test_manual_attendance_queues_one_batch(self):
+        """Test that manual attendance queues a single batched entry for the new students with a Stellar key"""
+        keys = sorted(Keypair.random().public_key for _ in range(2))
+        User.objects.filter(pk=self.student.pk).update(stellar_public_key=keys[0])
+        other = User.objects.create_user(username='student2', password='pass12345', is_student=True,
+                                         stellar_public_key=keys[1])
+        keyless = User.objects.create_user(username='student3', password='pass12345', is_student=True)
+        Enrollment.objects.create(student=other, course=self.course, roll_number='2')
+        Enrollment.objects.create(student=keyless, course=self.course, roll_number='3')
+        self.client.force_login(self.teacher)
+        response = self.client.post(reverse('manual_attendance', args=[self.lecture.id]),
+                                    {'students': [self.student.id, other.id, keyless.id]}, follow=True)
+
+        self.assertEqual(Attendance.objects.filter(lecture=self.lecture).count(), 3)
+        self.assertIn('student3', ' '.join(str(message) for message in response.context['messages']))
+        entry = BlockchainOutbox.objects.get()
+        self.assertEqual(entry.kind, BlockchainOutbox.MANUAL_ATTENDANCE_BATCH)
+        self.assertEqual(sorted(s['public_key'] for s in entry.payload['students']), keys)
+
+        call_command('process_blockchain_outbox', '--once', '--concurrency', '1', stdout=StringIO())
+        self.assertEqual(Attendance.objects.filter(lecture=self.lecture, blockchain_verified=True).count(), 2)
+
+
+@override_settings(STELLAR_SIMULATOR=True, STELLAR_CONTRACT_ID='', STELLAR_SIMULATOR_LATENCY=0.0,
+                   STELLAR_SIMULATOR_ERROR_RATE=0.0, STELLAR_SIMULATOR_LEDGER_CLOSE=0.0,
+                   STELLAR_FEE_STATS_BACKGROUND=False, STELLAR_CHANNELS_ENABLED=False,
+                   STELLAR_ASYNC_SUBMISSION=True)
+class TransactionConfirmationTests(TestCase):
+    """Test cases for async submission and the batched confirmation poller"""
+
+    def setUp(self):
+        cache.clear()
+        close_clients()
+        reset_simulator()
+        teacher_keys, student_keys = Keypair.random(), Keypair.random()
+        self.teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True,
+                                                stellar_seed=teacher_keys.secret,
+                                                stellar_public_key=teacher_keys.public_key)
+        self.student = User.objects.create_user(username='student', password='pass12345', is_student=True,
+                                                stellar_seed=student_keys.secret,
+                                                stellar_public_key=student_keys.public_key)
+        course = Course.objects.create(name='Physics', code='PHY101', teacher=self.teacher)
+        self.lecture = Lecture.objects.create(course=course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        self.session = AttendanceSession.objects.create(lecture=self.lecture, nonce='abc123',
+                                                        end_time=timezone.now() + timedelta(minutes=15))
+        self.attendance = Attendance.objects.create(student=self.student, lecture=self.lecture, session=self.session)
+
+    def tearDown(self):
+        close_clients()
+        reset_simulator()
+        cache.clear()
+
+    def test_submissions_are_confirmed_from_their_source_accounts(self):
+        """Test that queued hashes are confirmed with one history read per source account and rows updated in bulk"""
+        requests_before = get_simulator().stats['requests']
+        self.assertEqual(outbox.confirm_submitted(), {'confirmed': 0, 'failed': 0, 'waiting': 0, 'bumped': 0})  # Idle round
+        self.assertEqual(get_simulator().stats['requests'], requests_before)
+        outbox.enqueue(BlockchainOutbox.CREATE_LECTURE, self.teacher, lecture=self.lecture, course_id=1,
+                       title='Optics', date_timestamp=0, duration_minutes=60)
+        outbox.enqueue(BlockchainOutbox.START_ATTENDANCE, self.teacher, lecture=self.lecture, session=self.session)
+        outbox.enqueue(BlockchainOutbox.MARK_ATTENDANCE, self.student, lecture=self.lecture,
+                       attendance=self.attendance, nonce='abc123')
+        call_command('process_blockchain_outbox', '--once', '--concurrency', '1', stdout=StringIO())
+
+        entries = BlockchainOutbox.objects.all()
+        self.assertEqual({entry.status for entry in entries}, {BlockchainOutbox.SUBMITTED})
+        self.assertTrue(all(len(entry.transaction_hash) == 64 for entry in entries))
+        self.assertFalse(Attendance.objects.get().blockchain_verified)
+
+        requests_before = get_simulator().stats['requests']
+        self.assertEqual(outbox.confirm_submitted(), {'confirmed': 3, 'failed': 0, 'waiting': 0, 'bumped': 0})
+        # The teacher's two transactions and the student's one
+        self.assertEqual(get_simulator().stats['requests'] - requests_before, 2)
+
+        attendance = Attendance.objects.get()
+        self.assertTrue(attendance.blockchain_verified)
+        self.assertEqual(attendance.transaction_hash,
+                         BlockchainOutbox.objects.get(kind=BlockchainOutbox.MARK_ATTENDANCE).transaction_hash)
+        self.assertTrue(AttendanceSession.objects.get().blockchain_verified)
+        self.assertEqual(Lecture.objects.get().blockchain_lecture_id, str(self.lecture.pk))
+        self.assertEqual(set(BlockchainOutbox.objects.values_list('status', flat=True)), {BlockchainOutbox.DONE})
+
+    @override_settings(STELLAR_CHANNELS_ENABLED=True)
+    def test_channel_stays_leased_until_confirmed(self):
+        """Test that a queued transaction holds its channel so the next write cannot queue behind it"""
+        channel = Keypair.random()
+        get_simulator().fund(channel.public_key)
+        get_simulator().fund(self.teacher.stellar_public_key)  # Only transaction sources are funded on first use
+        ChannelAccount.objects.create(public_key=channel.public_key, secret_seed=channel.secret)
+        channel_pool.refresh()
+        outbox.enqueue(BlockchainOutbox.START_ATTENDANCE, self.teacher, lecture=self.lecture, session=self.session)
+        call_command('process_blockchain_outbox', '--once', '--concurrency', '1', stdout=StringIO())
+
+        entry = BlockchainOutbox.objects.get()
+        self.assertEqual(entry.status, BlockchainOutbox.SUBMITTED)
+        self.assertEqual(entry.source_account, channel.public_key)
+        self.assertTrue(entry.channel_lease.startswith(channel.public_key))
+        self.assertIsNone(channel_pool.lease())
+
+        self.assertEqual(outbox.confirm_submitted()['confirmed'], 1)
+        self.assertEqual(BlockchainOutbox.objects.get().channel_lease, '')
+        lease = channel_pool.lease()
+        self.assertEqual(lease.public_key, channel.public_key)
+        channel_pool.release(lease)
+        channel_pool.refresh()
+
+    def test_expired_transaction_is_resubmitted(self):
+        """Test that a hash Horizon never saw is queued again after its deadline"""
+        entry = outbox.enqueue(BlockchainOutbox.MARK_ATTENDANCE, self.student, lecture=self.lecture,
+                               attendance=self.attendance, nonce='abc123')
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(
+            status=BlockchainOutbox.SUBMITTED, transaction_hash='f' * 64, attempts=1,
+            available_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(outbox.confirm_submitted()['failed'], 1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, BlockchainOutbox.PENDING)
+        self.assertIn('expired', entry.last_error)
+        self.assertFalse(Attendance.objects.get().blockchain_verified)
+
+    def test_confirmation_pages_through_other_transactions(self):
+        """Test that a hash behind several pages of the account's later transactions is still confirmed"""
+        for _ in range(5):
+            StellarHelper.mark_attendance(self.student.stellar_seed, 999, 'other')
+        entry = outbox.enqueue(BlockchainOutbox.MARK_ATTENDANCE, self.student, lecture=self.lecture,
+                               attendance=self.attendance, nonce='abc123')
+        call_command('process_blockchain_outbox', '--once', '--concurrency', '1', stdout=StringIO())
+        for _ in range(5):
+            StellarHelper.mark_attendance(self.student.stellar_seed, 999, 'other')
+
+        self.assertEqual(outbox.confirm_submitted(page_size=2)['confirmed'], 1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, BlockchainOutbox.DONE)
+        self.assertTrue(Attendance.objects.get().blockchain_verified)
+
+    def test_other_accounts_traffic_costs_nothing(self):
+        """Test that transactions of accounts with nothing pending are never read"""
+        outbox.enqueue(BlockchainOutbox.MARK_ATTENDANCE, self.student, lecture=self.lecture,
+                       attendance=self.attendance, nonce='abc123')
+        call_command('process_blockchain_outbox', '--once', '--concurrency', '1', stdout=StringIO())
+        for _ in range(10):
+            StellarHelper.mark_attendance(Keypair.random().secret, 999, 'other')
+
+        requests_before = get_simulator().stats['requests']
+        self.assertEqual(outbox.confirm_submitted(page_size=2)['confirmed'], 1)
+        self.assertEqual(get_simulator().stats['requests'] - requests_before, 1)
+
+    def test_waiting_transaction_is_fee_bumped(self):
+        """Test that a transaction still queued after a few ledgers is outbid by a fee bump from its source"""
+        entry = outbox.enqueue(BlockchainOutbox.MARK_ATTENDANCE, self.student, lecture=self.lecture,
+                               attendance=self.attendance, nonce='abc123')
+        call_command('process_blockchain_outbox', '--once', '--concurrency', '1', stdout=StringIO())
+        entry.refresh_from_db()
+        self.assertTrue(entry.envelope_xdr)
+        BlockchainOutbox.objects.filter(pk=entry.pk).update(processed_at=timezone.now() - timedelta(seconds=20))
+
+        with mock.patch('attendance.outbox._scan_account', return_value={}), \
+                mock.patch('attendance.outbox.submit_envelope') as submit_envelope:
+            self.assertEqual(outbox.confirm_submitted()['bumped'], 1)
+            self.assertEqual(outbox.confirm_submitted()['bumped'], 0)  # The next bump waits as many ledgers more
+
+        fee_bump = submit_envelope.call_args.args[1]
+        self.assertEqual(fee_bump.transaction.fee_source.account_id, self.student.stellar_public_key)
+        self.assertEqual(fee_bump.transaction.inner_transaction_envelope.hash_hex(), entry.transaction_hash)
+        bumped = BlockchainOutbox.objects.get()
+        self.assertEqual(bumped.fee_bumps, 1)
+        self.assertEqual(bumped.transaction_hash, entry.transaction_hash)
+        self.assertEqual(bumped.envelope_xdr, fee_bump.to_xdr())
@@ -0,0 +1,255 @@
+import json
+import time as clock
+from datetime import date, time, timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from attendance import qr_payload, qr_utils
+from attendance.models import Attendance, AttendanceSession, Course, Enrollment, Lecture, User
+from attendance.qr_utils import (QRImageCache, build_qr, current_step, generate_qr_code, qr_image_cache,
+                                 rotating_payload, session_payload, static_payload, verify_qr_data)
+
+
+@override_settings(QR_CACHE_SIZE=2)
+class QRImageCacheTests(TestCase):
+    """Test cases for the rendered QR image cache"""
+
+    def setUp(self):
+        qr_image_cache.clear()
+        self.expiry = timezone.now() + timedelta(minutes=10)
+
+    def tearDown(self):
+        qr_image_cache.clear()
+
+    def test_same_session_renders_once(self):
+        """Test that repeated requests for one lecture, nonce and expiry reuse the image"""
+        with mock.patch.object(qr_utils, '_render_qr_code', wraps=qr_utils._render_qr_code) as render:
+            first = generate_qr_code(1, 'abc123', self.expiry)
+            second = generate_qr_code(1, 'abc123', self.expiry)
+            generate_qr_code(1, 'abc123', self.expiry + timedelta(minutes=5))
+        self.assertEqual(first, second)
+        self.assertEqual(render.call_count, 2)
+        stats = qr_image_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that the cache stays bounded and keeps recently used images"""
+        cache = QRImageCache()
+        cache.set((1, 'a', None), 'one')
+        cache.set((2, 'b', None), 'two')
+        cache.get((1, 'a', None))
+        cache.set((3, 'c', None), 'three')
+        self.assertIsNone(cache.get((2, 'b', None)))
+        self.assertEqual(cache.get((1, 'a', None)), 'one')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_closing_session_invalidates_lecture(self):
+        """Test that closing a session drops that lecture's images only"""
+        teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        course = Course.objects.create(name='Physics', code='PHY101', teacher=teacher)
+        lecture = Lecture.objects.create(course=course, title='Optics', date=date.today(),
+                                         start_time=time(9), end_time=time(10))
+        session = AttendanceSession.objects.create(lecture=lecture, nonce='abc123', end_time=self.expiry)
+        generate_qr_code(lecture.id, 'abc123', self.expiry)
+        generate_qr_code(lecture.id + 1, 'other', self.expiry)
+
+        self.client.force_login(teacher)
+        self.client.get(reverse('close_attendance_session', args=[session.pk]))
+        stats = qr_image_cache.stats()
+        self.assertEqual((stats['size'], stats['invalidations']), (1, 1))
+
+
+class QRImageEndpointTests(TestCase):
+    """Test cases for the per-session QR image and poll endpoints"""
+
+    def setUp(self):
+        qr_image_cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        course = Course.objects.create(name='Physics', code='PHY101', teacher=self.teacher)
+        self.lecture = Lecture.objects.create(course=course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        self.session = AttendanceSession.objects.create(lecture=self.lecture, nonce='abc123',
+                                                        end_time=timezone.now() + timedelta(minutes=10))
+        self.client.force_login(self.teacher)
+
+    def tearDown(self):
+        qr_image_cache.clear()
+
+    def test_image_is_served_with_etag_and_revalidated(self):
+        """Test that the PNG carries an ETag and a matching If-None-Match gets a 304"""
+        url = reverse('attendance_qr_image', args=[self.session.pk])
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+        self.session.nonce = 'def456'
+        self.session.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_stale_version_redirects_to_the_current_image(self):
+        """Test that only the current version is cached and an old one is sent to the new URL"""
+        current = self.client.get(reverse('attendance_qr_status', args=[self.session.pk])).json()['image_url']
+        response = self.client.get(current)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        self.session.nonce = 'def456'
+        self.session.save()
+        stale = self.client.get(current)
+        self.assertEqual(stale.status_code, 302)
+        self.assertIn('no-cache', stale['Cache-Control'])
+        self.assertEqual(stale['Location'],
+                         self.client.get(reverse('attendance_qr_status', args=[self.session.pk])).json()['image_url'])
+
+    def test_poll_reports_changes_and_close(self):
+        """Test that the JSON poll changes version with the nonce and reports a closed session"""
+        url = reverse('attendance_qr_status', args=[self.session.pk])
+        first = self.client.get(url)
+        self.assertTrue(first.json()['active'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        self.session.is_active = False
+        self.session.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).json(), {'active': False})
+        image = self.client.get(reverse('attendance_qr_image', args=[self.session.pk]))
+        self.assertEqual(image.status_code, 404)
+
+    def test_other_users_are_refused(self):
+        """Test that only the course teacher can fetch the code"""
+        student = User.objects.create_user(username='student', password='pass12345', is_student=True)
+        self.client.force_login(student)
+        self.assertEqual(self.client.get(reverse('attendance_qr_image', args=[self.session.pk])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('attendance_qr_status', args=[self.session.pk])).status_code, 403)
+
+    def test_lecture_page_links_the_image(self):
+        """Test that the lecture page no longer inlines the QR code as base64"""
+        response = self.client.get(reverse('lecture_detail', args=[self.lecture.pk]))
+        self.assertNotContains(response, 'data:image/png;base64')
+        self.assertContains(response, reverse('attendance_qr_image', args=[self.session.pk]))
+        self.assertContains(response, reverse('attendance_projector', args=[self.session.pk]))
+        projector = self.client.get(reverse('attendance_projector', args=[self.session.pk]))
+        self.assertContains(projector, reverse('attendance_qr_status', args=[self.session.pk]))
+
+
+@override_settings(QR_TOKEN_MODE='rotating', QR_TOKEN_STEP=15, QR_TOKEN_SKEW_STEPS=1, QR_TOKEN_SECRET='test-secret')
+class RotatingQRTokenTests(TestCase):
+    """Test cases for HMAC-signed rotating QR tokens"""
+
+    def setUp(self):
+        teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        course = Course.objects.create(name='Physics', code='PHY101', teacher=teacher)
+        self.lecture = Lecture.objects.create(course=course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        self.session = AttendanceSession.objects.create(lecture=self.lecture, nonce='abc123',
+                                                        end_time=timezone.now() + timedelta(minutes=10))
+        self.student = User.objects.create_user(username='student', password='pass12345', is_student=True)
+        Enrollment.objects.create(student=self.student, course=course, roll_number='1')
+
+    def test_token_verifies_within_skew_without_queries(self):
+        """Test that current and neighbouring steps verify with no database access"""
+        step = current_step()
+        with self.assertNumQueries(0):
+            for offset in (-1, 0, 1):
+                data = verify_qr_data(rotating_payload(self.lecture.id, self.session.pk, step + offset))
+                self.assertEqual(data['session_id'], self.session.pk)
+
+    def test_stale_tampered_and_static_codes_are_rejected(self):
+        """Test that old steps, altered fields and static nonce codes do not verify"""
+        step = current_step()
+        self.assertIsNone(verify_qr_data(rotating_payload(self.lecture.id, self.session.pk, step - 2)))
+        tampered = json.loads(rotating_payload(self.lecture.id, self.session.pk, step))
+        tampered['s'] += 1
+        self.assertIsNone(verify_qr_data(json.dumps(tampered)))
+        with override_settings(QR_TOKEN_SECRET='other-secret'):
+            forged = rotating_payload(self.lecture.id, self.session.pk, step)
+        self.assertIsNone(verify_qr_data(forged))
+        self.assertIsNone(verify_qr_data(static_payload(self.lecture.id, 'abc123', self.session.end_time)))
+
+    def test_scan_marks_attendance(self):
+        """Test that a student scanning the current token is recorded for the session"""
+        self.client.force_login(self.student)
+        qr_data = rotating_payload(self.lecture.id, self.session.pk)
+        response = self.client.post(reverse('process_attendance'), {'qr_data': qr_data}).json()
+        self.assertTrue(response['success'])
+        self.assertEqual(Attendance.objects.get().session, self.session)
+
+    def test_image_rotates_with_the_step(self):
+        """Test that the QR image version changes when the time step does"""
+        teacher = User.objects.get(username='teacher')
+        self.client.force_login(teacher)
+        url = reverse('attendance_qr_status', args=[self.session.pk])
+        now = clock.time()
+        with mock.patch('attendance.qr_utils.time.time', return_value=now):
+            first = self.client.get(url).json()
+        with mock.patch('attendance.qr_utils.time.time', return_value=now + 15):
+            second = self.client.get(url).json()
+        self.assertNotEqual(first['image_url'], second['image_url'])
+        self.assertLessEqual(second['refresh_in'], 15)
+
+
+class CompactQRPayloadTests(TestCase):
+    """Test cases for the compact base45 QR payload format"""
+
+    def setUp(self):
+        teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        course = Course.objects.create(name='Physics', code='PHY101', teacher=teacher)
+        self.lecture = Lecture.objects.create(course=course, title='Optics', date=date.today(),
+                                              start_time=time(9), end_time=time(10))
+        self.session = AttendanceSession.objects.create(lecture=self.lecture, nonce='x' * 44,
+                                                        end_time=timezone.now() + timedelta(minutes=10))
+        self.student = User.objects.create_user(username='student', password='pass12345', is_student=True)
+        Enrollment.objects.create(student=self.student, course=course, roll_number='1')
+
+    def test_base45_matches_rfc_vectors(self):
+        """Test that base45 encodes the RFC 9285 examples and round-trips odd lengths"""
+        for data, text in ((b'AB', 'BB8'), (b'Hello!!', '%69 VD92EX0'), (b'base-45', 'UJCLQE7W581')):
+            self.assertEqual(qr_payload.b45encode(data), text)
+            self.assertEqual(qr_payload.b45decode(text), data)
+        for bad in ('GGW', 'A', 'ab'):
+            with self.assertRaises(ValueError):
+                qr_payload.b45decode(bad)
+
+    @override_settings(QR_PAYLOAD_FORMAT='compact', QR_TOKEN_MODE='static')
+    def test_compact_code_is_smaller_and_scans(self):
+        """Test that the compact payload needs a lower QR version and marks attendance"""
+        compact = session_payload(self.session)
+        legacy = static_payload(self.lecture.id, self.session.nonce, self.session.end_time)
+        self.assertTrue(set(compact) <= set(qr_payload.BASE45_ALPHABET))
+        self.assertLess(build_qr(compact).version, build_qr(legacy).version)
+
+        self.client.force_login(self.student)
+        response = self.client.post(reverse('process_attendance'), {'qr_data': compact}).json()
+        self.assertTrue(response['success'])
+
+    @override_settings(QR_PAYLOAD_FORMAT='compact', QR_TOKEN_MODE='static')
+    def test_wrong_nonce_and_expired_codes_are_rejected(self):
+        """Test that a compact code for another nonce or past its expiry is refused"""
+        forged = qr_payload.pack_static(self.lecture.id, self.session.pk, 'guess', self.session.end_time)
+        self.client.force_login(self.student)
+        response = self.client.post(reverse('process_attendance'), {'qr_data': forged}).json()
+        self.assertFalse(response['success'])
+
+        expired = qr_payload.pack_static(self.lecture.id, self.session.pk, self.session.nonce,
+                                         timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(verify_qr_data(expired))
+
+    @override_settings(QR_PAYLOAD_FORMAT='compact', QR_TOKEN_MODE='rotating')
+    def test_compact_rotating_token_verifies(self):
+        """Test that a compact rotating token decodes to the same checked token"""
+        data = verify_qr_data(session_payload(self.session))
+        self.assertEqual((data['lecture_id'], data['session_id']), (self.lecture.id, self.session.pk))
+
+    @override_settings(QR_PAYLOAD_FORMAT='compact', QR_TOKEN_MODE='static')
+    def test_json_payloads_are_still_accepted(self):
+        """Test that codes printed in the JSON format keep working"""
+        legacy = static_payload(self.lecture.id, self.session.nonce, self.session.end_time)
+        self.assertEqual(verify_qr_data(legacy)['nonce'], self.session.nonce)
@@ -0,0 +1,66 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from attendance.models import User
+from attendance.ratelimit import RateLimit, parse_rate
+
+
+@override_settings(RATE_LIMITS={'check_in': '2/m', 'signup': '1/h'})
+class RateLimitTests(TestCase):
+    """Test cases for the shared sliding-window rate limiter"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        """Test that rates are read as count per period in seconds"""
+        self.assertEqual(parse_rate('20/m'), (20, 60))
+        self.assertEqual(parse_rate('100/10s'), (100, 10))
+        self.assertEqual(parse_rate('5/h'), (5, 3600))
+        with self.assertRaises(ValueError):
+            parse_rate('fast')
+
+    def test_sliding_window(self):
+        """Test that the previous window's hits count in proportion to their overlap"""
+        limit = RateLimit('test', 3, 60)
+        self.assertEqual([limit.hit('ip:1', now=600 + i)[0] for i in range(4)], [True, True, True, False])
+        self.assertEqual(limit.hit('ip:2', now=600), (True, 0))
+
+        # Half-way through the next window half of the four earlier hits remain
+        self.assertEqual(limit.count('ip:1', now=690), 2.0)
+        self.assertTrue(limit.hit('ip:1', now=690)[0])
+        allowed, retry_after = limit.hit('ip:1', now=690)
+        self.assertFalse(allowed)
+        self.assertFalse(limit.is_limited('ip:1', now=690 + retry_after))
+        self.assertTrue(limit.hit('ip:1', now=690 + retry_after)[0])
+
+    def test_check_in_flood_is_shed_before_the_view(self):
+        """Test that scans over the limit get a JSON 429 without running the view"""
+        student = User.objects.create_user(username='student', password='pass12345', is_student=True)
+        self.client.force_login(student)
+        for i in range(2):
+            response = self.client.post(reverse('process_attendance'), {'qr_data': f'code {i}'})
+            self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('process_attendance'), {'qr_data': 'code 3'})
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(response.json()['success'])
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        # Limits are per student
+        other = User.objects.create_user(username='other', password='pass12345', is_student=True)
+        self.client.force_login(other)
+        self.assertEqual(self.client.post(reverse('process_attendance'), {'qr_data': 'code'}).status_code, 200)
+
+    def test_signup_submissions_are_limited_per_ip(self):
+        """Test that signup posts over the limit are refused while the form still loads"""
+        self.assertEqual(self.client.post(reverse('student_signup'), {}).status_code, 200)
+        self.assertEqual(self.client.post(reverse('student_signup'), {}).status_code, 429)
+        self.assertEqual(self.client.get(reverse('student_signup')).status_code, 200)
+        response = self.client.post(reverse('student_signup'), {}, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
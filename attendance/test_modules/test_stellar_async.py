@@ -0,0 +1,102 @@
+import asyncio
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from stellar_sdk import Account, Keypair
+
+from attendance.stellar_async import AsyncStellarHelper, async_registry
+from attendance.stellar_fees import FeePolicy
+from attendance.stellar_sequence import SequenceManager
+from attendance.test_modules.test_stellar_helper import tx_failed
+
+STUDENTS = [Keypair.random() for _ in range(50)]
+
+
+def async_server(delay=0.05):
+    submitted = []
+
+    async def submit_transaction(envelope):
+        await asyncio.sleep(delay)
+        submitted.append(envelope)
+        return {'hash': envelope.hash_hex()}
+
+    async def load_account(public_key):
+        return Account(public_key, 100)
+
+    server = mock.Mock()
+    server.submit_transaction = submit_transaction
+    server.submit_transaction_async = submit_transaction
+    server.load_account = load_account
+    return server, submitted
+
+
+@override_settings(STELLAR_CONTRACT_ID='CTEST', STELLAR_FEE_STATS_BACKGROUND=False)
+class AsyncStellarHelperTests(SimpleTestCase):
+    """Test cases for the async StellarHelper variant"""
+
+    def setUp(self):
+        cache.clear()
+        self.patches = [
+            mock.patch('attendance.stellar_async.fee_policy', FeePolicy(fetch_stats=lambda: None)),
+            mock.patch('attendance.stellar_async.sequence_manager', SequenceManager(loader=None)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        cache.clear()
+
+    async def test_check_ins_run_concurrently_on_one_loop(self):
+        """Test that 50 check-ins overlap instead of queueing behind each other"""
+        server, submitted = async_server(delay=0.05)
+        with mock.patch('attendance.stellar_async.get_async_horizon_server', return_value=server):
+            started = time.monotonic()
+            responses = await asyncio.gather(*[
+                AsyncStellarHelper.mark_attendance(student.secret, 7, 'nonce') for student in STUDENTS
+            ])
+            elapsed = time.monotonic() - started
+
+        self.assertTrue(all(response['status'] == 'success' for response in responses))
+        self.assertEqual(len(submitted), 50)
+        self.assertLess(elapsed, 1.0)  # serially this would take 2.5s
+
+    async def test_one_signer_gets_distinct_sequences(self):
+        """Test that concurrent writes from one teacher draw from the shared sequence counter"""
+        teacher = Keypair.random()
+        server, submitted = async_server(delay=0)
+        with mock.patch('attendance.stellar_async.get_async_horizon_server', return_value=server), \
+                mock.patch('attendance.stellar_async.channel_pool') as channel_pool:
+            channel_pool.lease.return_value = None
+            await asyncio.gather(*[
+                AsyncStellarHelper.close_attendance_session(teacher.secret, lecture) for lecture in range(5)
+            ])
+
+        self.assertEqual(sorted(envelope.transaction.sequence for envelope in submitted), [101, 102, 103, 104, 105])
+
+    async def test_batch_drops_rejected_students_like_the_sync_helper(self):
+        """Test that the async batch resubmits a chunk without its rejected students once"""
+        teacher, students = Keypair.random(), [student.public_key for student in STUDENTS[:3]]
+        calls = []
+
+        async def submit(keypair, memo, operations=(), **kwargs):
+            calls.append(len(operations))
+            if len(calls) == 1:
+                raise tx_failed(['op_success', 'op_no_destination', 'op_success'])
+            return {'hash': 'retryhash'}
+
+        with mock.patch.object(AsyncStellarHelper, '_submit_transaction', side_effect=submit):
+            response = await AsyncStellarHelper.batch_manual_attendance(teacher.secret, 7, students)
+
+        self.assertEqual(calls, [3, 2])
+        self.assertEqual(response['status'], 'partial')
+        self.assertIn('op_no_destination', response['results'][students[1]]['error'])
+        self.assertEqual(response['transactions'], [{'hash': 'retryhash', 'students': [students[0], students[2]]}])
+
+    async def test_clients_are_pooled_per_loop(self):
+        """Test that one running loop reuses the same async Horizon server"""
+        self.assertIs(async_registry.horizon('https://example.org'), async_registry.horizon('https://example.org'))
+        await async_registry.close()
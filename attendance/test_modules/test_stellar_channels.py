@@ -0,0 +1,96 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from stellar_sdk import Keypair
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import BadRequestError
+
+from attendance.models import ChannelAccount
+from attendance.stellar_channels import ChannelPool
+from attendance.stellar_fees import FeePolicy
+from attendance.stellar_helper import StellarHelper
+from attendance.stellar_sequence import SequenceManager
+
+
+def horizon_error(result_code):
+    body = {'extras': {'result_codes': {'transaction': result_code}}}
+    return BadRequestError(Response(status_code=400, text=json.dumps(body), headers={}, url=''))
+
+
+@override_settings(STELLAR_CHANNELS_ENABLED=True, STELLAR_CHANNEL_MAX_FAILURES=2)
+class ChannelPoolTests(TestCase):
+    """Test cases for channel-account leasing and health tracking"""
+
+    def setUp(self):
+        cache.clear()
+        self.keypairs = [Keypair.random() for _ in range(3)]
+        for keypair in self.keypairs:
+            ChannelAccount.objects.create(public_key=keypair.public_key, secret_seed=keypair.secret)
+        self.pool = ChannelPool()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_leases_are_exclusive_and_round_robin(self):
+        """Test that concurrent leases get distinct channels until the pool is exhausted"""
+        leases = [self.pool.lease() for _ in range(3)]
+        self.assertEqual({lease.public_key for lease in leases}, {kp.public_key for kp in self.keypairs})
+        self.assertIsNone(self.pool.lease())
+
+        self.pool.release(leases[1])
+        self.assertEqual(self.pool.lease().public_key, leases[1].public_key)
+
+    def test_failing_channel_is_cooled_down(self):
+        """Test that repeated channel-level failures take a channel out of rotation"""
+        lease = self.pool.lease()
+        self.pool.release(lease)
+        self.pool.record_failure(lease, horizon_error('tx_failed'))  # operation's fault, not counted
+        self.pool.record_failure(lease, horizon_error('tx_insufficient_balance'))
+        self.pool.record_failure(lease, horizon_error('tx_insufficient_balance'))
+
+        channel = ChannelAccount.objects.get(public_key=lease.public_key)
+        self.assertFalse(channel.is_healthy)
+        leased = {self.pool.lease().public_key for _ in range(2)}
+        self.assertNotIn(lease.public_key, leased)
+
+    @override_settings(STELLAR_CHANNELS_ENABLED=False)
+    def test_disabled_pool_leases_nothing(self):
+        """Test that the signer's own account is used when channels are disabled"""
+        self.assertIsNone(self.pool.lease())
+
+
+@override_settings(STELLAR_CHANNELS_ENABLED=True, STELLAR_FEE_STATS_BACKGROUND=False, STELLAR_ASYNC_SUBMISSION=False)
+class ChannelSubmissionTests(TestCase):
+    """Test cases for submitting teacher writes through a channel account"""
+
+    def setUp(self):
+        cache.clear()
+        self.channel = Keypair.random()
+        ChannelAccount.objects.create(public_key=self.channel.public_key, secret_seed=self.channel.secret)
+        self.teacher = Keypair.random()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_channel_is_source_and_teacher_signs_operations(self):
+        """Test that the channel pays and sequences while the teacher owns the operations"""
+        server = mock.Mock()
+        server.submit_transaction.return_value = {'hash': 'abc'}
+        with mock.patch('attendance.stellar_helper.channel_pool', ChannelPool()), \
+                mock.patch('attendance.stellar_helper.get_horizon_server', return_value=server), \
+                mock.patch('attendance.stellar_helper.sequence_manager', SequenceManager(loader=lambda key: 10)), \
+                mock.patch('attendance.stellar_helper.fee_policy', FeePolicy(fetch_stats=lambda: None)):
+            StellarHelper._submit_transaction(
+                self.teacher, "Att end:1", [StellarHelper._self_payment(self.teacher.public_key)],
+                use_channel=True
+            )
+
+        envelope = server.submit_transaction.call_args[0][0]
+        transaction = envelope.transaction
+        self.assertEqual(transaction.source.account_id, self.channel.public_key)
+        self.assertEqual(transaction.sequence, 11)
+        self.assertEqual(transaction.operations[0].source.account_id, self.teacher.public_key)
+        self.assertEqual(len(envelope.signatures), 2)
+        self.assertIsNone(cache.get(f"stellar_channel_lease:{self.channel.public_key}"))
@@ -0,0 +1,42 @@
+from django.test import SimpleTestCase
+
+from attendance.stellar_clients import ClientRegistry
+
+
+class ClientRegistryTests(SimpleTestCase):
+    """Test cases for the pooled Horizon/Soroban client registry"""
+
+    def setUp(self):
+        self.registry = ClientRegistry()
+
+    def tearDown(self):
+        self.registry.close()
+
+    def test_same_server_returned_per_url(self):
+        """Test that repeated lookups reuse one pooled server per URL"""
+        first = self.registry.horizon('https://horizon.example.org')
+        second = self.registry.horizon('https://horizon.example.org')
+        other = self.registry.horizon('https://other.example.org')
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertIs(
+            self.registry.soroban('https://rpc.example.org'),
+            self.registry.soroban('https://rpc.example.org')
+        )
+
+    def test_stats_and_close(self):
+        """Test that pool statistics are reported and cleared on close"""
+        self.registry.horizon('https://horizon.example.org')
+        stats = self.registry.stats()
+        self.assertIn('https://horizon.example.org', stats['horizon'])
+        self.assertEqual(stats['horizon']['https://horizon.example.org']['requests_sent'], 0)
+
+        self.registry.close()
+        self.assertEqual(self.registry.stats()['horizon'], {})
+
+    def test_reset_after_fork_drops_inherited_clients(self):
+        """Test that a forked child builds its own clients"""
+        parent = self.registry.horizon('https://horizon.example.org')
+        self.registry.reset_after_fork()
+        child = self.registry.horizon('https://horizon.example.org')
+        self.assertIsNot(parent, child)
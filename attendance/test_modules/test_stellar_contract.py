@@ -0,0 +1,124 @@
+from datetime import time, timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from stellar_sdk import Keypair, StrKey, parse_transaction_envelope_from_xdr, scval
+
+from attendance.models import BlockchainOutbox, Course, Lecture, User
+from attendance.stellar_clients import close_clients
+from attendance.stellar_contract import argument_shape, contract_invoker
+from attendance.stellar_helper import StellarHelper, get_network_passphrase
+from attendance.stellar_simulator import get_simulator, reset_simulator
+
+CONTRACT_ID = StrKey.encode_contract(bytes(32))
+
+
+@override_settings(STELLAR_SIMULATOR=True, STELLAR_CONTRACT_ID=CONTRACT_ID, STELLAR_CONTRACT_INVOCATION=True,
+                   STELLAR_SIMULATOR_LATENCY=0.0, STELLAR_SIMULATOR_ERROR_RATE=0.0,
+                   STELLAR_SIMULATOR_LEDGER_CLOSE=0.0, STELLAR_FEE_STATS_BACKGROUND=False,
+                   STELLAR_CHANNELS_ENABLED=False, STELLAR_ASYNC_SUBMISSION=False)
+class ContractInvocationTests(TestCase):
+    """Test cases for contract calls with cached Soroban preparation"""
+
+    def setUp(self):
+        cache.clear()
+        close_clients()
+        reset_simulator()
+        self.students = [Keypair.random() for _ in range(3)]
+        for keys in self.students:
+            get_simulator().fund(keys.public_key)
+
+    def tearDown(self):
+        close_clients()
+        reset_simulator()
+        cache.clear()
+
+    def mark(self, keys, lecture_id=7):
+        return StellarHelper.mark_attendance(keys.secret, lecture_id, 'abc123')
+
+    def test_repeat_calls_reuse_the_preparation(self):
+        """Test that only the first check-in of an argument shape is simulated"""
+        hits_before = contract_invoker.stats['cache_hits']
+        for keys in self.students:
+            self.assertEqual(self.mark(keys)['status'], 'success')
+        self.assertEqual(get_simulator().stats['simulations'], 1)
+        self.assertEqual(contract_invoker.stats['cache_hits'] - hits_before, 2)
+        self.assertEqual(get_simulator().stats['applied'], 3)
+
+    def test_rejected_preparation_is_resimulated(self):
+        """Test that a call rejected for its resource fee drops the cache and is retried once"""
+        self.assertEqual(self.mark(self.students[0])['status'], 'success')
+        simulator = get_simulator()
+        simulator.soroban_resource_fee *= 2  # The cached fee (with margin) is now too low
+
+        invalidations_before = contract_invoker.stats['invalidations']
+        self.assertEqual(self.mark(self.students[1])['status'], 'success')
+        self.assertEqual(contract_invoker.stats['invalidations'] - invalidations_before, 1)
+        self.assertEqual(simulator.stats['simulations'], 2)
+        self.assertEqual(self.mark(self.students[2])['status'], 'success')
+        self.assertEqual(simulator.stats['simulations'], 2)
+
+    def test_argument_shape_ignores_values(self):
+        """Test that calls differing only in values share a shape, and other types do not"""
+        first = [scval.to_address(self.students[0].public_key), scval.to_uint64(1), scval.to_bytes(bytes(32))]
+        second = [scval.to_address(self.students[1].public_key), scval.to_uint64(99), scval.to_bytes(b'\x01' * 32)]
+        self.assertEqual(argument_shape(first), argument_shape(second))
+        self.assertNotEqual(argument_shape(first), argument_shape(first[:2] + [scval.to_bytes(bytes(16))]))
+        self.assertNotEqual(argument_shape(first), argument_shape([scval.to_address(CONTRACT_ID)] + first[1:]))
+
+    def test_failed_envelope_invalidates_its_shape(self):
+        """Test that a ledger failure reported later drops the preparation used to build it"""
+        response = self.mark(self.students[0])
+        envelope_xdr = get_simulator().transactions[response['hash']]['envelope_xdr']
+        contract_invoker.invalidate_envelope(envelope_xdr, get_network_passphrase())
+
+        self.mark(self.students[1])
+        self.assertEqual(get_simulator().stats['simulations'], 2)
+
+    def test_verify_attendance_reads_the_contract(self):
+        """Test that a check-in the indexer has not seen is confirmed by the contract"""
+        self.mark(self.students[0], lecture_id=12)
+        self.assertTrue(StellarHelper.verify_attendance(12, self.students[0].public_key))
+        self.assertFalse(StellarHelper.verify_attendance(12, self.students[1].public_key))
+
+    def test_teacher_is_added_by_the_admin(self):
+        """Test that registering a teacher calls add_teacher signed by the admin"""
+        admin, teacher = Keypair.random(), Keypair.random()
+        get_simulator().fund(admin.public_key)
+        get_simulator().fund(teacher.public_key)
+        with override_settings(STELLAR_ADMIN_SECRET=admin.secret):
+            response = StellarHelper.register_teacher(teacher.secret)
+        self.assertEqual(response['status'], 'success')
+        envelope = parse_transaction_envelope_from_xdr(get_simulator().transactions[response['hash']]['envelope_xdr'],
+                                                       get_network_passphrase())
+        self.assertEqual(envelope.transaction.source.account_id, admin.public_key)
+        invoke_args = envelope.transaction.operations[0].host_function.invoke_contract
+        self.assertEqual(invoke_args.function_name.sc_symbol, b'add_teacher')
+        self.assertEqual(scval.to_native(invoke_args.args[1]).address, teacher.public_key)
+
+        with override_settings(STELLAR_ADMIN_SECRET=''):
+            self.assertIn('error', StellarHelper.register_teacher(teacher.secret))
+
+    def test_migration_adds_teachers_and_upcoming_lectures(self):
+        """Test that preparing a new contract allow-lists the teachers and queues only today's and later lectures"""
+        admin, keys = Keypair.random(), Keypair.random()
+        get_simulator().fund(admin.public_key)
+        teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True,
+                                           stellar_seed=keys.secret, stellar_public_key=keys.public_key)
+        course = Course.objects.create(name='Physics', code='PHY101', teacher=teacher)
+        today = timezone.localdate()
+        upcoming = Lecture.objects.create(course=course, title='Optics', date=today,
+                                          start_time=time(9), end_time=time(10))
+        Lecture.objects.create(course=course, title='Mechanics', date=today - timedelta(days=7),
+                               start_time=time(9), end_time=time(10))
+
+        with override_settings(STELLAR_ADMIN_SECRET=admin.secret):
+            call_command('migrate_attendance_contract', stdout=StringIO())
+
+        self.assertEqual(get_simulator().stats['applied'], 1)  # add_teacher
+        entry = BlockchainOutbox.objects.get()
+        self.assertEqual((entry.kind, entry.lecture, entry.signer), (BlockchainOutbox.CREATE_LECTURE, upcoming, teacher))
+        self.assertEqual(entry.payload['duration_minutes'], 60)
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from stellar_sdk import Keypair, Network
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import BadRequestError, BadResponseError
+
+from attendance.stellar_fees import ADMIN, CHECKIN, FeePolicy, submit_with_fee_bumps
+from attendance.stellar_helper import StellarHelper
+from attendance.stellar_sequence import SequenceManager
+
+FEE_STATS = {
+    'last_ledger_base_fee': '100',
+    'fee_charged': {'p10': '100', 'p50': '200', 'p90': '5000', 'p95': '8000', 'p99': '20000'},
+}
+
+
+def timeout_error():
+    return BadResponseError(Response(status_code=504, text='{"status": 504}', headers={}, url=''))
+
+
+@override_settings(STELLAR_FEE_STATS_BACKGROUND=False, STELLAR_FEE_CHECKIN_PERCENTILE=50,
+                   STELLAR_FEE_ADMIN_PERCENTILE=90, STELLAR_MAX_BASE_FEE=10000,
+                   STELLAR_FEE_DEFAULT=1000, STELLAR_FEE_BUMP_MULTIPLIER=2, STELLAR_FEE_BUMP_ATTEMPTS=2,
+                   STELLAR_ASYNC_SUBMISSION=False)
+class FeePolicyTests(SimpleTestCase):
+    """Test cases for fee selection from cached fee stats"""
+
+    def test_operation_classes_bid_their_percentile(self):
+        """Test that check-ins bid the median and admin writes the 90th percentile"""
+        fetch = mock.Mock(return_value=FEE_STATS)
+        policy = FeePolicy(fetch_stats=fetch)
+        self.assertEqual(policy.base_fee(CHECKIN), 200)
+        self.assertEqual(policy.base_fee(ADMIN), 5000)
+        self.assertEqual(policy.base_fee(percentile=99), 10000)  # capped at STELLAR_MAX_BASE_FEE
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_default_fee_without_stats(self):
+        """Test that an unreachable Horizon falls back to STELLAR_FEE_DEFAULT"""
+        policy = FeePolicy(fetch_stats=mock.Mock(side_effect=RuntimeError('down')))
+        self.assertEqual(policy.base_fee(CHECKIN), 1000)
+
+    def test_stuck_transaction_is_fee_bumped(self):
+        """Test that a 504 resubmits the same envelope inside a higher-fee fee bump"""
+        source = Keypair.random()
+        envelope = StellarHelper._self_payment(source.public_key)
+        server = mock.Mock()
+        server.submit_transaction.side_effect = [timeout_error(), {'hash': 'bumped'}]
+        with mock.patch('attendance.stellar_helper.get_horizon_server', return_value=server), \
+                mock.patch('attendance.stellar_helper.fee_policy', FeePolicy(fetch_stats=lambda: FEE_STATS)), \
+                mock.patch('attendance.stellar_helper.sequence_manager', SequenceManager(loader=lambda key: 1)):
+            response = StellarHelper._submit_transaction(source, "Att:1", [envelope], fee_class=CHECKIN)
+
+        self.assertEqual(response, {'hash': 'bumped'})
+        inner, bumped = [call[0][0] for call in server.submit_transaction.call_args_list]
+        self.assertEqual(inner.transaction.fee, 200)
+        self.assertIsNotNone(inner.transaction.preconditions.time_bounds)
+        self.assertEqual(bumped.transaction.inner_transaction_envelope.hash(), inner.hash())
+        self.assertEqual(bumped.transaction.fee, 10000 * 2)  # inner operation plus the fee bump itself
+
+    def test_fee_bump_outbids_the_queued_fee_tenfold(self):
+        """Test that a bump bids at least 10x the stuck fee, whatever the multiplier, up to the cap"""
+        policy = FeePolicy(fetch_stats=mock.Mock(side_effect=RuntimeError('down')))
+        self.assertEqual(policy.bump_fee(100), 1000)
+        self.assertEqual(policy.bump_fee(500), 5000)  # STELLAR_FEE_BUMP_MULTIPLIER=2 alone would bid 1000
+        self.assertEqual(policy.bump_fee(5000), 10000)  # capped at STELLAR_MAX_BASE_FEE
+
+    def test_other_errors_are_not_bumped(self):
+        """Test that a rejected transaction is raised without a fee bump"""
+        server = mock.Mock()
+        error = BadRequestError(Response(
+            status_code=400, text='{"extras": {"result_codes": {"transaction": "tx_failed"}}}', headers={}, url=''
+        ))
+        server.submit_transaction.side_effect = error
+        with self.assertRaises(BadRequestError):
+            submit_with_fee_bumps(server, mock.Mock(), Keypair.random(), 100,
+                                  Network.TESTNET_NETWORK_PASSPHRASE, policy=FeePolicy(fetch_stats=lambda: FEE_STATS))
+        self.assertEqual(server.submit_transaction.call_count, 1)
+
+    def test_try_again_later_is_not_bumped(self):
+        """Test that a 503 (a transaction from the source is already queued) is raised without a fee bump"""
+        server = mock.Mock()
+        server.submit_transaction.side_effect = BadResponseError(Response(
+            status_code=503, text='{"status": 503}', headers={}, url=''
+        ))
+        with self.assertRaises(BadResponseError):
+            submit_with_fee_bumps(server, mock.Mock(), Keypair.random(), 100,
+                                  Network.TESTNET_NETWORK_PASSPHRASE, policy=FeePolicy(fetch_stats=lambda: FEE_STATS))
+        self.assertEqual(server.submit_transaction.call_count, 1)
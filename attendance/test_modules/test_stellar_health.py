@@ -0,0 +1,118 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from attendance.models import User
+from attendance.stellar_health import PROBE_FLAG_KEY, SNAPSHOT_KEY, HealthProber, health_prober
+
+
+class CountingProbe:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {'status': 'success', 'message': 'ok', 'horizon': {'latency_ms': 12.5, 'latest_ledger': 100},
+                'soroban': {'latency_ms': 20.0}}
+
+
+@override_settings(STELLAR_HEALTH_TTL=15, STELLAR_HEALTH_HISTORY=3)
+class HealthProberTests(TestCase):
+    """Test cases for the cached blockchain health snapshot"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_concurrent_callers_share_one_probe(self):
+        """Test that callers arriving during a probe wait for it instead of probing again"""
+        probe = CountingProbe(delay=0.2)
+        prober = HealthProber(probe)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(prober.snapshot())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(probe.calls, 1)
+        self.assertEqual({result['status'] for result in results}, {'success'})
+
+    def test_fresh_snapshot_is_served_from_cache(self):
+        """Test that no probe runs while the snapshot is within its TTL"""
+        probe = CountingProbe()
+        prober = HealthProber(probe)
+        prober.snapshot()
+        prober.snapshot()
+        self.assertEqual(probe.calls, 1)
+
+    def test_stale_snapshot_is_served_while_refreshing(self):
+        """Test that a stale snapshot is returned at once and re-probed in the background"""
+        probe = CountingProbe()
+        prober = HealthProber(probe)
+        stale = prober.refresh()
+        cache.set(SNAPSHOT_KEY, {**stale, 'checked_at': time.time() - 60})
+
+        result = prober.snapshot()
+        self.assertTrue(result['stale'])
+        deadline = time.monotonic() + 2
+        while probe.calls < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(probe.calls, 2)
+
+    def test_probe_in_another_process_is_not_duplicated(self):
+        """Test that the shared probing flag keeps a second process from probing"""
+        probe = CountingProbe()
+        prober = HealthProber(probe, sleep=lambda seconds: cache.delete(PROBE_FLAG_KEY))
+        cache.add(PROBE_FLAG_KEY, True)
+        result = prober.snapshot()
+        self.assertEqual(probe.calls, 0)
+        self.assertEqual(result['status'], 'error')
+
+    def test_history_is_bounded(self):
+        """Test that only the configured number of history points is kept"""
+        prober = HealthProber(CountingProbe())
+        for _ in range(5):
+            prober.refresh(force=True)
+        history = prober.history()
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history[-1]['horizon_latency_ms'], 12.5)
+        self.assertEqual(history[-1]['latest_ledger'], 100)
+
+
+@override_settings(STELLAR_HEALTH_TTL=15)
+class BlockchainStatusViewTests(TestCase):
+    """Test cases for the blockchain status endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='pass12345', is_teacher=True)
+        self.client.force_login(self.teacher)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_ajax_poll_serves_cached_snapshot(self):
+        """Test that repeated polls reuse one probe and include the history"""
+        probe = CountingProbe()
+        health_prober._probe, original = probe, health_prober._probe
+        try:
+            for _ in range(3):
+                response = self.client.get(reverse('blockchain_status'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            page = self.client.get(reverse('blockchain_status'))
+        finally:
+            health_prober._probe = original
+
+        self.assertEqual(probe.calls, 1)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertEqual(len(response.json()['history']), 1)
+        self.assertContains(page, 'Recent Checks')
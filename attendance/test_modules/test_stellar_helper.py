@@ -0,0 +1,98 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from stellar_sdk import Keypair
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import BadRequestError
+
+from attendance.stellar_helper import StellarHelper
+
+TEACHER = Keypair.random()
+STUDENTS = [Keypair.random().public_key for _ in range(250)]
+
+
+def tx_failed(operation_codes):
+    body = {'extras': {'result_codes': {'transaction': 'tx_failed', 'operations': operation_codes}}}
+    return BadRequestError(Response(status_code=400, text=json.dumps(body), headers={}, url=''))
+
+
+@override_settings(STELLAR_CONTRACT_ID='CTEST')
+class BatchManualAttendanceTests(SimpleTestCase):
+    """Test cases for StellarHelper.batch_manual_attendance"""
+
+    def test_students_are_packed_into_100_operation_transactions(self):
+        """Test that 250 students need three transactions and each is reported"""
+        submitted = []
+
+        def submit(keypair, memo, operations=(), **kwargs):
+            submitted.append(list(operations))
+            return {'hash': f"hash{len(submitted)}"}
+
+        with mock.patch.object(StellarHelper, '_submit_transaction', side_effect=submit):
+            response = StellarHelper.batch_manual_attendance(TEACHER.secret, 7, STUDENTS)
+
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual([len(ops) for ops in submitted], [100, 100, 50])
+        self.assertEqual(submitted[0][0].destination.account_id, STUDENTS[0])
+        self.assertEqual([tx['hash'] for tx in response['transactions']], ['hash1', 'hash2', 'hash3'])
+        self.assertEqual(response['transactions'][2]['students'], STUDENTS[200:])
+        self.assertEqual(response['results'][STUDENTS[150]], {'status': 'success', 'hash': 'hash2'})
+
+    def test_rejected_operations_are_dropped_and_chunk_resubmitted(self):
+        """Test that one unfunded student does not fail the whole chunk"""
+        students = STUDENTS[:3]
+        calls = []
+
+        def submit(keypair, memo, operations=(), **kwargs):
+            calls.append(len(operations))
+            if len(calls) == 1:
+                raise tx_failed(['op_success', 'op_no_destination', 'op_success'])
+            return {'hash': 'retryhash'}
+
+        with mock.patch.object(StellarHelper, '_submit_transaction', side_effect=submit):
+            response = StellarHelper.batch_manual_attendance(TEACHER.secret, 7, students)
+
+        self.assertEqual(calls, [3, 2])
+        self.assertEqual(response['status'], 'partial')
+        self.assertIn('op_no_destination', response['results'][students[1]]['error'])
+        self.assertEqual(response['transactions'], [{'hash': 'retryhash', 'students': [students[0], students[2]]}])
+
+    def test_total_failure_returns_error(self):
+        """Test that a failure for every student is reported as an error"""
+        with mock.patch.object(StellarHelper, '_submit_transaction', side_effect=RuntimeError('down')):
+            response = StellarHelper.batch_manual_attendance(TEACHER.secret, 7, STUDENTS[:5])
+        self.assertIn('error', response)
+        self.assertEqual(len(response['results']), 5)
+
+    def test_missing_and_invalid_keys_are_reported_without_failing_the_chunk(self):
+        """Test that students without a usable key are reported and the rest are still submitted"""
+        submitted = []
+
+        def submit(keypair, memo, operations=(), **kwargs):
+            submitted.append([operation.destination.account_id for operation in operations])
+            return {'hash': 'hash1'}
+
+        students = [STUDENTS[0], None, '', 'GNOTAKEY', STUDENTS[1]]
+        with mock.patch.object(StellarHelper, '_submit_transaction', side_effect=submit):
+            response = StellarHelper.batch_manual_attendance(TEACHER.secret, 7, students)
+
+        self.assertEqual(submitted, [STUDENTS[:2]])
+        self.assertEqual(response['status'], 'partial')
+        for key in (None, '', 'GNOTAKEY'):
+            self.assertIn('invalid Stellar public key', response['results'][key]['error'])
+
+    def test_lecture_ids_are_never_truncated_in_memos(self):
+        """Test that a lecture id too long for the memo is refused rather than cut short"""
+        memos = []
+
+        def submit(keypair, memo, operations=(), **kwargs):
+            memos.append(memo)
+            return {'hash': 'hash1'}
+
+        with mock.patch.object(StellarHelper, '_submit_transaction', side_effect=submit):
+            StellarHelper.batch_manual_attendance(TEACHER.secret, 12345678, STUDENTS[:1])
+            response = StellarHelper.batch_manual_attendance(TEACHER.secret, 10 ** 23, STUDENTS[:1])
+
+        self.assertEqual(memos, ['MAtt:12345678'])
+        self.assertIn('too long', response['error'])
@@ -0,0 +1,152 @@
+from datetime import date, time, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from stellar_sdk import Keypair, Network
+
+from attendance.models import (Attendance, AttendanceSession, ChainAttendanceRecord, Course, Enrollment,
+                               IndexerCursor, Lecture, User)
+from attendance.stellar_clients import close_clients
+from attendance.stellar_helper import StellarHelper
+from attendance.stellar_indexer import ACCOUNT_CURSOR, AttendanceIndexer, parse_memo, watched_accounts
+from attendance.stellar_simulator import get_simulator, reset_simulator
+
+
+class MemoParsingTests(TestCase):
+    """Test cases for recognising the memos StellarHelper writes"""
+
+    def test_attendance_memos(self):
+        """Test that each memo shape maps to its kind, lecture reference and trailing part"""
+        self.assertEqual(parse_memo('Att:42:bm9uY2Vf'), (ChainAttendanceRecord.CHECK_IN, '42', 'bm9uY2Vf'))
+        self.assertEqual(parse_memo('MAtt:42'), (ChainAttendanceRecord.MANUAL, '42', ''))
+        self.assertEqual(parse_memo('Att start:42'), (ChainAttendanceRecord.SESSION_START, '42', ''))
+        self.assertEqual(parse_memo('Create lecture: 42'), (ChainAttendanceRecord.LECTURE, '42', ''))
+        self.assertIsNone(parse_memo('Register student'))
+        self.assertIsNone(parse_memo(None))
+
+
+@override_settings(STELLAR_SIMULATOR=True, STELLAR_CONTRACT_ID='', STELLAR_SIMULATOR_LATENCY=0.0,
+                   STELLAR_SIMULATOR_ERROR_RATE=0.0, STELLAR_SIMULATOR_LEDGER_CLOSE=0.0,
+                   STELLAR_SIMULATOR_AUTO_FUND=True, STELLAR_FEE_STATS_BACKGROUND=False,
+                   STELLAR_CHANNELS_ENABLED=False)
+class AttendanceIndexerTests(TestCase):
+    """Test cases for indexing attendance writes from the ledger"""
+
+    def setUp(self):
+        cache.clear()
+        close_clients()
+        reset_simulator()
+        self.teacher = self.make_user('teacher', is_teacher=True)
+        self.course = Course.objects.create(name='Course', code='C1', teacher=self.teacher)
+        self.lecture = self.make_lecture()
+        self.session = AttendanceSession.objects.create(lecture=self.lecture, nonce=StellarHelper.generate_nonce())
+        self.students = [self.make_user(f'student{i}', is_student=True) for i in range(3)]
+        for i, student in enumerate(self.students):
+            Enrollment.objects.create(student=student, course=self.course, roll_number=str(i))
+            get_simulator().fund(student.stellar_public_key)  # Payment destinations must exist
+
+    def tearDown(self):
+        close_clients()
+        reset_simulator()
+        cache.clear()
+
+    def make_user(self, username, **flags):
+        keypair = Keypair.random()
+        return User.objects.create(username=username, stellar_public_key=keypair.public_key,
+                                   stellar_seed=keypair.secret, **flags)
+
+    def make_lecture(self):
+        return Lecture.objects.create(course=self.course, title='Lecture', date=date(2026, 1, 5),
+                                      start_time=time(9), end_time=time(10))
+
+    def indexer(self, **kwargs):
+        return AttendanceIndexer(Network.TESTNET_NETWORK_PASSPHRASE, page_size=2, **kwargs)
+
+    def check_in(self, student, lecture=None, nonce=None):
+        lecture = lecture or self.lecture
+        Attendance.objects.get_or_create(student=student, lecture=lecture)
+        StellarHelper.mark_attendance(student.stellar_seed, lecture.pk, nonce or self.session.nonce)
+
+    def verified(self, student, lecture=None):
+        return StellarHelper.verify_attendance((lecture or self.lecture).pk, student.stellar_public_key)
+
+    def test_verify_attendance_reads_the_index(self):
+        """Test that check-ins, single and batch manual marks all verify once indexed"""
+        checked_in, manual, batched = self.students
+        other_lecture = self.make_lecture()
+        StellarHelper.start_attendance(self.teacher.stellar_seed, self.lecture.pk)
+        self.check_in(checked_in)
+        StellarHelper.manual_attendance(self.teacher.stellar_seed, self.lecture.pk, manual.stellar_public_key)
+        StellarHelper.batch_manual_attendance(self.teacher.stellar_seed, other_lecture.pk,
+                                              [batched.stellar_public_key])
+
+        for student in self.students:
+            self.assertFalse(self.verified(student) or self.verified(student, other_lecture))
+
+        counts = self.indexer().run_once()
+        self.assertEqual(counts['transactions'], 4)
+
+        self.assertTrue(self.verified(checked_in))
+        self.assertTrue(self.verified(manual))
+        self.assertTrue(self.verified(batched, other_lecture))
+        self.assertFalse(self.verified(checked_in, other_lecture))
+        record = ChainAttendanceRecord.objects.get(kind=ChainAttendanceRecord.CHECK_IN)
+        self.assertEqual(record.signer_public_key, checked_in.stellar_public_key)
+
+    def test_writes_from_unentitled_accounts_are_ignored(self):
+        """Test that only the course teacher's marks and enrolled students' check-ins with a session nonce count"""
+        outsider = self.make_user('outsider', is_student=True)
+        student, classmate, _ = self.students
+        StellarHelper.start_attendance(self.teacher.stellar_seed, self.lecture.pk)
+        self.check_in(outsider)
+        self.check_in(student, nonce='guessed-nonce')
+        # A student posing as the teacher, and a session start it signs itself
+        StellarHelper.manual_attendance(classmate.stellar_seed, self.lecture.pk, classmate.stellar_public_key)
+        StellarHelper.manual_attendance(classmate.stellar_seed, self.lecture.pk, student.stellar_public_key)
+        StellarHelper.start_attendance(classmate.stellar_seed, self.lecture.pk)
+
+        self.indexer().run_once()
+
+        self.assertEqual(list(ChainAttendanceRecord.objects.values_list('kind', 'signer_public_key')),
+                         [(ChainAttendanceRecord.SESSION_START, self.teacher.stellar_public_key)])
+        for user in (outsider, student, classmate):
+            self.assertFalse(self.verified(user))
+
+    def test_check_in_before_the_session_start_does_not_count(self):
+        """Test that a check-in only verifies when the session start precedes it on the ledger"""
+        early, on_time, _ = self.students
+        self.check_in(early)
+        StellarHelper.start_attendance(self.teacher.stellar_seed, self.lecture.pk)
+        self.check_in(on_time)
+
+        self.indexer().run_once()
+
+        self.assertFalse(self.verified(early))
+        self.assertTrue(self.verified(on_time))
+
+    def test_cursor_resumes_without_duplicates(self):
+        """Test that a second run starts after each account's stored cursor"""
+        first, second, _ = self.students
+        StellarHelper.start_attendance(self.teacher.stellar_seed, self.lecture.pk)
+        self.check_in(first)
+        self.indexer().run_once()
+        first_cursor = IndexerCursor.objects.get(name=ACCOUNT_CURSOR.format(first.stellar_public_key)).cursor
+
+        self.check_in(first, self.make_lecture())  # No session nonce for this lecture: not indexed
+        self.check_in(second)
+        counts = self.indexer().run_once()
+
+        self.assertEqual(counts['transactions'], 1)
+        self.assertEqual(ChainAttendanceRecord.objects.count(), 3)
+        self.assertNotEqual(IndexerCursor.objects.get(name=ACCOUNT_CURSOR.format(first.stellar_public_key)).cursor,
+                            first_cursor)
+
+    def test_students_are_followed_only_while_active(self):
+        """Test that staff are always followed and students only with recent or unconfirmed attendance"""
+        active, confirmed, idle = self.students
+        Attendance.objects.create(student=active, lecture=self.lecture)
+        Attendance.objects.create(student=confirmed, lecture=self.lecture, blockchain_verified=True)
+        Attendance.objects.filter(student=confirmed).update(timestamp=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(watched_accounts(), [self.teacher.stellar_public_key, active.stellar_public_key])
@@ -0,0 +1,92 @@
+import json
+import threading
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import BadRequestError
+
+from attendance.stellar_sequence import SequenceManager, is_bad_sequence_error
+
+PUBLIC_KEY = 'GBRPYHIL2CI3FNQ4BXLFMNDLFJUNPU2HY3ZMFSHONUCEOASW7QC7OX2H'
+
+
+def horizon_error(result_code):
+    body = {'extras': {'result_codes': {'transaction': result_code}}}
+    return BadRequestError(Response(status_code=400, text=json.dumps(body), headers={}, url=''))
+
+
+class SequenceManagerTests(SimpleTestCase):
+    """Test cases for the local sequence-number manager"""
+
+    def setUp(self):
+        cache.clear()
+        self.ledger_sequence = 100
+        self.loads = 0
+        self.manager = SequenceManager(loader=self.load)
+
+    def tearDown(self):
+        cache.clear()
+
+    def load(self, public_key):
+        self.loads += 1
+        return self.ledger_sequence
+
+    def test_sequences_are_loaded_once_and_incremented(self):
+        """Test that only the first reservation hits the loader"""
+        self.assertEqual(self.manager.next_sequence(PUBLIC_KEY), 101)
+        self.assertEqual(self.manager.next_sequence(PUBLIC_KEY), 102)
+        self.assertEqual(self.manager.next_account(PUBLIC_KEY).sequence, 102)
+        self.assertEqual(self.loads, 1)
+
+    def test_concurrent_callers_get_unique_sequences(self):
+        """Test that threads never receive the same sequence number"""
+        reserved = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(20):
+                sequence = self.manager.next_sequence(PUBLIC_KEY)
+                with lock:
+                    reserved.append(sequence)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(reserved), 160)
+        self.assertEqual(len(set(reserved)), 160)
+        self.assertEqual(self.loads, 1)
+
+    def test_bad_sequence_resyncs_and_retries(self):
+        """Test that tx_bad_seq reloads the ledger sequence and rebuilds"""
+        self.manager.next_sequence(PUBLIC_KEY)  # cache primed at 101
+        self.ledger_sequence = 200  # another worker moved the account on
+        attempts = []
+
+        def build_and_submit(account):
+            attempts.append(account.sequence)
+            if len(attempts) == 1:
+                raise horizon_error('tx_bad_seq')
+            return {'successful': True}
+
+        self.assertEqual(self.manager.submit(PUBLIC_KEY, build_and_submit), {'successful': True})
+        self.assertEqual(attempts, [101, 200])
+
+    def test_other_errors_invalidate_the_cache(self):
+        """Test that a failed submission forces a reload next time"""
+        def build_and_submit(account):
+            raise horizon_error('tx_insufficient_fee')
+
+        with self.assertRaises(BadRequestError):
+            self.manager.submit(PUBLIC_KEY, build_and_submit)
+        self.manager.next_sequence(PUBLIC_KEY)
+        self.assertEqual(self.loads, 2)
+
+    def test_is_bad_sequence_error(self):
+        """Test detection of tx_bad_seq results"""
+        self.assertTrue(is_bad_sequence_error(horizon_error('tx_bad_seq')))
+        self.assertFalse(is_bad_sequence_error(horizon_error('tx_failed')))
+        self.assertFalse(is_bad_sequence_error(ValueError('boom')))
@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from stellar_sdk import Keypair, Network, TransactionBuilder
+from stellar_sdk.exceptions import BadRequestError
+
+from attendance.stellar_clients import close_clients, get_horizon_server
+from attendance.stellar_helper import StellarHelper
+from attendance.stellar_sequence import sequence_manager
+from attendance.stellar_simulator import AsyncSimulatorClient, LedgerSimulator, get_simulator, reset_simulator
+
+
+@override_settings(STELLAR_SIMULATOR=True, STELLAR_CONTRACT_ID='', STELLAR_SIMULATOR_LATENCY=0.0,
+                   STELLAR_SIMULATOR_ERROR_RATE=0.0, STELLAR_SIMULATOR_LEDGER_CLOSE=0.0,
+                   STELLAR_SIMULATOR_AUTO_FUND=True, STELLAR_FEE_STATS_BACKGROUND=False,
+                   STELLAR_CHANNELS_ENABLED=False)
+class LedgerSimulatorTests(TestCase):
+    """Test cases for running StellarHelper against the offline ledger simulator"""
+
+    def setUp(self):
+        cache.clear()
+        close_clients()
+        reset_simulator()
+
+    def tearDown(self):
+        close_clients()
+        reset_simulator()
+        cache.clear()
+
+    def test_check_ins_run_the_real_code_path(self):
+        """Test that check-ins are built, signed and sequenced without testnet"""
+        student = Keypair.random()
+        for lecture in (7, 8):
+            response = StellarHelper.mark_attendance(student.secret, lecture, 'nonce')
+            self.assertEqual(response['status'], 'success')
+            self.assertNotIn('simulated', response['message'])
+
+        simulator = get_simulator()
+        records = sorted(simulator.transactions.values(), key=lambda record: record['source_account_sequence'])
+        self.assertEqual([record['memo'] for record in records], ['Att:7:nonce', 'Att:8:nonce'])
+        self.assertEqual(simulator.accounts[student.public_key]['sequence'], (1 << 32) + 2)
+
+    def test_stale_sequence_is_resynced(self):
+        """Test that a wrong cached sequence gets tx_bad_seq and is recovered from the ledger"""
+        student = Keypair.random()
+        get_simulator().fund(student.public_key)
+        sequence_manager.prime(student.public_key, 42)
+
+        response = StellarHelper.mark_attendance(student.secret, 7, 'nonce')
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(get_simulator().stats['rejected'], 1)
+
+    def test_unsigned_operation_is_rejected(self):
+        """Test that signatures are verified against the transaction and operation sources"""
+        signer, other = Keypair.random(), Keypair.random()
+        server = get_horizon_server()
+        transaction = TransactionBuilder(
+            source_account=server.load_account(signer.public_key),
+            network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE,
+            base_fee=100
+        ).append_payment_op(other.public_key, StellarHelper._self_payment(other.public_key).asset, '1',
+                            source=other.public_key).add_text_memo('x').set_timeout(30).build()
+        transaction.sign(signer)
+
+        with self.assertRaises(BadRequestError) as raised:
+            server.submit_transaction(transaction)
+        self.assertEqual(raised.exception.extras['result_codes']['transaction'], 'tx_bad_auth')
+
+    @override_settings(STELLAR_SIMULATOR_AUTO_FUND=False)
+    def test_unfunded_students_fail_their_operations(self):
+        """Test that batch manual attendance sees op_no_destination for unfunded students"""
+        teacher, funded, unfunded = Keypair.random(), Keypair.random(), Keypair.random()
+        get_simulator().fund(teacher.public_key)
+        get_simulator().fund(funded.public_key)
+
+        response = StellarHelper.batch_manual_attendance(teacher.secret, 7, [funded.public_key, unfunded.public_key])
+        self.assertEqual(response['status'], 'partial')
+        self.assertIn('op_no_destination', response['results'][unfunded.public_key]['error'])
+        self.assertEqual(response['transactions'][0]['students'], [funded.public_key])
+
+    def test_streams_replay_the_ledger_and_end(self):
+        """Test that sync and async streams yield the records after the cursor and then stop"""
+        student = Keypair.random()
+        for lecture in (7, 8, 9):
+            StellarHelper.mark_attendance(student.secret, lecture, 'nonce')
+        builder = get_horizon_server().transactions().for_account(student.public_key).limit(2)
+
+        memos = [record['memo'] for record in builder.stream()]
+        self.assertEqual(memos, ['Att:7:nonce', 'Att:8:nonce', 'Att:9:nonce'])
+        self.assertEqual(list(builder.cursor('now').stream()), [])
+
+        async def stream_async():
+            url = f'https://horizon.invalid/accounts/{student.public_key}/transactions'
+            return [record['memo'] async for record in AsyncSimulatorClient().stream(url, {'limit': 1})]
+
+        self.assertEqual(asyncio.run(stream_async()), memos)
+
+    def test_error_injection_is_reproducible(self):
+        """Test that the same seed injects the same errors"""
+        def outcomes(seed):
+            simulator = LedgerSimulator(Network.TESTNET_NETWORK_PASSPHRASE, error_rate=0.3, seed=seed)
+            return [simulator.handle('GET', 'https://horizon.invalid/')[0].status_code for _ in range(20)]
+
+        self.assertEqual(outcomes(1), outcomes(1))
+        self.assertIn(503, outcomes(1))
+        self.assertEqual(json.loads(get_simulator().handle('GET', 'https://horizon.invalid/fee_stats')[0].text)
+                         ['last_ledger_base_fee'], '100')
@@ -20,6 +20,9 @@ urlpatterns = [
     path('attendance/scan/', views.scan_attendance, name='scan_attendance'),
     path('attendance/process/', views.process_attendance, name='process_attendance'),
     path('attendance/sessions/<int:session_id>/close/', views.close_attendance_session, name='close_attendance_session'),
+    path('attendance/sessions/<int:session_id>/qr.png', views.attendance_qr_image, name='attendance_qr_image'),
+    path('attendance/sessions/<int:session_id>/qr.json', views.attendance_qr_status, name='attendance_qr_status'),
+    path('attendance/sessions/<int:session_id>/projector/', views.attendance_projector, name='attendance_projector'),
     path('attendance/manual/<int:lecture_id>/', views.manual_attendance, name='manual_attendance'),
     
     # User Management
@@ -4,23 +4,43 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import PasswordResetView
 from django.contrib import messages
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.db import transaction
-from django.urls import reverse_lazy
+from django.db.models import Count, Max, Q
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
 from django.views.generic import CreateView, ListView, DetailView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.core.cache import cache
+from django.conf import settings
 from datetime import datetime
 import logging
+import math
 
-from .models import User, Course, Lecture, Enrollment, AttendanceSession, Attendance
+from .models import (User, Course, Lecture, Enrollment, AttendanceSession, Attendance, BlockchainOutbox,
+                     ChainAttendanceRecord, IndexerCursor)
 from .forms import (AdminSignUpForm, TeacherSignUpForm, StudentSignUpForm, 
                     CourseForm, LectureForm, EnrollmentForm, 
                     AttendanceSessionForm, QRAttendanceForm, ManualAttendanceForm)
-from .stellar_helper import StellarHelper
-from .qr_utils import generate_qr_code, verify_qr_data
+from .stellar_helper import StellarHelper, is_valid_public_key
+from .stellar_clients import client_stats
+from .stellar_channels import channel_pool
+from .stellar_health import health_prober
+from .circuit_breaker import OPEN, breaker_states, get_breaker
+from .stellar_contract import contract_invoker
+from . import outbox
+from .keypair_pool import provision_account
+from .anchoring import anchor_session, anchoring_enabled
+from .checkin import ALREADY_MARKED, CheckInError, check_in
+from .checkin_buffer import buffer_check_in, write_behind_enabled
+from .roster import drop_roster, load_roster
+from .idempotency import idempotency_stats, idempotent
+from .ratelimit import RateLimit, client_ip, ratelimit
+from .qr_utils import (invalidate_qr_code, payload_etag, qr_image_cache, render_payload_png, rotating_tokens_enabled,
+                       seconds_until_rotation, session_payload, verify_qr_data)
 
 # Authentication Views
+@method_decorator(ratelimit('signup'), name='dispatch')
 class AdminSignUpView(CreateView):
     model = User
     form_class = AdminSignUpForm
@@ -31,20 +51,15 @@ class AdminSignUpView(CreateView):
         return super().get_context_data(**kwargs)
     
     def form_valid(self, form):
-        user = form.save()
-        # Create a blockchain wallet for the admin
-        keypair = StellarHelper.create_keypair()
-        user.stellar_public_key = keypair['public_key']
-        user.stellar_seed = keypair['secret_seed']
-        user.save()
-        # Fund the account on testnet
-        StellarHelper.fund_account(user.stellar_public_key)
-        # Register user on the blockchain
-        StellarHelper.register_teacher(user.stellar_seed)
+        with transaction.atomic():
+            user = form.save()
+            # Claim a pre-funded blockchain wallet; registration runs in the outbox worker
+            provision_account(user, 'admin')
         login(self.request, user)
         return redirect('dashboard')
 
 @login_required
+@ratelimit('signup')
 def teacher_signup(request):
     if not request.user.is_superuser:
         messages.error(request, "You don't have permission to create teacher accounts.")
@@ -53,16 +68,10 @@ def teacher_signup(request):
     if request.method == 'POST':
         form = TeacherSignUpForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            # Create a blockchain wallet for the teacher
-            keypair = StellarHelper.create_keypair()
-            user.stellar_public_key = keypair['public_key']
-            user.stellar_seed = keypair['secret_seed']
-            user.save()
-            # Fund the account on testnet
-            StellarHelper.fund_account(user.stellar_public_key)
-            # Register teacher on the blockchain
-            StellarHelper.register_teacher(user.stellar_seed)
+            with transaction.atomic():
+                user = form.save()
+                # Claim a pre-funded blockchain wallet; registration runs in the outbox worker
+                provision_account(user, 'teacher')
             messages.success(request, f"Teacher account {user.username} created successfully!")
             return redirect('teacher_list')
     else:
@@ -73,6 +82,7 @@ def teacher_signup(request):
         'user_type': 'teacher'
     })
 
+@method_decorator(ratelimit('signup'), name='dispatch')
 class StudentSignUpView(CreateView):
     model = User
     form_class = StudentSignUpForm
@@ -83,16 +93,10 @@ class StudentSignUpView(CreateView):
         return super().get_context_data(**kwargs)
     
     def form_valid(self, form):
-        user = form.save()
-        # Create a blockchain wallet for the student
-        keypair = StellarHelper.create_keypair()
-        user.stellar_public_key = keypair['public_key']
-        user.stellar_seed = keypair['secret_seed']
-        user.save()
-        # Fund the account on testnet
-        StellarHelper.fund_account(user.stellar_public_key)
-        # Register student on the blockchain
-        StellarHelper.register_student(user.stellar_seed)
+        with transaction.atomic():
+            user = form.save()
+            # Claim a pre-funded blockchain wallet; registration runs in the outbox worker
+            provision_account(user, 'student')
         login(self.request, user)
         return redirect('dashboard')
 
@@ -182,32 +186,29 @@ def course_detail(request, pk):
         if request.method == 'POST' and 'lecture_form' in request.POST:
             lecture_form = LectureForm(request.POST)
             if lecture_form.is_valid():
-                lecture = lecture_form.save(commit=False)
-                lecture.course = course
-                lecture.save()
-                
-                # Create lecture in blockchain
-                # Calculate duration in minutes from start_time and end_time
-                start_dt = datetime.combine(lecture.date, lecture.start_time)
-                end_dt = datetime.combine(lecture.date, lecture.end_time)
-                duration_minutes = int((end_dt - start_dt).total_seconds() / 60)
-                
-                blockchain_response = StellarHelper.create_lecture(
-                    request.user.stellar_seed,
-                    lecture.id,
-                    course.id,
-                    lecture.title,
-                    int(start_dt.timestamp()),
-                    duration_minutes
-                )
-                
-                # Update lecture with blockchain ID if successful
-                if 'error' not in blockchain_response:
-                    lecture.blockchain_lecture_id = str(lecture.id)
+                with transaction.atomic():
+                    lecture = lecture_form.save(commit=False)
+                    lecture.course = course
                     lecture.save()
-                    messages.success(request, "Lecture created successfully and recorded on blockchain!")
-                else:
-                    messages.warning(request, f"Lecture created but blockchain recording failed: {blockchain_response.get('error', 'Unknown error')}")
+                    
+                    # Calculate duration in minutes from start_time and end_time
+                    start_dt = datetime.combine(lecture.date, lecture.start_time)
+                    end_dt = datetime.combine(lecture.date, lecture.end_time)
+                    duration_minutes = int((end_dt - start_dt).total_seconds() / 60)
+                    
+                    # Queue the blockchain record; the outbox worker sets
+                    # blockchain_lecture_id once the network accepts it
+                    outbox.enqueue(
+                        BlockchainOutbox.CREATE_LECTURE,
+                        request.user,
+                        lecture=lecture,
+                        course_id=course.id,
+                        title=lecture.title,
+                        date_timestamp=int(start_dt.timestamp()),
+                        duration_minutes=duration_minutes
+                    )
+                
+                messages.success(request, "Lecture created successfully! Blockchain recording is queued.")
                 
                 return redirect('course_detail', pk=course.pk)
         else:
@@ -272,6 +273,8 @@ def lecture_detail(request, pk):
                     # Update existing session
                     active_session.end_time = timezone.now() + timezone.timedelta(minutes=duration)
                     active_session.save()
+                    invalidate_qr_code(lecture.id)
+                    load_roster(active_session)
                 else:
                     # Create new session
                     end_time = timezone.now() + timezone.timedelta(minutes=duration)
@@ -279,42 +282,37 @@ def lecture_detail(request, pk):
                     # Generate nonce
                     nonce = StellarHelper.generate_nonce()
                     
-                    # Start attendance on blockchain
-                    blockchain_response = StellarHelper.start_attendance(
-                        request.user.stellar_seed,
-                        lecture.id,
-                        duration * 60  # Convert to seconds
-                    )
-                    
-                    # If we get a nonce from the blockchain, use it instead
-                    if 'error' not in blockchain_response and 'nonce' in blockchain_response:
-                        nonce = blockchain_response['nonce']
-                    
-                    # Create session in database
-                    active_session = AttendanceSession.objects.create(
-                        lecture=lecture,
-                        end_time=end_time,
-                        nonce=nonce,
-                        is_active=True,
-                        blockchain_verified=True if 'error' not in blockchain_response else False
-                    )
+                    with transaction.atomic():
+                        # Create session in database
+                        active_session = AttendanceSession.objects.create(
+                            lecture=lecture,
+                            end_time=end_time,
+                            nonce=nonce,
+                            is_active=True,
+                            blockchain_verified=False
+                        )
+                        
+                        # Queue the blockchain record; the outbox worker marks the
+                        # session verified once the network accepts it
+                        outbox.enqueue(
+                            BlockchainOutbox.START_ATTENDANCE,
+                            request.user,
+                            lecture=lecture,
+                            session=active_session,
+                            duration_seconds=duration * 60  # Convert to seconds
+                        )
                     
-                    if 'error' in blockchain_response:
-                        messages.warning(request, f"Attendance session started but blockchain recording failed: {blockchain_response.get('error', 'Unknown error')}")
-                    else:
-                        messages.success(request, "Attendance session started and recorded on blockchain!")
+                    # Check-ins are authorized from this roster without queries
+                    load_roster(active_session)
+                    messages.success(request, "Attendance session started! Blockchain recording is queued.")
                 
                 return redirect('lecture_detail', pk=lecture.pk)
         else:
             session_form = AttendanceSessionForm()
         
-        # Generate QR code if session is active
+        # Link the QR image instead of inlining it, so browsers can cache it
         if active_session:
-            qr_code = generate_qr_code(
-                lecture.id,
-                active_session.nonce,
-                active_session.end_time
-            )
+            qr_code = _qr_image_url(active_session)
     
     # Check if student has marked attendance
     student_attended = False
@@ -332,6 +330,8 @@ def lecture_detail(request, pk):
         'active_session': active_session,
         'session_form': session_form,
         'qr_code': qr_code,
+        'qr_rotating': rotating_tokens_enabled(),
+        'qr_poll_seconds': _qr_poll_seconds(),
         'student_attended': student_attended
     })
 
@@ -344,7 +344,30 @@ def scan_attendance(request):
     
     return render(request, 'attendance/scan_attendance.html')
 
+def _chain_unavailable():
+    """
+    Whether Horizon's circuit breaker is open, so queued writes will wait
+    """
+    return get_breaker(settings.STELLAR_HORIZON_URL).state == OPEN
+
+
+INVALID_QR = 'Invalid QR code or expired'
+
+
+def _final_check_in_answer(data):
+    # Answers that a repeat of the same scan would get again; errors that a
+    # later retry could clear (no session yet, server errors) are not replayed
+    return data.get('success') or data.get('error') in (INVALID_QR, ALREADY_MARKED)
+
+
+def _check_in_limited(request, retry_after):
+    return JsonResponse({'success': False, 'error': 'Too many scans. Please wait a moment and try again.'},
+                        status=429)
+
+
 @login_required
+@idempotent('check_in', field='qr_data', replayable=_final_check_in_answer)
+@ratelimit('check_in', key='user', limited_response=_check_in_limited)
 def process_attendance(request):
     """Process the scanned QR code data"""
     if not request.user.is_student:
@@ -358,65 +381,32 @@ def process_attendance(request):
             # Verify QR data
             data = verify_qr_data(qr_data)
             if not data:
-                return JsonResponse({'success': False, 'error': 'Invalid QR code or expired'})
-            
-            lecture_id = data['lecture_id']
-            nonce = data['nonce']
-            
-            # Get lecture and active session
-            lecture = get_object_or_404(Lecture, pk=lecture_id)
-            session = AttendanceSession.objects.filter(
-                lecture=lecture,
-                nonce=nonce,
-                is_active=True
-            ).first()
-            
-            if not session:
-                return JsonResponse({'success': False, 'error': 'No active attendance session for this lecture'})
-            
-            # Check if already marked
-            if Attendance.objects.filter(lecture=lecture, student=request.user).exists():
-                return JsonResponse({'success': False, 'error': 'You have already marked attendance for this lecture'})
-            
-            # Check if student is enrolled in the course
-            if not Enrollment.objects.filter(course=lecture.course, student=request.user).exists():
-                return JsonResponse({'success': False, 'error': 'You are not enrolled in this course'})
-            
-            # Mark attendance on blockchain
-            blockchain_response = StellarHelper.mark_attendance(
-                request.user.stellar_seed,
-                lecture.id,
-                nonce
-            )
-            
-            # Determine blockchain verification status
-            blockchain_verified = 'error' not in blockchain_response
-            
-            # Create attendance record
-            attendance = Attendance.objects.create(
-                student=request.user,
-                lecture=lecture,
-                session=session,
-                blockchain_verified=blockchain_verified
-            )
+                return JsonResponse({'success': False, 'error': INVALID_QR})
             
-            # If there's a transaction hash from blockchain, save it
-            if blockchain_verified and 'hash' in blockchain_response:
-                attendance.transaction_hash = blockchain_response['hash']
-                attendance.save()
-                
-                response_message = 'Attendance marked successfully and recorded on blockchain!'
-            else:
-                response_message = 'Attendance marked successfully, but blockchain recording failed.'
-                if 'error' in blockchain_response:
-                    print(f"Blockchain error: {blockchain_response['error']}")
+            try:
+                if write_behind_enabled():
+                    # Validate against the cached session and journal the
+                    # check-in; the flusher writes it to the database
+                    roster = buffer_check_in(request.user, data)
+                else:
+                    # Authorize from the cached roster, then insert; the unique
+                    # constraint catches duplicates
+                    roster = check_in(request.user, data)
+            except CheckInError as e:
+                return JsonResponse({'success': False, 'error': str(e)})
             
+            message = 'Attendance marked successfully! Blockchain confirmation is pending.'
+            chain_pending = _chain_unavailable()
+            if chain_pending:
+                message = 'Attendance recorded locally. The blockchain is unavailable; it will be recorded once it recovers.'
             return JsonResponse({
                 'success': True, 
-                'message': response_message,
-                'course': lecture.course.name,
-                'lecture': lecture.title,
-                'blockchain_verified': blockchain_verified
+                'message': message,
+                'course': roster.course_name,
+                'lecture': roster.lecture_title,
+                'blockchain_verified': False,
+                'blockchain_pending': True,
+                'chain_pending': chain_pending
             })
             
         except Exception as e:
@@ -435,26 +425,131 @@ def close_attendance_session(request, session_id):
         messages.error(request, "You don't have permission to close this attendance session.")
         return redirect('lecture_detail', pk=lecture.pk)
     
-    session.is_active = False
-    session.end_time = timezone.now()
-    session.save()
-    
-    # Close session on blockchain if it was verified
-    if session.blockchain_verified:
-        blockchain_response = StellarHelper.close_attendance_session(
-            request.user.stellar_seed,
-            lecture.id
-        )
+    with transaction.atomic():
+        session.is_active = False
+        session.end_time = timezone.now()
+        session.save()
         
-        if 'error' in blockchain_response:
-            messages.warning(request, f"Attendance session closed but blockchain update failed: {blockchain_response.get('error', 'Unknown error')}")
-        else:
-            messages.success(request, "Attendance session closed and blockchain updated!")
-    else:
-        messages.success(request, "Attendance session closed successfully!")
+        # Queue the blockchain update, which waits for the session start to
+        # be confirmed; a session the chain never saw start is not closed there
+        if outbox.start_recorded(session):
+            outbox.enqueue(
+                BlockchainOutbox.CLOSE_ATTENDANCE,
+                request.user,
+                lecture=lecture,
+                session=session
+            )
+        if anchoring_enabled():
+            anchor_session(session)
+    invalidate_qr_code(lecture.id)
+    drop_roster(lecture.id)
+    
+    messages.success(request, "Attendance session closed successfully!")
     
     return redirect('lecture_detail', pk=lecture.pk)
 
+def _qr_session(request, session_id):
+    """
+    The session whose QR code ``request.user`` may display, or None
+    """
+    session = get_object_or_404(AttendanceSession.objects.select_related('lecture__course'), pk=session_id)
+    course = session.lecture.course
+    if not request.user.is_teacher or (request.user != course.teacher and not request.user.is_admin):
+        return None
+    return session
+
+def _qr_etag(session):
+    return payload_etag(session_payload(session))
+
+def _qr_image_url(session):
+    # The version parameter makes a new nonce or expiry a new URL
+    version = _qr_etag(session).strip('"')
+    return f"{reverse('attendance_qr_image', args=[session.pk])}?v={version}"
+
+def _seconds_left(session):
+    return max(int((session.end_time - timezone.now()).total_seconds()), 0)
+
+def _qr_max_age(session):
+    # A rotating code is replaced at the next step, a static one lasts the session
+    if rotating_tokens_enabled():
+        return min(seconds_until_rotation(), _seconds_left(session))
+    return _seconds_left(session)
+
+@login_required
+def attendance_qr_image(request, session_id):
+    """Serve the raw PNG of an active session's QR code, honouring If-None-Match"""
+    session = _qr_session(request, session_id)
+    if session is None:
+        return HttpResponseForbidden()
+    if not session.is_active:
+        raise Http404("Attendance session is closed")
+    
+    payload = session_payload(session)
+    etag = payload_etag(payload)
+    version = request.GET.get('v')
+    if version is not None and version != etag.strip('"'):
+        # A stale version must not be cached as the current image
+        response = redirect(_qr_image_url(session))
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(render_payload_png(session.lecture_id, payload), content_type='image/png')
+    response['ETag'] = etag
+    if version is None:
+        # The unversioned URL shows whatever is current, so always revalidate
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        # This version's image cannot change before then
+        patch_cache_control(response, private=True, max_age=_qr_max_age(session))
+    return response
+
+@login_required
+def attendance_qr_status(request, session_id):
+    """Lightweight poll telling projector pages whether the QR code changed"""
+    session = _qr_session(request, session_id)
+    if session is None:
+        return JsonResponse({'active': False, 'error': 'Permission denied'}, status=403)
+    
+    etag = _qr_etag(session) if session.is_active else '"closed"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        data = {'active': session.is_active}
+        if session.is_active:
+            data.update({
+                'etag': etag.strip('"'),
+                'image_url': _qr_image_url(session),
+                'expires_at': session.end_time.isoformat(),
+                'seconds_left': _seconds_left(session),
+                'refresh_in': _qr_max_age(session),
+            })
+        response = JsonResponse(data)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _qr_poll_seconds():
+    # Poll often enough to show each rotating code for most of its step
+    if rotating_tokens_enabled():
+        return max(1, min(5, settings.QR_TOKEN_STEP // 3))
+    return 5
+
+@login_required
+def attendance_projector(request, session_id):
+    """Full-screen QR display that swaps the image only when the code changes"""
+    session = _qr_session(request, session_id)
+    if session is None:
+        messages.error(request, "You don't have permission to display this attendance session.")
+        return redirect('dashboard')
+    
+    return render(request, 'attendance/projector.html', {
+        'session': session,
+        'lecture': session.lecture,
+        'qr_image_url': _qr_image_url(session) if session.is_active else None,
+        'poll_url': reverse('attendance_qr_status', args=[session.pk]),
+        'poll_seconds': _qr_poll_seconds(),
+    })
+
 @login_required
 def manual_attendance(request, lecture_id):
     """Allow teachers to mark attendance manually"""
@@ -490,31 +585,42 @@ def manual_attendance(request, lecture_id):
                 Attendance.objects.filter(lecture=lecture).exclude(student__in=selected_students).delete()
                 
                 # Add attendance for newly selected students
-                for student in selected_students:
-                    if not Attendance.objects.filter(lecture=lecture, student=student).exists():
-                        # Record attendance on blockchain
-                        blockchain_response = StellarHelper.manual_attendance(
-                            request.user.stellar_seed,
-                            lecture.id,
-                            student.stellar_public_key
-                        )
-                        
-                        # Determine blockchain verification status
-                        blockchain_verified = 'error' not in blockchain_response
-                        
-                        # Create attendance record
-                        attendance = Attendance.objects.create(
-                            student=student,
-                            lecture=lecture,
-                            blockchain_verified=blockchain_verified
-                        )
-                        
-                        # If there's a transaction hash from blockchain, save it
-                        if blockchain_verified and 'hash' in blockchain_response:
-                            attendance.transaction_hash = blockchain_response['hash']
-                            attendance.save()
+                already_marked = set(
+                    Attendance.objects.filter(lecture=lecture).values_list('student_id', flat=True)
+                )
+                new_students = [student for student in selected_students if student.id not in already_marked]
+                Attendance.objects.bulk_create([
+                    Attendance(student=student, lecture=lecture, blockchain_verified=False)
+                    for student in new_students
+                ])
+                
+                # Queue one batched blockchain record for the whole selection,
+                # signed by the teacher; students without a Stellar account
+                # are only recorded here
+                public_keys = {student.id: student.stellar_public_key for student in new_students
+                               if is_valid_public_key(student.stellar_public_key)}
+                unrecordable = [student.username for student in new_students if student.id not in public_keys]
+                if public_keys:
+                    created = Attendance.objects.filter(
+                        lecture=lecture, student_id__in=public_keys
+                    ).values_list('id', 'student_id')
+                    outbox.enqueue(
+                        BlockchainOutbox.MANUAL_ATTENDANCE_BATCH,
+                        request.user,
+                        lecture=lecture,
+                        students=[
+                            {'attendance_id': attendance_id, 'public_key': public_keys[student_id]}
+                            for attendance_id, student_id in created
+                        ]
+                    )
             
             messages.success(request, "Attendance updated successfully!")
+            if unrecordable:
+                messages.warning(request, "Not recorded on the blockchain (no valid Stellar account): "
+                                          f"{', '.join(unrecordable)}")
+            if _chain_unavailable():
+                messages.warning(request, "The blockchain is currently unavailable. Attendance is recorded locally "
+                                          "and will be written to the blockchain once it recovers.")
             return redirect('lecture_detail', pk=lecture.pk)
     else:
         form = ManualAttendanceForm(course, initial={'students': initial_students})
@@ -562,15 +668,29 @@ def check_blockchain_connection(request):
         messages.error(request, "You don't have permission to access this page")
         return redirect('dashboard')
     
-    # Check the contract connection
-    result = StellarHelper.verify_contract_connection()
+    # Serve the cached health snapshot instead of probing the network per view
+    result = dict(health_prober.snapshot())
+    history = health_prober.history()
     
     # Return JSON response or render a template based on the request
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        result['history'] = history
+        result['connection_pools'] = client_stats()
+        result['channel_accounts'] = channel_pool.stats()
+        result['circuit_breakers'] = breaker_states()
+        result['contract_preparation'] = dict(contract_invoker.stats)
+        result['qr_image_cache'] = qr_image_cache.stats()
+        result['check_in_idempotency'] = idempotency_stats()
         return JsonResponse(result)
     
     return render(request, 'attendance/blockchain_status.html', {
-        'result': result
+        'result': result,
+        'circuit_breakers': breaker_states(),
+        'checked_at': datetime.fromtimestamp(result['checked_at'], tz=timezone.get_current_timezone()),
+        'history': [
+            {**point, 'checked_at': datetime.fromtimestamp(point['checked_at'], tz=timezone.get_current_timezone())}
+            for point in reversed(history)
+        ],
     })
 
 @login_required
@@ -597,6 +717,14 @@ def blockchain_statistics(request):
         blockchain_verified=True
     ).order_by('-timestamp')[:10]
     
+    # What the ledger itself holds, from the index kept by index_blockchain
+    chain = ChainAttendanceRecord.objects.aggregate(
+        attendance=Count('pk', filter=Q(kind__in=(ChainAttendanceRecord.CHECK_IN, ChainAttendanceRecord.MANUAL))),
+        sessions=Count('pk', filter=Q(kind=ChainAttendanceRecord.SESSION_START)),
+        lectures=Count('pk', filter=Q(kind=ChainAttendanceRecord.LECTURE)),
+        latest_ledger=Max('ledger'),
+    )
+    
     return render(request, 'attendance/blockchain_statistics.html', {
         'total_lectures': total_lectures,
         'lectures_on_blockchain': lectures_on_blockchain,
@@ -605,7 +733,12 @@ def blockchain_statistics(request):
         'total_sessions': total_sessions,
         'blockchain_verified_sessions': blockchain_verified_sessions,
         'recent_attendances': recent_attendances,
-        'blockchain_percentage': int(blockchain_verified_attendance / max(total_attendance, 1) * 100)
+        'blockchain_percentage': int(blockchain_verified_attendance / max(total_attendance, 1) * 100),
+        'chain_attendance': chain['attendance'],
+        'chain_sessions': chain['sessions'],
+        'chain_lectures': chain['lectures'],
+        'chain_latest_ledger': chain['latest_ledger'],
+        'indexer_updated_at': IndexerCursor.objects.aggregate(latest=Max('updated_at'))['latest'],
     })
 
 
@@ -623,31 +756,26 @@ class RateLimitedPasswordResetView(PasswordResetView):
     MAX_ATTEMPTS = 5  # Maximum attempts per hour
     RATE_LIMIT_WINDOW = 3600  # 1 hour in seconds
     
-    def get_rate_limit_key(self):
-        """Generate cache key for rate limiting based on IP address"""
-        ip_address = self.get_client_ip()
-        return f"password_reset_limit_{ip_address}"
+    @property
+    def rate_limit(self):
+        """Shared sliding-window limit on submitted resets"""
+        return RateLimit('password_reset', self.MAX_ATTEMPTS, self.RATE_LIMIT_WINDOW)
     
     def get_client_ip(self):
         """Get client IP address from request"""
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-        return ip
+        return client_ip(self.request)
+    
+    def get_rate_limit_identity(self):
+        """Rate limits are counted per IP address"""
+        return f"ip:{self.get_client_ip()}"
     
     def is_rate_limited(self):
         """Check if current IP is rate limited"""
-        cache_key = self.get_rate_limit_key()
-        current_attempts = cache.get(cache_key, 0)
-        return current_attempts >= self.MAX_ATTEMPTS
+        return self.rate_limit.is_limited(self.get_rate_limit_identity())
     
     def increment_attempt(self):
-        """Increment rate limit counter for current IP"""
-        cache_key = self.get_rate_limit_key()
-        current_attempts = cache.get(cache_key, 0)
-        cache.set(cache_key, current_attempts + 1, self.RATE_LIMIT_WINDOW)
+        """Count an attempt for current IP (atomically, across workers)"""
+        self.rate_limit.hit(self.get_rate_limit_identity())
     
     def dispatch(self, request, *args, **kwargs):
         """Check rate limiting before processing request"""
@@ -668,10 +796,11 @@ class RateLimitedPasswordResetView(PasswordResetView):
         logger.info(f"Password reset attempt from IP {self.get_client_ip()}")
         
         # Add informational message
+        remaining = max(0, self.MAX_ATTEMPTS - math.ceil(self.rate_limit.count(self.get_rate_limit_identity())))
         messages.info(
             self.request,
             f"Password reset email sent if the account exists. "
-            f"You have {max(0, self.MAX_ATTEMPTS - cache.get(self.get_rate_limit_key(), 0))} attempts remaining this hour."
+            f"You have {remaining} attempts remaining this hour."
         )
         
         return super().form_valid(form)
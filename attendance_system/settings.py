@@ -29,6 +29,71 @@ env = environ.Env(
     STELLAR_RPC_URL=(str, 'https://soroban-testnet.stellar.org'),
     STELLAR_CONTRACT_ID=(str, ''),
     STELLAR_ADMIN_SECRET=(str, ''),
+    STELLAR_HTTP_POOL_SIZE=(int, 20),
+    STELLAR_HTTP_RETRIES=(int, 3),
+    STELLAR_HTTP_TIMEOUT=(int, 20),
+    STELLAR_SEQUENCE_TTL=(int, 300),
+    STELLAR_SEQUENCE_RETRIES=(int, 2),
+    STELLAR_OUTBOX_CONCURRENCY=(int, 4),
+    STELLAR_OUTBOX_MAX_ATTEMPTS=(int, 5),
+    STELLAR_OUTBOX_RETRY_DELAY=(int, 30),
+    STELLAR_OUTBOX_LEASE_SECONDS=(int, 120),
+    STELLAR_CHANNELS_ENABLED=(bool, True),
+    STELLAR_CHANNEL_LEASE_SECONDS=(int, 60),
+    STELLAR_CHANNEL_MAX_FAILURES=(int, 3),
+    STELLAR_CHANNEL_COOLDOWN=(int, 300),
+    STELLAR_FEE_STATS_TTL=(int, 10),
+    STELLAR_FEE_STATS_BACKGROUND=(bool, True),
+    STELLAR_FEE_CHECKIN_PERCENTILE=(int, 50),
+    STELLAR_FEE_ADMIN_PERCENTILE=(int, 90),
+    STELLAR_FEE_DEFAULT=(int, 1000),
+    STELLAR_MAX_BASE_FEE=(int, 100000),
+    STELLAR_FEE_BUMP_MULTIPLIER=(int, 10),
+    STELLAR_FEE_BUMP_ATTEMPTS=(int, 2),
+    STELLAR_FEE_BUMP_AFTER_LEDGERS=(int, 3),
+    STELLAR_TX_TIMEOUT=(int, 60),
+    STELLAR_ASYNC_SUBMISSION=(bool, True),
+    STELLAR_CONFIRMATION_GRACE=(int, 15),
+    STELLAR_SIMULATOR=(bool, False),
+    STELLAR_SIMULATOR_LATENCY=(float, 0.05),
+    STELLAR_SIMULATOR_ERROR_RATE=(float, 0.0),
+    STELLAR_SIMULATOR_LEDGER_CLOSE=(float, 5.0),
+    STELLAR_SIMULATOR_SEED=(int, 0),
+    STELLAR_SIMULATOR_AUTO_FUND=(bool, True),
+    STELLAR_KEYPAIR_POOL_SIZE=(int, 50),
+    STELLAR_KEYPAIR_POOL_BALANCE=(str, '5'),
+    STELLAR_FRIENDBOT_TIMEOUT=(int, 30),
+    STELLAR_HEALTH_TTL=(int, 15),
+    STELLAR_HEALTH_HISTORY=(int, 60),
+    STELLAR_BREAKER_ENABLED=(bool, True),
+    STELLAR_BREAKER_WINDOW=(int, 20),
+    STELLAR_BREAKER_MIN_CALLS=(int, 5),
+    STELLAR_BREAKER_FAILURE_RATE=(float, 0.5),
+    STELLAR_BREAKER_SLOW_CALL_SECONDS=(float, 5.0),
+    STELLAR_BREAKER_SLOW_CALL_RATE=(float, 0.8),
+    STELLAR_BREAKER_OPEN_SECONDS=(int, 30),
+    STELLAR_BREAKER_HALF_OPEN_CALLS=(int, 2),
+    STELLAR_ATTENDANCE_ANCHORING=(str, 'transaction'),
+    STELLAR_CONTRACT_INVOCATION=(bool, False),
+    STELLAR_SOROBAN_PREPARE_TTL=(int, 300),
+    STELLAR_SOROBAN_RESOURCE_MARGIN=(float, 1.2),
+    QR_CACHE_SIZE=(int, 256),
+    QR_TOKEN_MODE=(str, 'static'),
+    QR_TOKEN_STEP=(int, 15),
+    QR_TOKEN_SKEW_STEPS=(int, 1),
+    QR_TOKEN_SECRET=(str, ''),
+    QR_PAYLOAD_FORMAT=(str, 'compact'),
+    CHECKIN_WRITE_BEHIND=(bool, False),
+    CHECKIN_BUFFER_DIR=(str, str(BASE_DIR / 'var' / 'checkin_buffer')),
+    CHECKIN_BUFFER_FSYNC=(bool, True),
+    CHECKIN_FLUSH_BATCH_SIZE=(int, 500),
+    CHECKIN_FLUSH_INTERVAL=(float, 1.0),
+    CHECKIN_SESSION_CACHE_SECONDS=(int, 30),
+    CHECKIN_IDEMPOTENCY_TTL=(int, 900),
+    QUERY_COUNT_HEADER=(bool, False),
+    RATE_LIMIT_CHECK_IN=(str, '30/m'),
+    RATE_LIMIT_SIGNUP=(str, '10/h'),
+    CACHE_URL=(str, 'locmemcache://unique-snowflake'),
     STATIC_URL=(str, '/static/'),
 )
 
@@ -77,6 +142,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'attendance.middleware.QueryCountMiddleware',
 ]
 
 ROOT_URLCONF = 'attendance_system.urls'
@@ -192,11 +258,10 @@ SERVER_EMAIL = DEFAULT_FROM_EMAIL
 PASSWORD_RESET_TIMEOUT = 86400  # 24 hours in seconds
 
 # Cache configuration for rate limiting
+# Per-process by default; set CACHE_URL (e.g. redis://localhost:6379/1) so
+# workers and web processes share leases, sequences and health snapshots
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+    'default': env.cache_url('CACHE_URL'),
 }
 STELLAR_NETWORK = env('STELLAR_NETWORK')
 STELLAR_TESTNET = STELLAR_NETWORK == 'testnet'
@@ -204,3 +269,119 @@ STELLAR_HORIZON_URL = env('STELLAR_HORIZON_URL')
 STELLAR_RPC_URL = env('STELLAR_RPC_URL')
 STELLAR_CONTRACT_ID = env('STELLAR_CONTRACT_ID')
 STELLAR_ADMIN_SECRET = env('STELLAR_ADMIN_SECRET')
+
+# Pooled Horizon/Soroban HTTP clients (see attendance/stellar_clients.py)
+STELLAR_HTTP_POOL_SIZE = env('STELLAR_HTTP_POOL_SIZE')  # keep-alive connections per URL
+STELLAR_HTTP_RETRIES = env('STELLAR_HTTP_RETRIES')
+STELLAR_HTTP_TIMEOUT = env('STELLAR_HTTP_TIMEOUT')  # seconds
+
+# Locally managed source-account sequence numbers (see attendance/stellar_sequence.py)
+STELLAR_SEQUENCE_TTL = env('STELLAR_SEQUENCE_TTL')  # seconds before a cached sequence is reloaded
+STELLAR_SEQUENCE_RETRIES = env('STELLAR_SEQUENCE_RETRIES')  # rebuilds after tx_bad_seq
+
+# Blockchain outbox worker (python manage.py process_blockchain_outbox)
+STELLAR_OUTBOX_CONCURRENCY = env('STELLAR_OUTBOX_CONCURRENCY')  # entries submitted in parallel
+STELLAR_OUTBOX_MAX_ATTEMPTS = env('STELLAR_OUTBOX_MAX_ATTEMPTS')
+STELLAR_OUTBOX_RETRY_DELAY = env('STELLAR_OUTBOX_RETRY_DELAY')  # seconds, doubled per attempt
+STELLAR_OUTBOX_LEASE_SECONDS = env('STELLAR_OUTBOX_LEASE_SECONDS')  # before a crashed worker's entry is retried
+
+# Channel accounts for teacher/admin writes (python manage.py provision_channel_accounts)
+STELLAR_CHANNELS_ENABLED = env('STELLAR_CHANNELS_ENABLED')
+STELLAR_CHANNEL_LEASE_SECONDS = env('STELLAR_CHANNEL_LEASE_SECONDS')  # lease lifetime; never shorter than STELLAR_TX_TIMEOUT + STELLAR_CONFIRMATION_GRACE
+STELLAR_CHANNEL_MAX_FAILURES = env('STELLAR_CHANNEL_MAX_FAILURES')  # consecutive failures before cool-down
+STELLAR_CHANNEL_COOLDOWN = env('STELLAR_CHANNEL_COOLDOWN')  # seconds
+
+# Adaptive transaction fees (see attendance/stellar_fees.py)
+STELLAR_FEE_STATS_TTL = env('STELLAR_FEE_STATS_TTL')  # seconds between fee_stats refreshes
+STELLAR_FEE_STATS_BACKGROUND = env('STELLAR_FEE_STATS_BACKGROUND')  # refresh in a daemon thread instead of inline
+STELLAR_FEE_CHECKIN_PERCENTILE = env('STELLAR_FEE_CHECKIN_PERCENTILE')  # student check-ins and registrations
+STELLAR_FEE_ADMIN_PERCENTILE = env('STELLAR_FEE_ADMIN_PERCENTILE')  # teacher/admin writes
+STELLAR_FEE_DEFAULT = env('STELLAR_FEE_DEFAULT')  # stroops per operation until fee stats are known
+STELLAR_MAX_BASE_FEE = env('STELLAR_MAX_BASE_FEE')  # stroops per operation, hard cap including fee bumps
+STELLAR_FEE_BUMP_MULTIPLIER = env('STELLAR_FEE_BUMP_MULTIPLIER')  # at least 10: stellar-core's minimum to replace a queued transaction
+STELLAR_FEE_BUMP_ATTEMPTS = env('STELLAR_FEE_BUMP_ATTEMPTS')  # fee bumps before a stuck transaction is given up
+STELLAR_FEE_BUMP_AFTER_LEDGERS = env('STELLAR_FEE_BUMP_AFTER_LEDGERS')  # ledgers a queued transaction waits before the confirmation poller fee-bumps it
+STELLAR_TX_TIMEOUT = env('STELLAR_TX_TIMEOUT')  # seconds until a submitted transaction expires
+
+# Transaction confirmation (python manage.py poll_blockchain_transactions)
+STELLAR_ASYNC_SUBMISSION = env('STELLAR_ASYNC_SUBMISSION')  # return once queued; the poller confirms inclusion
+STELLAR_CONFIRMATION_GRACE = env('STELLAR_CONFIRMATION_GRACE')  # seconds past STELLAR_TX_TIMEOUT before a missing transaction counts as expired
+
+# Offline ledger simulator in place of Horizon/Soroban RPC (see attendance/stellar_simulator.py)
+STELLAR_SIMULATOR = env('STELLAR_SIMULATOR')  # in-memory ledger per process: web, outbox worker and indexer don't share it
+STELLAR_SIMULATOR_LATENCY = env('STELLAR_SIMULATOR_LATENCY')  # mean seconds per request
+STELLAR_SIMULATOR_ERROR_RATE = env('STELLAR_SIMULATOR_ERROR_RATE')  # share of requests failing with 5xx
+STELLAR_SIMULATOR_LEDGER_CLOSE = env('STELLAR_SIMULATOR_LEDGER_CLOSE')  # seconds; 0 closes a ledger per transaction
+STELLAR_SIMULATOR_SEED = env('STELLAR_SIMULATOR_SEED')
+STELLAR_SIMULATOR_AUTO_FUND = env('STELLAR_SIMULATOR_AUTO_FUND')  # create unknown accounts on first use
+
+# Pre-funded keypairs handed out at signup (python manage.py refill_keypair_pool)
+STELLAR_KEYPAIR_POOL_SIZE = env('STELLAR_KEYPAIR_POOL_SIZE')  # unclaimed keypairs the refiller keeps ready
+STELLAR_KEYPAIR_POOL_BALANCE = env('STELLAR_KEYPAIR_POOL_BALANCE')  # XLM per account when funded from STELLAR_ADMIN_SECRET
+STELLAR_FRIENDBOT_TIMEOUT = env('STELLAR_FRIENDBOT_TIMEOUT')  # seconds
+
+# Cached Horizon/Soroban health snapshot (python manage.py probe_blockchain_health)
+STELLAR_HEALTH_TTL = env('STELLAR_HEALTH_TTL')  # seconds a snapshot is served before it is re-probed
+STELLAR_HEALTH_HISTORY = env('STELLAR_HEALTH_HISTORY')  # snapshots kept for the trend display
+
+# Per-endpoint circuit breakers around Horizon/Soroban calls (see attendance/circuit_breaker.py)
+STELLAR_BREAKER_ENABLED = env('STELLAR_BREAKER_ENABLED')
+STELLAR_BREAKER_WINDOW = env('STELLAR_BREAKER_WINDOW')  # recent calls the rates are computed over
+STELLAR_BREAKER_MIN_CALLS = env('STELLAR_BREAKER_MIN_CALLS')  # calls in the window before the breaker can open
+STELLAR_BREAKER_FAILURE_RATE = env('STELLAR_BREAKER_FAILURE_RATE')  # share of errors/5xx that opens the breaker
+STELLAR_BREAKER_SLOW_CALL_SECONDS = env('STELLAR_BREAKER_SLOW_CALL_SECONDS')
+STELLAR_BREAKER_SLOW_CALL_RATE = env('STELLAR_BREAKER_SLOW_CALL_RATE')  # share of slow calls that opens the breaker
+STELLAR_BREAKER_OPEN_SECONDS = env('STELLAR_BREAKER_OPEN_SECONDS')  # fail fast this long before trial calls
+STELLAR_BREAKER_HALF_OPEN_CALLS = env('STELLAR_BREAKER_HALF_OPEN_CALLS')  # successful trial calls that close it again
+
+# How QR check-ins reach the chain: 'transaction' (one per check-in) or 'merkle'
+# (one Merkle root per session batch; see attendance/anchoring.py and
+# python manage.py anchor_attendance)
+STELLAR_ATTENDANCE_ANCHORING = env('STELLAR_ATTENDANCE_ANCHORING')
+
+# Call the attendance contract (STELLAR_CONTRACT_ID) instead of writing memo-only
+# transactions; simulations are cached per argument shape (see attendance/stellar_contract.py)
+STELLAR_CONTRACT_INVOCATION = env('STELLAR_CONTRACT_INVOCATION')
+STELLAR_SOROBAN_PREPARE_TTL = env('STELLAR_SOROBAN_PREPARE_TTL')  # seconds a cached preparation is reused
+STELLAR_SOROBAN_RESOURCE_MARGIN = env('STELLAR_SOROBAN_RESOURCE_MARGIN')  # headroom on cached resources and fee
+
+# Rendered attendance QR images kept per process, keyed by lecture, nonce and expiry
+QR_CACHE_SIZE = env('QR_CACHE_SIZE')  # images kept before the least recently used is evicted
+
+# QR payloads: 'static' (session nonce and expiry) or 'rotating' (HMAC over
+# lecture, session and time step, verified without a database lookup)
+QR_TOKEN_MODE = env('QR_TOKEN_MODE')
+QR_TOKEN_STEP = env('QR_TOKEN_STEP')  # seconds each rotating code is shown
+QR_TOKEN_SKEW_STEPS = env('QR_TOKEN_SKEW_STEPS')  # neighbouring steps still accepted (scan delay, clock skew)
+QR_TOKEN_SECRET = env('QR_TOKEN_SECRET')  # HMAC key; SECRET_KEY is used when empty
+# 'compact' packs the payload in binary and encodes it as base45 (QR
+# alphanumeric mode, lower QR version); 'json' keeps the original JSON text.
+# Scans of either format are accepted.
+QR_PAYLOAD_FORMAT = env('QR_PAYLOAD_FORMAT')
+
+# Write-behind check-ins: scans are validated against cached session state and
+# journaled to disk, then bulk-inserted by python manage.py flush_checkin_buffer
+# (see attendance/checkin_buffer.py)
+CHECKIN_WRITE_BEHIND = env('CHECKIN_WRITE_BEHIND')
+CHECKIN_BUFFER_DIR = env('CHECKIN_BUFFER_DIR')  # must be shared by the web workers and the flusher
+CHECKIN_BUFFER_FSYNC = env('CHECKIN_BUFFER_FSYNC')  # fsync each journaled check-in before answering
+CHECKIN_FLUSH_BATCH_SIZE = env('CHECKIN_FLUSH_BATCH_SIZE')  # rows per bulk_create transaction
+CHECKIN_FLUSH_INTERVAL = env('CHECKIN_FLUSH_INTERVAL')  # seconds between flushes
+CHECKIN_SESSION_CACHE_SECONDS = env('CHECKIN_SESSION_CACHE_SECONDS')  # already-marked students cached for write-behind scans
+
+# Repeated check-in POSTs (the scanner re-decoding the code, phone retries)
+# get the first answer replayed from the cache (see attendance/idempotency.py)
+CHECKIN_IDEMPOTENCY_TTL = env('CHECKIN_IDEMPOTENCY_TTL')  # seconds an answer is replayed
+
+# Add X-DB-Query-Count / X-DB-Query-Time-Ms, X-Cache-Backend and
+# X-Stellar-Simulator headers to every response, for
+# python manage.py loadtest_checkins (see attendance/middleware.py)
+QUERY_COUNT_HEADER = env('QUERY_COUNT_HEADER')
+
+# Shared sliding-window rate limits applied before the view runs, as
+# 'count/period' ('20/m', '100/10s'); empty disables (see attendance/ratelimit.py).
+# Counts are only shared between processes with a shared CACHE_URL.
+RATE_LIMITS = {
+    'check_in': env('RATE_LIMIT_CHECK_IN'),  # per student
+    'signup': env('RATE_LIMIT_SIGNUP'),  # per client IP, submitted signup forms
+}